@@ -1,5 +1,5 @@
+import atoms
 import bib
-import bibpdb
 import ctl
 import geometry
 
@@ -25,8 +25,6 @@ def align_layer(axes, layer, conf, sess):
     center_res = ax_reprs_first.termini[0]+ \
             round( (ax_reprs_first.termini[1]-ax_reprs_first.termini[0])/2 )
 
-    sess.open_session(conf.layer_raw_path)
-
     # combine all models to intermediate_id
     intermediate_id = 101
     chainids_new = sess.combine(models_to_align, intermediate_id)
@@ -66,8 +64,7 @@ def align_layer(axes, layer, conf, sess):
     # determine residue with lowest and the highest coordinate in z direction
     sess.save_model_id(intermediate_id, \
                        conf.layer_aligned_raw_path[:-4]+'.pdb', 'pdb')
-    coords = bibpdb.open_pdb(str(conf.layer_aligned_raw_path[:-4])+'.pdb', \
-                            False)
+    coords = atoms.read_atom_table(conf.layer_aligned_raw_path[:-4]+'.pdb')
     os.unlink(conf.layer_aligned_raw_path[:-4]+'.pdb')
     pre_alignment_extrema = geometry.get_extrema(coords, 'z', 'all')
 
@@ -129,8 +126,7 @@ def align_layer(axes, layer, conf, sess):
     # turn probable outside of layer model to top (estimation)
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     sess.save_model_id((1,), conf.layer_aligned_raw_path[:-4]+'.pdb', 'pdb')
-    coord = bibpdb.open_pdb(str(conf.layer_aligned_raw_path[:-4])+'.pdb', \
-                            False)
+    coord = atoms.read_atom_table(conf.layer_aligned_raw_path[:-4]+'.pdb')
     os.unlink(conf.layer_aligned_raw_path[:-4]+'.pdb')
 
     cen = geometry.get_center(coord, 'all')
@@ -151,6 +147,4 @@ def align_layer(axes, layer, conf, sess):
     # split combine models and assign original ids
     sess.split(intermediate_id)
 
-    sess.save_models('all', conf.layer_aligned_raw_path)
-
     return
@@ -4,12 +4,14 @@ import structure.monomer
 
 import bib
 import align_layer
+import checkpoint
 import chimerax_api
 import complete_outer_chains
 import ctl
 import export
 import filesystem
 import geometry
+import lattice_scan
 import math
 import os
 import structure.primitive_unit_cell
@@ -17,7 +19,6 @@ import proteinmerge
 import snapin
 import validation
 
-import glob
 import json
 
 
@@ -61,12 +62,29 @@ class Assembler():
         self.model_reg = self.axes[0].model_reg
 
         self.lc_offset = lc_offset
-        self.lc_var = [0, 30, 2, 4, 6, 8, 10, 12, 14, 16, 18, 20, \
-                       22, 24, 26, 28]
-        # self.lc_var = [0, 2, 4]
+        self.lc_offset_max = 30
+        self.lc_offset_step = 2
+            # variation of lattice constant: lattice offsets 0 ... lc_offset_max
+            # (grid of lc_offset_step)
+        self.lc_search = 0
+            # 0: linear scan of the lattice offsets with the validation of the
+            #    tile (alignment and snap-in for each offset), all scanned
+            #    offsets are exported
+            # 1: golden-section search with the clashes between the
+            #    representations (lattice_scan), only the offsets 0,
+            #    lc_offset_max and the offset found are exported
+        self.refpoint_constant_base = 0
+            # reference point constant of the snapped-in layer (offset 0)
+
+        self.snapshots = {}
+            # in-memory snapshots of the session:
+            # 'raw', 'aligned', 'snapin', 'snapin_base'
+        self.debug_mode = False
+        self.checkpoints = None
+            # stage checkpoints of the run (checkpoint.Manifest)
 
         if lc_offset == False:
-            self.lc_var = [0]
+            self.lc_offset_max = 0
 
         # test if gene contains only one domain
         if len(conf.domains) == 1 and len(self.axes) > 1:
@@ -79,16 +97,28 @@ class Assembler():
         return
 
 
-    def run(self, debug_mode=False):
+    def run(self, debug_mode=False, resume=True):
         '''
         Run whole assembly process.
 
+        resume: resume a previous run in the export folder after its completed
+            stages (checkpoint manifest with the same inputs). The layer
+            stages (build, alignment, snapin) are kept in memory only and are
+            always repeated, skipped are the lattice scan, completed lattice
+            offsets and completed exports.
+
         Return:
             int: 1:assembly possible
                  2:assembly not possible because tilt >45°
                  3:assembly not possible because gap between both SymPlexes
                     too large
         '''
+        self.debug_mode = debug_mode
+        self.checkpoints = checkpoint.Manifest(self.conf.export_path+ \
+                                               checkpoint.manifest_filename, \
+                                               self.get_input_hash(), \
+                                               reset=not resume)
+
         folds = [ax.fold for ax in self.axes]
         self.layers[1].export_possible_symmgroups(folds, self.conf)
 
@@ -128,6 +158,8 @@ class Assembler():
             else:
                 ctl.error('run: Exception')
 
+        self.checkpoints.complete('build_layer')
+
         self.layers[1].export_param(self.conf.export_path+ \
                                     self.conf.export_file_prefix+ \
                                     self.export_file_infix, \
@@ -173,6 +205,30 @@ class Assembler():
         return True, 1, 'run: finished'
 
 
+    def get_input_hash(self):
+        '''
+        Get hash of the inputs of the run (parameters of the assembly and
+        active models of the axes) for the checkpoints.
+        '''
+        params = { 'version': self.conf.version, \
+                   'flatten_modes': self.conf.flatten_modes, \
+                   'delete_termini_modes': self.conf.delete_termini_modes, \
+                   'filters_for_export': self.conf.filters_for_export, \
+                   'snapshot_modes': self.conf.snapshot_modes, \
+                   'alignment_pivot_pos': self.alignment_pivot_pos, \
+                   'export_file_infix': self.export_file_infix, \
+                   'contact_submodel_orientation': \
+                                    self.contact_submodel_orientation, \
+                   'lc_offset_max': self.lc_offset_max, \
+                   'lc_offset_step': self.lc_offset_step, \
+                   'lc_search': self.lc_search, \
+                   'axes': [[ax.model_active_path, ax.domains, ax.surface] \
+                            for ax in self.axes] }
+
+        return checkpoint.get_input_hash(params, \
+                                    [ax.model_active_path for ax in self.axes])
+
+
     def get_coincident_residues(self, id1, id2, res_ov, session, max_dist=1):
         '''
         Get corresponding residues in residue overlap that have a distance <=1.
@@ -273,9 +329,10 @@ class Assembler():
             l.add_representation(ax0_current_model)
 
         # set name to submodels of ax0 representation/representative
-        for i in range(1, 1+ax0.fold):
-            sess.rename_model((ax0_current_model.id[0], i), \
-                    'ax'+ax0_current_model.idstr+'mol'+str(i))
+        with sess.batch('build_layer: rename'):
+            for i in range(1, 1+ax0.fold):
+                sess.rename_model((ax0_current_model.id[0], i), \
+                        'ax'+ax0_current_model.idstr+'mol'+str(i))
 
 
         # continue, if more than 1 axis object is provided as input
@@ -308,25 +365,26 @@ class Assembler():
                 if ax1.model_active_orient == -1:
                     intermediate_ids = []
                     ax1_submodel_id_fixed = 1
-                    
-                    for ii in range(1, ax1.fold):
 
-                        # inverse chain ids for flipped symplex
-                        # ax1_submodel_id is fixed
-                        sess.change_model_id( \
+                    with sess.batch('build_layer: change_model_id'):
+                        for ii in range(1, ax1.fold):
+
+                            # inverse chain ids for flipped symplex
+                            # ax1_submodel_id is fixed
+                            sess.change_model_id( \
                                 (ax1_current_model.id[0], \
                                     (ax1_submodel_id_fixed+ii-1)%ax1.fold+1), \
                                 (ax1_current_model.id[0], \
                                     10+(ax1.fold+ax1_submodel_id_fixed-ii-1)% \
                                     ax1.fold+1) )
-                        intermediate_ids.append( \
+                            intermediate_ids.append( \
                                     10+(ax1.fold+ax1_submodel_id_fixed-ii-1)% \
                                     ax1.fold+1)
 
-                    for ii in intermediate_ids:
-                        sess.change_model_id( \
-                                (ax1_current_model.id[0], ii), \
-                                (ax1_current_model.id[0], (ii-10)) )
+                        for ii in intermediate_ids:
+                            sess.change_model_id( \
+                                    (ax1_current_model.id[0], ii), \
+                                    (ax1_current_model.id[0], (ii-10)) )
 
                     renamed = True # avoid 2x renaming of chain ids
 
@@ -424,23 +482,25 @@ class Assembler():
                     if renamed == False:
                         intermediate_ids = []
 
-                        for ii in range(1, ax1.fold):
+                        with sess.batch('build_layer: change_model_id'):
+                            for ii in range(1, ax1.fold):
 
-                            # inverse chain ids for flipped symplex
-                            # ax1_submodel_id is fixed
-                            sess.change_model_id( \
+                                # inverse chain ids for flipped symplex
+                                # ax1_submodel_id is fixed
+                                sess.change_model_id( \
                                     (ax1_current_model.id[0], \
                                         (ax1_submodel_id+ii-1)%ax1.fold+1), \
                                     (ax1_current_model.id[0], \
                                         10+(ax1.fold+ax1_submodel_id-ii-1)% \
                                         ax1.fold+1) )
-                            intermediate_ids.append( \
-                                10+(ax1.fold+ax1_submodel_id-ii-1)%ax1.fold+1)
+                                intermediate_ids.append( \
+                                    10+(ax1.fold+ax1_submodel_id-ii-1)% \
+                                    ax1.fold+1)
 
-                        for ii in intermediate_ids:
-                            sess.change_model_id( \
-                                    (ax1_current_model.id[0], ii), \
-                                    (ax1_current_model.id[0], (ii-10)) )
+                            for ii in intermediate_ids:
+                                sess.change_model_id( \
+                                        (ax1_current_model.id[0], ii), \
+                                        (ax1_current_model.id[0], (ii-10)) )
 
 
                 # determine rotational symmetry axis of ax1
@@ -529,9 +589,10 @@ class Assembler():
 
                     # set name to submodels of ax0 representation/
                     # representative
-                    for i in range(1,1+ax0.fold):
-                        sess.rename_model((ax0_current_model.id[0], i), \
-                                'ax'+str(2+ax1_model_i)+'mol'+str(i))
+                    with sess.batch('build_layer: rename'):
+                        for i in range(1,1+ax0.fold):
+                            sess.rename_model((ax0_current_model.id[0], i), \
+                                    'ax'+str(2+ax1_model_i)+'mol'+str(i))
 
                     # determine rotation of ax0 representation/representative
                     transl_vec = sess.measure_transl_vec( \
@@ -566,10 +627,11 @@ class Assembler():
 
                     # set name to submodels of ax0 representation/
                     # representative
-                    for i in range(1, 1+ax0.fold):
-                        sess.rename_model( \
-                            (ax0_current_model.id[0], i), \
-                            'ax'+str(2+ax0.fold+ax1_model_i)+'mol'+str(i))
+                    with sess.batch('build_layer: rename'):
+                        for i in range(1, 1+ax0.fold):
+                            sess.rename_model( \
+                                (ax0_current_model.id[0], i), \
+                                'ax'+str(2+ax0.fold+ax1_model_i)+'mol'+str(i))
 
                     ax0_current_model.move_model( \
                         [ax0_model.trans_vect[0], ax0_model.trans_vect[1], 0])
@@ -598,7 +660,33 @@ class Assembler():
                 self.export_meta(ax0, meta_path+export_file_prefix+'.txt')
 
         sess.format_session()
-        sess.save_models('all', self.conf.layer_raw_path)
+        self.take_snapshot('raw', self.conf.layer_raw_path)
+
+        return
+
+
+    def take_snapshot(self, name, path):
+        '''
+        Take in-memory snapshot of the session (including the model register).
+        The session is additionally saved to path in debug mode only.
+        '''
+        sess = self.axes[0].chimerax_session
+        self.snapshots[name] = sess.snapshot()
+
+        if self.debug_mode:
+            sess.save_models('all', path)
+
+        return
+
+
+    def restore_snapshot(self, name):
+        ''' Restore in-memory snapshot of the session. '''
+
+        if name not in self.snapshots:
+            ctl.e(name)
+            ctl.error('Assembler: restore_snapshot: snapshot not existing')
+
+        self.axes[0].chimerax_session.restore(self.snapshots[name])
 
         return
 
@@ -606,30 +694,100 @@ class Assembler():
     def process_layer(self, combine_mode=2):
         '''
         Process the layer for different variations of lattice constants.
+
+        lc_search 0: linear scan of the lattice offsets (lc_offset_max first)
+            until the validation result of the tile has decayed to the level
+            of lc_offset_max (lattice_scan.clash_decay), all scanned offsets
+            are exported, the layer is aligned and snapped in for each
+            lattice offset
+        lc_search 1: search of the lattice offset with the clashes between
+            the representations (lattice_scan.LatticeScan), exported are the
+            lattice offsets 0, lc_offset_max and the offset found, the layer
+            is aligned and snapped in only once (lattice offset 0), the other
+            lattice offsets are translations of the snapped-in
+            representations (lattice_scan.translate_layer)
         '''
-        clashes = []
+        self.lc_offset = 0
+        clashes = [self.process_layer_lc(combine_mode)]
+
+        if self.lc_offset_max == 0 or max(self.conf.flatten_modes) < 2 or \
+           self.refpoint_constant_base == 0:
+            return clashes
+
+        if self.lc_search == 0:
+            return self.process_layer_linear(clashes, combine_mode)
+
+        lc_offset_found = self.lattice_scan()
+
+        if self.debug_mode:
+            # comparison with the linear scan
+            self.process_layer_linear(clashes[:1], combine_mode)
+            ctl.p('lattice offset: search '+str(lc_offset_found)+ \
+                  ', linear scan '+str(self.lc_offset))
+
+        for lc_offset in sorted(set([self.lc_offset_max, lc_offset_found])):
+            if lc_offset == 0:
+                continue
 
-        # variation of lattice constant
-        for i,lc_offset in enumerate(self.lc_var):
             self.lc_offset = lc_offset
-            if i == 0:
-                preserve_connections = False
-            else:
-                preserve_connections = True
+            clashes.append(self.process_layer_lc(combine_mode, \
+                                                 preserve_connections=True))
+
+        return clashes
+
+
+    def process_layer_linear(self, clashes, combine_mode=2):
+        '''
+        Linear scan of the lattice offsets lc_offset_max, lc_offset_step,
+        2*lc_offset_step, ... (lattice offset 0 already processed, clashes:
+        [validation result of the tile for offset 0]) until the validation
+        result has decayed to the level of lc_offset_max.
+
+        Return:
+            validation results of the tile for the scanned offsets
+            (self.lc_offset: last scanned offset)
+        '''
+        lc_offsets = [self.lc_offset_max]+ \
+                     list(range(self.lc_offset_step, self.lc_offset_max, \
+                                self.lc_offset_step))
 
-            clashes_ = self.process_layer_lc( \
-                            combine_mode, \
-                            preserve_connections=preserve_connections)
+        for i,lc_offset in enumerate(lc_offsets, 1):
+            self.lc_offset = lc_offset
+            clashes_ = self.process_layer_lc(combine_mode, \
+                                             preserve_connections=True)
             clashes.append(clashes_)
 
             if i > 1 and abs(clashes_-clashes[1]) <= \
-                        abs(clashes[0]-clashes[1])*0.1353:
-                ctl.d('variation finished')
+                        abs(clashes[0]-clashes[1])*lattice_scan.clash_decay:
+                ctl.d('variation finished, lc_offset: '+str(lc_offset))
                 break
 
         return clashes
 
 
+    def lattice_scan(self):
+        '''
+        Search of the lattice offset with the clashes between the
+        representations of the snapped-in layer (lattice_scan.LatticeScan).
+        '''
+        if self.checkpoints.done('lattice_scan'):
+            lc_offset_found = self.checkpoints.get('lattice_scan', 'lc_offset')
+        else:
+            self.restore_snapshot('snapin_base')
+
+            scan = lattice_scan.LatticeScan(self.axes, self.layers[1], \
+                                            self.refpoint_constant_base, \
+                                            self.axes[0].chimerax_session)
+            lc_offset_found = scan.search(self.lc_offset_max, \
+                                          self.lc_offset_step)
+            self.checkpoints.complete('lattice_scan', \
+                                      { 'lc_offset': lc_offset_found })
+
+        ctl.d('variation finished, lc_offset: '+str(lc_offset_found))
+
+        return lc_offset_found
+
+
     def process_layer_lc(self, combine_mode=2, preserve_connections=False):
         '''
         Process the layer for a given lattice constant,
@@ -644,6 +802,17 @@ class Assembler():
         export different configurations
         '''
         validation_result_tile = 1000 # return variable
+
+        # lattice offsets != 0 completed in a previous run
+        lc_stage = 'lc'+('00'+str(self.lc_offset))[-2:]
+        puc = self.layers[1].primitive_unit_cell
+
+        if self.lc_offset != 0 and self.checkpoints.done(lc_stage):
+            puc.validation_scores = self.checkpoints.get(lc_stage, \
+                                        'validation_scores', \
+                                        puc.validation_scores)
+
+            return self.checkpoints.get(lc_stage, 'validation_result_tile')
         
         ax0 = self.axes[0]
 
@@ -654,25 +823,49 @@ class Assembler():
         
         self.layers[1].calc_refpoint_constant(self.lc_offset)
 
-        # align layer_flat to ref points and move all other models relative to
-        # it
-        if len(self.axes) > 1 and max(self.conf.flatten_modes) >= 1:
-            ax0.chimerax_session.open_session(self.conf.layer_raw_path)
+        if self.lc_offset == 0 or self.lc_search == 0:
 
-            align_layer.align_layer(self.axes, \
-                                    self.layers[1], \
-                                    self.conf, \
-                                    ax0.chimerax_session)
-        aligned_file = sorted(glob.glob(self.conf.layer_aligned_raw_path))
-        
+            # align layer_flat to ref points and move all other models
+            # relative to it
+            if len(self.axes) > 1 and max(self.conf.flatten_modes) >= 1:
+                self.restore_snapshot('raw')
+
+                align_layer.align_layer(self.axes, \
+                                        self.layers[1], \
+                                        self.conf, \
+                                        ax0.chimerax_session)
+
+                self.take_snapshot('aligned', self.conf.layer_aligned_raw_path)
 
-        # snapin ax0s to ref points
-        snapin_file = sorted(glob.glob(self.conf.layer_snapin_raw_path))
-        if max(self.conf.flatten_modes) >= 2:
-            ax0.chimerax_session.open_session(self.conf.layer_aligned_raw_path)
-            snapin.snapin_layer(self.axes, self.layers[1], self.conf, \
-                                preserve_connections)
-            snapin_file = sorted(glob.glob(self.conf.layer_snapin_raw_path))
+                if self.lc_offset == 0:
+                    self.checkpoints.complete('aligned')
+            
+
+            # snapin ax0s to ref points
+            if max(self.conf.flatten_modes) >= 2:
+                self.restore_snapshot('aligned')
+                snapin.snapin_layer(self.axes, self.layers[1], self.conf, \
+                                    preserve_connections)
+                self.take_snapshot('snapin', self.conf.layer_snapin_raw_path)
+
+                # snapped-in layer as base for the variation of the lattice
+                # constant
+                if self.lc_offset == 0:
+                    self.snapshots['snapin_base'] = self.snapshots['snapin']
+                    self.refpoint_constant_base = \
+                                        self.layers[1].refpoint_constant
+                    self.checkpoints.complete('snapin', \
+                        { 'refpoint_constant': self.refpoint_constant_base })
+
+        else:
+            # lc_search 1: move snapped-in representations to the ref points
+            # of the lattice offset (no new alignment and snapin)
+            self.restore_snapshot('snapin_base')
+            lattice_scan.translate_layer(self.axes, self.layers[1], \
+                                         self.layers[1].refpoint_constant/ \
+                                         self.refpoint_constant_base, \
+                                         ax0.chimerax_session)
+            self.take_snapshot('snapin', self.conf.layer_snapin_raw_path)
 
 
         meta_path = self.conf.get_struct_coll_meta_path()
@@ -697,7 +890,7 @@ class Assembler():
                          meta_path+export_file_prefix+lc_offset_infix+'.txt')
 
 
-        model_reg_resetpoint = ax0.model_reg
+        model_reg_resetpoint = ax0.model_reg.snapshot()
 
         # flatten_modes 0,1,2,3,4:
         # 0: pure superposition, 
@@ -737,12 +930,15 @@ class Assembler():
                                         filter_for_export, \
                                         snapshot, \
                                         do_snapshot_w_separated_chains, \
-                                        aligned_file, snapin_file, \
                                         combine_mode, model_reg_resetpoint)
 
                         if validation_result_tile_ != -1:
                             validation_result_tile = validation_result_tile_
 
+        self.checkpoints.complete(lc_stage, \
+                { 'validation_result_tile': validation_result_tile, \
+                  'validation_scores': puc.validation_scores })
+
         return validation_result_tile
 
 
@@ -750,7 +946,6 @@ class Assembler():
                                deletetermini, flatten_mode, flatten, \
                                filter_for_export, \
                                snapshot, do_snapshot_w_separated_chains, \
-                               aligned_file, snapin_file, \
                                combine_mode, model_reg_resetpoint):
         '''
         Process layer for specific setup.
@@ -773,32 +968,57 @@ class Assembler():
         else:     
             lc_offset_infix = ''
 
+        export_path = \
+            [[self.conf.export_path_pure_superposition, \
+              self.conf.export_path, \
+              self.conf.export_path_tile, \
+              self.conf.export_path_complete_chains, \
+              self.conf.export_path_primitive_unit_cell, \
+              self.conf.export_path_assembly] \
+              [flatten_mode], \
+            self.conf.export_path_snapshot][snapshot]+ \
+            self.conf.export_path_filters[filter_for_export]+ \
+            self.export_file_infix+ \
+            self.conf.fn_infix_termini[deletetermini]+'_'+ \
+            ['', \
+            'flat_', \
+            'tile_', \
+            'complete_chains_', \
+            'primitive_unit_cell_', \
+            'assembly_3x3_'][flatten_mode]+ \
+            lc_offset_infix+'v'+self.conf.version+'.cif'
+        export_path = filesystem.clean_path(export_path)
+
+        # export completed in a previous run
+        export_stage = 'export:'+os.path.relpath(export_path, \
+                                                 self.conf.export_path)
+
+        if self.checkpoints.done(export_stage):
+            if flatten_mode == 5:
+                self.layers[1].primitive_unit_cell.validation_scores = \
+                        self.checkpoints.get(export_stage, 'validation_scores')
+
+            return self.checkpoints.get(export_stage, 'validation_result_tile')
+
         ax0 = self.axes[0]
         if len(self.axes) > 1:
             ax1 = self.axes[1]
 
         ax0.chimerax_session.init()
 
-        if len(aligned_file) == 1:
-            ax0.chimerax_session.open_session( \
-                    self.conf.layer_aligned_raw_path)
-        else:
-            ax0.chimerax_session.open_session( \
-                    self.conf.layer_raw_path)
-
         if flatten_mode >= 2:
-            if len(snapin_file) != 1:
-                ctl.error('Assembler: process_layer: len(snapin_file) != 1')
-
-            ax0.chimerax_session.open_session( \
-                    self.conf.layer_snapin_raw_path)
+            self.restore_snapshot('snapin')
+        elif 'aligned' in self.snapshots:
+            self.restore_snapshot('aligned')
+        else:
+            self.restore_snapshot('raw')
 
 
         # reset connected flag ax0
         for r in ax0.get_representations():
               ax0.get_representation(r).connected = []
 
-        ax0.model_reg = model_reg_resetpoint
+        ax0.model_reg.restore(model_reg_resetpoint)
 
 
         # reset connected flag ax1, but only if ax1 exists
@@ -806,7 +1026,7 @@ class Assembler():
             for r in ax1.get_representations():
                 ax1.get_representation(r).connected = []
 
-            ax1.model_reg = model_reg_resetpoint
+            ax1.model_reg.restore(model_reg_resetpoint)
 
 
         if deletetermini == 1:
@@ -925,27 +1145,6 @@ class Assembler():
         ax0.chimerax_session.close_id(combination_model_id)
 
 
-        export_path = \
-            [[self.conf.export_path_pure_superposition, \
-              self.conf.export_path, \
-              self.conf.export_path_tile, \
-              self.conf.export_path_complete_chains, \
-              self.conf.export_path_primitive_unit_cell, \
-              self.conf.export_path_assembly] \
-              [flatten_mode], \
-            self.conf.export_path_snapshot][snapshot]+ \
-            self.conf.export_path_filters[filter_for_export]+ \
-            self.export_file_infix+ \
-            self.conf.fn_infix_termini[deletetermini]+'_'+ \
-            ['', \
-            'flat_', \
-            'tile_', \
-            'complete_chains_', \
-            'primitive_unit_cell_', \
-            'assembly_3x3_'][flatten_mode]+ \
-            lc_offset_infix+'v'+self.conf.version+'.cif'
-        export_path = filesystem.clean_path(export_path)
-
         # superposition
         if flatten_mode < 4:
             if len(self.axes) > 1:
@@ -986,7 +1185,8 @@ class Assembler():
                                     self.axes, \
                                     export_path, \
                                     self.conf, \
-                                    ax0.chimerax_session)
+                                    ax0.chimerax_session, \
+                                    self.debug_mode)
 
             # export
             export.compatibility_cif_export(export_path, \
@@ -1061,7 +1261,8 @@ class Assembler():
                                                     self.axes, \
                                                     export_path, \
                                                     self.conf, \
-                                                    ax0.chimerax_session)
+                                                    ax0.chimerax_session, \
+                                                    self.debug_mode)
 
                 self.layers[1].primitive_unit_cell.validation_scores = \
                                                     validation_scores[1]
@@ -1071,6 +1272,12 @@ class Assembler():
                         ax0.chimerax_session, \
                         self.conf.cif_postprocess)
 
+        self.checkpoints.complete(export_stage, \
+                { 'validation_result_tile': validation_result_tile, \
+                  'validation_scores': \
+                        self.layers[1].primitive_unit_cell.validation_scores }, \
+                [export_path])
+
         return validation_result_tile
 
 
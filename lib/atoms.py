@@ -0,0 +1,404 @@
+import ctl
+import rigid_body
+
+import collections
+import numpy as np
+import os
+import time
+import zlib
+
+
+'''
+Module providing a NumPy representation of the atoms of a coord file (pdb
+format), independent of a ChimeraX session.
+'''
+
+pdb_record = np.dtype({'names': ['name', 'resname', 'chainid', 'resid', \
+                                 'x', 'y', 'z', 'bfact', 'element'], \
+                       'formats': ['S4', 'S3', 'S1', 'S4', \
+                                   'S8', 'S8', 'S8', 'S6', 'S2'], \
+                       'offsets': [12, 17, 21, 22, 30, 38, 46, 60, 76], \
+                       'itemsize': 80})
+        # fixed columns of 'ATOM' lines
+
+table_cache = collections.OrderedDict()
+        # LRU cache of atom tables: (path, mtime, size): [AtomTable, checksum]
+table_cache_size = 32
+racy_time = 2 # s
+
+aa31 = {'VAL':'V', 'ILE':'I', 'LEU':'L', 'GLU':'E', 'GLN':'Q', \
+        'ASP':'D', 'ASN':'N', 'HIS':'H', 'TRP':'W', 'PHE':'F', \
+        'TYR':'Y', 'ARG':'R', 'LYS':'K', 'SER':'S', 'THR':'T', \
+        'MET':'M', 'ALA':'A', 'GLY':'G', 'PRO':'P', 'CYS':'C'}
+
+
+class Atoms():
+    '''
+    This class describes the atoms of a coord file as columns (NumPy arrays).
+
+    The original pdb lines are kept as template for the export, only chain
+    ids, residue ids and coordinates are rewritten.
+    '''
+
+    columns = ['lines', 'name', 'resname', 'chainid', 'resid', 'element', \
+               'bfact', 'xyz']
+
+
+    def __init__(self, lines=[]):
+        '''
+        Initialization of the Atoms class from 'ATOM' lines of a pdb file.
+        '''
+        lines = [l.rstrip('\r\n') for l in lines]
+        records = parse_lines(lines)
+
+        self.lines = np.array(lines, dtype=object)
+        self.name = np.char.strip(records['name']).astype('<U4')
+        self.resname = np.char.strip(records['resname']).astype('<U3')
+        self.chainid = records['chainid'].astype('<U1')
+        self.resid = records['resid'].astype(int)
+        self.bfact = records['bfact'].astype(float)
+        self.xyz = np.stack((records['x'].astype(float), \
+                             records['y'].astype(float), \
+                             records['z'].astype(float)), axis=1)
+
+        # element from atom name if element column is empty
+        element = np.char.strip(records['element']).astype('<U2')
+        no_element = element == ''
+        element[no_element] = self.name[no_element].astype('<U1')
+        self.element = element
+
+        return
+
+
+    def __len__(self):
+        ''' Get number of atoms. '''
+
+        return len(self.lines)
+
+
+    def select(self, mask):
+        '''
+        Get subset of atoms (boolean mask or index array) as new Atoms object.
+        '''
+        atoms = Atoms()
+
+        for c in self.columns:
+            setattr(atoms, c, getattr(self, c)[mask].copy())
+
+        return atoms
+
+
+    def copy(self):
+        ''' Get copy of the atoms. '''
+
+        return self.select(np.arange(len(self)))
+
+
+    def transform(self, tf):
+        ''' Apply transform (3x4 matrix) to the coordinates. '''
+
+        self.xyz = rigid_body.apply(tf, self.xyz)
+
+        return
+
+
+    def move(self, vect):
+        ''' Translate coordinates by vector. '''
+
+        self.xyz = self.xyz+np.asarray(vect, dtype=float)
+
+        return
+
+
+    def get_chainids(self):
+        ''' Get chain ids in the order of the coord file. '''
+
+        chainids = []
+
+        for c in self.chainid:
+            if c not in chainids:
+                chainids.append(str(c))
+
+        return chainids
+
+
+    def get_residue_starts(self):
+        '''
+        Get indices of the first atom of each residue (consecutive atoms with
+        the same chain id and residue id).
+        '''
+        if len(self) == 0:
+            return np.zeros(0, dtype=int)
+
+        new_res = np.ones(len(self), dtype=bool)
+        new_res[1:] = (self.resid[1:] != self.resid[:-1]) | \
+                      (self.chainid[1:] != self.chainid[:-1])
+
+        return np.nonzero(new_res)[0]
+
+
+    def get_residue_index(self):
+        ''' Get residue index of each atom. '''
+
+        res_index = np.zeros(len(self), dtype=int)
+        res_index[self.get_residue_starts()] = 1
+
+        return np.cumsum(res_index)-1
+
+
+    def resids(self, chainid=''):
+        '''
+        Get residue ids of a chain (chainid='': residues of all chains in the
+        order of the coord file).
+        '''
+        starts = self.get_residue_starts()
+
+        if chainid != '':
+            starts = starts[self.chainid[starts] == chainid]
+
+        return [int(r) for r in self.resid[starts]]
+
+
+    def get_res_n(self):
+        ''' Get overall number of residues. '''
+
+        return len(self.get_residue_starts())
+
+
+    def get_seq(self, chainid):
+        ''' Get sequence of a chain. '''
+
+        starts = self.get_residue_starts()
+        starts = starts[self.chainid[starts] == chainid]
+
+        return ''.join([aa31.get(str(r), '') for r in self.resname[starts]])
+
+
+    def get_chain(self, chainid):
+        ''' Get atoms of a chain as new Atoms object. '''
+
+        return self.select(self.chainid == chainid)
+
+
+    def get_xyz_many(self, chainid, resids, atomid='CA'):
+        '''
+        Get coordinates (x, y, z) of several residues of a chain as array
+        with shape (n, 3).
+        '''
+        rows = np.nonzero((self.chainid == chainid) & \
+                          (self.name == atomid))[0]
+        row_of_resid = {}
+
+        for row in rows:
+            resid = int(self.resid[row])
+
+            if resid in row_of_resid:
+                row_of_resid[resid] = -2
+            else:
+                row_of_resid[resid] = row
+
+        selected = []
+
+        for resid in resids:
+            row = row_of_resid.get(resid, -1)
+
+            if row < 0:
+                ctl.e(chainid)
+                ctl.e(resid)
+                ctl.error('Atoms: get_xyz_many: no unique coord found for '+ \
+                          'resid')
+
+            selected.append(row)
+
+        return self.xyz[np.array(selected, dtype=int)].reshape(-1, 3)
+
+
+    def write_pdb(self, path):
+        '''
+        Write atoms to pdb file, with 'TER' after each chain and 'END'.
+        '''
+        f = open(path, 'w')
+
+        for i,l in enumerate(self.lines):
+            if i > 0 and self.chainid[i] != self.chainid[i-1]:
+                f.write('TER\n')
+
+            l = (l+' '*80)[:80]
+            f.write(l[0:21]+self.chainid[i]+ \
+                    ('    '+str(self.resid[i]))[-4:]+l[26:30]+ \
+                    '%8.3f%8.3f%8.3f' % tuple(self.xyz[i])+ \
+                    l[54:].rstrip()+'\n')
+
+        if len(self) > 0:
+            f.write('TER\n')
+
+        f.write('END\n')
+        f.close()
+
+        return
+
+
+class AtomTable(Atoms):
+    '''
+    This class describes the atoms of a pdb file (Atoms) together with the
+    boundaries of the file ('TER', 'END' and 'ENDMDL' records), read in one
+    pass over the file.
+
+    Atom tables from get_atom_table are shared (cache), they must not be
+    changed (use copy()).
+    '''
+
+
+    def __init__(self, lines=[], boundaries=[], raw_lines=[]):
+        '''
+        Initialization of the AtomTable class.
+
+        boundaries: list of [record ('TER' or 'END'), number of atoms before
+                    the record]
+        raw_lines: 'ATOM' lines as read from the file (with line endings)
+        '''
+        Atoms.__init__(self, lines)
+
+        self.boundaries = boundaries
+        self.raw_lines = raw_lines
+
+        return
+
+
+    def get_lines(self, stop_at_TER=True):
+        '''
+        Get 'ATOM' lines as read from the file, with stop_at_TER only the
+        lines before the first 'TER' record.
+        '''
+        if stop_at_TER:
+            for record, atoms_n in self.boundaries:
+                if record == 'TER':
+                    return self.raw_lines[:atoms_n]
+
+        return list(self.raw_lines)
+
+
+    def get_multimer_n(self):
+        '''
+        Get number of chains: number of 'TER' records and 'END' records not
+        following 'TER' or 'END' (like bibpdb.get_multimer_n on the lines).
+        '''
+        n = 0
+
+        for i, (record, atoms_n) in enumerate(self.boundaries):
+            if atoms_n+i < 1:
+                continue # first line of the file
+
+            after_boundary = i > 0 and self.boundaries[i-1][1] == atoms_n
+
+            if record == 'TER' or (record == 'END' and not after_boundary):
+                n += 1
+
+        return n
+
+
+def parse_lines(lines):
+    '''
+    Parse the fixed columns of 'ATOM' lines as NumPy structured array (one
+    vectorized step for all lines).
+    '''
+    buffer = ''.join([(l+' '*80)[:80] for l in lines]). \
+                                        encode('ascii', errors='replace')
+
+    return np.frombuffer(buffer, dtype=pdb_record, count=len(lines))
+
+
+def read_atom_table(path):
+    '''
+    Read pdb file in one pass: 'ATOM' lines and the boundaries ('TER', 'END'
+    and 'ENDMDL' records).
+    '''
+    raw_lines = []
+    boundaries = []
+
+    f = open(path, 'r')
+
+    for l in f:
+        if len(l) > 10 and l[0:4] == 'ATOM':
+            raw_lines.append(l)
+        elif l[0:3] == 'TER' or l[0:3] == 'END':
+            boundaries.append([l[0:3], len(raw_lines)])
+
+    f.close()
+
+    return AtomTable(raw_lines, boundaries, raw_lines)
+
+
+def get_checksum(path):
+    ''' Get checksum of the content of a file. '''
+
+    f = open(path, 'rb')
+    checksum = zlib.crc32(f.read())
+    f.close()
+
+    return checksum
+
+
+def get_atom_table(path):
+    '''
+    Get atom table of a pdb file from the LRU cache (key: path, modification
+    time and size of the file), the file is read if not cached.
+
+    Files modified within racy_time before they were read can be changed
+    again without a different modification time (timestamp resolution), the
+    content of those cached files is verified by a checksum.
+    '''
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+
+    if key in table_cache:
+        table, checksum = table_cache[key]
+
+        if checksum == None or checksum == get_checksum(path):
+            table_cache.move_to_end(key)
+            return table
+
+    checksum = None
+    if time.time()-stat.st_mtime < racy_time:
+        checksum = get_checksum(path)
+
+    table = read_atom_table(path)
+    table_cache[key] = [table, checksum]
+    table_cache.move_to_end(key)
+
+    if len(table_cache) > table_cache_size:
+        table_cache.popitem(last=False)
+
+    return table
+
+
+def from_columns(name, resname, chainid, resid, element, xyz, bfact=None):
+    '''
+    Create Atoms object from columns (e.g. atoms of a ChimeraX structure),
+    without pdb lines as template.
+    '''
+    atoms = Atoms()
+    n = len(name)
+
+    atoms.lines = np.array(['']*n, dtype=object)
+    atoms.name = np.asarray(name, dtype=str)
+    atoms.resname = np.asarray(resname, dtype=str)
+    atoms.chainid = np.asarray(chainid, dtype=str)
+    atoms.resid = np.asarray(resid, dtype=int)
+    atoms.element = np.asarray(element, dtype=str)
+    atoms.bfact = np.zeros(n) if bfact is None else \
+                                        np.asarray(bfact, dtype=float)
+    atoms.xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+
+    return atoms
+
+
+def read_pdb(path):
+    '''
+    Read 'ATOM' entries of a pdb file (all models/chains).
+    '''
+    f = open(path, 'r')
+    lines = [l for l in f if l[0:4] == 'ATOM']
+    f.close()
+
+    return Atoms(lines)
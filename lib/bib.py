@@ -41,21 +41,7 @@ def get_multimer_n(file):
     Get number of chains in a given pdb file.
     Use case: e.g. get multiplicity of a multimer in a pdb file.
     '''
-    n = 0
-    f = filesystem.get_file(file)
-
-    # remove all lines except 'ATOM', 'END' and 'TER'
-    code_cleaned = ['ATOM', 'END', 'TER']
-    f = [l for l in f if any(l.startswith(code) for code in code_cleaned)]
-
-    for i, l in enumerate(f):
-        if i >= 1:   
-            if f[i][0:3] == 'TER' or \
-                    (f[i][0:3] == 'END' and f[i-1][0:3] != 'END' and \
-                    f[i-1][0:3] != 'TER'):
-                n += 1
-
-    return n
+    return bibpdb.get_multimer_n(file)
 
 
 def place_plane(session):
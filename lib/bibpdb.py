@@ -1,8 +1,10 @@
+import atoms
 import ctl
 import filesystem
 
 import glob
 import math
+import numpy as np
 
 
 '''
@@ -65,15 +67,28 @@ def set_f(l, field, nr):
 def lddt_to_bfact(file_in, file_out, stop_at_TER=True): 
     ''' Convert LDDT to b factors in given pdb file. '''
 
-    c1 = open_pdb(file_in, stop_at_TER)
-    w = []
-    bfact = {}
+    try:
+        table = atoms.get_atom_table(file_in)
+    except IOError:
+        return {}
 
-    for i,l in enumerate(c1):
-        lddt = float(l[60:70])
+    atoms_n = len(table.get_lines(stop_at_TER))
 
+    # value of the last atom of each residue id (like overwriting in file
+    # order), residue ids in the order of their first occurrence
+    resids = table.resid[:atoms_n]
+    resids_unique, first = np.unique(resids, return_index=True)
+    last = atoms_n-1-np.unique(resids[::-1], return_index=True)[1]
+    order = np.argsort(first)
+
+    resids_unique = resids_unique[order]
+    lddts = table.bfact[last[order]]
+
+    bfact = {}
+
+    for resid, lddt in zip(resids_unique.tolist(), lddts.tolist()):
         lRMSD = 1.5*math.exp(4*(0.7-lddt/100))*1 # regular formula
-        bfact[int(l[22:30])] = round(lRMSD*lRMSD*8/3*3.1415*3.1415, 2)
+        bfact[resid] = round(lRMSD*lRMSD*8/3*3.1415*3.1415, 2)
 
     return bfact
 
@@ -149,18 +164,11 @@ def open_pdb(fileIn, stop_at_TER=True):
     ''' Open pdb file. '''
 
     try:
-        f = open(fileIn, 'r')
-        ra = f.readable()
-        if ra == True:
-            c1 = f.readlines()
-        f.close()
+        table = atoms.get_atom_table(fileIn)
     except IOError:
         return []
-         
-    c1 = trim_pdb(c1, stop_at_TER)
-    c2 = c1
 
-    return c2
+    return table.get_lines(stop_at_TER)
 
 
 def reorder_chainids(file, order, fileout=''):
@@ -212,18 +220,4 @@ def get_multimer_n(file):
     Get number of chains in a given pdb file.
     Use case: e.g. get multiplicity of a multimer in a pdb file.
     '''
-    n = 0
-    f = filesystem.get_file(file)
-
-    # remove all lines except 'ATOM', 'END' and 'TER'
-    code_cleaned = ['ATOM', 'END', 'TER']
-    f = [l for l in f if any(l.startswith(code) for code in code_cleaned)]
-
-    for i, l in enumerate(f):
-        if i >= 1:   
-            if f[i][0:3] == 'TER' or \
-                    (f[i][0:3] == 'END' and f[i-1][0:3] != 'END' and \
-                    f[i-1][0:3] != 'TER'):
-                n += 1
-
-    return n
+    return atoms.get_atom_table(file).get_multimer_n()
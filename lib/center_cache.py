@@ -0,0 +1,145 @@
+import ctl
+import rigid_body
+
+import numpy as np
+
+
+class CenterCache():
+    '''
+    This class describes a cache of the centers (mean CA coordinates of a
+    residue range) of the models in a ChimeraX session.
+
+    For each part (structure) of a center, the center in the coordinate
+    system of the structure and the number of residues are stored with the
+    scene position of the structure and a transform version counter. When
+    the structure is moved or rotated, the center is updated analytically
+    (center' = R*center+t with the current scene position) instead of being
+    recomputed. An entry is recomputed when it is invalidated or when a
+    structure has changed (e.g. deleted residues or reopened model).
+    '''
+
+
+    def __init__(self):
+        ''' Initialization of the CenterCache class. '''
+
+        self.entries = {}
+
+        self.hits = 0 # centers of unmoved models
+        self.updates = 0 # centers of moved models, updated analytically
+        self.misses = 0 # centers computed
+
+        return
+
+
+    def invalidate(self, model_id=None):
+        '''
+        Invalidate entries.
+
+        model_id=None invalidates all entries, otherwise all entries of the
+        main model of model_id (incl. submodels) are invalidated.
+        '''
+        if model_id == None:
+            self.entries = {}
+
+            return
+
+        for key in list(self.entries):
+            if key[0] == model_id[0]:
+                del self.entries[key]
+
+        return
+
+
+    def get_entry(self, key, structs):
+        '''
+        Get valid entry of key (main model id, ...) for the given structures
+        (parts of the center), None if not existing or a structure has
+        changed since the entry was built. The scene positions of moved
+        structures are updated.
+        '''
+        entry = self.entries.get(key)
+
+        if entry == None or len(entry) != len(structs):
+            return None
+
+        for part, struct in zip(entry, structs):
+            if part['structure'] is not struct or \
+               part['atoms_n'] != struct.num_atoms:
+                return None
+
+        moved = False
+
+        for part in entry:
+            position = part['structure'].scene_position.matrix
+
+            if not np.array_equal(part['position'], position):
+                part['position'] = np.array(position, dtype=float)
+                part['version'] += 1
+                moved = True
+
+        if moved:
+            self.updates += 1
+        else:
+            self.hits += 1
+
+        return entry
+
+
+    def build_entry(self, key, structs, xyz_parts):
+        '''
+        Build entry of key from the scene coordinates of the residues of
+        each structure (xyz_parts, list of arrays (n, 3)).
+        '''
+        entry = []
+
+        for struct, xyz in zip(structs, xyz_parts):
+            position = np.array(struct.scene_position.matrix, dtype=float)
+            center = np.zeros(3)
+
+            if len(xyz) > 0:
+                center = rigid_body.apply(rigid_body.inverse(position), \
+                                          [np.mean(xyz, axis=0)])[0]
+
+            entry.append({ 'structure': struct, \
+                           'atoms_n': struct.num_atoms, \
+                           'position': position, \
+                           'version': 0, \
+                           'center': center, \
+                           'n': len(xyz) })
+
+        self.entries[key] = entry
+        self.misses += 1
+
+        return entry
+
+
+    def get_center(self, entry):
+        '''
+        Get center (scene coordinates) of an entry: mean of the centers of
+        its parts at their scene positions, weighted by number of residues.
+        '''
+        sum_vect = np.zeros(3)
+        sum_n = 0
+
+        for part in entry:
+            sum_vect += part['n']*rigid_body.apply(part['position'], \
+                                                   [part['center']])[0]
+            sum_n += part['n']
+
+        if sum_n == 0:
+            ctl.error('get_center: empty residue range')
+
+        return sum_vect/sum_n
+
+
+    def get_stats(self):
+        '''
+        Get cache statistics.
+
+        Return:
+            dict with 'hits', 'updates', 'misses', 'entries'
+        '''
+        return { 'hits': self.hits, \
+                 'updates': self.updates, \
+                 'misses': self.misses, \
+                 'entries': len(self.entries) }
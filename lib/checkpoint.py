@@ -0,0 +1,148 @@
+import ctl
+
+import hashlib
+import json
+import os
+import time
+
+
+'''
+Module providing stage checkpoints of a run (e.g. Assembler.run), so that a
+restarted run resumes after the completed stages.
+
+The checkpoints are recorded in a manifest (json file in the export folder)
+together with a hash of the inputs of the run. A stage is completed if it is
+recorded in the manifest and all its output files exist with the recorded
+sizes. If the inputs have changed, all checkpoints are discarded.
+'''
+
+manifest_filename = 'checkpoints.json'
+
+
+def get_input_hash(params, files=[]):
+    '''
+    Get hash of the inputs of a run: parameters (json serializable) and
+    contents of the input files.
+    '''
+    h = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode())
+
+    for file in files:
+        h.update(file.encode())
+
+        try:
+            f = open(file, 'rb')
+
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+
+            f.close()
+        except IOError:
+            h.update(b'missing')
+
+    return h.hexdigest()
+
+
+class Manifest():
+    '''
+    This class describes the checkpoints of the stages of a run.
+    '''
+
+
+    def __init__(self, path, input_hash, reset=False):
+        '''
+        Initialization of the Manifest class, checkpoints of a previous run
+        with the same input hash are loaded.
+
+        reset: discard checkpoints of a previous run
+        '''
+        self.path = path
+        self.input_hash = input_hash
+        self.stages = {}
+            # stage: {'time': .., 'data': {..}, 'files': {file: size}},
+            # file paths relative to the manifest folder
+
+        manifest = self.read()
+
+        if manifest != None and not reset:
+            if manifest['input_hash'] == input_hash:
+                self.stages = manifest['stages']
+                ctl.p('checkpoints: '+str(len(self.stages))+ \
+                      ' completed stages loaded')
+            else:
+                ctl.p('checkpoints: inputs changed, checkpoints discarded')
+
+        return
+
+
+    def read(self):
+        ''' Read manifest file (None if not existing). '''
+
+        try:
+            f = open(self.path, 'r')
+            manifest = json.load(f)
+            f.close()
+        except (IOError, ValueError):
+            return None
+
+        return manifest
+
+
+    def write(self):
+        ''' Write manifest file (atomic replacement). '''
+
+        f = open(self.path+'.tmp', 'w')
+        json.dump({ 'input_hash': self.input_hash, \
+                    'stages': self.stages }, f, indent=1, default=float)
+                # default: numpy numbers
+        f.close()
+
+        os.replace(self.path+'.tmp', self.path)
+
+        return
+
+
+    def done(self, stage):
+        ''' Check if a stage is completed. '''
+
+        if stage not in self.stages:
+            return False
+
+        folder = os.path.dirname(self.path)
+
+        for file, size in self.stages[stage]['files'].items():
+            file = os.path.join(folder, file)
+
+            if not os.path.exists(file) or os.path.getsize(file) != size:
+                ctl.d('checkpoints: output of stage '+stage+' changed: '+file)
+                return False
+
+        return True
+
+
+    def get(self, stage, key, default=None):
+        ''' Get data entry of a completed stage. '''
+
+        return self.stages[stage]['data'].get(key, default)
+
+
+    def complete(self, stage, data={}, files=[]):
+        '''
+        Record completed stage with data (json serializable) and output files
+        (files not existing are skipped).
+        '''
+        folder = os.path.dirname(self.path)
+        files_sizes = {}
+
+        for file in files:
+            if os.path.exists(file):
+                files_sizes[os.path.relpath(file, folder)] = \
+                                                        os.path.getsize(file)
+
+        self.stages[stage] = { 'time': time.time(), \
+                               'data': data, \
+                               'files': files_sizes }
+        self.write()
+
+        ctl.d('checkpoints: stage completed: '+stage)
+
+        return
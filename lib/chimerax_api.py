@@ -1,12 +1,20 @@
+from center_cache import CenterCache
+from coord_index import CoordIndex
+import atoms
+import contacts
 import ctl
 import geometry
-import math
-import re
+import rigid_body
 
+import contextlib
+import numpy as np
 import os
+import time
 
-from chimerax.atomic import all_atomic_structures
+from chimerax.atomic import all_atomic_structures, Structure
 from chimerax.core.commands import run
+from chimerax.core.models import Model
+from chimerax.geometry import Place, rotation, translation
 
 
 class ChimeraxSession():
@@ -20,6 +28,13 @@ class ChimeraxSession():
 
         self.session = session
         self.model_reg = -1
+        self.coord_index = CoordIndex()
+        self.center_cache = CenterCache()
+
+        self.batch_level = 0 # nesting level of batch() contexts
+        self.batch_label = ''
+        self.batch_cmds = [] # commands gathered in the current batch
+        self.batch_timings = [] # [label, number of commands, time in s]
 
         if silent == 0:
             self.init()
@@ -31,7 +46,10 @@ class ChimeraxSession():
         '''
         Initialization of new session in the ChimeraX application.
         '''
+        self.flush()
         run(self.session, 'close session')
+        self.coord_index.invalidate()
+        self.center_cache.invalidate()
 
         if graphics:
             run(self.session, 'camera ortho')
@@ -55,6 +73,7 @@ class ChimeraxSession():
     def get_structure(self, model_id):
         ''' Get structure model object of ChimeraX session. '''
 
+        self.flush()
         models = self.session.models.list()
         ret = []
 
@@ -123,6 +142,84 @@ class ChimeraxSession():
             ctl.error('ChimeraxSession: open_session: file does not exist.')
 
         self.run('open "'+path+'"')
+        self.coord_index.invalidate()
+        self.center_cache.invalidate()
+
+        return
+
+
+    def snapshot(self):
+        '''
+        Get in-memory snapshot of the models of the session, replaces saving
+        and reopening of a session file (open_session).
+
+        The snapshot contains model ids, names and positions of all group
+        models and copies of all structures (atoms with chain ids and
+        coordinates), together with a snapshot of the model register.
+        Other models (e.g. volumes) are not included.
+
+        Return:
+            snapshot (list of [model_id, name, position, structure copy or
+            None for group models], model register snapshot)
+        '''
+        self.flush()
+        entries = []
+
+        def add_entries(models):
+            for m in models:
+                if isinstance(m, Structure):
+                    entries.append([m.id, m.name, m.position.matrix.copy(), \
+                                    m.copy(m.name)])
+                elif type(m) is Model:
+                    entries.append([m.id, m.name, m.position.matrix.copy(), \
+                                    None])
+                    add_entries(m.child_models())
+
+        add_entries(self.session.models.scene_root_model.child_models())
+
+        model_reg_snapshot = None
+        if self.model_reg != -1:
+            model_reg_snapshot = self.model_reg.snapshot()
+
+        return [entries, model_reg_snapshot]
+
+
+    def restore(self, snapshot):
+        '''
+        Restore the models of the session (and the model register) from an
+        in-memory snapshot (see snapshot), all other models are closed.
+
+        The snapshot is not changed, it can be restored several times.
+        '''
+        entries, model_reg_snapshot = snapshot
+
+        self.flush()
+        self.session.models.close(self.session.models.list())
+        self.coord_index.invalidate()
+        self.center_cache.invalidate()
+
+        restored = {}
+
+        for model_id, name, position, structure in \
+                                        sorted(entries, key=lambda e: e[0]):
+            if structure is None:
+                m = Model(name, self.session)
+            else:
+                m = structure.copy(name)
+
+            parent = restored.get(model_id[:-1])
+                    # parents are restored before their submodels (sorted ids)
+
+            self.session.models.add([m], parent=parent)
+
+            if m.id != model_id:
+                self.session.models.assign_id(m, model_id)
+
+            m.position = Place(matrix=position)
+            restored[model_id] = m
+
+        if model_reg_snapshot is not None:
+            self.model_reg.restore(model_reg_snapshot)
 
         return
 
@@ -196,54 +293,124 @@ class ChimeraxSession():
         model_id = self.model_reg.convert_model_id(model_id)
 
         struct = self.get_structure(model_id)
-        residues = struct.residues
-
-        res_found = []
-        
-        for r in residues:
-            if chainid != '':
-                if chainid != r.chain_id:
-                    continue
-
-            if r.number == resid:
-                res_found.append(r)
-                break
+        entry = self.coord_index.get_entry(model_id, struct)
+        row = self.coord_index.get_row(entry, resid, atomid, chainid)
 
-        if len(res_found) == 0 and error_when_res_not_found:
+        if row == -1 and error_when_res_not_found:
             ctl.e(model_id)
             ctl.e(resid)
             ctl.error('get_xyz: no residue found for resid')
-        elif len(res_found) == 0:
+        elif row == -1:
             return False
-        elif len(res_found) > 1:
+        elif row == -2:
             ctl.e(model_id)
             ctl.e(resid)
-            ctl.error('get_xyz: no unique residue found for resid')
+            ctl.error('get_xyz: no unique coord found for resid')
 
-        coord_found = []
+        return entry['xyz'][row].copy()
 
-        for a in res_found[0].atoms:
-            if a.name == atomid:
-                coord_found.append(a.scene_coord)
-                break
 
-        if len(coord_found) != 1:
-            ctl.e(idstr)
-            ctl.error('get_xyz: no unique coord found for resid')
+    def get_xyz_many(self, model_id, resids, atomid='CA', chainid=''):
+        '''
+        Get coordinates (x, y, z) of several residues of a model as array with
+        shape (n, 3).
+        '''
+        model_id = self.model_reg.convert_model_id(model_id)
+
+        struct = self.get_structure(model_id)
+        entry = self.coord_index.get_entry(model_id, struct)
+
+        rows = []
 
-        return coord_found[0]
+        for resid in resids:
+            row = self.coord_index.get_row(entry, resid, atomid, chainid)
+
+            if row < 0:
+                ctl.e(model_id)
+                ctl.e(resid)
+                ctl.error('get_xyz_many: no unique coord found for resid')
+
+            rows.append(row)
+
+        return entry['xyz'][np.array(rows, dtype=int)].reshape(-1, 3)
+
+
+    def get_center(self, model_ids, res_range, resids_model_id=None):
+        '''
+        Get center (mean CA coordinates) of the residues inside res_range of
+        one or several (sub)models of a main model.
+
+        The center is cached (CenterCache) and updated analytically when the
+        models are moved or rotated.
+
+        resids_model_id: model id with the residue ids used for all models,
+                         default: residue ids of each model
+        '''
+        model_ids = [self.model_reg.convert_model_id(m) for m in model_ids]
+
+        if resids_model_id != None:
+            resids_model_id = self.model_reg.convert_model_id(resids_model_id)
+
+        key = (model_ids[0][0], tuple(model_ids), tuple(res_range), \
+               resids_model_id)
+        structs = [self.get_structure(m) for m in model_ids]
+
+        entry = self.center_cache.get_entry(key, structs)
+
+        if entry == None:
+            xyz_parts = []
+
+            if resids_model_id != None:
+                resids_all = self.resids(resids_model_id)
+
+            for model_id in model_ids:
+                if resids_model_id == None:
+                    resids_all = self.resids(model_id)
+
+                resids = [resid for resid in resids_all \
+                          if res_range[0] <= resid <= res_range[1]]
+                xyz_parts.append(self.get_xyz_many(model_id, resids))
+
+            entry = self.center_cache.build_entry(key, structs, xyz_parts)
+
+        return self.center_cache.get_center(entry)
+
+
+    def get_center_cache_stats(self):
+        '''
+        Get statistics of the center cache (for profiling).
+
+        Return:
+            dict with 'hits', 'updates', 'misses', 'entries'
+        '''
+        return self.center_cache.get_stats()
 
 
     def move_model(self, model_id, vect):
         '''
         Move model.
+
+        The translation is applied directly to the scene position of the
+        model (same result as the "move" command along the screen axes).
         '''
         model_id = self.model_reg.convert_model_id(model_id)
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
-        self.run('move x '+str(vect[0])+' models #'+model_id_str)
-        self.run('move y '+str(vect[1])+' models #'+model_id_str)
-        self.run('move z '+str(vect[2])+' models #'+model_id_str)
+        self.flush()
+        models = self.session.models.list(model_id=model_id)
+                # pending (batched) renaming of models is run before lookup
+
+        if len(models) == 1:
+            axes = self.session.main_view.camera.position.axes()
+            shift = vect[0]*axes[0]+vect[1]*axes[1]+vect[2]*axes[2]
+            models[0].scene_position = \
+                                translation(shift)*models[0].scene_position
+        else:
+            self.run_batched('move x '+str(vect[0])+' models #'+model_id_str)
+            self.run_batched('move y '+str(vect[1])+' models #'+model_id_str)
+            self.run_batched('move z '+str(vect[2])+' models #'+model_id_str)
+
+        self.coord_index.invalidate(model_id)
 
         return
 
@@ -251,19 +418,37 @@ class ChimeraxSession():
     def turn_model(self, model_id, axis, angle, center=[]):
         '''
         Turn model around axis.
+
+        With a given center, the rotation is applied directly to the scene
+        position of the model (same result as the "turn" command around the
+        screen axes).
         '''
         model_id = self.model_reg.convert_model_id(model_id)
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
         axis_str = ['x', 'y', 'z']
 
+        self.flush()
+        models = self.session.models.list(model_id=model_id)
+                # pending (batched) renaming of models is run before lookup
+
+        if center != [] and len(models) == 1:
+            axes = self.session.main_view.camera.position.axes()
+            models[0].scene_position = \
+                    rotation(axes[axis], angle, center)* \
+                    models[0].scene_position
+            self.coord_index.invalidate(model_id)
+
+            return
+
         center_str = ''
         if center != []:
             center_str = ' center '+ \
                         str(center[0])+', '+str(center[1])+', '+str(center[2])
 
-        self.run('turn '+axis_str[axis]+' '+str(angle)+ \
+        self.run_batched('turn '+axis_str[axis]+' '+str(angle)+ \
                          center_str+' models #'+model_id_str)
+        self.coord_index.invalidate(model_id)
 
         return
 
@@ -294,6 +479,10 @@ class ChimeraxSession():
         self.run('align '+' '.join(model_residues_str)+ \
                         ' toAtoms #'+','.join(ref_model_ids_str))
 
+        for m in model_residues:
+            model_id = self.model_reg.convert_model_id(m[0])
+            self.coord_index.invalidate(model_id[:1])
+
         return
 
 
@@ -302,7 +491,7 @@ class ChimeraxSession():
         Get coordinates (x, y, z) of a residue (model_id, resid) using the
         "getcrd" command of ChimeraX.
         '''
-        re = run(self.session, 'getcrd '+str(idstr))
+        re = self.run('getcrd '+str(idstr))
 
         return re[0]
 
@@ -316,7 +505,7 @@ class ChimeraxSession():
         model_id0_str = self.model_reg.convert_model_id_to_str(model_id0)
         model_id1_str = self.model_reg.convert_model_id_to_str(model_id1)
         
-        selection = run(self.session, 'interfaces select #'+ \
+        selection = self.run('interfaces select #'+ \
                             model_id0_str+' contacting #'+ \
                             model_id1_str+' bothSides true')
 
@@ -359,20 +548,126 @@ class ChimeraxSession():
             bring_id = self.model_reg.convert_model_id(bring_id)
             bring_id_str = ' bring #'+str(bring_id[0])+'.1-100'
 
-        run(self.session, \
+        self.run( \
             'match #'+model_id_str+model_chainid_infix+model_res_range_txt+ \
             ' to #'+match_to_id_str+match_to_chainid_infix+ \
             bring_id_str)
 
+        self.coord_index.invalidate(model_id)
+
+        if bring_id != None:
+            self.coord_index.invalidate(bring_id[:1])
+
         return
 
 
     def run(self, cmd, downgrade_errors=False):
-        ''' Run command iwth the "run" command of ChimeraX. '''
+        '''
+        Run command iwth the "run" command of ChimeraX.
+
+        Commands gathered in a batch are run before.
+        '''
+        self.flush()
 
         return run(self.session, cmd, downgrade_errors=downgrade_errors)
 
 
+    def run_batched(self, cmd):
+        '''
+        Run command, inside of a batch() context the command is gathered and
+        run together with the other commands of the batch.
+
+        Only for commands whose return value is not used.
+        '''
+        if self.batch_level > 0:
+            self.batch_cmds.append(cmd)
+        else:
+            self.run(cmd)
+
+        return
+
+
+    @contextlib.contextmanager
+    def batch(self, label=''):
+        '''
+        Context to gather commands and run them as one semicolon-joined
+        command when the context is left.
+
+        Methods that read the state of the session run the gathered commands
+        before, so the order of all commands is preserved.
+
+        usage:
+            with sess.batch('label'):
+                sess.rename_model(...)
+                sess.change_model_id(...)
+        '''
+        if self.batch_level == 0:
+            self.batch_label = label
+
+        self.batch_level += 1
+
+        try:
+            yield self
+        finally:
+            self.batch_level -= 1
+
+            if self.batch_level == 0:
+                self.flush()
+
+        return
+
+
+    def flush(self):
+        '''
+        Run gathered commands of the current batch and record timing.
+        '''
+        if len(self.batch_cmds) == 0:
+            return
+
+        cmds = self.batch_cmds
+        self.batch_cmds = []
+
+        t_start = time.time()
+        run(self.session, '; '.join(cmds))
+        t = time.time()-t_start
+
+        self.batch_timings.append([self.batch_label, len(cmds), t])
+        ctl.d('batch '+self.batch_label+': '+str(len(cmds))+' commands, '+ \
+              str(round(t, 4))+' s')
+
+        return
+
+
+    def get_batch_timings(self):
+        '''
+        Get summary of batch timings.
+
+        Return:
+            dict: label -> [number of batches, number of commands, time in s]
+        '''
+        timings = {}
+
+        for label, cmds_n, t in self.batch_timings:
+            if label not in timings:
+                timings[label] = [0, 0, 0]
+
+            timings[label][0] += 1
+            timings[label][1] += cmds_n
+            timings[label][2] += t
+
+        return timings
+
+
+    def atomic_structures(self):
+        '''
+        Get all atomic structures of ChimeraX session, gathered commands are
+        run before.
+        '''
+        self.flush()
+
+        return all_atomic_structures(self.session)
+
+
     def get_seq(self, model_id, selector=3):
         ''' Get sequence of a model. '''
 
@@ -391,7 +686,7 @@ class ChimeraxSession():
         ret = []
         seq = ''
 
-        for s in all_atomic_structures(self.session):
+        for s in self.atomic_structures():
 
             #format: e.g. 1.1
             if '#'+modelid+' ' in str(s)+' ':
@@ -414,7 +709,7 @@ class ChimeraxSession():
 
         length = 0
 
-        for s in all_atomic_structures(self.session):
+        for s in self.atomic_structures():
             ctl.p(str(s))
 
             if ('#'+str(model_id[0])+'.' in str(s)+' ') or \
@@ -440,7 +735,7 @@ class ChimeraxSession():
 
         length = 0
 
-        for s in all_atomic_structures(self.session):
+        for s in self.atomic_structures():
             ctl.p(str(s))
 
             if ('#'+model_id_str+'.' in str(s)+' ') or \
@@ -462,7 +757,7 @@ class ChimeraxSession():
         '''
         last_model_id = 0
 
-        for m in all_atomic_structures(self.session):
+        for m in self.atomic_structures():
             model_id = str(m).split('#')[1]
             model_id_0 = int(model_id.split('.')[0])
             
@@ -503,6 +798,8 @@ class ChimeraxSession():
         # avoid closing of whole ChimeraX session when to_close is empty
         if len(model_id_str) >= 1:
             self.run('close #'+model_id_str)
+            self.coord_index.invalidate(model_id)
+            self.center_cache.invalidate(model_id)
 
 
         if self.model_reg.model_exists(model_id) == True:
@@ -520,6 +817,8 @@ class ChimeraxSession():
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
         self.run('split #'+model_id_str)
+        self.coord_index.invalidate(model_id)
+        self.center_cache.invalidate(model_id)
 
         return
 
@@ -528,10 +827,13 @@ class ChimeraxSession():
         '''
         Delete residue range of given model id.
         '''
+        model_id = self.model_reg.convert_model_id(model_id)
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
         self.run('delete #'+model_id_str+ \
                             ':'+str(res_range[0])+'-'+str(res_range[1]))
+        self.coord_index.invalidate(model_id)
+        self.center_cache.invalidate(model_id)
 
         return
 
@@ -545,7 +847,7 @@ class ChimeraxSession():
         else:
             model_ids_str = self.ids_str_from_model_ids(model_ids)
 
-        self.run('hide '+model_ids_str+' models')
+        self.run_batched('hide '+model_ids_str+' models')
 
         return
 
@@ -559,7 +861,7 @@ class ChimeraxSession():
         else:
             model_ids_str = self.ids_str_from_model_ids(model_ids)
 
-        self.run('show '+model_ids_str+' models')
+        self.run_batched('show '+model_ids_str+' models')
 
         return
 
@@ -573,7 +875,7 @@ class ChimeraxSession():
         else:
             model_ids_str = self.ids_str_from_model_ids(model_ids)
 
-        self.run('hide '+model_ids_str+' atoms')
+        self.run_batched('hide '+model_ids_str+' atoms')
 
         return
 
@@ -584,7 +886,7 @@ class ChimeraxSession():
         '''
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
-        self.run('hide #'+model_id_str+' cartoons')
+        self.run_batched('hide #'+model_id_str+' cartoons')
 
         return
 
@@ -595,7 +897,7 @@ class ChimeraxSession():
         '''
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
-        self.run('show #'+model_id_str+' cartoons')
+        self.run_batched('show #'+model_id_str+' cartoons')
 
         return
 
@@ -607,7 +909,14 @@ class ChimeraxSession():
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
         model_id_new_str = self.model_reg.convert_model_id_to_str(model_id_new)
 
-        self.run('rename #'+model_id_str+' id #'+model_id_new_str)
+        self.run_batched('rename #'+model_id_str+' id #'+model_id_new_str)
+        self.coord_index.invalidate(self.model_reg.convert_model_id(model_id))
+        self.coord_index.invalidate( \
+                self.model_reg.convert_model_id(model_id_new))
+        self.center_cache.invalidate( \
+                self.model_reg.convert_model_id(model_id))
+        self.center_cache.invalidate( \
+                self.model_reg.convert_model_id(model_id_new))
 
         return
 
@@ -618,7 +927,7 @@ class ChimeraxSession():
         '''
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
-        self.run('rename #'+model_id_str+' '+model_name_new)
+        self.run_batched('rename #'+model_id_str+' '+model_name_new)
 
         return
 
@@ -629,7 +938,8 @@ class ChimeraxSession():
         '''
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
-        self.run('changechains #'+model_id_str+' '+str(chain_id))
+        self.run_batched('changechains #'+model_id_str+' '+str(chain_id))
+        self.coord_index.invalidate(self.model_reg.convert_model_id(model_id))
 
         return
 
@@ -640,7 +950,7 @@ class ChimeraxSession():
         model_id_str = self.model_reg.convert_model_id_to_str(model_id)
         chain = ''
 
-        for s in all_atomic_structures(self.session):
+        for s in self.atomic_structures():
             if '#'+model_id_str+' ' in str(s)+' ':
 
                 for r in s.residues:
@@ -656,7 +966,7 @@ class ChimeraxSession():
         ret = []
         modelid = self.model_reg.convert_model_id_to_str(modelid)
 
-        for s in all_atomic_structures(self.session):
+        for s in self.atomic_structures():
             if '#'+modelid+' ' in str(s)+' ':
 
              for r in s.residues:
@@ -747,7 +1057,7 @@ class ChimeraxSession():
         model_id2 = self.model_reg.convert_model_id(model_id)
         subids = []
 
-        for s in all_atomic_structures(self.session):
+        for s in self.atomic_structures():
             if '#'+str(model_id2[0])+'.' in str(s):
                 subid = str(s).split('#')[1]
                 subids.append( self.model_reg.convert_model_id(subid) )
@@ -755,18 +1065,104 @@ class ChimeraxSession():
         return subids
 
 
+    def get_position(self, model_id):
+        '''
+        Get scene position of a model as 3x4 matrix (rotation, translation).
+        '''
+        model_id = self.model_reg.convert_model_id(model_id)
+
+        self.flush()
+        models = self.session.models.list(model_id=model_id)
+
+        if len(models) != 1:
+            ctl.e(model_id)
+            ctl.error('get_position: no unique model found for model_id')
+
+        return np.array(models[0].scene_position.matrix, dtype=float)
+
+
+    def transform_model(self, model_id, tf):
+        '''
+        Apply transform (3x4 matrix in scene coordinates) to a model.
+        '''
+        model_id = self.model_reg.convert_model_id(model_id)
+
+        self.flush()
+        models = self.session.models.list(model_id=model_id)
+
+        if len(models) != 1:
+            ctl.e(model_id)
+            ctl.error('transform_model: no unique model found for model_id')
+
+        models[0].scene_position = Place(matrix=tf)*models[0].scene_position
+        self.coord_index.invalidate(model_id)
+
+        return
+
+
+    def transform_models(self, transforms):
+        '''
+        Apply transforms (3x4 matrices in scene coordinates) to models in one
+        step.
+
+        transforms: list of [model_id, tf]
+        '''
+        self.flush()
+
+        for model_id, tf in transforms:
+            model_id = self.model_reg.convert_model_id(model_id)
+
+            models = self.session.models.list(model_id=model_id)
+
+            if len(models) != 1:
+                ctl.e(model_id)
+                ctl.error('transform_models: no unique model found for '+ \
+                          'model_id')
+
+            models[0].scene_position = \
+                                Place(matrix=tf)*models[0].scene_position
+            self.coord_index.invalidate(model_id)
+
+        return
+
+
+    def get_screen_axes(self):
+        '''
+        Get screen axes x, y, z in scene coordinates (rows of a 3x3 array),
+        the axes of move_model and turn_model.
+        '''
+        self.flush()
+
+        return np.array(self.session.main_view.camera.position.axes(), \
+                        dtype=float)
+
+
+    def measure_rotation(self, model_id, model_id_ref):
+        '''
+        Measure rotation of model_id relative to model_id_ref (like the
+        "measure rotation" command of ChimeraX, calculated from the model
+        positions).
+
+        Return:
+            angle: rotation angle (degrees)
+            axis: rotation axis
+            axis_point: point on rotation axis
+            transl: translation vector
+        '''
+        tf = rigid_body.relative(self.get_position(model_id), \
+                                 self.get_position(model_id_ref))
+
+        return rigid_body.describe(tf)
+
+
     def get_rot_axis_z_dist(self, model_id, model_id_ref):
         '''
         Get distance of rotation axis from molecule center.
         '''
         model_id = self.model_reg.convert_model_id(model_id)
 
-        model_id_str = self.model_reg.convert_model_id_to_str(model_id)
-        model_id_ref_str = self.model_reg.convert_model_id_to_str(model_id_ref)
-
-        re = self.run('measure rotation #'+model_id_str+' toModel #'+ \
-                      model_id_ref_str+' showAxis false')
-        rot_axis_point = get_rot_axis_point(re.description())
+        angle, rot_axis, rot_axis_point, transl = \
+                                self.measure_rotation(model_id, model_id_ref)
         cen = self.model_reg.get_model((model_id[0],)).get_center()
         dist = geometry.dist(rot_axis_point, cen)
 
@@ -780,16 +1176,9 @@ class ChimeraxSession():
         model_id = self.model_reg.convert_model_id(model_id)
         model_id_ref = self.model_reg.convert_model_id(model_id_ref)
 
-        model_id_str = self.model_reg.convert_model_id_to_str(model_id)
-        model_id_ref_str = self.model_reg.convert_model_id_to_str(model_id_ref)
-
-        angle = 0
-        re = self.run('measure rotation #'+model_id_str+' toModel #'+ \
-                      model_id_ref_str+' showAxis false')
-        rot_axis = get_rot_axis(re.description())
-        angle = re.rotation_angle()/math.pi*180
+        angle, rot_axis, rot_axis_point, transl = \
+                                self.measure_rotation(model_id, model_id_ref)
 
-        rot_axis_point = get_rot_axis_point(re.description())
         cen = self.model_reg.get_model((model_id[0],)).get_center()
         dist = geometry.dist(rot_axis_point, cen)
 
@@ -868,14 +1257,12 @@ class ChimeraxSession():
 
         for i in ids:
 
-            for s in all_atomic_structures(self.session):
+            for s in self.atomic_structures():
                 if '#'+str(i)+'.' in str(s):
                     chainid = self.get_chainid(str(s.id[0])+'.'+str(s.id[1]))
                     chainid_new = 'mid'+str(s.id[0])+'point'+str(s.id[1])+ \
                             'cid'+str(chainid)+'end'
                     chainids_new.append(chainid_new)
-                    ret = self.run('changechains '+ \
-                            '#'+str(s.id[0])+'.'+str(s.id[1])+' '+chainid_new)
 
                     idstr = idstr+'#'+str(s.id[0])+'.'+str(s.id[1])+' '
                     ctl.d(s.name)
@@ -883,7 +1270,14 @@ class ChimeraxSession():
                     ids_to_combine.append( s.id )
                     ctl.d(s)
 
+        with self.batch('combine'):
+            for j,s_id in enumerate(ids_to_combine):
+                self.run_batched('changechains '+ \
+                        '#'+str(s_id[0])+'.'+str(s_id[1])+' '+chainids_new[j])
+
         ret = self.run('combine '+idstr+' modelId #'+str(intermediate_id))
+        self.coord_index.invalidate()
+        self.center_cache.invalidate()
         
         return chainids_new
 
@@ -896,8 +1290,11 @@ class ChimeraxSession():
         '''
         ret = self.run('split #'+str(id_to_split)+'')
 
-        for s in all_atomic_structures(self.session):
-            if '#'+str(id_to_split)+'.' in str(s):
+        structures = [s for s in self.atomic_structures() \
+                      if '#'+str(id_to_split)+'.' in str(s)]
+
+        with self.batch('split'):
+            for s in structures:
                 mid = str(s).split(' mid')[1].split('cid')[0]. \
                           replace('point', '.')
                 cid = str(s).split('cid')[1].split('end')[0]
@@ -905,11 +1302,16 @@ class ChimeraxSession():
                 ctl.d(mid)
                 ctl.d(cid)
 
-                self.run('rename #'+str(s.id[0])+'.'+str(s.id[1])+ \
-                         ' id #'+mid+' ')
-                self.run('changechains '+'#'+str(s.id[0])+'.'+str(s.id[1])+ \
-                         ' '+cid)
+                self.run_batched('rename #'+str(s.id[0])+'.'+str(s.id[1])+ \
+                                 ' id #'+mid+' ')
+                self.run_batched('changechains '+'#'+mid+' '+cid)
+                        # The renamed model is addressed by its new id mid:
+                        # the commands of the batch run in order, s.id is
+                        # read before the batch is flushed (pending batched
+                        # commands are flushed before model lookups).
 
+        self.coord_index.invalidate()
+        self.center_cache.invalidate()
         self.close_id(id_to_split)
 
         return
@@ -928,143 +1330,101 @@ class ChimeraxSession():
         return clashes
 
 
-    def set_marker(self, points, model_id_start, color='red', radius=10):
-        ''' Set marker to each point in list. '''
-
-        model_id_start = self.model_reg.convert_model_id(model_id_start)
-
-        for i,p in enumerate(points):
-            model_id = model_id_start[0]+i
-            model_id_str = self.model_reg.convert_model_id_to_str(model_id)
-
-            self.run('marker #'+model_id_str+' position '+ \
-                str(p[0])+','+str(p[1])+','+str(p[2])+ \
-                ' color '+color+' radius '+str(radius))
-
-        return
-
-
-    def measure_transl_vec(self, model_id, ref_model_id):
-        ''' Measure translation vector. '''
-
-        model_id = self.model_reg.convert_model_id(model_id)
-        model_id_str = self.model_reg.convert_model_id_to_str(model_id)
-
-        ref_model_id = self.model_reg.convert_model_id(ref_model_id)
-        ref_model_id_str = self.model_reg.convert_model_id_to_str(ref_model_id)
-
-        re = self.run('measure rotation #'+model_id_str+ \
-                ' toModel #'+ref_model_id_str+' showAxis false')
-
-        transl_vec = self.get_transl_vec(re.description())
-
-        return transl_vec
-
+    def get_atoms(self, model_id, without_h=True):
+        '''
+        Get atoms of a model including all submodels (scene coordinates) for
+        the calculations independent of ChimeraX commands (module contacts)
+        and the cif export (export.write_cif).
 
-    def measure_rot_axis(self, model_id, ref_model_id):
-        ''' Measure rotation axis. '''
+        The chain ids are prefixed by the model id of the structure (e.g.
+        '3.2.2/A') to keep the residues of different structures apart.
 
+        Return:
+            Atoms object, bonds (sparse adjacency matrix of the bonds of the
+            ChimeraX structures), model id of the structure of each atom
+        '''
         model_id = self.model_reg.convert_model_id(model_id)
-        model_id_str = self.model_reg.convert_model_id_to_str(model_id)
-
-        ref_model_id = self.model_reg.convert_model_id(ref_model_id)
-        ref_model_id_str = self.model_reg.convert_model_id_to_str(ref_model_id)
 
-        re = self.run('measure rotation #'+model_id_str+ \
-                ' toModel #'+ref_model_id_str+' showAxis false')
+        columns = {'name': [], 'resname': [], 'chainid': [], 'resid': [], \
+                   'element': [], 'xyz': [], 'bfact': []}
+        bond_pairs = []
+        atom_model_ids = []
+        atoms_n = 0
 
-        rot_axis = self.get_rot_axis(re.description())
+        for s in self.atomic_structures():
+            if s.id[:len(model_id)] != model_id:
+                continue
 
-        return rot_axis
+            a = s.residues.atoms
 
+            if without_h:
+                a = a[a.element_names != 'H']
 
-    def get_transl_vec(self, txt):
-        ''' Get translation vector from ChimeraX text description. '''
+            residues = a.residues
+            s_id = '.'.join([str(i) for i in s.id])
 
-        vec = [0, 0, 0]
-        txt = txt.split("\n")
+            columns['name'].append(a.names)
+            columns['resname'].append(residues.names)
+            columns['chainid'].append(np.array([s_id+'/'+c for c in \
+                                                residues.chain_ids]))
+            columns['resid'].append(residues.numbers)
+            columns['element'].append(a.element_names)
+            columns['xyz'].append(a.scene_coords)
+            columns['bfact'].append(a.bfactors)
 
-        vec[0] = txt[1].strip()
-        vec[1] = txt[2].strip()
-        vec[2] = txt[3].strip()
+            a1, a2 = s.bonds.atoms
+            i1 = a.indices(a1)
+            i2 = a.indices(a2)
+            bonded = (i1 >= 0) & (i2 >= 0)
+            bond_pairs.append(np.stack((i1[bonded], i2[bonded]), axis=1)+ \
+                              atoms_n)
 
-        # replace multiple spaces by a single space
-        vec = [re.sub(r'\s{2,}', ' ', v) for v in vec]
+            atom_model_ids += [s.id]*len(a)
+            atoms_n += len(a)
 
-        vec = [v.split(' ')[3] for v in vec]
-        vec = [float(v) for v in vec]
-
-        return vec
-
-
-    def get_rot_axis(self, txt):
-        ''' Get rotation axis from ChimeraX text description. '''
-
-        vec = [0,0,0]
-        txt = txt.split("\n")
-        v0 = txt[4].strip()
-
-        # replace multiple spaces by a single space
-        v0 = re.sub(r'\s{2,}', ' ', v0)
-        
-        v0 = v0.split(' ')
-
-        vec = [v0[1], v0[2], v0[3]]
-        vec = [float(v) for v in vec]
-
-        return vec
-
-
-def get_transl_vec(txt):
-    ''' Get translation vector from ChimeraX text description. '''
-
-    vec = [0,0,0]
-    txt = txt.split("\n")
+        if atoms_n == 0:
+            ctl.e(model_id)
+            ctl.error('get_atoms: no atoms found for model_id')
 
-    vec[0] = txt[1].strip()
-    vec[1] = txt[2].strip()
-    vec[2] = txt[3].strip()
+        for c in columns:
+            columns[c] = np.concatenate(columns[c])
 
-    # replace multiple spaces by a single space
-    vec = [re.sub(r'\s{2,}', ' ', v) for v in vec]
+        model_atoms = atoms.from_columns(**columns)
+        bonds = contacts.get_bond_matrix(np.concatenate(bond_pairs), \
+                                         atoms_n)
 
-    vec = [v.split(' ')[3] for v in vec]
-    vec = [float(v) for v in vec]
+        return model_atoms, bonds, atom_model_ids
 
-    return vec
 
+    def set_marker(self, points, model_id_start, color='red', radius=10):
+        ''' Set marker to each point in list. '''
 
-def get_rot_axis(txt):
-    ''' Get rotation axis from ChimeraX text description. '''
+        model_id_start = self.model_reg.convert_model_id(model_id_start)
 
-    vec = [0,0,0]
-    txt = txt.split("\n")
-    v0 = txt[4].strip()
+        for i,p in enumerate(points):
+            model_id = model_id_start[0]+i
+            model_id_str = self.model_reg.convert_model_id_to_str(model_id)
 
-    # replace multiple spaces by a single space
-    v0 = re.sub(r'\s{2,}', ' ', v0)
-    
-    v0 = v0.split(' ')
+            self.run('marker #'+model_id_str+' position '+ \
+                str(p[0])+','+str(p[1])+','+str(p[2])+ \
+                ' color '+color+' radius '+str(radius))
 
-    vec = [v0[1], v0[2], v0[3]]
-    vec = [float(v) for v in vec]
+        return
 
-    return vec
 
+    def measure_transl_vec(self, model_id, ref_model_id):
+        ''' Measure translation vector. '''
 
-def get_rot_axis_point(txt):
-    ''' Get rotation axis point from ChimeraX text description. '''
+        angle, rot_axis, rot_axis_point, transl_vec = \
+                                self.measure_rotation(model_id, ref_model_id)
 
-    vec = [0,0,0]
-    txt = txt.split("\n")
-    v0 = txt[5].strip()
+        return transl_vec
 
-    # replace multiple spaces by a single space
-    v0 = re.sub(r'\s{2,}', ' ', v0)
 
-    v0 = v0.split(' ')
+    def measure_rot_axis(self, model_id, ref_model_id):
+        ''' Measure rotation axis. '''
 
-    vec = [v0[2], v0[3], v0[4]]
-    vec = [float(v) for v in vec]
+        angle, rot_axis, rot_axis_point, transl_vec = \
+                                self.measure_rotation(model_id, ref_model_id)
 
-    return vec
+        return rot_axis
@@ -0,0 +1,364 @@
+import math
+import numpy as np
+import scipy.sparse
+from scipy.spatial import cKDTree
+
+
+'''
+Module providing clash and interface detection on atom coordinates (Atoms
+objects) with KD-trees, independent of a ChimeraX session.
+
+The parameters follow the defaults of the ChimeraX commands "clashes" and
+"interfaces". Radii are united-atom van der Waals radii (implicit hydrogens),
+as used by ChimeraX for structures without hydrogens.
+'''
+
+# van der Waals radii (united atom)
+radius_c_sp3 = 1.88
+radius_c_aromatic = 1.76
+radius_c_sp2 = 1.61 # carbon without hydrogen (carbonyl, carboxyl, ring)
+radius_n = 1.64
+radius_o_carbonyl = 1.42
+radius_o_hydroxyl = 1.46
+radius_s = 1.77
+radius_default = 1.8
+
+c_sp2 = { 'ASP': ['CG'], 'GLU': ['CD'], 'ASN': ['CG'], 'GLN': ['CD'], \
+          'ARG': ['CZ'], 'PHE': ['CG'], 'TYR': ['CG', 'CZ'], \
+          'TRP': ['CG', 'CD2', 'CE2'], 'HIS': ['CG'] }
+c_aromatic = { 'PHE': ['CD1', 'CD2', 'CE1', 'CE2', 'CZ'], \
+               'TYR': ['CD1', 'CD2', 'CE1', 'CE2'], \
+               'TRP': ['CD1', 'CE3', 'CZ2', 'CZ3', 'CH2'], \
+               'HIS': ['CD2', 'CE1'] }
+o_hydroxyl = { 'SER': ['OG'], 'THR': ['OG1'], 'TYR': ['OH'], \
+               'ASP': ['OD1', 'OD2'], 'GLU': ['OE1', 'OE2'] }
+
+# covalent radii for the detection of bonds
+covalent_radii = { 'C': 0.76, 'N': 0.71, 'O': 0.66, 'S': 1.05, 'H': 0.31 }
+bond_tolerance = 0.4
+
+backbone_atoms = ['N', 'CA', 'C', 'O']
+
+
+def get_radius(resname, name, element):
+    ''' Get van der Waals radius of an atom. '''
+
+    if element == 'C':
+        if name == 'C' or name in c_sp2.get(resname, []):
+            return radius_c_sp2
+        if name in c_aromatic.get(resname, []):
+            return radius_c_aromatic
+
+        return radius_c_sp3
+
+    if element == 'N':
+        return radius_n
+
+    if element == 'O':
+        if name == 'OXT' or name in o_hydroxyl.get(resname, []):
+            return radius_o_hydroxyl
+
+        return radius_o_carbonyl
+
+    if element == 'S':
+        return radius_s
+
+    return radius_default
+
+
+def get_radii(atoms):
+    '''
+    Get van der Waals radii of all atoms (determined once per distinct
+    residue name, atom name and element).
+    '''
+    if len(atoms) == 0:
+        return np.zeros(0)
+
+    keys = np.char.add(np.char.add(atoms.resname.astype(str), ' '), \
+                       np.char.add(np.char.add(atoms.name.astype(str), ' '), \
+                                   atoms.element.astype(str)))
+    keys_unique, inverse = np.unique(keys, return_inverse=True)
+
+    radii = np.array([get_radius(*k.split(' ')) for k in keys_unique], \
+                     dtype=float)
+
+    return radii[inverse]
+
+
+def get_bonds(atoms, mol_index=None):
+    '''
+    Get covalent bonds from interatomic distances.
+
+    Atoms of different molecules are never bonded, otherwise severely
+    clashing atoms of neighboring molecules would be treated as bonded.
+
+    Args:
+        mol_index: molecule index of each atom (int array), None: chain ids
+
+    Return:
+        sparse adjacency matrix (csr, bool)
+    '''
+    n = len(atoms)
+    cov = np.array([covalent_radii.get(e, 0.77) for e in atoms.element])
+
+    if mol_index is None:
+        mol_index = np.unique(atoms.chainid, return_inverse=True)[1]
+
+    pairs = cKDTree(atoms.xyz).query_pairs( \
+                        2*cov.max()+bond_tolerance, output_type='ndarray')
+    pairs = pairs[mol_index[pairs[:, 0]] == mol_index[pairs[:, 1]]]
+
+    d = np.linalg.norm(atoms.xyz[pairs[:, 0]]-atoms.xyz[pairs[:, 1]], axis=1)
+    bonded = d < cov[pairs[:, 0]]+cov[pairs[:, 1]]+bond_tolerance
+
+    return get_bond_matrix(pairs[bonded], n)
+
+
+def get_bond_matrix(pairs, n):
+    '''
+    Get sparse adjacency matrix (csr, bool) of n atoms from bonded atom
+    pairs (i, j).
+    '''
+    pairs = np.asarray(pairs, dtype=int).reshape(-1, 2)
+
+    adj = scipy.sparse.coo_matrix( \
+                (np.ones(2*len(pairs), dtype=bool), \
+                 (np.concatenate((pairs[:, 0], pairs[:, 1])), \
+                  np.concatenate((pairs[:, 1], pairs[:, 0])))), \
+                shape=(n, n))
+
+    return adj.tocsr()
+
+
+def get_bond_separation_mask(bonds, pairs, bond_separation):
+    '''
+    Check for atom pairs if the atoms are separated by fewer than
+    bond_separation bonds.
+    '''
+    n = bonds.shape[0]
+    step = (bonds+scipy.sparse.identity(n, dtype=bool, format='csr')). \
+                                                            astype(np.int32)
+    reach = step
+
+    for i in range(1, bond_separation-1):
+        reach = (reach @ step).astype(bool).astype(np.int32)
+
+    if len(pairs) == 0:
+        return np.zeros(0, dtype=bool)
+
+    return np.asarray(reach[pairs[:, 0], pairs[:, 1]]).ravel() > 0
+
+
+def find_clashes(atoms, test_mask=None, overlap_cutoff=0.6, \
+                 hbond_allowance=0.4, bond_separation=4, intra_res=False, \
+                 radii=None, bonds=None, group=None):
+    '''
+    Find clashes (like the ChimeraX command "clashes").
+
+    Atom pairs within the same residue (intra_res=False) and atom pairs
+    separated by fewer than bond_separation bonds are skipped. For possibly
+    hydrogen-bonded pairs (N/O) the overlap is reduced by hbond_allowance.
+
+    Args:
+        test_mask: atoms to test (bool array), pairs with at least one test
+                   atom are considered (restrict "any"), None: all atoms
+        group: group index of each atom (int array), pairs within a group are
+               skipped (e.g. rigid bodies moved relative to each other)
+
+    Return:
+        array of clashing atom pairs (i, j), array of overlaps
+    '''
+    if radii is None:
+        radii = get_radii(atoms)
+
+    if len(atoms) < 2:
+        return np.zeros((0, 2), dtype=int), np.zeros(0)
+
+    pairs = get_close_pairs(atoms.xyz, 2*radii.max()-overlap_cutoff, \
+                            test_mask)
+
+    if group is not None:
+        pairs = pairs[group[pairs[:, 0]] != group[pairs[:, 1]]]
+
+    d = np.linalg.norm(atoms.xyz[pairs[:, 0]]-atoms.xyz[pairs[:, 1]], axis=1)
+    overlap = radii[pairs[:, 0]]+radii[pairs[:, 1]]-d
+
+    polar = np.isin(atoms.element, ['N', 'O'])
+    hbond = polar[pairs[:, 0]] & polar[pairs[:, 1]]
+    overlap[hbond] -= hbond_allowance
+
+    clash = overlap >= overlap_cutoff
+    pairs = pairs[clash]
+    overlap = overlap[clash]
+
+    if not intra_res:
+        res_index = atoms.get_residue_index()
+        inter = res_index[pairs[:, 0]] != res_index[pairs[:, 1]]
+        pairs = pairs[inter]
+        overlap = overlap[inter]
+
+    if bonds is None:
+        bonds = get_bonds(atoms)
+
+    separated = ~get_bond_separation_mask(bonds, pairs, bond_separation)
+
+    return pairs[separated], overlap[separated]
+
+
+def get_close_pairs(xyz, cutoff, test_mask=None):
+    '''
+    Get atom pairs (i < j) within cutoff distance. With test_mask, only the
+    test atoms are queried against all atoms, so the costs scale with the
+    number of test atoms and not with the size of the whole assembly.
+    '''
+    if test_mask is None or test_mask.all():
+        return cKDTree(xyz).query_pairs(cutoff, output_type='ndarray')
+
+    test = np.nonzero(test_mask)[0]
+
+    if len(test) == 0:
+        return np.zeros((0, 2), dtype=int)
+
+    dist = cKDTree(xyz[test]).sparse_distance_matrix( \
+                cKDTree(xyz), cutoff, output_type='ndarray')
+
+    i = test[dist['i']]
+    j = dist['j']
+
+    # pairs of two test atoms are found in both directions
+    keep = (i != j) & ((i < j) | ~test_mask[j])
+
+    return np.stack((np.minimum(i, j), np.maximum(i, j)), axis=1)[keep]
+
+
+def get_clashing_atoms(pairs):
+    ''' Get indices of all atoms involved in clashes. '''
+
+    return np.unique(pairs.ravel())
+
+
+def get_clash_counts(atoms, pairs, backbone=['N', 'CA', 'C']):
+    '''
+    Count clashes per atom and per residue.
+
+    A clash between backbone atoms (both atoms in backbone) is counted
+    additionally as backbone clash of both atoms.
+
+    Return:
+        clashes per atom, clashes per residue, backbone clashes per atom
+        (int arrays)
+    '''
+    n = len(atoms)
+    atom_counts = np.bincount(pairs.ravel(), minlength=n)
+
+    bb = np.isin(atoms.name, backbone)
+    bb_pairs = pairs[bb[pairs[:, 0]] & bb[pairs[:, 1]]]
+    bb_counts = np.bincount(bb_pairs.ravel(), minlength=n)
+
+    res_index = atoms.get_residue_index()
+    res_counts = np.bincount(res_index, weights=atom_counts, \
+                             minlength=atoms.get_res_n()).astype(int)
+
+    return atom_counts, res_counts, bb_counts
+
+
+def get_sphere_points(points_n):
+    ''' Get points evenly distributed on unit sphere (golden spiral). '''
+
+    i = np.arange(points_n)+0.5
+    phi = np.arccos(1-2*i/points_n)
+    theta = math.pi*(1+5**0.5)*i
+
+    return np.stack((np.cos(theta)*np.sin(phi), np.sin(theta)*np.sin(phi), \
+                     np.cos(phi)), axis=1)
+
+
+def get_occluded(points, xyz, radii, owner=None):
+    '''
+    Check if points are inside of the spheres (xyz, radii). The sphere of the
+    owner atom of a point is not considered.
+    '''
+    occluded = np.zeros(len(points), dtype=bool)
+
+    if len(points) == 0 or len(xyz) == 0:
+        return occluded
+
+    dist = cKDTree(points).sparse_distance_matrix( \
+                cKDTree(xyz), radii.max(), output_type='ndarray')
+
+    inside = dist['v'] < radii[dist['j']]
+
+    if owner is not None:
+        inside &= dist['j'] != owner[dist['i']]
+
+    occluded[dist['i'][inside]] = True
+
+    return occluded
+
+
+def get_buried_area(atoms, atoms_partner, probe_radius=1.4, points_n=100):
+    '''
+    Get solvent accessible surface area of each atom that is buried by a
+    partner (numerical calculation with points on the atom spheres).
+    '''
+    radii = get_radii(atoms)+probe_radius
+    radii_partner = get_radii(atoms_partner)+probe_radius
+    buried_area = np.zeros(len(atoms))
+
+    if len(atoms) == 0 or len(atoms_partner) == 0:
+        return buried_area
+
+    # only atoms near the partner can be buried
+    dist, index = cKDTree(atoms_partner.xyz).query(atoms.xyz)
+    near = np.nonzero(dist < radii+radii_partner.max())[0]
+
+    sphere = get_sphere_points(points_n)
+    points = (atoms.xyz[near][:, None, :]+ \
+              radii[near][:, None, None]*sphere[None, :, :]).reshape(-1, 3)
+    owner = np.repeat(near, points_n)
+
+    accessible = ~get_occluded(points, atoms.xyz, radii, owner)
+    buried = accessible & get_occluded(points, atoms_partner.xyz, \
+                                       radii_partner)
+
+    point_area = 4*math.pi*radii[owner]**2/points_n
+    np.add.at(buried_area, owner[buried], point_area[buried])
+
+    return buried_area
+
+
+def get_interface_residues(atoms0, atoms1, area_cutoff=300, \
+                           res_area_cutoff=15, probe_radius=1.4):
+    '''
+    Get interface residues between two sets of atoms (like the ChimeraX
+    command "interfaces ... bothSides true").
+
+    A residue is an interface residue if its buried area is at least
+    res_area_cutoff, the interface is only considered if the buried area of
+    the interface is at least area_cutoff.
+
+    Return:
+        list of [side, resid] (side 0: atoms0, 1: atoms1)
+    '''
+    residues = []
+    area = 0
+
+    for side, atoms, atoms_partner in [(0, atoms0, atoms1), \
+                                       (1, atoms1, atoms0)]:
+        buried_area = get_buried_area(atoms, atoms_partner, probe_radius)
+        area += buried_area.sum()
+
+        res_index = atoms.get_residue_index()
+        res_area = np.bincount(res_index, weights=buried_area, \
+                               minlength=res_index[-1]+1 \
+                                         if len(res_index) > 0 else 0)
+        res_resids = atoms.resid[atoms.get_residue_starts()]
+
+        for i in np.nonzero(res_area >= res_area_cutoff)[0]:
+            residues.append([side, int(res_resids[i])])
+
+    # buried area of the interface: mean of both sides
+    if area/2 < area_cutoff:
+        return []
+
+    return residues
@@ -0,0 +1,140 @@
+import numpy as np
+
+
+class CoordIndex():
+    '''
+    This class describes an index of the atom coordinates of the models in a
+    ChimeraX session.
+
+    For each model, the scene coordinates of all atoms are stored in a NumPy
+    array. The rows of the array are referenced by residue id, chain id and
+    atom name. An entry is built once per model and rebuilt when it is
+    invalidated or when the underlying structure has changed.
+    '''
+
+
+    def __init__(self):
+        ''' Initialization of the CoordIndex class. '''
+
+        self.entries = {}
+
+        return
+
+
+    def invalidate(self, model_id=None):
+        '''
+        Invalidate index entries.
+
+        model_id=None invalidates all entries, a main model id invalidates
+        the model and all of its submodels, a submodel id invalidates the
+        submodel and its main model.
+        '''
+        if model_id == None:
+            self.entries = {}
+
+            return
+
+        for m in list(self.entries):
+            if len(model_id) == 1 and m[0] == model_id[0]:
+                del self.entries[m]
+            elif len(model_id) >= 2 and (m == model_id or m == model_id[:1]):
+                del self.entries[m]
+
+        return
+
+
+    def get_entry(self, model_id, struct):
+        '''
+        Get index entry of model_id. The entry is built if not existing or
+        if the structure has changed since the entry was built.
+        '''
+        entry = self.entries.get(model_id)
+
+        if entry == None or not self.entry_valid(entry, struct):
+            entry = self.build_entry(struct)
+            self.entries[model_id] = entry
+
+        return entry
+
+
+    def entry_valid(self, entry, struct):
+        '''
+        Check if index entry still describes the given structure.
+
+        Covers commands that are run directly in ChimeraX without the
+        ChimeraxSession methods (e.g. reopening a model with the same id or
+        moving it).
+        '''
+        if entry['structure'] is not struct:
+            return False
+
+        if entry['atoms_n'] != struct.num_atoms:
+            return False
+
+        if not np.array_equal(entry['position'], \
+                              struct.scene_position.matrix):
+            return False
+
+        return True
+
+
+    def build_entry(self, struct):
+        '''
+        Build index entry for a structure in one pass over all atoms.
+
+        Like a residue by residue search, only the first residue with a
+        given residue id (and chain id) and the first atom with a given name
+        in this residue are referenced.
+        '''
+        residues = struct.residues
+        atoms = residues.atoms
+
+        res_rows = {} # resid -> residue index
+        res_rows_chain = {} # (chainid, resid) -> residue index
+
+        for i,(chainid, resid) in enumerate(zip(residues.chain_ids, \
+                                                residues.numbers)):
+            resid = int(resid)
+
+            if resid not in res_rows:
+                res_rows[resid] = i
+
+            if (chainid, resid) not in res_rows_chain:
+                res_rows_chain[(chainid, resid)] = i
+
+        atom_rows = {} # (residue index, atom name) -> row in xyz
+        atom_res = residues.indices(atoms.residues)
+
+        for i,(res_i, name) in enumerate(zip(atom_res, atoms.names)):
+            if (int(res_i), name) not in atom_rows:
+                atom_rows[(int(res_i), name)] = i
+
+        entry = { 'structure': struct, \
+                  'atoms_n': struct.num_atoms, \
+                  'position': struct.scene_position.matrix.copy(), \
+                  'xyz': np.array(atoms.scene_coords, dtype=float), \
+                  'res_rows': res_rows, \
+                  'res_rows_chain': res_rows_chain, \
+                  'atom_rows': atom_rows }
+
+        return entry
+
+
+    def get_row(self, entry, resid, atomid='CA', chainid=''):
+        '''
+        Get row in the coordinate array of an index entry.
+
+        Return:
+            row: row index, -1: residue not found, -2: atom not found
+        '''
+        if chainid != '':
+            res_i = entry['res_rows_chain'].get((chainid, resid), -1)
+        else:
+            res_i = entry['res_rows'].get(resid, -1)
+
+        if res_i == -1:
+            return -1
+
+        row = entry['atom_rows'].get((res_i, atomid), -2)
+
+        return row
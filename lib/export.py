@@ -1,260 +1,367 @@
 import ctl
 import filesystem
 
+import itertools
+import numpy as np
 import os
 import re
+import string
 
 
-def get_cif_col(l, colnumb, datatype=None):
+cif_col_sep = re.compile(r'\s{2,}')
+        # multiple whitespace characters separating the columns of a cif file
+
+res_id_n = 100000 # number of residue ids of sort_lines (-100000 to 99999)
+
+
+def get_cif_cols(l):
     '''
-    Get cell data of given column number in a line of a cif file.
+    Get cell data of all columns in a line of a cif file (multiple
+    whitespace characters as single separator).
     '''
-    col = None
+    s = l[:-1] if l[-1:] == '\n' else l
 
-    # replace multiple spaces by a single space
-    l = re.sub(r'\s{2,}', ' ', l)
+    # fast path for lines with spaces as the only whitespace characters
+    # (like ChimeraX), same result as the regular expression
+    if s != '' and s[0] != ' ' and s[-1] != ' ' and s.isprintable():
+        cols = s.split()
 
-    l = l.split(' ')
+        if len(s) < len(l):
+            cols[-1] += '\n'
+
+        return cols
+
+    return cif_col_sep.sub(' ', l).split(' ')
+
+
+def get_cif_col(l, colnumb, datatype=None):
+    '''
+    Get cell data of given column number in a line of a cif file.
+    '''
+    col = get_cif_cols(l)[colnumb]
 
     if datatype == 'int':
-        col = int(l[colnumb])
-    if datatype == 'str':
-        col = l[colnumb]
-    else:
-        col = l[colnumb]
+        col = int(col)
 
     return col
 
 
 def sort_lines(out):
-    ''' Sort lines of cif file regarding residue id. '''
+    '''
+    Sort lines of cif file regarding residue id.
 
-    out2 = [[] for i in range(0,100000)]
-        # 100000: max residue id
-    out3 = []
-    atom_nr = 0
+    The lines are sorted stable by residue id (negative residue ids after
+    the positive ones), the residue id (label_seq_id) and atom serial columns
+    are adjusted to the number of digits.
+    '''
+    if len(out) == 0:
+        return []
 
-    res_id_max = 0
-    for l in out:
-        res_id = int(get_cif_col(l, 13, 'int'))
-        if res_id > res_id_max:  
-            res_id_max = res_id
+    # each line is tokenized once
+    res_ids = np.array([int(get_cif_cols(l)[13]) for l in out], dtype=int)
 
-    chainid_len = len(get_cif_col(l, 6, 'str'))
+    chainid_len = len(get_cif_col(out[-1], 6, 'str'))
     if chainid_len < 1:
         ctl.error('sort_lines: len(chainid_len) < 1')
 
-    for l in out:
-        res_id = int(get_cif_col(l, 13, 'int'))
+    if res_ids.min() < -res_id_n or res_ids.max() >= res_id_n:
+        ctl.e(res_ids.min())
+        ctl.e(res_ids.max())
+        ctl.error('sort_lines: residue id out of range')
+
+    order = np.argsort(res_ids%res_id_n, kind='stable')
 
-        res_id_str = str(res_id)+'     '
-        pos_sep1 = l.find(' . ')
-        l2 = l[:pos_sep1+10+chainid_len]+res_id_str[:len(str(res_id_max))+1]+ \
-             l[pos_sep1+9+chainid_len+len(str(res_id_max))+1:]   
-                    # len(str(res_id_max))+1:
-                    # adjust column width to the number of digits
+    res_id_digits = len(str(max(0, int(res_ids.max()))))
+    atom_nr_digits = len(str(len(out)))
 
-        out2[res_id].append(l2)
+    out_sorted = []
 
-    atom_nr_max = 0
-    for o in out2:
-        for l in o:
-            atom_nr_max += 1
+    for atom_nr, i in enumerate(order.tolist(), 1):
+        l = out[i]
 
-    for o in out2:
-        for l in o:
-            atom_nr += 1
-            l2 = l[:5]+(str(atom_nr)+'      ')[:len(str(atom_nr_max))+1]+ \
-                 l[5+len(str(atom_nr_max)):]
-                    # len(str(atom_nr))+1:
-                    # adjust column width to the number of digits
+        pos = l.find(' . ')+10+chainid_len
+        l = l[:pos]+(str(res_ids[i])+'     ')[:res_id_digits+1]+ \
+            l[pos+res_id_digits:]
+                # adjust column width to the number of digits
 
-            out3.append(l2)
+        l = l[:5]+(str(atom_nr)+'      ')[:atom_nr_digits+1]+ \
+            l[5+atom_nr_digits:]
 
-    return out3
+        out_sorted.append(l)
+
+    return out_sorted
 
 
 def postprocess(import_file, export_file):
     '''
     Postprocessing of cif file.
 
-    E.g. removal of helix and sheet metadata.
+    E.g. removal of helix and sheet metadata, atom lines sorted by residue
+    id (sort_lines). The file is processed line by line, only the lines of
+    one atom_site table are kept in memory. The export file is replaced
+    after completion (import_file and export_file can be equal).
     '''
-    f = filesystem.get_file(import_file)
+    f = open(import_file, 'r')
+    fo = open(export_file+'.tmp', 'w')
     current_chain_id = 0
 
-    out = []
-    out2 = []
-    collect_active = False
+    atom_lines = []
     skip_active = False
-    
-    for i,l in enumerate(f):
+
+    l_next = f.readline()
+
+    while l_next != '':
+        l = l_next
+        l_next = f.readline()
 
         if skip_active == True and (l.strip() == '' or \
-                l.startswith(( \
-                    '#', 'data_', 'loop_', 'global_', 'save_', 'stop_'))):
+                l.startswith( \
+                    ('#', 'data_', 'loop_', 'global_', 'save_', 'stop_'))):
             skip_active = False
 
         if l.startswith('loop_'):
-            if i+1 < len(f):
-                if f[i+1].startswith(('_struct_sheet_range.', \
-                                      '_struct_conf.')):
-                    skip_active = True
+            if l_next.startswith(('_struct_sheet_range.', '_struct_conf.')):
+                skip_active = True
 
         if skip_active == True:
             continue
-            
+
 
         if l[:4] == 'HELX':
             ctl.error('postprocess: "HELX" remaining')
 
         if l[:1] == '?':
             ctl.error('postprocess: "?" remaining')
-        
+
         if l[:4] == 'ATOM':
-            out2.append(l)
-            collect_active = True
+            atom_lines.append(l)
 
         else:
-            if collect_active == True:
-                collect_active = False
-                out2 = sort_lines(out2)
-                for l2 in out2:
-                    out.append(l2)
-                out2 = []
+            if len(atom_lines) > 0:
+                fo.writelines(sort_lines(atom_lines))
+                atom_lines = []
             else:
                 if l[:10] == 'data_chain':
                     current_chain_id = int(l[10:])
                     ctl.d(current_chain_id)
 
-            out.append(l)            
+            fo.write(l)
 
-    fo = open(export_file, 'w')
-    for l in out:
-        fo.write(l)
+    f.close()
     fo.close()
 
+    os.replace(export_file+'.tmp', export_file)
+
     return
 
 
-def compatibility_cif_export(export_path, export_model_id, session, \
-                             cif_postprecess=True):
-    ''' Compatibility cif export. '''
+chain_ids_single = string.ascii_uppercase+string.ascii_lowercase+ \
+                   string.digits
+        # chain ids assigned to chains with conflicting ids (get_chain_ids)
 
-    export_path = filesystem.clean_path(export_path)
-    debug_mode = False
+atom_site_cols = ['group_PDB', 'id', 'type_symbol', 'label_atom_id', \
+                  'label_alt_id', 'label_comp_id', 'label_asym_id', \
+                  'label_entity_id', 'label_seq_id', 'Cartn_x', 'Cartn_y', \
+                  'Cartn_z', 'auth_asym_id', 'auth_seq_id', \
+                  'pdbx_PDB_ins_code', 'occupancy', 'B_iso_or_equiv', \
+                  'pdbx_PDB_model_num']
+        # columns of the atom_site table (like ChimeraX)
 
-    filesystem.create_folder([export_path[:-4]+'_tmp.cif'])
-    session.run('save "'+export_path[:-4]+'_tmp.cif" #'+ \
-                str(export_model_id)+' ')
-    session.init()
-    session.run('open "'+export_path[:-4]+'_tmp.cif"')
-    session.run('split #1')
-    for i in range(1,200):
-        session.run('rename #1.'+str(i)+' chain'+str(i))
 
-    session.run('save "'+export_path[:-4]+'_tmp.cif'+'" #'+str(1)+' ')
+def get_chain_ids(chains):
+    '''
+    Get unique chain ids for the chains of several structures (like the
+    ChimeraX command "combine"): the chain id is kept if it is not used by a
+    previous chain, otherwise the next unused chain id is assigned.
 
-    if debug_mode:
-        session.run('save "'+export_path[:-4]+'_tmp0.cif'+'" #'+str(1)+' ')
+    chains: list of chain ids
 
-    if cif_postprecess:
-        if debug_mode:
-            postprocess(export_path[:-4]+'_tmp.cif', \
-                        export_path[:-4]+'_tmp2.cif')
-        postprocess(export_path[:-4]+'_tmp.cif', \
-                    export_path[:-4]+'_tmp.cif')
+    Return:
+        list of unique chain ids
+    '''
+    used = set(chains[:1])
+    chain_ids = chains[:1]
 
-    session.init()
-    session.run('open "'+export_path[:-4]+'_tmp.cif"')
-    session.run('save "'+export_path+'" #'+str(1)+' ')
+    candidates = itertools.chain(chain_ids_single, \
+                                 (c0+c1 for c0 in chain_ids_single \
+                                        for c1 in chain_ids_single))
 
-    if not debug_mode:
-        os.unlink(export_path[:-4]+'_tmp.cif')
+    for c in chains[1:]:
+        while c in used:
+            c = next(candidates)
 
-    return
+        used.add(c)
+        chain_ids.append(c)
 
+    return chain_ids
 
-def compatibility_cif_export_combine(export_path, export_model_id, session, \
-                                     cif_postprecess=True):
-    ''' Compatibility cif export with combination of models. '''
 
+def get_symm_lines(a, b, c, alpha, beta, gamma, symmgroup):
+    ''' Get lines of the cell and symmetry information of a cif file. '''
+
+    return ["#", \
+            "_cell.entry_id 01", \
+            "_cell.length_a "+str(round(a, 3)), \
+            "_cell.length_b "+str(round(b, 3)), \
+            "_cell.length_c "+str(round(c, 3)), \
+            "_cell.angle_alpha "+str(round(alpha, 2)), \
+            "_cell.angle_beta  "+str(round(beta, 2)), \
+            "_cell.angle_gamma "+str(round(gamma, 2)), \
+            "_cell.Z_PDB ?", \
+            "#", \
+            "_symmetry.entry_id 01", \
+            "_symmetry.space_group_name_H-M '"+symmgroup+"'"]
+
+
+def write_atom_site(f, model_atoms, rows, chain_ids, entity_ids):
+    '''
+    Write atom_site table of the given atoms (rows) with atom serials
+    starting at 1 and columns aligned like ChimeraX.
+
+    chain_ids, entity_ids: chain id and entity id of each row
+    '''
+    resids = model_atoms.resid[rows].astype(str)
+    xyz = model_atoms.xyz[rows]
+
+    cols = [np.full(len(rows), 'ATOM'), \
+            np.arange(1, len(rows)+1).astype(str), \
+            model_atoms.element[rows], \
+            model_atoms.name[rows], \
+            np.full(len(rows), '.'), \
+            model_atoms.resname[rows], \
+            chain_ids, \
+            entity_ids, \
+            resids, \
+            np.char.mod('%.3f', xyz[:, 0]), \
+            np.char.mod('%.3f', xyz[:, 1]), \
+            np.char.mod('%.3f', xyz[:, 2]), \
+            chain_ids, \
+            resids, \
+            np.full(len(rows), '?'), \
+            np.full(len(rows), '1.00'), \
+            np.char.mod('%.2f', model_atoms.bfact[rows]), \
+            np.full(len(rows), '1')]
+
+    f.write('loop_\n')
+    for col in atom_site_cols:
+        f.write('_atom_site.'+col+'\n')
+
+    # columns padded to the longest entry
+    fmt = ' '.join(['%-'+str(max(np.char.str_len(c.astype(str)).max(), 1))+ \
+                    's' for c in cols[:-1]])+' %s\n'
+
+    for row in zip(*[c.tolist() for c in cols]):
+        f.write(fmt % row)
+
+    f.write('#\n')
+
+    return
+
+
+def write_cif(export_path, model_id, sess, combine=False, sort=True, \
+              symm=None):
+    '''
+    Write the atoms of a model including all submodels (scene coordinates)
+    directly to a cif file, without saving and reopening in ChimeraX.
+
+    combine=False: one data block for each chain (data_chain<i>),
+                   chain ids of the structures
+    combine=True: one data block with all chains (like the ChimeraX command
+                  "combine"), conflicting chain ids are replaced
+                  (get_chain_ids)
+    sort: atoms of each chain sorted by residue id (stable, order of the
+          atoms within a residue kept) and label_seq_id set to the residue id
+    symm: cell and symmetry information [a, b, c, alpha, beta, gamma,
+          symmgroup] (get_symm_lines)
+    '''
     export_path = filesystem.clean_path(export_path)
-    debug_mode = False
 
-    filesystem.create_folder([export_path[:-4]+'_tmp.cif'])
-    session.run('save "'+export_path[:-4]+'_tmp.cif" #'+str(export_model_id))
-    session.init()
-    session.run('open "'+export_path[:-4]+'_tmp.cif"')
-    session.run('split #1')
-    for i in range(1,200):
-        session.run('rename #1.'+str(i)+' chain'+str(i))
+    model_atoms, bonds, atom_model_ids = sess.get_atoms(model_id, \
+                                                        without_h=False)
+
+    # chains in the order of the structures (model ids) and of their first
+    # atom, chain ids of model_atoms are prefixed by the structure model id
+    chain_keys, first, chain_index = np.unique(model_atoms.chainid, \
+                                    return_index=True, return_inverse=True)
+    order = sorted(range(len(chain_keys)), \
+                   key=lambda k: (atom_model_ids[first[k]], first[k]))
 
-    session.run('save "'+export_path[:-4]+'_tmp.cif'+'" #'+str(1)+' ')
+    chains = []
+    entities = {} # sequence: entity id
+
+    for k in order:
+        rows = np.flatnonzero(chain_index == k)
+
+        if sort:
+            rows = rows[np.argsort(model_atoms.resid[rows], kind='stable')]
+
+        starts = np.flatnonzero(np.diff(model_atoms.resid[rows], \
+                                        prepend=np.nan) != 0)
+        seq = tuple(model_atoms.resname[rows[starts]].tolist())
+        entity_id = entities.setdefault(seq, str(len(entities)+1))
+
+        chains.append([str(chain_keys[k]).split('/')[-1], entity_id, rows])
+
+    if combine:
+        chain_ids = get_chain_ids([c[0] for c in chains])
+
+        for i,c in enumerate(chains):
+            c[0] = chain_ids[i]
+
+        blocks = [['combination', chains]]
+    else:
+        blocks = [['chain'+str(i+1), [c]] for i,c in enumerate(chains)]
 
-    if cif_postprecess:
-        if debug_mode:
-            postprocess(export_path[:-4]+'_tmp.cif', \
-                        export_path[:-4]+'_tmp2.cif')
-        postprocess(export_path[:-4]+'_tmp.cif', \
-                    export_path[:-4]+'_tmp.cif')
+    filesystem.create_folder([export_path])
 
-    session.init()
-    session.run('open "'+export_path[:-4]+'_tmp.cif"')
+    f = open(export_path+'.tmp', 'w')
 
-    combination_model_id = session.last_id()+1
-    session.run('combine #1-'+str(session.last_id())+ \
-            ' close false modelId #'+str(combination_model_id))
+    for name, block_chains in blocks:
+        f.write('data_'+name+'\n')
+        f.write('#\n')
+        f.write('_audit_conform.dict_name mmcif_pdbx.dic\n')
 
-    session.run('save "'+export_path+'" #'+str(combination_model_id))
+        if symm != None:
+            for l in get_symm_lines(*symm):
+                f.write(l+'\n')
 
-    if not debug_mode:
-        os.unlink(export_path[:-4]+'_tmp.cif')
+        f.write('#\n')
+
+        rows = np.concatenate([c[2] for c in block_chains])
+        write_atom_site(f, model_atoms, rows, \
+                        np.concatenate([np.full(len(c[2]), c[0]) \
+                                        for c in block_chains]), \
+                        np.concatenate([np.full(len(c[2]), c[1]) \
+                                        for c in block_chains]))
+
+    f.close()
+
+    os.replace(export_path+'.tmp', export_path)
 
     return
 
 
-def cif_add_symm(source_path, export_path, a, b, c,
-                 alpha, beta, gamma, symmgroup):
-    ''' Add symmetry information to cif file. '''
-
-    a = str(round(a, 3))
-    b = str(round(b, 3))
-    c = str(round(c, 3))
-
-    alpha = str(round(alpha, 2))
-    beta = str(round(beta, 2))
-    gamma = str(round(gamma, 2))
-
-    ctl.d(a)
-    ctl.d(b)
-    ctl.d(c)    
-    ctl.d(alpha)    
-
-    sym_lines = ["#", \
-    "_cell.entry_id 01", \
-    "_cell.length_a "+a, \
-    "_cell.length_b "+b, \
-    "_cell.length_c "+c, \
-    "_cell.angle_alpha "+alpha, \
-    "_cell.angle_beta  "+beta, \
-    "_cell.angle_gamma "+gamma, \
-    "_cell.Z_PDB ?", \
-    "#", \
-    "_symmetry.entry_id 01", \
-    "_symmetry.space_group_name_H-M '"+symmgroup+"'"]
-
-    ctl.d(sym_lines)
-    f = filesystem.get_file(source_path)
-    ctl.p('step 2')
-    fo = open(export_path, 'w')
-    for l in f:
-        fo.write(l)
-        if l[0:len('_software.pdbx_ordinal')] == '_software.pdbx_ordinal':
-            for s in sym_lines:
-                fo.write(s+"\r\n")
-    ctl.p('step 3')
-    fo.close()
-    ctl.p('step 4')
+def compatibility_cif_export(export_path, export_model_id, session, \
+                             cif_postprecess=True):
+    '''
+    Compatibility cif export: one data block for each chain (data_chain<i>)
+    with atoms sorted by residue id (cif_postprecess), see write_cif.
+    '''
+    write_cif(export_path, export_model_id, session, False, cif_postprecess)
 
     return
+
+
+def compatibility_cif_export_combine(export_path, export_model_id, session, \
+                                     cif_postprecess=True, symm=None):
+    '''
+    Compatibility cif export with combination of models: one data block with
+    all chains (unique chain ids) and atoms sorted by residue id
+    (cif_postprecess), optionally with cell and symmetry information (symm),
+    see write_cif.
+    '''
+    write_cif(export_path, export_model_id, session, True, cif_postprecess, \
+              symm)
+
+    return
+
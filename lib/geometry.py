@@ -1,10 +1,120 @@
-import bibpdb
+import atoms
 import ctl
 
 import math
+import numpy as np
 import os
 
 
+'''
+Module providing vector geometry. The batched functions take arrays of
+vectors (n, 3) and return arrays, for single vectors in loops the scalar
+functions (dist, crossproduct, ...) are faster.
+'''
+
+# batched functions
+# -----------------
+
+def as_vectors(a):
+    ''' Get array of vectors (n, dim) from a vector or a list of vectors. '''
+
+    a = np.asarray(a, dtype=float)
+
+    if a.ndim == 1:
+        a = a.reshape(1, -1)
+
+    return a
+
+
+def dists(a, b, xy=False):
+    '''
+    Get pairwise distance matrix (n, m) between the vectors a (n, 3) and
+    b (m, 3).
+
+    xy: distances in the xy plane
+    '''
+    a = as_vectors(a)
+    b = as_vectors(b)
+
+    if xy:
+        a = a[:, :2]
+        b = b[:, :2]
+
+    diff = a[:, None, :]-b[None, :, :]
+
+    return np.sqrt((diff**2).sum(axis=2))
+
+
+def dists_rowwise(a, b, xy=False):
+    '''
+    Get distances between corresponding vectors of a (n, 3) and b (n, 3).
+
+    xy: distances in the xy plane
+    '''
+    diff = as_vectors(b)-as_vectors(a)
+
+    if xy:
+        diff = diff[:, :2]
+
+    return np.sqrt((diff**2).sum(axis=1))
+
+
+def crossproducts(a, b):
+    ''' Calculate crossproducts of corresponding vectors (n, 3). '''
+
+    return np.cross(as_vectors(a), as_vectors(b))
+
+
+def dotproducts(a, b):
+    ''' Calculate dot products of corresponding vectors (n, 3). '''
+
+    return (as_vectors(a)*as_vectors(b)).sum(axis=1)
+
+
+def norms(a):
+    ''' Normalize vectors (n, 3). '''
+
+    a = as_vectors(a)
+
+    return a/np.sqrt((a**2).sum(axis=1))[:, None]
+
+
+def nearest_points(coords, ref_points, xy=False):
+    '''
+    Get nearest reference point for each of the coordinates (n, 3), on
+    equal distances the first reference point.
+
+    Return:
+        indices of the reference points (n), distances (n)
+    '''
+    d = dists(coords, ref_points, xy)
+    indices = d.argmin(axis=1)
+
+    return indices, d[np.arange(len(indices)), indices]
+
+
+def rotations_around_z(vectors, angles):
+    '''
+    Rotate vectors (n, 2) or (n, 3) around z axis by angles (degrees, single
+    angle or one per vector).
+    '''
+    vectors = as_vectors(vectors)
+    angles = np.broadcast_to(np.asarray(angles, dtype=float)/180*math.pi, \
+                             (len(vectors),))
+
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+
+    rotated = vectors.copy()
+    rotated[:, 0] = vectors[:, 0]*cos-vectors[:, 1]*sin
+    rotated[:, 1] = vectors[:, 0]*sin+vectors[:, 1]*cos
+
+    return rotated
+
+
+# scalar functions
+# ----------------
+
 def dist(x1, x2):
     ''' Get distance of 2 input vectors. '''
 
@@ -83,65 +193,65 @@ def rotation_around_z(vector, angle):
     return rotated
 
 
-def get_center(coord, chainid0='A', res_range=0):
-    ''' Get center of CA atoms of given coordinates. '''
+def get_ca_atoms(coord, chainid0='A', res_range=0):
+    '''
+    Get mask of the CA atoms of a chain (chainid0, 'all': all chains) within
+    a residue range. Source is an Atoms object (e.g. atoms.get_atom_table) or
+    the content of a pdb coordinate file as line list.
 
-    center = [0,0,0]
-    sum0 = [0,0,0]
-    sumN = 0
+    Return:
+        Atoms object, mask
+    '''
+    if not isinstance(coord, atoms.Atoms):
+        coord = atoms.Atoms([l for l in coord \
+                             if l[0:4] == 'ATOM' or l[0:6] == 'HETATM'])
 
     if res_range == 0:
         res_range = [1, 10000]
 
-    for l in coord:
-        if l[0:4] == 'ATOM' or l[0:6] == 'HETATM':
-           name = bibpdb.get_f(l, 'name')
-           chainid = bibpdb.get_f(l, 'chainid')
-           resnr = bibpdb.get_f(l, 'resnr')
+    mask = (coord.name == 'CA') & \
+           (coord.resid >= res_range[0]) & (coord.resid <= res_range[1])
 
-        if resnr < res_range[0] or resnr > res_range[1]:
-            continue
+    if chainid0 != 'all':
+        mask &= coord.chainid == chainid0
 
-        if (chainid == chainid0 or chainid0 == 'all') and name == 'CA':
-            sumN += 1
-            sum0[0] += bibpdb.get_f(l, 'x')
-            sum0[1] += bibpdb.get_f(l, 'y')
-            sum0[2] += bibpdb.get_f(l, 'z')     
+    return coord, mask
 
-    center[0] = sum0[0]/sumN
-    center[1] = sum0[1]/sumN
-    center[2] = sum0[2]/sumN
-    
-    return center
+
+def get_center(coord, chainid0='A', res_range=0):
+    ''' Get center of CA atoms of given coordinates. '''
+
+    coord, mask = get_ca_atoms(coord, chainid0, res_range)
+
+    if not mask.any():
+        ctl.e(chainid0)
+        ctl.e(res_range)
+        ctl.error('get_center: no CA atoms found')
+
+    return coord.xyz[mask].mean(axis=0).tolist()
 
 
 def get_extrema(coord, axis, chainid0='A', res_range=0):
     '''
     Get residue id with the lowest and the highest coordinate (CA atom) on
-    given axis ("x", "y", "z"). Source is the content of a pdb coordinate file
-    as line list.
+    given axis ("x", "y", "z"). Source is an Atoms object or the content of a
+    pdb coordinate file as line list.
     '''
 
     extrema = [[-1, 1000000], [-1, -1]]
-        # [[residue id, lowest coordinate], [residue id, highest coordinate]]
-
-    if res_range == 0:
-        res_range = [1, 10000]
-
-    for l in coord:
-        if l[0:4] == 'ATOM' or l[0:6] == 'HETATM':
-           name = bibpdb.get_f(l, 'name')
-           chainid = bibpdb.get_f(l, 'chainid')
-           resnr = bibpdb.get_f(l, 'resnr')
+        # [[lowest coordinate, residue id], [highest coordinate, residue id]]
 
-        if resnr < res_range[0] or resnr > res_range[1]:
-            continue
+    coord, mask = get_ca_atoms(coord, chainid0, res_range)
+    z = coord.xyz[mask, 2]
+    resids = coord.resid[mask]
 
-        if (chainid == chainid0 or chainid0 == 'all') and name == 'CA':
-            if bibpdb.get_f(l, 'z') < extrema[0][0]:
-                extrema[0] = [bibpdb.get_f(l, 'z'), resnr]
+    # first occurrence of the extreme values beyond the initial values
+    if (z < extrema[0][0]).any():
+        i = int(np.argmin(z))
+        extrema[0] = [float(z[i]), int(resids[i])]
 
-            if bibpdb.get_f(l, 'z') > extrema[1][0]:
-                extrema[1] = [bibpdb.get_f(l, 'z'), resnr]
+    if (z > extrema[1][0]).any():
+        i = int(np.argmax(z))
+        extrema[1] = [float(z[i]), int(resids[i])]
     
     return extrema
@@ -1,43 +1,53 @@
 import ctl
 
-import community
 import networkx as nx
 
+try:
+    import community # python-louvain, only for method 'best_partition'
+except ImportError:
+    community = None
+
 
 '''
 Module providing functions for clustering of interface matrices.
 '''
 
-def cluster(corr_coefficients, mode=0, verbous=False):
+seed = 0 # random seed of the community detection (reproducible clusters)
+
+
+def get_node(c):
     '''
-    Clustering according to correlation coefficients.
+    Get node id (folder name, score, rank) of an entry of the correlation
+    coefficients.
     '''
-    g = nx.MultiGraph()
-    nodes = []
-    edges = []
+    rank_id = int(c[3]. \
+                  replace('unrelaxed_rank', '').replace('rank', ''). \
+                  split('_')[0])
 
-    # proportionality constant between edge weight and correlation coefficient
-    alpha = 1
+    return c[0].split('/')[-1]+'_'+str(c[2])+'_'+str(rank_id)
 
-    for c in corr_coefficients:
-        rank_id0 = int(c[0][3]. \
-                       replace('unrelaxed_rank', '').replace('rank', ''). \
-                       split('_')[0])
-        rank_id1 = int(c[1][3]. \
-                       replace('unrelaxed_rank', '').replace('rank', ''). \
-                       split('_')[0])
 
-        # define node ids
-        n0 = c[0][0].split('/')[-1]+'_'+str(c[0][2])+'_'+str(rank_id0)
-        n1 = c[1][0].split('/')[-1]+'_'+str(c[1][2])+'_'+str(rank_id1)
+def get_graph(corr_coefficients, mode=0):
+    '''
+    Build weighted graph from correlation coefficients.
+
+    Identical edges occurring more than once are counted once, edges of the
+    same node pair with different weights are summed up (like the parallel
+    edges of a multigraph in the community detection).
+    '''
+    nodes = {} # dict as ordered set
+    edges = {} # (n0, n1): set of weights
 
-        if n0 not in nodes:
-            nodes.append(n0)
+    # proportionality constant between edge weight and correlation coefficient
+    alpha = 1
+    minarea = 0
 
-        if n1 not in nodes:
-            nodes.append(n1)
+    for c in corr_coefficients:
+        n0 = get_node(c[0])
+        n1 = get_node(c[1])
 
-        minarea = 0
+        nodes[n0] = None
+        nodes[n1] = None
 
         if corr_coefficients[c][0] > 0 and \
            corr_coefficients[c][1] >= minarea:
@@ -46,27 +56,63 @@ def cluster(corr_coefficients, mode=0, verbous=False):
             # 0: set edge weights to correlation coeff
             # 1: set all edge weights to 1
             if mode == 0:
-                edge = (min(n0, n1), max(n0, n1), alpha*corr_coefficients[c][0])
+                weight = alpha*corr_coefficients[c][0]
             elif mode == 1:
-                edge = (min(n0, n1), max(n0, n1), 1)
+                weight = 1
             else:
                 ctl.error('cluster: mode not set correctly')
 
-            if edge not in edges:
-                edges.append(edge)
+            edges.setdefault((min(n0, n1), max(n0, n1)), set()).add(weight)
 
-    for n in nodes:
-        g.add_node(n)
+    g = nx.Graph()
+    g.add_nodes_from(nodes)
+    g.add_weighted_edges_from([(e[0], e[1], sum(sorted(w))) \
+                               for e, w in edges.items()])
 
-    for e in edges:
-        g.add_edge(e[0], e[1], weight=e[2])
+    return g
+
+
+def cluster(corr_coefficients, mode=0, verbous=False, method='louvain'):
+    '''
+    Clustering according to correlation coefficients.
+
+    method: community detection,
+        'louvain': Louvain method of networkx (fixed seed)
+        'best_partition': Louvain method of python-louvain (fixed seed)
+
+    Return:
+        partitions: dict node: cluster index, g: graph, partitions_n
+    '''
+    g = get_graph(corr_coefficients, mode)
 
     if verbous:
         ctl.d('edge weights:')
-        for e in g.edges(data=True, keys=True):
+        for e in g.edges(data=True):
             ctl.d(e)
 
-    partitions = community.best_partition(g, weight='weight', resolution=1)
+    if method == 'louvain':
+        communities = nx.community.louvain_communities(g, weight='weight', \
+                                                       resolution=1, \
+                                                       seed=seed)
+        partitions = {}
+
+        for i,nodes in enumerate(communities):
+            for n in nodes:
+                partitions[n] = i
+
+        # node order of the graph
+        partitions = {n: partitions[n] for n in g.nodes}
+
+    elif method == 'best_partition':
+        if community == None:
+            ctl.error('cluster: python-louvain (community) not installed')
+
+        partitions = community.best_partition(g, weight='weight', \
+                                              resolution=1, \
+                                              random_state=seed)
+    else:
+        ctl.error('cluster: method not set correctly')
+
     partitions_n = 0
 
     for p in partitions:
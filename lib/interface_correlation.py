@@ -0,0 +1,249 @@
+import ctl
+
+import numpy as np
+import scipy.sparse
+
+
+'''
+Module providing batched calculation of correlation coefficients between
+interface distograms.
+
+All distograms are encoded as rows of one sparse matrix over a shared key
+space of residue pairs. The correlation of two distograms in forward
+orientation compares the same columns, the reverse orientation (signed
+interface matrices) compares each column with the column of the reversed
+residue pair. Both orientations are described by a permutation of the column
+indices.
+'''
+
+def encode(interface_distograms):
+    '''
+    Encode interface distograms as sparse matrix.
+
+    Return:
+        matr: sparse matrix (CSC) with distances, one row per distogram
+        keys: residue pair keys in the order of the matrix columns
+        perm_reverse: column index of the reversed residue pair for each
+                column, -1 if the reversed residue pair does not occur
+    '''
+    key_index = {}
+    rows = []
+    cols = []
+    vals = []
+
+    for i,d in enumerate(interface_distograms):
+        distogram = interface_distograms[d]
+
+        for key in distogram:
+            if key not in key_index:
+                key_index[key] = len(key_index)
+
+            rows.append(i)
+            cols.append(key_index[key])
+            vals.append(distogram[key][0])
+
+    keys = list(key_index)
+    perm_reverse = np.array([key_index.get((k[1], k[0]), -1) for k in keys], \
+                            dtype=int)
+
+    matr = scipy.sparse.csc_matrix( \
+                (np.array(vals, dtype=float), \
+                 (np.array(rows, dtype=int), np.array(cols, dtype=int))), \
+                shape=(len(interface_distograms), len(keys)))
+
+    return matr, keys, perm_reverse
+
+
+def pair_sums(matr, perm, chunk_size=5000000, matr_a=None):
+    '''
+    Calculate for all pairs of rows (i, j) the sum of the min/max ratios of
+    the entries matr[i, k] and matr[j, perm[k]] over all columns k where
+    both entries exist.
+
+    The entry pairs are generated column by column in chunks of at most
+    about chunk_size pairs and accumulated into a dense matrix.
+
+    matr_a: matrix with a subset of the rows of matr (other rows empty),
+            only the pairs (i, j) with row i in matr_a are calculated
+
+    Return:
+        sums: dense matrix with the sums of min/max ratios
+        counts: dense matrix with the number of contributing columns
+    '''
+    if matr_a is None:
+        matr_a = matr
+
+    n = matr.shape[0]
+    indptr_a = matr_a.indptr
+    indices_a = matr_a.indices
+    data_a = matr_a.data
+    indptr = matr.indptr
+    indices = matr.indices
+    data = matr.data
+
+    sums = np.zeros(n*n)
+    counts = np.zeros(n*n)
+
+    cols_a = np.nonzero(perm >= 0)[0]
+    cols_b = perm[cols_a]
+
+    len_a = indptr_a[cols_a+1]-indptr_a[cols_a]
+    len_b = indptr[cols_b+1]-indptr[cols_b]
+    sizes = len_a*len_b
+
+    start = 0
+    while start < len(cols_a):
+
+        # determine chunk of columns
+        stop = start+1
+        chunk_n = sizes[start]
+        while stop < len(cols_a) and chunk_n+sizes[stop] <= chunk_size:
+            chunk_n += sizes[stop]
+            stop += 1
+
+        sizes_ = sizes[start:stop]
+        col_rep = np.repeat(np.arange(start, stop), sizes_)
+        offsets = np.repeat(np.cumsum(sizes_)-sizes_, sizes_)
+        t = np.arange(len(col_rep))-offsets
+
+        ia = indptr_a[cols_a[col_rep]]+t//len_b[col_rep]
+        ib = indptr[cols_b[col_rep]]+t%len_b[col_rep]
+
+        va = data_a[ia]
+        vb = data[ib]
+        rel = np.minimum(va, vb)/np.maximum(va, vb)
+
+        if np.any(rel < 0):
+            ctl.error('pair_sums: interface_correlation')
+
+        flat = indices_a[ia]*n+indices[ib]
+        sums += np.bincount(flat, weights=rel, minlength=n*n)
+        counts += np.bincount(flat, minlength=n*n)
+
+        start = stop
+
+    return sums.reshape(n, n), counts.reshape(n, n).astype(int)
+
+
+def get_coefficient(sums, counts, sums_reverse, counts_reverse, i, j, \
+                    signed):
+    '''
+    Get correlation coefficient of the distograms of rows i, j from the pair
+    sums (pair_sums).
+
+    Return:
+        (corr_coeff, nonzero_n), (0, 0) if no common residue pairs
+    '''
+    nonzero_n = int(counts[i, j])
+
+    if not signed:
+        if nonzero_n == 0:
+            return (0, 0)
+
+        corr_coeff = float(sums[i, j])/(nonzero_n**(1/2))
+
+    else:
+        corr_coeff = 0
+        if nonzero_n != 0:
+            corr_coeff = float(sums[i, j])/nonzero_n
+
+        # overlay in orientation 2 (reverse)
+        nonzero_n1 = int(counts_reverse[i, j])
+        corr_coeff1 = 0
+        if nonzero_n1 != 0:
+            corr_coeff1 = float(sums_reverse[i, j])/nonzero_n1
+
+        if corr_coeff1 > corr_coeff:
+            corr_coeff = corr_coeff1
+            nonzero_n = nonzero_n1
+
+        if nonzero_n == 0:
+            return (0, 0)
+
+    max_corr_coeff = 50 # 50 not reached in typical predictions
+
+    if corr_coeff > max_corr_coeff:
+        ctl.e('corr_coeff')
+        ctl.e(corr_coeff)
+        ctl.error('interface_correlation: '+ \
+                  'corr_fact > max_corr_coeff')
+
+    return (corr_coeff, nonzero_n)
+
+
+def corr_coefficients(interface_distograms, signed=False):
+    '''
+    Calculate correlation coefficients between all combinations of given
+    interface distograms.
+
+    signed=False: like interface_matrix.get_corr_coefficient()
+    signed=True: like interface_matrix_signed.get_corr_coefficient(), the
+                 better of both overlay orientations is used
+    '''
+    corr_coefficients = {}
+    distogram_keys = list(interface_distograms)
+
+    if len(distogram_keys) < 2:
+        return corr_coefficients
+
+    matr, keys, perm_reverse = encode(interface_distograms)
+
+    sums, counts = pair_sums(matr, np.arange(len(keys)))
+    sums_reverse, counts_reverse = None, None
+
+    if signed:
+        sums_reverse, counts_reverse = pair_sums(matr, perm_reverse)
+
+    for i,d0 in enumerate(distogram_keys):
+        for j in range(i+1, len(distogram_keys)):
+            corr_coefficients[(d0, distogram_keys[j])] = get_coefficient( \
+                    sums, counts, sums_reverse, counts_reverse, i, j, signed)
+
+    return corr_coefficients
+
+
+def corr_coefficients_new(interface_distograms, new_keys, signed=False):
+    '''
+    Calculate correlation coefficients between the new interface distograms
+    (new_keys) and all given interface distograms (like corr_coefficients,
+    only the rows of the new distograms are calculated).
+
+    Return:
+        dict (d0, d1): (corr_coeff, nonzero_n) with d0 in new_keys, each
+        pair of new distograms once (in the order of interface_distograms)
+    '''
+    corr_coefficients = {}
+    distogram_keys = list(interface_distograms)
+    new_rows = [i for i,d in enumerate(distogram_keys) if d in new_keys]
+
+    if len(distogram_keys) < 2 or len(new_rows) == 0:
+        return corr_coefficients
+
+    matr, keys, perm_reverse = encode(interface_distograms)
+
+    # matrix with the entries of the new distograms only
+    coo = matr.tocoo()
+    in_new = np.isin(coo.row, new_rows)
+    matr_new = scipy.sparse.csc_matrix( \
+                (coo.data[in_new], (coo.row[in_new], coo.col[in_new])), \
+                shape=matr.shape)
+
+    sums, counts = pair_sums(matr, np.arange(len(keys)), matr_a=matr_new)
+    sums_reverse, counts_reverse = None, None
+
+    if signed:
+        sums_reverse, counts_reverse = pair_sums(matr, perm_reverse, \
+                                                 matr_a=matr_new)
+
+    new_set = set(new_rows)
+
+    for i in new_rows:
+        for j in range(0, len(distogram_keys)):
+            if j == i or (j in new_set and j < i):
+                continue
+
+            corr_coefficients[(distogram_keys[i], distogram_keys[j])] = \
+                get_coefficient(sums, counts, sums_reverse, counts_reverse, \
+                                i, j, signed)
+
+    return corr_coefficients
@@ -1,9 +1,11 @@
 import ctl
 import filesystem
-import geometry
+import interface_correlation
 
 import glob
+import numpy as np
 import os
+from scipy.spatial import cKDTree
 
 
 '''
@@ -16,28 +18,114 @@ def create(interface_res, mate_distances, sess):
     (list interface_res).
     Distances above a cutoff value are not considered.
     '''
+    coords = get_coords(interface_res, sess)
+    resids = [r[1] for r in interface_res]
+
+    return create_from_coords(resids, coords, mate_distances)
+
+
+def create_from_coords(resids, coords, mate_distances):
+    '''
+    Calculate non-zero interface matrix elements from given residue ids and
+    CA coordinates (array with shape (n, 3)) of the interface residues.
+    Distances above a cutoff value are not considered.
+    '''
     matr = {}
     cutoff = 10
 
-    for r0 in interface_res:
-        for r1 in interface_res:
-            if r1[1] <= r0[1]:
-                continue
+    pairs = []
 
-            r0_coords =  sess.get_xyz(r0[0], r0[1])
-            r1_coords =  sess.get_xyz(r1[0], r1[1])
-            d = geometry.dist(r0_coords, r1_coords)
-            key = (r0[1], r1[1])
+    for i, j, d in neighbor_pairs(coords, None, cutoff):
 
-            if d <= cutoff:
-                matr[key] = [round(d, 2), \
-                             mate_distances[r0[1]], mate_distances[r1[1]]]
+        # order residue pair by resid, pairs with equal resids are skipped
+        if resids[i] < resids[j]:
+            pairs.append((i, j, d))
+        elif resids[j] < resids[i]:
+            pairs.append((j, i, d))
+
+    # for residue pairs occurring more than once, the last pair in the order
+    # of interface_res determines the matrix element
+    for i, j, d in sorted(pairs):
+        key = (resids[i], resids[j])
+        matr[key] = [round(d, 2), \
+                     mate_distances[resids[i]], mate_distances[resids[j]]]
 
     matr_sort = dict(sorted(matr.items(), key=lambda item: item[0]))
 
     return matr_sort
 
 
+def get_coords(residues, sess):
+    '''
+    Get CA coordinates of residues given as list of [model_id, resid] as
+    array with shape (n, 3), with one batch per model.
+    '''
+    coords = np.zeros((len(residues), 3))
+    rows_per_model = {}
+
+    for i,r in enumerate(residues):
+        model_id = sess.model_reg.convert_model_id(r[0])
+
+        if model_id not in rows_per_model:
+            rows_per_model[model_id] = []
+
+        rows_per_model[model_id].append(i)
+
+    for model_id in rows_per_model:
+        rows = rows_per_model[model_id]
+        coords[rows] = sess.get_xyz_many(model_id, \
+                                         [residues[i][1] for i in rows])
+
+    return coords
+
+
+def neighbor_pairs(coords0, coords1, cutoff):
+    '''
+    Get all pairs of points with a distance <= cutoff using a KD-tree.
+
+    coords1=None: pairs (i, j) with i < j within coords0
+    otherwise: pairs (i, j) with i in coords0 and j in coords1
+
+    Return:
+        list of (i, j, d), distances d calculated like geometry.dist()
+    '''
+    coords0 = np.asarray(coords0, dtype=float).reshape(-1, 3)
+
+    # the tree search uses a slightly larger radius, the cutoff is applied to
+    # the exactly recalculated distances
+    search_r = cutoff+1e-6
+
+    if coords1 is None:
+        coords1 = coords0
+
+        if len(coords0) < 2:
+            return []
+
+        idx = cKDTree(coords0).query_pairs(search_r, output_type='ndarray')
+        idx0 = idx[:, 0]
+        idx1 = idx[:, 1]
+
+    else:
+        coords1 = np.asarray(coords1, dtype=float).reshape(-1, 3)
+
+        if len(coords0) == 0 or len(coords1) == 0:
+            return []
+
+        neighbors = cKDTree(coords1).query_ball_point(coords0, search_r)
+        idx0 = np.array([i for i,n in enumerate(neighbors) for j in n], \
+                        dtype=int)
+        idx1 = np.array([j for n in neighbors for j in n], dtype=int)
+
+    diff = coords1[idx1]-coords0[idx0]
+    dists = np.sqrt(diff[:, 0]**2+diff[:, 1]**2+diff[:, 2]**2)
+    within = dists <= cutoff
+
+    pairs = [(int(i), int(j), float(d)) for i, j, d in \
+             zip(idx0[within], idx1[within], dists[within])]
+
+    return pairs
+
+
 def get_corr_coefficient(distogram0, distogram1):
     '''
     Calculate correlation coefficients between 2 given interface distograms.
@@ -46,16 +134,15 @@ def get_corr_coefficient(distogram0, distogram1):
     corr_sum = 0
     
     for d0 in distogram0:
-        for d1 in distogram1:
-            if d0 == d1:
-                rel = min(distogram0[d0][0], distogram1[d1][0])/ \
-                      max(distogram0[d0][0], distogram1[d1][0])
+        if d0 in distogram1:
+            rel = min(distogram0[d0][0], distogram1[d0][0])/ \
+                  max(distogram0[d0][0], distogram1[d0][0])
 
-                if rel < 0:
-                    ctl.error('get_corr_coefficient: interface_correlation')
+            if rel < 0:
+                ctl.error('get_corr_coefficient: interface_correlation')
 
-                corr_sum += rel
-                nonzero_n += 1
+            corr_sum += rel
+            nonzero_n += 1
 
     if nonzero_n == 0:
         return 0, 0
@@ -77,17 +164,8 @@ def corr_coefficients(interface_distograms):
     Calculate correlation coefficients between all combinations of given
     interface distograms.
     '''
-    corr_coefficients = {}
-
-    for i,d0 in enumerate(interface_distograms):
-        for j,d1 in enumerate(interface_distograms):
-            if j <= i:
-                continue
-
-            corr_coefficient, nonzero_n = get_corr_coefficient( \
-                    interface_distograms[d0], interface_distograms[d1])
-
-            corr_coefficients[(d0, d1)] = (corr_coefficient, nonzero_n)
+    corr_coefficients = interface_correlation.corr_coefficients( \
+                                    interface_distograms, signed=False)
 
     return corr_coefficients
 
@@ -111,16 +189,23 @@ def export_to_txt(matrix_elements, path_file):
     return
 
 
-def load(path, excl_res=[]):
+def get_path(path):
     '''
-    Load interface distogram.
+    Get path of the interface distogram file of a coord file.
     '''
     fn = path.split('/')[-1]
     fn_part1 = '_'.join(fn.split('_')[0:-1])
     path_dir = os.path.dirname(path)+'/'
     path_dir2 = filesystem.clean_path(path_dir+'../interfaces/')
 
-    file = path_dir2+fn_part1+'_interface.txt'
+    return path_dir2+fn_part1+'_interface.txt'
+
+
+def load(path, excl_res=[]):
+    '''
+    Load interface distogram.
+    '''
+    file = get_path(path)
     files = sorted(glob.glob(file))
 
     if len(files) != 1:
@@ -1,6 +1,7 @@
 import ctl
 import filesystem
-import geometry
+import interface_correlation
+import interface_matrix
 import molmodel
 
 import glob
@@ -19,6 +20,24 @@ def create(interface_res, rmsds, sess):
     '''
     interface_residues = molmodel.interface_residues_per_model(interface_res)
 
+    coords = {}
+
+    for model_id in interface_residues:
+        coords[model_id] = sess.get_xyz_many(model_id, \
+                                             interface_residues[model_id])
+
+    return create_from_coords(interface_residues, coords, rmsds)
+
+
+def create_from_coords(interface_residues, coords, rmsds):
+    '''
+    Calculate non-zero interface matrix (signed interface matrix) elements from
+    given interface residues and CA coordinates per model.
+
+    Args:
+        interface_residues: dict model_id -> list of resids
+        coords: dict model_id -> CA coordinates of the resids, shape (n, 3)
+    '''
     matr = {}
     cutoff = 10
 
@@ -27,15 +46,15 @@ def create(interface_res, rmsds, sess):
             if model_id1[1] <= model_id0[1]:
                 continue
 
-            for r0 in interface_residues[model_id0]:
-                for r1 in interface_residues[model_id1]:
-                    r0_coords = sess.get_xyz(model_id0, r0)
-                    r1_coords = sess.get_xyz(model_id1, r1)
-                    d = geometry.dist(r0_coords, r1_coords)
-                    key = ((model_id0[1], model_id1[1]), r0, r1)
+            resids0 = interface_residues[model_id0]
+            resids1 = interface_residues[model_id1]
 
-                    if d <= cutoff:
-                        matr[key] = [round(d, 2), rmsds[r0], rmsds[r1]]
+            for i, j, d in interface_matrix.neighbor_pairs( \
+                                coords[model_id0], coords[model_id1], cutoff):
+                r0 = resids0[i]
+                r1 = resids1[j]
+                key = ((model_id0[1], model_id1[1]), r0, r1)
+                matr[key] = [round(d, 2), rmsds[r0], rmsds[r1]]
 
     matr_sort = dict(sorted(matr.items(), key=lambda item: item[0]))
 
@@ -85,32 +104,33 @@ def get_corr_coefficient(distogram0, distogram1):
 
 
     for d0 in distogram0:
-        for d1 in distogram1:
 
-            # get correlation of overlay orientation 1
-            # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-            if d0 == d1:
-                rel = min(distogram0[d0][0], distogram1[d1][0])/ \
-                      max(distogram0[d0][0], distogram1[d1][0])
+        # get correlation of overlay orientation 1
+        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        if d0 in distogram1:
+            rel = min(distogram0[d0][0], distogram1[d0][0])/ \
+                  max(distogram0[d0][0], distogram1[d0][0])
+
+            if rel < 0:
+                ctl.error('get_corr_coefficient: interface_correlation')
 
-                if rel < 0:
-                    ctl.error('get_corr_coefficient: interface_correlation')
+            corr_sum += rel
+            nonzero_n += 1
 
-                corr_sum += rel
-                nonzero_n += 1
 
+        # get correlation of overlay in orientation 2 (reverse)
+        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        d1 = (d0[1], d0[0])
 
-            # get correlation of overlay in orientation 2 (reverse)
-            # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-            if d0[0] == d1[1] and d0[1] == d1[0]:
-                rel = min(distogram0[d0][0], distogram1[d1][0])/ \
-                      max(distogram0[d0][0], distogram1[d1][0])
+        if d1 in distogram1:
+            rel = min(distogram0[d0][0], distogram1[d1][0])/ \
+                  max(distogram0[d0][0], distogram1[d1][0])
 
-                if rel < 0:
-                    ctl.error('get_corr_coefficient: interface_correlation')
+            if rel < 0:
+                ctl.error('get_corr_coefficient: interface_correlation')
 
-                corr_sum1 += rel
-                nonzero_n1 += 1
+            corr_sum1 += rel
+            nonzero_n1 += 1
 
 
     # get correlation of overlay orientation 1
@@ -152,17 +172,8 @@ def corr_coefficients(interface_distograms):
     Calculate correlation coefficients between all combinations of given
     interface distograms.
     '''
-    corr_coefficients = {}
-
-    for i,d0 in enumerate(interface_distograms):
-        for j,d1 in enumerate(interface_distograms):
-            if j <= i:
-                continue
-
-            corr_coefficient, nonzero_n = get_corr_coefficient( \
-                    interface_distograms[d0], interface_distograms[d1])
-
-            corr_coefficients[(d0, d1)] = (corr_coefficient, nonzero_n)
+    corr_coefficients = interface_correlation.corr_coefficients( \
+                                    interface_distograms, signed=True)
 
     return corr_coefficients
 
@@ -187,17 +198,24 @@ def export_to_txt(matrix_elements, path_file):
     return
 
 
-def monomers_involved(path, excl_res=[]):
+def get_path(path):
     '''
-    Determine all distinct monomer pairs involved in interfaces described
-    by the interface distogram.
+    Get path of the interface distogram file of a coord file.
     '''
     fn = path.split('/')[-1]
     fn_part1 = '_'.join(fn.split('_')[0:-1])
     path_dir = os.path.dirname(path)+'/'
     path_dir2 = filesystem.clean_path(path_dir+'../interfaces/')
 
-    file = path_dir2+fn_part1+'_interface_signed.txt'
+    return path_dir2+fn_part1+'_interface_signed.txt'
+
+
+def monomers_involved(path, excl_res=[]):
+    '''
+    Determine all distinct monomer pairs involved in interfaces described
+    by the interface distogram.
+    '''
+    file = get_path(path)
     files = sorted(glob.glob(file))
 
     if len(files) != 1:
@@ -220,12 +238,7 @@ def load(path, excl_res=[], monomers_involved=[1, 2]):
     '''
     Load interface distogram.
     '''
-    fn = path.split('/')[-1]
-    fn_part1 = '_'.join(fn.split('_')[0:-1])
-    path_dir = os.path.dirname(path)+'/'
-    path_dir2 = filesystem.clean_path(path_dir+'../interfaces/')
-
-    file = path_dir2+fn_part1+'_interface_signed.txt'
+    file = get_path(path)
     files = sorted(glob.glob(file))
 
     if len(files) != 1:
@@ -0,0 +1,237 @@
+import atoms
+import contacts
+import ctl
+
+import math
+import numpy as np
+
+
+'''
+Module providing the variation of the lattice constant on a snapped-in layer
+(snapin.snapin_layer) without repeating the alignment and the snap-in.
+
+All reference points of a layer are proportional to the reference point
+constant, therefore the snapped-in representations of axis 0 and 1 are moved
+to the reference points of another lattice constant by a translation in the
+xy plane (scaling of their center positions).
+'''
+
+clash_decay = 0.1353 # exp(-2), clashes decayed to the level of the max offset
+golden_ratio = (math.sqrt(5)-1)/2
+
+
+def get_layer_models(axes, layer):
+    ''' Get representations of axis 0 and 1 that are snapped in. '''
+
+    models = []
+
+    for ax in axes[:2]:
+        models += layer.ax_models(ax)
+
+    return models
+
+
+def get_centers_xy(models):
+    ''' Get centers of representations in the xy plane (array (n, 2)). '''
+
+    return np.array([m.get_center()[:2] for m in models], dtype=float). \
+                                                                reshape(-1, 2)
+
+
+def get_shifts(centers_xy, scale):
+    '''
+    Get translations of the representations for the scaling of the reference
+    points by scale.
+    '''
+    return centers_xy*(scale-1)
+
+
+def translate_layer(axes, layer, scale, sess):
+    '''
+    Move snapped-in representations of axis 0 and 1 to the reference points
+    scaled by scale.
+    '''
+    models = get_layer_models(axes, layer)
+    shifts = get_shifts(get_centers_xy(models), scale)
+
+    with sess.batch('lattice_scan: translate_layer'):
+        for m, shift in zip(models, shifts):
+            sess.move_model((m.id[0],), [shift[0], shift[1], 0])
+
+    return
+
+
+class LatticeScan():
+    '''
+    This class describes the clashes between the representations of a
+    snapped-in layer as function of the lattice offset.
+
+    The atoms of the representations are read once, for each lattice offset
+    only the representations are translated (rigid bodies) and the clashes
+    between different representations are determined (clashes within a
+    representation do not change).
+    '''
+
+
+    def __init__(self, axes, layer, refpoint_constant, sess):
+        '''
+        Initialization of the LatticeScan class.
+
+        refpoint_constant: reference point constant of the snapped-in layer
+        '''
+        self.refpoint_constant = refpoint_constant
+        self.lc_offsets = {} # lattice offset: clashes
+
+        models = get_layer_models(axes, layer)
+        self.centers_xy = get_centers_xy(models)
+
+        layer_atoms = []
+        group = []
+
+        for i, m in enumerate(models):
+            model_atoms, bonds, atom_model_ids = \
+                                        sess.get_atoms((m.id[0],))
+            layer_atoms.append(model_atoms)
+            group.append(np.full(len(model_atoms), i))
+
+        self.atoms = atoms.from_columns( \
+                np.concatenate([a.name for a in layer_atoms]), \
+                np.concatenate([a.resname for a in layer_atoms]), \
+                np.concatenate([a.chainid for a in layer_atoms]), \
+                np.concatenate([a.resid for a in layer_atoms]), \
+                np.concatenate([a.element for a in layer_atoms]), \
+                np.concatenate([a.xyz for a in layer_atoms]))
+        self.group = np.concatenate(group)
+        self.xyz = self.atoms.xyz.copy()
+        self.radii = contacts.get_radii(self.atoms)
+        self.bonds = contacts.get_bond_matrix([], len(self.atoms))
+                # no bonds between representations
+
+        self.res_n = self.atoms.get_res_n()
+
+        return
+
+
+    def get_clashes(self, lc_offset):
+        '''
+        Get clashes between representations per 100 residues for a lattice
+        offset (cached).
+        '''
+        if lc_offset in self.lc_offsets:
+            return self.lc_offsets[lc_offset]
+
+        scale = (self.refpoint_constant+lc_offset)/self.refpoint_constant
+        shifts = get_shifts(self.centers_xy, scale)
+
+        self.atoms.xyz = self.xyz.copy()
+        self.atoms.xyz[:, :2] += shifts[self.group]
+
+        pairs, overlaps = contacts.find_clashes(self.atoms, \
+                                                radii=self.radii, \
+                                                bonds=self.bonds, \
+                                                group=self.group)
+
+        clashes = 100*len(pairs)/self.res_n
+        self.lc_offsets[lc_offset] = clashes
+
+        ctl.d('lattice scan: lc_offset '+str(lc_offset)+': '+ \
+              str(round(clashes, 3))+' clashes per 100 residues')
+
+        return clashes
+
+
+    def decayed(self, lc_offset, lc_offset_max):
+        '''
+        Check if the clashes of a lattice offset have decayed to the level of
+        lc_offset_max (stop rule of the linear scan,
+        Assembler.process_layer_linear).
+        '''
+        clashes_0 = self.get_clashes(0)
+        clashes_max = self.get_clashes(lc_offset_max)
+
+        return abs(self.get_clashes(lc_offset)-clashes_max) <= \
+               abs(clashes_0-clashes_max)*clash_decay
+
+
+    def monotone(self):
+        ''' Check if the clashes of all evaluated offsets are decreasing. '''
+
+        clashes = [self.lc_offsets[k] for k in sorted(self.lc_offsets)]
+
+        return all(c1 <= c0 for c0, c1 in zip(clashes, clashes[1:]))
+
+
+    def search_linear(self, lc_offset_max, lc_offset_step=2):
+        '''
+        Linear scan of the offsets lc_offset_step, 2*lc_offset_step, ... for
+        the smallest offset where the clashes have decayed (decayed).
+
+        Return:
+            lattice offset, lc_offset_max if the clashes have not decayed
+        '''
+        for lc_offset in range(lc_offset_step, lc_offset_max, lc_offset_step):
+            if self.decayed(lc_offset, lc_offset_max):
+                return lc_offset
+
+        return lc_offset_max
+
+
+    def search(self, lc_offset_max, lc_offset_step=2):
+        '''
+        Search for the smallest lattice offset > 0 where the clashes have
+        decayed to the level of lc_offset_max (within clash_decay of the
+        clash difference between offset 0 and lc_offset_max, decayed).
+
+        Golden-section search over the offsets 0 ... lc_offset_max (grid of
+        lc_offset_step) minimizing the deviation of the clashes from this
+        level, which is unimodal for a decreasing clash curve. From the
+        final bracket, the smallest decayed offset is searched step by step.
+        If the evaluated clashes are not decreasing (non-monotone curve), the
+        result is determined by the linear scan (search_linear), like the
+        former scan of all offsets.
+
+        Return:
+            lattice offset, lc_offset_max if the clashes have not decayed
+        '''
+        clashes_0 = self.get_clashes(0)
+        clashes_max = self.get_clashes(lc_offset_max)
+        clashes_level = clashes_max+(clashes_0-clashes_max)*clash_decay
+
+        def f(k):
+            return abs(self.get_clashes(k*lc_offset_step)-clashes_level)
+
+        # bracket [a, b] on the grid indices
+        k_max = int(lc_offset_max/lc_offset_step)
+        a = 0
+        b = k_max
+
+        while b-a > 2:
+            c = int(round(b-golden_ratio*(b-a)))
+            d = int(round(a+golden_ratio*(b-a)))
+
+            if c == d:
+                d = c+1
+
+            if f(c) <= f(d):
+                b = d
+            else:
+                a = c
+
+        # smallest decayed offset starting from the final bracket
+        k = max(1, a)
+
+        if self.decayed(k*lc_offset_step, lc_offset_max):
+            while k > 1 and \
+                  self.decayed((k-1)*lc_offset_step, lc_offset_max):
+                k -= 1
+        else:
+            while k < k_max and \
+                  not self.decayed(k*lc_offset_step, lc_offset_max):
+                k += 1
+
+        if not self.monotone():
+            ctl.d('lattice scan: clashes not monotone, linear scan')
+
+            return self.search_linear(lc_offset_max, lc_offset_step)
+
+        return min(k*lc_offset_step, lc_offset_max)
@@ -1,6 +1,7 @@
 import glob
 
 import ctl
+import metadata_db
 
 
 '''
@@ -30,7 +31,17 @@ def get_subchain_abbr(path):
 def get_symm_order(path):
     '''
     Get order of rotational symmetry in a complex model from path.
+
+    The metadata database of the model is used if available (for coord
+    files in the symmetry directory of the model), otherwise the name of
+    the symmetry directory.
     '''
+    entry = metadata_db.get_model(path)
+
+    if entry != None and entry['symm_order'] != None and \
+       entry['symm_dir'] != None and '/'+entry['symm_dir']+'/' in path:
+        return entry['symm_order']
+
     dir_name = path.split('/')[-3]
     mult = -1
 
@@ -79,6 +90,26 @@ def get_rank(path):
 def get_score(path):
     '''
     Get score of a complex model from path.
+
+    The metadata database of the model is used if available, otherwise the
+    score in the file name.
+    '''
+    filename = path.split('/')[-1]
+
+    if not '.pdb' in filename:
+        return -1
+
+    entry = metadata_db.get_model(path)
+
+    if entry != None and entry['score'] != None:
+        return entry['score']
+
+    return parse_score(filename)
+
+
+def parse_score(path):
+    '''
+    Parse score of a complex model from a coord file name.
     '''
     filename = path.split('/')[-1]
     score = -1
@@ -150,7 +181,7 @@ def get_chainpair_nnptm(path):
     '''
     Get nnpTM score of a chain pair from path.
     '''
-    filename = fn.split('/')[-1]
+    filename = path.split('/')[-1]
     nnptm = float(filename.split('_iptm')[1].split('.txt')[0])
 
     return nnptm
@@ -159,10 +190,18 @@ def get_chainpair_nnptm(path):
 def get_clashes(path):
     '''
     Get clashes per 100aa of a complex model from path.
+
+    The metadata database of the model is used if available, otherwise the
+    '_cla' infix of the file name.
     '''
     filename = path.split('/')[-1]
-    cla = filename.split('_cla')[1].split('.pdb')[0]
-    cla = float(cla.replace('-', '.'))
+
+    entry = metadata_db.get_model(path)
+
+    if entry != None and entry['clashes'] != None:
+        cla = entry['clashes']
+    else:
+        cla = parse_clashes(filename)
 
     if cla < 0:
         ctl.e(filename)
@@ -172,30 +211,45 @@ def get_clashes(path):
     return cla
 
 
+def parse_clashes(path):
+    '''
+    Parse clashes per 100aa from a path including the '_cla' infix.
+    '''
+    cla = path.split('_cla')[1].split('.pdb')[0]
+    cla = float(cla.replace('-', '.'))
+
+    return cla
+
+
 def get_intermol_betasheets(path):
     '''
     Get fraction of beta sheet residues that is involved in
     intermolecular sheets from path.
+
+    The metadata database of the model is used if available, otherwise the
+    metadata file in the sheetintermol directory.
     '''
     filename = path.split('/')[-1]
 
-    path_dir = '/'.join(path.split('/')[:-1])+'/../sheetintermol/'
-    files_fraction = sorted(glob.glob( \
+    entry = metadata_db.get_model(path)
+
+    if entry != None and entry['sheetintermol_fraction'] != None:
+        fraction_minlen = entry['sheetintermol_minlen']
+        fraction = entry['sheetintermol_fraction']
+        betasheet_res_n = entry['betasheet_res_n']
+    else:
+        path_dir = '/'.join(path.split('/')[:-1])+'/../sheetintermol/'
+        files_fraction = sorted(glob.glob( \
                                 path_dir+filename.split('_cla')[0]+'*.txt'))
 
-    if len(files_fraction) != 1:
-        ctl.e(path_dir+filename.split('_cla')[0]+'*.txt')
-        ctl.e(path_dir)
-        ctl.e(files_fraction)
-        ctl.error('get_intermol_betasheets: len(files_fraction) != 1')
+        if len(files_fraction) != 1:
+            ctl.e(path_dir+filename.split('_cla')[0]+'*.txt')
+            ctl.e(path_dir)
+            ctl.e(files_fraction)
+            ctl.error('get_intermol_betasheets: len(files_fraction) != 1')
 
-    fraction_minlen = files_fraction[0].split('_sheetintermol')[1]. \
-                          split('_')[0]
-    fraction = files_fraction[0].split('_sheetintermol')[1].split('_')[1]
-    betasheet_res_n = int(files_fraction[0].split('_sheetintermol')[1]. \
-                          split('_')[2].split('.txt')[0])
-    fraction_minlen = float(fraction_minlen)
-    fraction = float(fraction)
+        fraction_minlen, fraction, betasheet_res_n = \
+                            parse_intermol_betasheets(files_fraction[0])
 
     if fraction < 0:
         ctl.e(filename)
@@ -210,21 +264,44 @@ def get_intermol_betasheets(path):
     return fraction_minlen, fraction, betasheet_res_n
 
 
+def parse_intermol_betasheets(path):
+    '''
+    Parse fractions of beta sheet residues that are involved in
+    intermolecular sheets from a path including the '_sheetintermol' infix.
+    '''
+    sheetintermol_txt = path.split('_sheetintermol')[1]
+
+    fraction_minlen = float(sheetintermol_txt.split('_')[0])
+    fraction = float(sheetintermol_txt.split('_')[1])
+    betasheet_res_n = int(sheetintermol_txt.split('_')[2].split('.txt')[0])
+
+    return fraction_minlen, fraction, betasheet_res_n
+
+
 def get_roll_clashes(path):
     '''
     Get clashes per 100aa (rolling range of 200aa) of a complex model from
     path.
+
+    The metadata database of the model is used if available, otherwise the
+    metadata file in the same directory.
     '''
-    filename = path.split('/')[-1]
-    path_dir = '/'.join(path.split('/')[:-1])+'/'
-    files_roll = sorted(glob.glob(path_dir+filename.split('_cla')[0]+'*.txt'))
+    entry = metadata_db.get_model(path)
 
-    if len(files_roll) != 1:
-        ctl.error('get_roll_clashes')
-        
-    filename = files_roll[0].split('/')[-1]
-    cla = filename.split('_rollcla')[1].split('_')[0]
-    cla = float(cla.replace('-', '.'))
+    if entry != None and entry['roll_clashes'] != None:
+        filename = path.split('/')[-1]
+        cla = entry['roll_clashes']
+    else:
+        filename = path.split('/')[-1]
+        path_dir = '/'.join(path.split('/')[:-1])+'/'
+        files_roll = sorted(glob.glob(path_dir+filename.split('_cla')[0]+ \
+                                      '*.txt'))
+
+        if len(files_roll) != 1:
+            ctl.error('get_roll_clashes')
+
+        filename = files_roll[0].split('/')[-1]
+        cla = parse_roll_clashes(filename)
 
     if cla < 0:
         ctl.e(filename)
@@ -234,31 +311,63 @@ def get_roll_clashes(path):
     return cla
 
 
+def parse_roll_clashes(path):
+    '''
+    Parse clashes per 100aa (rolling range of 200aa) from a path including
+    the '_rollcla' infix.
+    '''
+    cla = path.split('_rollcla')[1].split('_')[0]
+    cla = float(cla.replace('-', '.'))
+
+    return cla
+
+
 def get_rotsymm_ang(file_path):
     '''
     Get rotational symmetry angle of a oligomer model from path.
+
+    The metadata database of the model is used if available, otherwise the
+    metadata file in the symmetry directory.
     '''
     filename = file_path.split('/')[-1]
     folder = '/'.join(file_path.split('/')[:-2])+'/'
 
-    files_rotang = sorted(glob.glob(folder+filename.split('_cla')[0]+ \
-                                        '_rotang*.txt'))
-
     if 'symm_unclassified' in file_path or 'no_symm_found' in file_path:
         return []
 
-    if len(files_rotang) != 1:
-        ctl.e(file_path)
-        ctl.e(folder+filename.split('_cla')[0]+'_rotang*.txt')
-        ctl.e(files_rotang)
-        ctl.error('get_rotang')
+    entry = metadata_db.get_model(file_path)
 
-    if not '_rotang' in files_rotang[0]:
-        ctl.e(files_rotang)
-        ctl.error('get_rotsymm_ang: rotang metadata not found in path')
+    if entry != None and entry['rotang_min'] != None:
+        rotangs = [entry['rotang_min'], entry['rotang_max']]
+    else:
+        files_rotang = sorted(glob.glob(folder+filename.split('_cla')[0]+ \
+                                        '_rotang*.txt'))
+
+        if len(files_rotang) != 1:
+            ctl.e(file_path)
+            ctl.e(folder+filename.split('_cla')[0]+'_rotang*.txt')
+            ctl.e(files_rotang)
+            ctl.error('get_rotang')
+
+        if not '_rotang' in files_rotang[0]:
+            ctl.e(files_rotang)
+            ctl.error('get_rotsymm_ang: rotang metadata not found in path')
+
+        rotangs = parse_rotsymm_ang(files_rotang[0].split('/')[-1])
+
+    if min(rotangs) < 10:
+        ctl.e(rotangs)
+        ctl.error('get_rotsymm_ang: min(rotangs) < 10')
 
-    filename = files_rotang[0].split('/')[-1]
-    rotang_txt = filename.split('_rotang')[1].split('.txt')[0]
+    return rotangs
+
+
+def parse_rotsymm_ang(path):
+    '''
+    Parse rotational symmetry angles from a path including the '_rotang'
+    infix.
+    '''
+    rotang_txt = path.split('_rotang')[1].split('.txt')[0]
 
     if '_' in rotang_txt:
         rotangs = [float(rotang_txt.split('_')[0].replace('-', '.')), \
@@ -267,8 +376,4 @@ def get_rotsymm_ang(file_path):
         rotangs = [int(rotang_txt.split('-')[0]), \
                    int(rotang_txt.split('-')[1])]
 
-    if min(rotangs) < 10:
-        ctl.e(rotangs)
-        ctl.error('get_rotsymm_ang: min(rotangs) < 10')
-
     return rotangs
@@ -0,0 +1,299 @@
+import ctl
+import filesystem
+
+import os
+import sqlite3
+
+
+'''
+Module providing a SQLite database for metadata of coord files and assemblies.
+
+The database complements the metadata encoded in directory/file names (see
+module metadata). A database file is stored in the export directory of a
+run, entries reference files relative to this directory, so the directory
+can be renamed after completion (e.g. removal of the '_running' postfix).
+
+tables:
+    models: prepared SymPlex candidate models (model_preparation)
+    validations: validation data of created layer models (validation)
+    assemblies: results of the combinatorial search (symplex_comb)
+    prefilter: combinations predicted to fail before the assembly
+               (symplex_prefilter)
+'''
+
+db_filename = 'metadata.sqlite'
+
+tables = {
+    'models': [ ('name', 'TEXT PRIMARY KEY'), \
+                ('species', 'TEXT'), \
+                ('gene', 'TEXT'), \
+                ('prediction_scenario', 'TEXT'), \
+                ('symm_order', 'INTEGER'), \
+                ('symm_dir', 'TEXT'), \
+                ('rank', 'INTEGER'), \
+                ('score', 'REAL'), \
+                ('clashes', 'REAL'), \
+                ('roll_clashes', 'REAL'), \
+                ('sheetintermol_minlen', 'REAL'), \
+                ('sheetintermol_fraction', 'REAL'), \
+                ('betasheet_res_n', 'INTEGER'), \
+                ('rotang_min', 'REAL'), \
+                ('rotang_max', 'REAL') ], \
+    'validations': [ ('name', 'TEXT PRIMARY KEY'), \
+                     ('species', 'TEXT'), \
+                     ('gene', 'TEXT'), \
+                     ('score_quality', 'REAL'), \
+                     ('score_clash', 'REAL'), \
+                     ('score_bend', 'REAL'), \
+                     ('backbone_clashes', 'REAL'), \
+                     ('clashes_per_100residues', 'REAL'), \
+                     ('score_bendz', 'REAL') ], \
+    'assemblies': [ ('name', 'TEXT PRIMARY KEY'), \
+                    ('species', 'TEXT'), \
+                    ('gene', 'TEXT'), \
+                    ('symm_order0', 'INTEGER'), \
+                    ('symm_order1', 'INTEGER'), \
+                    ('subchains0', 'TEXT'), \
+                    ('subchains1', 'TEXT'), \
+                    ('result', 'INTEGER'), \
+                    ('result_infix', 'TEXT'), \
+                    ('ranking_candidate', 'INTEGER'), \
+                    ('score_quality', 'REAL'), \
+                    ('score_clash', 'REAL'), \
+                    ('score_bend', 'REAL'), \
+                    ('backbone_clashes', 'REAL'), \
+                    ('alignment_domain', 'INTEGER'), \
+                    ('alignment_pivot_pos', 'INTEGER'), \
+                    ('insertion_length', 'INTEGER'), \
+                    ('symplex_combination0', 'INTEGER'), \
+                    ('symplex_combination1', 'INTEGER') ], \
+    'prefilter': [ ('name', 'TEXT PRIMARY KEY'), \
+                   ('species', 'TEXT'), \
+                   ('gene', 'TEXT'), \
+                   ('predicted', 'INTEGER'), \
+                   ('result_infix', 'TEXT'), \
+                   ('axis_z0', 'REAL'), \
+                   ('axis_z1', 'REAL'), \
+                   ('coincident_n', 'INTEGER'), \
+                   ('tilt', 'REAL') ] }
+
+indexed_columns = ['species', 'gene', 'prediction_scenario', 'symm_order', \
+                   'rank', 'score', 'clashes', 'roll_clashes', \
+                   'sheetintermol_fraction', 'symm_order0', 'symm_order1', \
+                   'result', 'score_quality', 'score_clash', 'score_bend', \
+                   'backbone_clashes', 'predicted']
+
+connections = {} # db_path -> open connection
+db_paths = {} # directory -> db_path
+models_cache = {} # db_path -> [modification time, dict name -> entry]
+
+
+def connect(db_path):
+    '''
+    Get connection to database, the database and its tables are created if
+    not existing.
+    '''
+    if db_path in connections:
+        return connections[db_path]
+
+    filesystem.create_folder([db_path])
+
+    conn = sqlite3.connect(db_path, timeout=60)
+            # timeout: parallel worker processes write to the same database
+    conn.row_factory = sqlite3.Row
+
+    with conn:
+        for table in tables:
+            conn.execute('CREATE TABLE IF NOT EXISTS '+table+' ('+ \
+                    ', '.join([c[0]+' '+c[1] for c in tables[table]])+')')
+
+            for column in [c[0] for c in tables[table]]:
+                if column in indexed_columns:
+                    conn.execute('CREATE INDEX IF NOT EXISTS '+ \
+                                 table+'_'+column+' ON '+ \
+                                 table+' ('+column+')')
+
+    connections[db_path] = conn
+
+    return conn
+
+
+def close():
+    ''' Close all open connections. '''
+
+    for db_path in connections:
+        connections[db_path].close()
+
+    connections.clear()
+    db_paths.clear()
+    models_cache.clear()
+
+    return
+
+
+def write(db_path, table, entry):
+    '''
+    Write entry (dict with column names as keys) to a table, an existing
+    entry with the same name is replaced.
+    '''
+    columns = [c[0] for c in tables[table]]
+
+    for key in entry:
+        if key not in columns:
+            ctl.e(key)
+            ctl.error('metadata_db: write: unknown column in table '+table)
+
+    conn = connect(db_path)
+
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO '+table+' ('+ \
+                     ', '.join(entry)+') VALUES ('+ \
+                     ', '.join(['?' for key in entry])+')', \
+                     list(entry.values()))
+
+    return
+
+
+def update(db_path, table, name, entry):
+    '''
+    Update columns of an existing entry, an entry is created if not
+    existing.
+    '''
+    conn = connect(db_path)
+
+    with conn:
+        conn.execute('INSERT OR IGNORE INTO '+table+' (name) VALUES (?)', \
+                     [name])
+        conn.execute('UPDATE '+table+' SET '+ \
+                     ', '.join([key+' = ?' for key in entry])+ \
+                     ' WHERE name = ?', list(entry.values())+[name])
+
+    return
+
+
+def merge(db_path, db_path_src):
+    '''
+    Merge all entries of another database (e.g. of a worker process) into a
+    database, existing entries with the same name are replaced.
+    '''
+    conn = connect(db_path)
+    conn_src = sqlite3.connect(db_path_src, timeout=60)
+
+    with conn:
+        for table in tables:
+            columns = [c[0] for c in tables[table]]
+
+            try:
+                rows = conn_src.execute('SELECT '+', '.join(columns)+ \
+                                        ' FROM '+table).fetchall()
+            except sqlite3.OperationalError:
+                continue # table not existing in the source database
+
+            conn.executemany('INSERT OR REPLACE INTO '+table+' ('+ \
+                             ', '.join(columns)+') VALUES ('+ \
+                             ', '.join(['?' for c in columns])+')', rows)
+
+    conn_src.close()
+
+    return
+
+
+def query(db_path, table, order_by='', **conditions):
+    '''
+    Query entries of a table with equality conditions on columns,
+    e.g. query(db_path, 'models', symm_order=4).
+
+    Return:
+        list of entries (dicts)
+    '''
+    columns = [c[0] for c in tables[table]]
+
+    for key in list(conditions)+([order_by] if order_by != '' else []):
+        if key not in columns:
+            ctl.e(key)
+            ctl.error('metadata_db: query: unknown column in table '+table)
+
+    sql = 'SELECT * FROM '+table
+
+    if len(conditions) > 0:
+        sql += ' WHERE '+' AND '.join([key+' = ?' for key in conditions])
+
+    if order_by != '':
+        sql += ' ORDER BY '+order_by
+
+    conn = connect(db_path)
+    rows = conn.execute(sql, list(conditions.values())).fetchall()
+
+    return [dict(r) for r in rows]
+
+
+def find_db(path, levels=3):
+    '''
+    Find database of a coord file in its directory or in one of the parent
+    directories (up to levels).
+
+    Return:
+        db_path, '' if no database found
+    '''
+    directory = os.path.dirname(path)
+
+    if directory == '':
+        return ''
+
+    if directory in db_paths:
+        return db_paths[directory]
+
+    db_path = ''
+    d = directory
+
+    for i in range(0, levels+1):
+        if os.path.exists(d+'/'+db_filename):
+            db_path = d+'/'+db_filename
+            db_paths[directory] = db_path
+                # only found databases are cached, a database can be
+                # created later by a running model preparation
+            break
+
+        d = os.path.dirname(d)
+
+    return db_path
+
+
+def get_models(db_path):
+    '''
+    Get all entries of the table models of a database, loaded with one
+    query and reloaded only if the database file has changed.
+
+    Return:
+        dict name -> entry (dict)
+    '''
+    mtime = os.path.getmtime(db_path)
+
+    if db_path not in models_cache or models_cache[db_path][0] != mtime:
+        models_cache[db_path] = [mtime, dict([(e['name'], e) for e in \
+                                              query(db_path, 'models')])]
+
+    return models_cache[db_path][1]
+
+
+def get_model(path):
+    '''
+    Get entry of a prepared model from the path of one of its coord or
+    metadata files.
+
+    Return:
+        entry (dict), None if no entry found
+    '''
+    db_path = find_db(path)
+
+    if db_path == '':
+        return None
+
+    filename = path.split('/')[-1]
+
+    if '_cla' in filename:
+        name = filename.split('_cla')[0]
+    else:
+        name = filename.rsplit('.', 1)[0]
+
+    return get_models(db_path).get(name)
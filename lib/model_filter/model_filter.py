@@ -129,7 +129,7 @@ def clashes_converted(file_path):
             # coord files using a factor of 20 between unrelaxed and relaxed
 
     else:
-        cla = metadata.get_clashes(filename)
+        cla = metadata.get_clashes(file_path)
 
     return cla
 
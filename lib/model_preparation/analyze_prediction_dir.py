@@ -1,24 +1,28 @@
-import glob
 import os
-import sys
+import time
+import traceback
 
 import ctl
-import bib
-import bibfasta
 import chimerax_api
+import filesystem
+import metadata_db
 import model_preparation.bib
+import model_preparation.parallel
 import model_preparation.prepare_file
+import scheduler
 
 from structure.modelreg import ModelReg
 
 
-def analyze(prediction_dir, session):
+def analyze(prediction_dir, session, species='', gene=''):
     '''
     Preprocessing of predicted SymPlex (Symmetric Protein Complexes)
     candidate models
     - alignment of whole model to xy plane
     - counterclockwise renaming of chain ids
     - determination of the symmetry of SymPlex candidate
+
+    species, gene: stored in the metadata database
     '''
     sess = chimerax_api.ChimeraxSession(session, 1)
     model_reg = ModelReg()
@@ -30,41 +34,22 @@ def analyze(prediction_dir, session):
     path_export_postfix_running = '_running'
                 # postfix for temporary name of export folder during runtime
 
-    path_export = prediction_dir[0:-1]+'_o'+path_export_postfix_running+'/'
+    path_export, fasta_path, gene_id = model_preparation.bib. \
+                get_export_path(prediction_dir, path_export_postfix_running)
     files = model_preparation.bib.get_input_files(prediction_dir)
 
-    # get gene id from prediction_dir
-    gene_id = prediction_dir.split('/')[-2].split('_')[0]
-
-    if prediction_dir.split('/')[-2] != prediction_dir.split('/')[-3]:
-        fasta_path = '/'.join(prediction_dir.split('/')[:-2])+'/'
-    else: 
-        fasta_path = '/'.join(prediction_dir.split('/')[:-3])+'/'
-        prefix = prediction_dir.split('/')[-2]
-        path_export = fasta_path+prefix+'_or'+path_export_postfix_running+'/'
-
     try:
         os.mkdir(path_export)
     except IOError:
         pass
 
-
-    #fasta_file = sorted(glob.glob(fasta_path+'*.fa*'))
-    fasta_file = sorted(glob.glob(fasta_path+gene_id+'.fa*'))
-
-    if len(fasta_file) != 1:
-        f = open(prediction_dir+'ERROR_no_unique_fasta.txt', 'w')
-        f.write('') 
-        f.close()
-        ctl.error('no unique fasta')
-
-    seq = bibfasta.get_seq_from_fasta(fasta_file[0])
+    seq = model_preparation.bib.get_seq(prediction_dir, fasta_path, gene_id)
 
 
     # iterate through all model input files.
     for f0 in files:
         model_preparation.prepare_file.prepare_file(f0, seq, \
-                    path_export, sess)
+                    path_export, sess, species=species, gene=gene)
 
 
     # rename export folder after completion
@@ -72,3 +57,52 @@ def analyze(prediction_dir, session):
               path_export.replace(path_export_postfix_running, ''))
 
     return
+
+
+def analyze_jobs(jobs, lock_dir, worker_i, session):
+    '''
+    Preprocessing of the coord files of jobs (model_preparation.parallel.
+    get_jobs) in a worker process (headless ChimeraX instance).
+
+    Jobs are claimed by lock files, so the workers share one job list. Each
+    job is exported to the worker directory of the prediction directory, a
+    marker of the processed job is written (model_preparation.parallel.
+    write_done).
+    '''
+    sess = chimerax_api.ChimeraxSession(session, 1)
+    model_reg = ModelReg()
+    sess.set_model_reg(model_reg)
+
+    sess.run('close session')
+    sess.run('set bgColor white')
+
+    for job in jobs:
+        if scheduler.claim(lock_dir, job['key']) == False:
+            continue
+
+        time_start = time.time()
+        success = True
+        error = ''
+
+        try:
+            path_export = model_preparation.parallel.get_export_path( \
+                                            job['prediction_dir'], worker_i)
+            filesystem.create_folder([path_export])
+
+            model_preparation.prepare_file.prepare_file(job['file'], \
+                    job['seq'], path_export, sess, species=job['species'], \
+                    gene=job['gene'])
+
+        except Exception:
+            success = False
+            error = traceback.format_exc()
+            ctl.p(error)
+
+            sess.run('close session')
+
+        metadata_db.close()
+
+        model_preparation.parallel.write_done(lock_dir, job, success, error, \
+                                              time.time()-time_start)
+
+    return
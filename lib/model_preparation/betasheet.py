@@ -36,6 +36,16 @@ def intermolecular_betasheet_fraction(model_id, path_export, sess, verbous):
                         intermolecular_betasheet_residues( \
                             model_id, path_export, dssp_minlen, sess)
 
+    return get_sheetintermol_infix(sheet_intermol_res, sheet_intramol_res, \
+                                   sheet_intermol_minlen_res, verbous)
+
+
+def get_sheetintermol_infix(sheet_intermol_res, sheet_intramol_res, \
+                            sheet_intermol_minlen_res, verbous=False):
+    '''
+    Calculate fraction of beta sheet residues that is involved in
+    intermolecular sheets and the filename infix with this information.
+    '''
     sheet_res = list(set(sheet_intramol_res+sheet_intermol_res))
 
     sheet_res_n = len(sheet_res)
@@ -75,8 +85,7 @@ def intermolecular_betasheet_residues(model_id, path_export, dssp, sess):
     '''
     Determine residues involved in intermolecular beta sheets.
     '''
-    sheet_intramol_res = []
-    sheet_intermol_res = []
+    ladders = []
 
     for d in dssp:
 
@@ -84,79 +93,71 @@ def intermolecular_betasheet_residues(model_id, path_export, dssp, sess):
         # ~~~~~~~~~~~~~~~~~~~~~~~~
         if ' antiparallel ' in d:
             ranges = d.split(' antiparallel ')
-            range0 = ranges[0].split(' -> ')
-            begin0 = int(range0[0].split(':')[1].strip())
-            end0 = int(range0[1].split(':')[1].strip())
-            chain0 = range0[0].split('/')[1].split(':')[0].strip()
+            sheet_type = 'antiparallel'
 
-            range1 = ranges[1].split(' -> ')
-            begin1 = int(range1[0].split(':')[1].strip())
-            end1 = int(range1[1].split(':')[1].strip())
-            chain1 = range1[0].split('/')[1].split(':')[0].strip()
+        # parallel beta sheets
+        # ~~~~~~~~~~~~~~~~~~~~
+        elif ' parallel ' in d:
+            ranges = d.split(' parallel ')
+            sheet_type = 'parallel'
 
-            r0 = [chain0+str(r) for r in range(begin0, end0+1)]
-            r1 = [chain1+str(r) for r in range(begin1, end1+1)]
+        else:
+            continue
 
-            if chain0 != chain1:
-                for r in r0:
-                    if r not in sheet_intermol_res:
-                        sheet_intermol_res.append(r)
+        range0 = ranges[0].split(' -> ')
+        begin0 = int(range0[0].split(':')[1].strip())
+        end0 = int(range0[1].split(':')[1].strip())
+        chain0 = range0[0].split('/')[1].split(':')[0].strip()
 
-                for r in r1:
-                    if r not in sheet_intermol_res:
-                        sheet_intermol_res.append(r)
+        range1 = ranges[1].split(' -> ')
+        begin1 = int(range1[0].split(':')[1].strip())
+        end1 = int(range1[1].split(':')[1].strip())
+        chain1 = range1[0].split('/')[1].split(':')[0].strip()
 
-            elif chain0 == chain1:
-                for r in r0:
-                    if r not in sheet_intramol_res:
-                        sheet_intramol_res.append(r)
+        ladders.append([chain0, begin0, end0, chain1, begin1, end1, \
+                        sheet_type])
 
-                for r in r1:
-                    if r not in sheet_intramol_res:
-                        sheet_intramol_res.append(r)
+    return ladder_residues(ladders)
 
-            else:
-                ctl.error('intermolecular_betasheet_fraction: '+ \
-                            'error in chain ids')
 
+def ladder_residues(ladders):
+    '''
+    Determine residues involved in intermolecular and intramolecular beta
+    sheets from beta ladders.
 
-        # parallel beta sheets
-        # ~~~~~~~~~~~~~~~~~~~~
-        elif ' parallel ' in d:
-            ranges = d.split(' parallel ')
-            range0 = ranges[0].split(' -> ')
-            begin0 = int(range0[0].split(':')[1].strip())
-            end0 = int(range0[1].split(':')[1].strip())
-            chain0 = range0[0].split('/')[1].split(':')[0].strip()
-
-            range1 = ranges[1].split(' -> ')
-            begin1 = int(range1[0].split(':')[1].strip())
-            end1 = int(range1[1].split(':')[1].strip())
-            chain1 = range1[0].split('/')[1].split(':')[0].strip()
-
-            r0 = [chain0+str(r) for r in range(begin0, end0+1)]
-            r1 = [chain1+str(r) for r in range(begin1, end1+1)]
-
-            if chain0 != chain1:
-                for r in r0:
-                    if r not in sheet_intermol_res:
-                        sheet_intermol_res.append(r)
-
-                for r in r1:
-                    if r not in sheet_intermol_res:
-                        sheet_intermol_res.append(r)
-
-            elif chain0 == chain1:
-                for r in r0:
-                    if r not in sheet_intramol_res:
-                        sheet_intramol_res.append(r)
-
-                for r in r1:
-                    if r not in sheet_intramol_res:
-                        sheet_intramol_res.append(r)
-
-            else:
-                ctl.error('intermolecular_betasheet_fraction: '+ \
-                            'error in chain ids')
+    Args:
+        ladders: list of [chain0, begin0, end0, chain1, begin1, end1, type]
+
+    Return:
+        sheet_intermol_res, sheet_intramol_res (residues as chainid+resid)
+    '''
+    sheet_intramol_res = []
+    sheet_intermol_res = []
+
+    for chain0, begin0, end0, chain1, begin1, end1, sheet_type in ladders:
+        r0 = [chain0+str(r) for r in range(begin0, end0+1)]
+        r1 = [chain1+str(r) for r in range(begin1, end1+1)]
+
+        if chain0 != chain1:
+            for r in r0:
+                if r not in sheet_intermol_res:
+                    sheet_intermol_res.append(r)
+
+            for r in r1:
+                if r not in sheet_intermol_res:
+                    sheet_intermol_res.append(r)
+
+        elif chain0 == chain1:
+            for r in r0:
+                if r not in sheet_intramol_res:
+                    sheet_intramol_res.append(r)
+
+            for r in r1:
+                if r not in sheet_intramol_res:
+                    sheet_intramol_res.append(r)
+
+        else:
+            ctl.error('intermolecular_betasheet_fraction: '+ \
+                        'error in chain ids')
 
     return sheet_intermol_res, sheet_intramol_res
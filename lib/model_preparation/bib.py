@@ -1,6 +1,8 @@
+import bibfasta
 import ctl
 
 import glob
+import os
 
 
 '''
@@ -27,3 +29,78 @@ def get_input_files(path):
             files = sorted(glob.glob(path+'*.pdb'))
 
     return files
+
+
+def get_prediction_dirs(work_dir):
+    '''
+    Get prediction directories in a working directory.
+
+    A subdirectory with relaxed files is appended if a complete set of relaxed
+    files is available.
+    '''
+    prediction_dirs0 = sorted(glob.glob(work_dir+'*_*x*'))
+    prediction_dirs = []
+
+    for d in prediction_dirs0:
+        if os.path.isdir(d):
+            prediction_dirs.append(d+'/')
+
+    prediction_dirs_for_processing = []
+
+    for d in prediction_dirs:
+
+        # append directory with unrelaxed files
+        prediction_dirs_for_processing.append(d)
+
+        if os.path.isdir(d+d.split('/')[-2]):
+            files_ranked = sorted(glob.glob(d+d.split('/')[-2]+ \
+                                        '/rank*_*.*.pdb'))
+
+            if len(files_ranked) >= 5:
+                # if directory with complete set of relaxed files available,
+                # also append directory with relaxed files
+                prediction_dirs_for_processing.append(d+d.split('/')[-2]+'/')
+
+    return prediction_dirs_for_processing
+
+
+def get_export_path(prediction_dir, path_export_postfix_running):
+    '''
+    Get export path and fasta path of a prediction directory.
+
+    Return:
+        path_export: export path with postfix for the temporary name during
+                     runtime
+        fasta_path: directory of the fasta file
+        gene_id: gene id
+    '''
+    path_export = prediction_dir[0:-1]+'_o'+path_export_postfix_running+'/'
+
+    # get gene id from prediction_dir
+    gene_id = prediction_dir.split('/')[-2].split('_')[0]
+
+    if prediction_dir.split('/')[-2] != prediction_dir.split('/')[-3]:
+        fasta_path = '/'.join(prediction_dir.split('/')[:-2])+'/'
+    else:
+        fasta_path = '/'.join(prediction_dir.split('/')[:-3])+'/'
+        prefix = prediction_dir.split('/')[-2]
+        path_export = fasta_path+prefix+'_or'+path_export_postfix_running+'/'
+
+    return path_export, fasta_path, gene_id
+
+
+def get_seq(prediction_dir, fasta_path, gene_id):
+    '''
+    Get sequence from the unique fasta file of a gene.
+    '''
+    fasta_file = sorted(glob.glob(fasta_path+gene_id+'.fa*'))
+
+    if len(fasta_file) != 1:
+        f = open(prediction_dir+'ERROR_no_unique_fasta.txt', 'w')
+        f.write('')
+        f.close()
+        ctl.error('no unique fasta')
+
+    seq = bibfasta.get_seq_from_fasta(fasta_file[0])
+
+    return seq
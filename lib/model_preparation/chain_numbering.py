@@ -1,3 +1,4 @@
+import atoms
 import bibpdb
 import ctl
 import geometry
@@ -56,13 +57,17 @@ def determine_subchain_order(coord, meta, mult):
     ctl.d('chaincenter')
     ctl.d(chaincenter)
 
+    # distances between all chaincenters
+    centerDists = model_preparation.geometry.get_distance_matrix(chaincenter)
+
     order = [0]
 
     for m in range(1, mult):
+        crossps = geometry.crossproducts(chaincenter[order[m-1]], chaincenter)
+
         for i,v in enumerate(chaincenter):
 
-            crossp = geometry.crossproduct(chaincenter[order[m-1]], \
-                                           chaincenter[i])
+            crossp = crossps[i].tolist()
             if -0.1 < crossp[2] < 0.1:
                 ctl.d('continue, because cp ~= 0')
                 ctl.d(crossp[2])
@@ -73,9 +78,8 @@ def determine_subchain_order(coord, meta, mult):
                 ctl.d(crossp[2])
                 continue
 
-            # calculate distances of v to all chaincenters
-            centerDist = model_preparation.geometry. \
-                                        get_distances(chaincenter, v)
+            # distances of v to all chaincenters
+            centerDist = centerDists[i].tolist()
             minDist = min(centerDist)
             currentDist = centerDist[order[m-1]]
             if currentDist <= minDist*1.2:
@@ -110,3 +114,46 @@ def determine_subchain_order(coord, meta, mult):
            break
 
     return order 
+
+
+def order_counterclockwise(f, meta, mult):
+    '''
+    Rename chain ids of a coord file in counterclockwise order.
+
+    Return:
+        symmaxis: False if no counterclockwise order (and therefore no symm
+                  axis) detectable
+    '''
+    symmaxis = True
+
+    coord = atoms.get_atom_table(f)
+    order = determine_subchain_order(coord, meta, mult)
+
+    # reverse order of chain ids if orientation is not counterclockwise
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    if order == -1:
+        # preparation: flip order when clockwise
+        order_flipped = []
+        for i in range(mult-1, -1, -1):
+            order_flipped.append(i)
+
+        bibpdb.reorder_chainids(f, order_flipped)
+
+
+    coord = atoms.get_atom_table(f)
+    order = determine_subchain_order(coord, meta, mult)
+
+    if order == -1:
+        ctl.d('order')
+        ctl.d(order)
+        ctl.d('still: order == -1, no symm axis detectable')
+        symmaxis = False
+
+    ctl.d('symmaxis')
+    ctl.d(symmaxis)
+
+    if symmaxis:
+        ctl.d(order)
+        bibpdb.reorder_chainids(f, order)
+
+    return symmaxis
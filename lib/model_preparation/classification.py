@@ -0,0 +1,300 @@
+import bibpdb
+import ctl
+import metadata
+import metadata_db
+import model_preparation.geometry
+
+import os
+import shutil
+
+
+'''
+Module providing functions to classify a prepared coord file and to export
+the classification (directories, marker files, metadata database entries).
+
+The functions do not depend on a ChimeraX session, they are shared by the
+model preparation in ChimeraX (prepare_file) and the headless model
+preparation (headless).
+'''
+
+def get_mol_count(resids, res_n, f):
+    '''
+    Determine number of chains in 2 ways and check for agreement.
+
+    Args:
+        resids: residue ids of all chains
+        res_n: overall number of residues
+        f: coord file
+    '''
+    mol_count = res_n/(resids[-1]-resids[0]+1)
+
+    if mol_count%1 > 0.001:
+        ctl.e(mol_count)
+        ctl.error('unclear number of chains')
+    else:
+        mol_count = int(mol_count)
+
+    mol_count2 = bibpdb.get_multimer_n(f)
+
+    if mol_count != mol_count2:
+        ctl.e(mol_count)
+        ctl.e(mol_count2)
+        ctl.error('unclear number of chains')
+
+    return mol_count
+
+
+def get_interface_res_range(interface_residues, res_range):
+    '''
+    Get residue range of the interface residues, the given residue range
+    (termini) is used for missing or very small interfaces.
+    '''
+    interface_residues = sorted([r[1] for r in interface_residues])
+
+    if len(interface_residues) < 1:
+        interface_res_range = res_range
+    else:
+        interface_res_range = [interface_residues[0], \
+                               interface_residues[-1]]
+
+        if interface_res_range[1]-interface_res_range[0] < 5:
+            interface_res_range = res_range
+
+    return interface_res_range
+
+
+def get_symmetry(rotang, mol_count, multiplicities):
+    '''
+    Get symmetry of a SymPlex candidate from the rotation angles between
+    next neighbor monomers.
+
+    Return:
+        multiplicity, symm_ang_infix, rotang_cleaned
+        (None, '', [] if no symmetry found)
+    '''
+    for multiplicity in multiplicities:
+        symm_ang = 360/multiplicity
+        symm_ang_infix = ('000'+str(round(symm_ang)))[-3:]
+
+        rotang_cleaned = model_preparation.geometry. \
+                        clean_rotang(rotang, multiplicity, mol_count)
+
+        d0 = 15
+        d1 = 15
+        if 5 in multiplicities:
+            if multiplicity == 5:
+                d0 = 6
+                d1 = 9
+            elif multiplicity == 6:
+                d1 = 6
+            elif multiplicity == 4:
+                d0 = 9
+
+        if 7 in multiplicities:
+            if multiplicity == 7:
+                d1 = 4
+            elif multiplicity == 6:
+                d0 = 4
+
+        # rule out that e.g. 4mer results in 2fold axis
+        if mol_count <= multiplicity:
+            if abs(max(rotang_cleaned)-symm_ang) < d0 and \
+               abs(min(rotang_cleaned)-symm_ang) < d1:
+
+                return multiplicity, symm_ang_infix, rotang_cleaned
+
+    return None, '', []
+
+
+def write_marker(path):
+    ''' Write empty marker file. '''
+
+    f = open(path, 'w')
+    f.write('')
+    f.close()
+
+    return
+
+
+def create_export_dirs(path_export, subdir):
+    '''
+    Create export directory of a classification with the subdirectories
+    "clashes/" and "sheetintermol/".
+    '''
+    for d in [subdir, subdir+'clashes/', subdir+'sheetintermol/']:
+        try:
+            os.mkdir(path_export+d)
+        except IOError:
+            pass
+
+    return
+
+
+def export_clashes(path_export, filename, clash_postfix, roll_clash_postfix):
+    ''' Export clash marker files of a prepared coord file. '''
+
+    try:
+        os.mkdir(path_export+'clashes/')
+    except IOError:
+        pass
+
+    write_marker(path_export+'clashes/'+filename[:-4]+clash_postfix+'.pdb')
+    write_marker(path_export+'clashes/'+ \
+                 filename[:-4]+roll_clash_postfix+'.txt')
+
+    return
+
+
+def export_no_symm(f, path_export, filename, clash_postfix, \
+                   roll_clash_postfix, sheetintermol_infix):
+    '''
+    Export coord file without unique axis of rotational symmetry.
+    '''
+    create_export_dirs(path_export, 'no_symm_found/')
+
+    shutil.copyfile(f, path_export+'no_symm_found/'+filename)
+    shutil.copyfile(f, path_export+'no_symm_found/clashes/'+ \
+                    filename[:-4]+clash_postfix+'.pdb')
+
+    write_marker(path_export+'no_symm_found/clashes/'+ \
+                 filename[:-4]+roll_clash_postfix+'.txt')
+    write_marker(path_export+'no_symm_found/sheetintermol/'+ \
+                 filename[:-4]+sheetintermol_infix+'.txt')
+
+    metadata_db.update(path_export+metadata_db.db_filename, 'models', \
+                       filename[:-4], { 'symm_order': -1, \
+                                        'symm_dir': 'no_symm_found' })
+
+    return
+
+
+def export_rmsd(path_export, filename, rmsd):
+    '''
+    Export rmsd between two monomers in the SymPlex candidate.
+    '''
+    try:
+        os.mkdir(path_export+'interfaces/')
+    except IOError:
+        pass
+
+    f_info = open(path_export+'interfaces/'+filename[:-4]+'_rmsd.txt', 'w')
+    f_info.write(str(rmsd))
+    f_info.close()
+
+    return
+
+
+def export_symm(f, path_export, filename, multiplicity, symm_ang_infix, \
+                rotang_cleaned, clash_postfix, roll_clash_postfix, \
+                sheetintermol_infix):
+    '''
+    Export coord file with classified rotational symmetry.
+
+    Return:
+        path of the directory for the interface matrices
+    '''
+    symm_dir = 'symm_'+symm_ang_infix+'/'
+    create_export_dirs(path_export, symm_dir)
+
+    shutil.copyfile(f, path_export+symm_dir+filename)
+    write_marker(path_export+symm_dir+'clashes/'+ \
+                 filename[:-4]+clash_postfix+'.pdb')
+
+    rotang_postfix = '_rotang'+ \
+                     str(round(min(rotang_cleaned))).replace('.', '-')+'_'+ \
+                     str(round(max(rotang_cleaned))).replace('.', '-')
+    write_marker(path_export+symm_dir+filename[:-4]+rotang_postfix+'.txt')
+
+    write_marker(path_export+symm_dir+'clashes/'+ \
+                 filename[:-4]+roll_clash_postfix+'.txt')
+    write_marker(path_export+symm_dir+'sheetintermol/'+ \
+                 filename[:-4]+sheetintermol_infix+'.txt')
+
+    rotangs = metadata.parse_rotsymm_ang(rotang_postfix)
+    metadata_db.update(path_export+metadata_db.db_filename, \
+                       'models', filename[:-4], \
+                       { 'symm_order': multiplicity, \
+                         'symm_dir': 'symm_'+symm_ang_infix, \
+                         'rotang_min': rotangs[0], \
+                         'rotang_max': rotangs[1] })
+
+    try:
+        os.mkdir(path_export+symm_dir+'interfaces/')
+    except IOError:
+        pass
+
+    return path_export+symm_dir+'interfaces/'
+
+
+def export_symm_unclassified(f, path_export, filename, rotang, \
+                             clash_postfix, roll_clash_postfix, \
+                             sheetintermol_infix):
+    '''
+    Export coord file with unique axis of rotational symmetry, but without
+    classified rotational symmetry.
+    '''
+    create_export_dirs(path_export, 'symm_unclassified/')
+
+    rotang_infix = '_'+str(round(min(rotang)))+'-'+str(round(max(rotang)))
+
+    shutil.copyfile(f, path_export+'symm_unclassified/'+ \
+                    filename[:-4]+rotang_infix+'.pdb')
+    shutil.copyfile(f, path_export+'symm_unclassified/clashes/'+ \
+                    filename[:-4]+rotang_infix+clash_postfix+'.pdb')
+
+    write_marker(path_export+'symm_unclassified/clashes/'+ \
+                 filename[:-4]+rotang_infix+roll_clash_postfix+'.txt')
+    write_marker(path_export+'symm_unclassified/sheetintermol/'+ \
+                 filename[:-4]+sheetintermol_infix+'.txt')
+
+    metadata_db.update(path_export+metadata_db.db_filename, \
+                       'models', filename[:-4], \
+                       { 'symm_order': -1, \
+                         'symm_dir': 'symm_unclassified' })
+
+    return
+
+
+def export_metadata(path_export, filename, species, gene, clash_postfix, \
+                    roll_clash_postfix, sheetintermol_infix):
+    '''
+    Export metadata of a prepared model to the metadata database in the
+    export directory.
+
+    The values are parsed from the same infixes that are used for the
+    metadata file names, so both sources are consistent. Species and gene
+    are given by the caller (configuration of 5_analyze_predictions), they
+    are not stored if empty.
+    '''
+    prediction_scenario = metadata.get_prediction_scenario(path_export[:-1])
+
+    rank = -1
+    if 'rank' in filename:
+        try:
+            rank = metadata.get_rank(filename)
+        except ValueError:
+            pass
+
+    fraction_minlen, fraction, betasheet_res_n = metadata. \
+                        parse_intermol_betasheets(sheetintermol_infix+'.txt')
+
+    entry = { 'name': filename[:-4], \
+              'prediction_scenario': prediction_scenario, \
+              'rank': rank, \
+              'score': metadata.parse_score(filename[:-4]+clash_postfix+ \
+                                            '.pdb'), \
+              'clashes': metadata.parse_clashes(clash_postfix+'.pdb'), \
+              'roll_clashes': metadata.parse_roll_clashes(roll_clash_postfix), \
+              'sheetintermol_minlen': fraction_minlen, \
+              'sheetintermol_fraction': fraction, \
+              'betasheet_res_n': betasheet_res_n }
+
+    if species != '':
+        entry['species'] = species
+
+    if gene != '':
+        entry['gene'] = gene
+
+    metadata_db.write(path_export+metadata_db.db_filename, 'models', entry)
+
+    return
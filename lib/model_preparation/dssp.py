@@ -0,0 +1,245 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+'''
+Module providing the determination of beta ladders (DSSP algorithm of Kabsch
+and Sander, 1983) on atom coordinates (Atoms objects), independent of a
+ChimeraX session.
+'''
+
+hbond_energy_cutoff = -0.5 # kcal/mol, like "dssp" in ChimeraX
+ca_dist_max = 9.0 # max CA distance of hydrogen bonded residues
+
+
+def get_backbone(atoms):
+    '''
+    Get backbone coordinates of all residues with complete backbone.
+
+    Return:
+        dict with the arrays 'chainid', 'resid', 'resname', 'N', 'CA', 'C',
+        'O', 'H' (H: nan if no amide hydrogen) and 'prev_linked' (residue is
+        linked to the previous residue by a peptide bond)
+    '''
+    res_index = atoms.get_residue_index()
+    res_n = atoms.get_res_n()
+    starts = atoms.get_residue_starts()
+
+    bb = {}
+    complete = np.ones(res_n, dtype=bool)
+
+    for name in ['N', 'CA', 'C', 'O']:
+        xyz = np.full((res_n, 3), np.nan)
+        rows = np.nonzero(atoms.name == name)[0]
+        xyz[res_index[rows]] = atoms.xyz[rows]
+        complete &= ~np.isnan(xyz[:, 0])
+        bb[name] = xyz
+
+    for name in ['N', 'CA', 'C', 'O']:
+        bb[name] = bb[name][complete]
+
+    bb['chainid'] = atoms.chainid[starts][complete]
+    bb['resid'] = atoms.resid[starts][complete]
+    bb['resname'] = atoms.resname[starts][complete]
+
+    n = len(bb['resid'])
+    prev_linked = np.zeros(n, dtype=bool)
+
+    if n > 1:
+        d_cn = np.linalg.norm(bb['N'][1:]-bb['C'][:-1], axis=1)
+        prev_linked[1:] = (bb['chainid'][1:] == bb['chainid'][:-1]) & \
+                          (d_cn < 2.5)
+
+    bb['prev_linked'] = prev_linked
+
+    # amide hydrogen: N-H parallel to the C=O of the previous residue
+    h = np.full((n, 3), np.nan)
+
+    if n > 1:
+        co = bb['C'][:-1]-bb['O'][:-1]
+        co = co/np.linalg.norm(co, axis=1)[:, None]
+        h[1:] = bb['N'][1:]+co
+
+    has_h = prev_linked & (bb['resname'] != 'PRO')
+    h[~has_h] = np.nan
+    bb['H'] = h
+
+    return bb
+
+
+def get_hbonds(bb):
+    '''
+    Get backbone hydrogen bonds (electrostatic energy < hbond_energy_cutoff).
+
+    Return:
+        set of (i, j): hydrogen bond C=O(i) -> N-H(j)
+    '''
+    n = len(bb['resid'])
+
+    if n < 2:
+        return set()
+
+    pairs = cKDTree(bb['CA']).query_pairs(ca_dist_max, output_type='ndarray')
+    pairs = np.concatenate((pairs, pairs[:, ::-1]))
+        # both directions: acceptor i, donor j
+
+    i = pairs[:, 0]
+    j = pairs[:, 1]
+
+    valid = ~np.isnan(bb['H'][j, 0])
+    i = i[valid]
+    j = j[valid]
+
+    r_on = np.linalg.norm(bb['O'][i]-bb['N'][j], axis=1)
+    r_ch = np.linalg.norm(bb['C'][i]-bb['H'][j], axis=1)
+    r_oh = np.linalg.norm(bb['O'][i]-bb['H'][j], axis=1)
+    r_cn = np.linalg.norm(bb['C'][i]-bb['N'][j], axis=1)
+
+    energy = 0.084*332*(1/r_on+1/r_ch-1/r_oh-1/r_cn)
+    hbond = energy < hbond_energy_cutoff
+
+    return set(zip(i[hbond].tolist(), j[hbond].tolist()))
+
+
+def get_bridges(bb, hbonds):
+    '''
+    Get beta bridges.
+
+    Return:
+        list of (i, j, type) with i < j, type: 'parallel' or 'antiparallel'
+    '''
+    n = len(bb['resid'])
+    linked = bb['prev_linked']
+    bridges = []
+
+    def hb(a, b):
+        return (a, b) in hbonds
+
+    def inner(k):
+        # residue k has linked neighbors on both sides
+        return 0 < k < n-1 and linked[k] and linked[k+1]
+
+    candidates = set()
+    for a, b in hbonds:
+        for i in [a-1, a, a+1]:
+            for j in [b-1, b, b+1]:
+                if i < j:
+                    candidates.add((i, j))
+                elif j < i:
+                    candidates.add((j, i))
+
+    for i, j in sorted(candidates):
+        if not inner(i) or not inner(j):
+            continue
+
+        if bb['chainid'][i] == bb['chainid'][j] and j-i < 3:
+            continue
+
+        if (hb(i-1, j) and hb(j, i+1)) or (hb(j-1, i) and hb(i, j+1)):
+            bridges.append((i, j, 'parallel'))
+        elif (hb(i, j) and hb(j, i)) or (hb(i-1, j+1) and hb(j-1, i+1)):
+            bridges.append((i, j, 'antiparallel'))
+
+    return bridges
+
+
+def get_ladders(atoms, min_strand_len=3):
+    '''
+    Get beta ladders (consecutive bridges of the same type, connected over
+    beta bulges).
+
+    Ladders with a strand shorter than min_strand_len residues are skipped.
+
+    Return:
+        list of [chain0, begin0, end0, chain1, begin1, end1, type] with
+        residue ranges in ascending order
+    '''
+    bb = get_backbone(atoms)
+    bridges = get_bridges(bb, get_hbonds(bb))
+    linked = bb['prev_linked']
+
+    def connected(a, b):
+        # residues a <= b in one continuous chain segment
+        return a <= b and linked[a+1:b+1].all()
+
+    # consecutive bridges
+    # ~~~~~~~~~~~~~~~~~~~
+    ladders = [] # [type, i0, i1, j0, j1]
+
+    for i, j, t in bridges:
+        extended = False
+
+        for lad in ladders:
+            if lad[0] != t or lad[2] != i-1 or not connected(lad[2], i):
+                continue
+
+            if t == 'parallel' and lad[4] == j-1 and connected(lad[4], j):
+                lad[2] = i
+                lad[4] = j
+                extended = True
+            elif t == 'antiparallel' and lad[3] == j+1 and \
+                 connected(j, lad[3]):
+                lad[2] = i
+                lad[3] = j
+                extended = True
+
+            if extended:
+                break
+
+        if not extended:
+            ladders.append([t, i, i, j, j])
+
+
+    # connection of ladders over beta bulges (gap of max. 4 residues on one
+    # strand and max. 1 residue on the other strand)
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    merged = True
+
+    while merged:
+        merged = False
+
+        for a in range(0, len(ladders)):
+            for b in range(0, len(ladders)):
+                l0 = ladders[a]
+                l1 = ladders[b]
+
+                if a == b or l0[0] != l1[0]:
+                    continue
+
+                gap_i = l1[1]-l0[2]-1
+
+                if l0[0] == 'parallel':
+                    gap_j = l1[3]-l0[4]-1
+                    ok = connected(l0[4], l1[3])
+                else:
+                    gap_j = l0[3]-l1[4]-1
+                    ok = connected(l1[4], l0[3])
+
+                if gap_i < 0 or gap_j < 0 or not ok or \
+                   not connected(l0[2], l1[1]):
+                    continue
+
+                if (gap_i <= 4 and gap_j <= 1) or (gap_i <= 1 and gap_j <= 4):
+                    l0[1] = min(l0[1], l1[1])
+                    l0[2] = max(l0[2], l1[2])
+                    l0[3] = min(l0[3], l1[3])
+                    l0[4] = max(l0[4], l1[4])
+                    del ladders[b]
+                    merged = True
+                    break
+
+            if merged:
+                break
+
+    ladders_res = []
+
+    for t, i0, i1, j0, j1 in ladders:
+        if i1-i0+1 < min_strand_len or j1-j0+1 < min_strand_len:
+            continue
+
+        ladders_res.append([str(bb['chainid'][i0]), int(bb['resid'][i0]), \
+                            int(bb['resid'][i1]), \
+                            str(bb['chainid'][j0]), int(bb['resid'][j0]), \
+                            int(bb['resid'][j1]), t])
+
+    return ladders_res
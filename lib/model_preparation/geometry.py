@@ -1,8 +1,7 @@
-import chimerax_api
 import ctl
 import geometry
-import math
 import molmodel
+import rigid_body
 import statistics
 
 
@@ -13,16 +12,55 @@ Module providing gemetric functions for model preparation.
 def get_distances(points, a):
     ''' Get distance of point a to each point in list "points". '''
 
-    dist = []
-        
-    for c in points:
-        l = geometry.dist(c, a)
-        if l == 0:
-            l = 1000000
+    return get_distance_matrix([a], points)[0].tolist()
 
-        dist.append(l)
 
-    return dist
+def get_distance_matrix(points, points1=None):
+    '''
+    Get distance matrix between the points and points1 (default: points),
+    distance 0 (identical points) is replaced by 1000000.
+    '''
+    if points1 is None:
+        points1 = points
+
+    d = geometry.dists(points, points1)
+    d[d == 0] = 1000000
+
+    return d
+
+
+def get_ca_xyz(model_id, res_range, mult, sess):
+    '''
+    Get CA coordinates of the monomers (submodels 1..mult) of a model in the
+    residue range.
+
+    Only residues present in all monomers are used, so the rows of the
+    coordinate arrays are paired (like the residue pairing of the match
+    command for identical sequences).
+
+    Return:
+        list of coordinate arrays (n, 3), index 0: monomer 1
+    '''
+    resids = None
+
+    for i in range(1, mult+1):
+        resids_i = set([r for r in sess.resids((model_id, i)) \
+                        if res_range[0] <= r <= res_range[1]])
+
+        if resids == None:
+            resids = resids_i
+        else:
+            resids = resids & resids_i
+
+    resids = sorted(resids)
+
+    if len(resids) < 3:
+        ctl.e(model_id)
+        ctl.e(res_range)
+        ctl.error('get_ca_xyz: less than 3 common residues in residue range')
+
+    return [sess.get_xyz_many((model_id, i), resids) \
+            for i in range(1, mult+1)]
 
 
 def get_pairwise_rotation(model_id, model_id2, res_range, mult, sess):
@@ -31,9 +69,6 @@ def get_pairwise_rotation(model_id, model_id2, res_range, mult, sess):
 
     list of rotation axes, axis points, rotation angles.
     '''
-    res_start = res_range[0]
-    res_end = res_range[1]
-
 
     # calculate matrices with rotation axes, axis points, rotation angles
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -42,34 +77,34 @@ def get_pairwise_rotation(model_id, model_id2, res_range, mult, sess):
     rot_axis_point_mat = \
                     [[None for j in range(0, mult)] for i in range(0, mult)]
 
-    # model_id: model to use for movements caused by match command
-    # model_id2: reference model
-    for i in range(1, mult+1):
-        for j in range(1, mult+1):
-            if j >= i:
-                continue
-
-            # reset monomer of model_id to the original position
-            sess.run('match #'+str(model_id)+'.'+str(i)+':'+ \
-                     str(res_start)+'-'+str(res_end)+ \
-                     ' to #'+str(model_id2)+'.'+str(i))
+    xyz = get_ca_xyz(model_id, res_range, mult, sess)
+    xyz2 = get_ca_xyz(model_id2, res_range, mult, sess)
 
+    # model_id: model to use for movements caused by superposition
+    # model_id2: reference model
+    for i in range(2, mult+1):
+        # reset monomer of model_id to the original position
+        tf_reset = rigid_body.align_and_prune(xyz[i-1], xyz2[i-1])[0]
+        xyz_reset = rigid_body.apply(tf_reset, xyz[i-1])
+        pos_reset = rigid_body.multiply(tf_reset, \
+                                        sess.get_position((model_id, i)))
+
+        for j in range(1, i):
             # measure rotation axes, axis points, rotation angles
-            sess.run('match #'+str(model_id)+'.'+str(i)+':'+ \
-                     str(res_start)+'-'+str(res_end)+ \
-                     ' to #'+str(model_id2)+'.'+str(j))
-            re = sess.run('measure rotation #'+ \
-                          str(model_id)+'.'+str(i)+':'+ \
-                          str(res_start)+'-'+str(res_end)+ \
-                          ' toModel #'+ \
-                          str(model_id2)+'.'+str(j)+' showAxis false')
-
-            rotangle = re.rotation_angle()/math.pi*180
+            tf = rigid_body.align_and_prune(xyz_reset, xyz2[j-1])[0]
+            rotangle, rot_axis, rot_axis_point, transl = \
+                    rigid_body.describe(rigid_body.relative( \
+                        rigid_body.multiply(tf, pos_reset), \
+                        sess.get_position((model_id2, j))))
+
             rotang_mat[i-1][j-1] = rotangle
-            rot_axis_mat[i-1][j-1] = chimerax_api.get_rot_axis( \
-                                                re.description())
-            rot_axis_point_mat[i-1][j-1] = chimerax_api.get_rot_axis_point( \
-                                                re.description())
+            rot_axis_mat[i-1][j-1] = rot_axis
+            rot_axis_point_mat[i-1][j-1] = rot_axis_point
+
+        # monomer i of model_id ends up superimposed onto monomer i-1 of
+        # model_id2 (last superposition)
+        sess.transform_model((model_id, i), \
+                             rigid_body.multiply(tf, tf_reset))
 
     return rotang_mat, rot_axis_mat, rot_axis_point_mat
 
@@ -78,41 +113,35 @@ def get_nn_rotation(model_id, model_id2, res_range, mult, sess):
     '''
     Get the rotation of next neighbor monomers in relation to each other.
     '''
-    res_start = res_range[0]
-    res_end = res_range[1]
-
     rotang = []
     rot_axis = []
     rot_axis_point = []
 
+    xyz = get_ca_xyz(model_id, res_range, mult, sess)
+
     for i in range(mult, 1, -1):
-        sess.run('match #'+str(model_id)+'.'+str(i)+':'+ \
-                 str(res_start)+'-'+str(res_end)+ \
-                 ' to #'+str(model_id)+'.'+str(i-1))
-        re = sess.run('measure rotation #'+ \
-                      str(model_id)+'.'+str(i)+':'+ \
-                      str(res_start)+'-'+str(res_end)+ \
-                      ' toModel #'+ \
-                      str(model_id)+'.'+str(i-1)+' showAxis false')
-        rotangle = re.rotation_angle()/math.pi*180
+        tf = rigid_body.align_and_prune(xyz[i-1], xyz[i-2])[0]
+        sess.transform_model((model_id, i), tf)
+        xyz[i-1] = rigid_body.apply(tf, xyz[i-1])
+
+        rotangle, axis, axis_point, transl = \
+                        sess.measure_rotation((model_id, i), (model_id, i-1))
 
         rotang.append(rotangle)
-        rot_axis.append(chimerax_api.get_rot_axis(re.description()))
-        rot_axis_point.append(chimerax_api. \
-                              get_rot_axis_point(re.description()))
-
-    sess.run('match #'+str(model_id)+'.'+str(1)+':'+ \
-             str(res_start)+'-'+str(res_end)+ \
-             ' to #'+str(model_id2)+'.'+str(mult))
-    re = sess.run('measure rotation #'+ \
-             str(model_id)+'.'+str(1)+':'+ \
-             str(res_start)+'-'+str(res_end)+' toModel #'+ \
-             str(model_id2)+'.'+str(mult)+' showAxis false')
-
-    rotangle = re.rotation_angle()/math.pi*180
+        rot_axis.append(axis)
+        rot_axis_point.append(axis_point)
+
+    xyz2 = get_ca_xyz(model_id2, res_range, mult, sess)
+
+    tf = rigid_body.align_and_prune(xyz[0], xyz2[mult-1])[0]
+    sess.transform_model((model_id, 1), tf)
+
+    rotangle, axis, axis_point, transl = \
+                        sess.measure_rotation((model_id, 1), (model_id2, mult))
+
     rotang.append(rotangle)
-    rot_axis.append(chimerax_api.get_rot_axis(re.description()))
-    rot_axis_point.append(chimerax_api.get_rot_axis_point(re.description()))
+    rot_axis.append(axis)
+    rot_axis_point.append(axis_point)
 
     rmsd, mate_distances = molmodel.get_sibling_rmsd( \
                         (model_id, 1), (model_id2, mult), [res_range], sess)
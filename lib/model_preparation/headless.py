@@ -0,0 +1,616 @@
+import atoms
+import bibpdb
+import contacts
+import ctl
+import geometry
+import interface_matrix
+import interface_matrix_signed
+import model_preparation.betasheet
+import model_preparation.bib
+import model_preparation.chain_numbering
+import model_preparation.classification
+import model_preparation.clashes
+import model_preparation.dssp
+import model_preparation.rotsymm_ax
+import molmodel
+import rigid_body
+
+from model_preparation.rotsymm_ax import RotSymmAxes
+
+import numpy as np
+import os
+import params
+
+
+'''
+Module providing the model preparation of coord files without a ChimeraX
+session (headless).
+
+The coord files are processed as NumPy arrays (Atoms objects), the steps
+follow the model preparation in ChimeraX (module prepare_file) and write the
+same export directories, marker files and metadata database entries.
+ChimeraX commands are replaced as follows:
+    clashes: contacts.find_clashes
+    dssp: model_preparation.dssp.get_ladders
+    interfaces: contacts.get_interface_residues
+    match, align, measure rotation: rigid_body
+'''
+
+plane_ref_points = [[0, 0, 0], [100, 0, 0], [0, 100, 0]]
+        # orientation points of the xy plane (see bib.place_plane)
+
+
+def align_to_fasta(input_file, output_file, seq):
+    ''' Align residue ids of pdb file to given sequence. '''
+
+    model = atoms.read_pdb(input_file)
+
+    seq_model = model.get_seq(model.get_chainids()[0])
+    offset = seq.find(seq_model)
+
+    if offset == -1:
+        ctl.error('align_pdb_to_fasta: offset invalid')
+
+    if offset != 0:
+        # renumber residues, first residue of each chain: offset+1
+        for chainid in model.get_chainids():
+            chain = model.chainid == chainid
+            model.resid[chain] += offset+1-model.resid[chain][0]
+
+    model.write_pdb(output_file)
+
+    return
+
+
+def get_meta(f):
+    '''
+    Get basic parameter of a coord file (see bib.open_model).
+    '''
+    rmsds = bibpdb.get_rmsds(f)
+    termini = molmodel.get_termini(rmsds, termini_with_signalsequence=False)
+    multimer_n = bibpdb.get_multimer_n(f)
+
+    return [[], termini, multimer_n, [[], []]]
+
+
+def get_clash_resids(model):
+    '''
+    Get residue ids of all atoms involved in clashes.
+
+    Cysteines are skipped to avoid counting clashes caused by unrecognized
+    disulfide bonds.
+    '''
+    pairs, overlaps = contacts.find_clashes(model, model.resname != 'CYS')
+    clashing = contacts.get_clashing_atoms(pairs)
+
+    return [int(r) for r in model.resid[clashing]]
+
+
+def clashes_per_100_rolling(model, clash_resids, rolling_len, mult):
+    '''
+    Determine clashes per 100aa in a rolling range along the whole chain.
+    Return a filename infix with this information.
+    '''
+    resids = model.resids()
+
+    if resids[-1]-resids[0]+1 < rolling_len:
+        zero, rolling_max_per100 = model_preparation.clashes. \
+                        get_clash_infix(len(clash_resids), model.get_res_n())
+        rolling_max_centerresid = resids[0]+round((resids[-1]-resids[0])/2)
+
+        roll_clash_infix = model_preparation.clashes.get_roll_clash_infix( \
+                            rolling_max_per100, rolling_max_centerresid)
+    else:
+        roll_clash_infix, rolling_max_per100 = model_preparation.clashes. \
+                get_roll_clashes(clash_resids, resids, rolling_len, mult)
+
+    return roll_clash_infix, rolling_max_per100
+
+
+def intermolecular_betasheet_fraction(model, verbous):
+    '''
+    Determine fraction of beta sheet residues that is involved in
+    intermolecular sheets.
+    '''
+    ladders = model_preparation.dssp.get_ladders(model)
+    ladders_minlen = model_preparation.dssp.get_ladders(model, 5)
+
+    sheet_intermol_res, sheet_intramol_res = \
+                    model_preparation.betasheet.ladder_residues(ladders)
+    sheet_intermol_minlen_res, zero = \
+                    model_preparation.betasheet.ladder_residues(ladders_minlen)
+
+    return model_preparation.betasheet.get_sheetintermol_infix( \
+                        sheet_intermol_res, sheet_intramol_res, \
+                        sheet_intermol_minlen_res, verbous)
+
+
+def get_ca_xyz(model, res_range, chainids):
+    '''
+    Get CA coordinates of the given chains for the residues in the residue
+    range that are present in all chains.
+    '''
+    resids = None
+
+    for chainid in chainids:
+        resids_c = set([r for r in model.resids(chainid) \
+                        if res_range[0] <= r <= res_range[1]])
+
+        if resids == None:
+            resids = resids_c
+        else:
+            resids = resids & resids_c
+
+    resids = sorted(resids)
+
+    return [model.get_xyz_many(chainid, resids) for chainid in chainids]
+
+
+def model_to_plane(model, meta, mult):
+    ''' Align ">=2"-fold axis model to xy plane (see bib.model_to_plane). '''
+
+    center_res = round((meta[1][0]+meta[1][1])/2)
+    chainids = model.get_chainids()
+
+    if mult == 2:
+        # plane defined by the centers of both chains and the normal of the
+        # rotation axis of the 2-fold axis
+        xyz = get_ca_xyz(model, [-1, 100000], chainids[0:2])
+        rot_axis = rigid_body.axis_angle( \
+                        rigid_body.align_and_prune(xyz[1], xyz[0])[0])[0]
+
+        center0 = model.get_xyz_many(chainids[0], [center_res])[0]
+        center1 = model.get_xyz_many(chainids[1], [center_res])[0]
+        normal = np.cross(center1-center0, rot_axis)
+
+        points = [center0, center1, center0+normal]
+
+    elif mult >= 3:
+        points = [model.get_xyz_many(c, [center_res])[0] \
+                  for c in chainids[0:3]]
+
+    else:
+        return
+
+    model.transform(rigid_body.align_points(points, plane_ref_points)[0])
+
+    return
+
+
+def center_model(model, f, meta):
+    '''
+    Move model center (CA atoms in the termini range) to the z axis and
+    save model.
+
+    Return:
+        center before movement
+    '''
+    model.write_pdb(f)
+
+    cen = geometry.get_center(model, 'all', meta[1])
+
+    model.move([(-1)*cen[0], (-1)*cen[1], 0])
+    model.write_pdb(f)
+
+    return cen
+
+
+def get_interface_residues(model, monomer0, monomer1):
+    '''
+    Get interface residues between two monomers (1: first chain).
+
+    Return:
+        list of [(0, monomer), resid]
+    '''
+    chainids = model.get_chainids()
+
+    residues = contacts.get_interface_residues( \
+                    model.get_chain(chainids[monomer0-1]), \
+                    model.get_chain(chainids[monomer1-1]))
+
+    monomers = [monomer0, monomer1]
+
+    return [[(0, monomers[r[0]]), r[1]] for r in residues]
+
+
+def get_interface_coords(model, interface_res):
+    ''' Get CA coordinates of interface residues [(0, monomer), resid]. '''
+
+    chainids = model.get_chainids()
+
+    if len(interface_res) == 0:
+        return np.zeros((0, 3))
+
+    return np.vstack([model.get_xyz_many(chainids[r[0][1]-1], [r[1]]) \
+                      for r in interface_res])
+
+
+def get_nn_rotation(model, res_range, mult):
+    '''
+    Get the rotation of next neighbor monomers in relation to each other.
+    '''
+    rotang = []
+    rot_axis = []
+    rot_axis_point = []
+
+    chainids = model.get_chainids()
+    xyz = get_ca_xyz(model, res_range, chainids[0:mult])
+
+    for i in range(mult, 1, -1):
+        tf = rigid_body.align_and_prune(xyz[i-1], xyz[i-2])[0]
+        rotangle, axis, axis_point, transl = rigid_body.describe(tf)
+
+        rotang.append(rotangle)
+        rot_axis.append(axis)
+        rot_axis_point.append(axis_point)
+
+    tf = rigid_body.align_and_prune(xyz[0], xyz[mult-1])[0]
+    rotangle, axis, axis_point, transl = rigid_body.describe(tf)
+
+    rotang.append(rotangle)
+    rot_axis.append(axis)
+    rot_axis_point.append(axis_point)
+
+    # rmsd between superimposed first monomer and last monomer
+    resids0 = model.resids(chainids[0])
+
+    if resids0 != model.resids(chainids[mult-1]):
+        ctl.error('get_mate_rmsd: given models are no siblings.')
+
+    coords0 = rigid_body.apply(tf, model.get_xyz_many(chainids[0], resids0))
+    coords1 = model.get_xyz_many(chainids[mult-1], resids0)
+    dists = np.sqrt(np.sum((coords1-coords0)**2, axis=1))
+
+    mate_distances = {}
+
+    for resid, d in zip(resids0, dists):
+        mate_distances[resid] = float(d)
+
+    rmsd = float(np.sqrt(np.mean(dists**2)))
+
+    # rotang: list is in inverse order!
+    return rotang, rot_axis, rot_axis_point, rmsd, mate_distances
+
+
+def get_pairwise_rotation(model, res_range, mult):
+    '''
+    Get the rotation of the monomers in relation to each other.
+
+    list of rotation axes, axis points, rotation angles.
+    '''
+    rotang_mat = [[None for j in range(0, mult)] for i in range(0, mult)]
+    rot_axis_mat = [[None for j in range(0, mult)] for i in range(0, mult)]
+    rot_axis_point_mat = \
+                    [[None for j in range(0, mult)] for i in range(0, mult)]
+
+    xyz = get_ca_xyz(model, res_range, model.get_chainids()[0:mult])
+
+    for i in range(1, mult+1):
+        for j in range(1, i):
+            tf = rigid_body.align_and_prune(xyz[i-1], xyz[j-1])[0]
+            rotangle, axis, axis_point, transl = rigid_body.describe(tf)
+
+            rotang_mat[i-1][j-1] = rotangle
+            rot_axis_mat[i-1][j-1] = axis
+            rot_axis_point_mat[i-1][j-1] = axis_point
+
+    return rotang_mat, rot_axis_mat, rot_axis_point_mat
+
+
+def get_pairwise_interface_residues(model, chain_n):
+    '''
+    Get interface residues between the monomers in relation to each other.
+    '''
+    mat_interface_residues = \
+                [[None for j in range(0, chain_n)] for i in range(0, chain_n)]
+
+    for i in range(0, chain_n):
+        for j in range(0, i):
+            mat_interface_residues[i][j] = \
+                            get_interface_residues(model, i+1, j+1)
+
+    return mat_interface_residues
+
+
+def write_symplexes(rot_axes, f):
+    '''
+    Write (export) all SymPlexes to separate coord files
+    (see RotSymmAxes.write_symplexes).
+    '''
+    files_written = []
+
+    model = atoms.read_pdb(f)
+    chainids = model.get_chainids()
+
+    for ax in rot_axes.axes:
+        chains = np.isin(model.chainid, [chainids[c] for c in ax[1]])
+        filename_ = rot_axes.get_symplex_filename()
+
+        model.select(chains).write_pdb(rot_axes.path_export+filename_)
+        bibpdb.clean_pdb(rot_axes.path_export+filename_)
+        files_written.append(rot_axes.path_export+filename_)
+
+    return files_written
+
+
+def export_interface_matrices(model, mol_count, mate_distances, f, \
+                              path_interfaces, filename):
+    '''
+    Calculate and export interface matrix and signed interface matrix.
+    '''
+
+    # calculate and export non-zero interface matrix elements for the first
+    # two monomers in the SymPlex candidate
+    # --------------------------------------------------------------------
+    interface_residues = get_interface_residues(model, 1, 2)
+
+    interface_mat = interface_matrix.create_from_coords( \
+                            [r[1] for r in interface_residues], \
+                            get_interface_coords(model, interface_residues), \
+                            mate_distances)
+
+    fn = path_interfaces+filename[:-4]+'_interface.txt'
+    interface_matrix.export_to_txt(interface_mat, fn)
+
+
+    # calculate and export non-zero interface matrix (signed interface
+    # matrix) elements for monomer pairs in the SymPlex candidate
+    # ----------------------------------------------------------------
+    rmsds = bibpdb.get_rmsds(f)
+    chainids = model.get_chainids()
+    interface_mat_signed = {}
+
+    monomer_pairs = [(m, m+1) for m in range(1, mol_count)]
+    if mol_count >= 3:
+        monomer_pairs.append((1, mol_count))
+
+    for monomer0, monomer1 in monomer_pairs:
+        interface_residues = molmodel.interface_residues_per_model( \
+                        get_interface_residues(model, monomer0, monomer1))
+
+        coords = {}
+        for model_id in interface_residues:
+            coords[model_id] = model.get_xyz_many(chainids[model_id[1]-1], \
+                                                  interface_residues[model_id])
+
+        interface_mat_signed.update(interface_matrix_signed. \
+                    create_from_coords(interface_residues, coords, rmsds))
+
+    fn = path_interfaces+filename[:-4]+'_interface_signed.txt'
+    interface_matrix_signed.export_to_txt(interface_mat_signed, fn)
+
+    return
+
+
+def prepare_file(f0, seq, path_export, verbous=False, iteration=0, \
+                 species='', gene=''):
+    '''
+    Prepare a single coord file.
+
+    species, gene: stored in the metadata database
+    '''
+    f = f0
+    filename = f.split('/')[-1]
+    ctl.d(filename)
+
+
+    # get type of microorganism (bacteria, virus)
+    microorganism_type = 0 # 0: bacteria and archaea, 1: virus
+
+    if 'virus' in f:
+        microorganism_type = 1
+
+
+    align_to_fasta(f, path_export+filename, seq)
+    f = path_export+filename
+
+    symmaxis = True # unique axis of rotational symmetry found
+
+
+    # preprocessing of pdb input file
+    model_preparation.chain_numbering.realign_chain_ids(f0, f, f)
+
+    model = atoms.read_pdb(f)
+    meta = get_meta(f)
+
+    # continue if whole model disordered (large rmsds)
+    if meta[1][0] == -1 or meta[1][1] == 10000:
+        return
+
+    mol_count = model_preparation.classification.get_mol_count( \
+                                    model.resids(), model.get_res_n(), f)
+
+    # continue if not at least 2 chains
+    if mol_count <= 1:
+        return
+
+
+    # get clashes per 100aa in a rolling range of 200aa along the whole
+    # chain and clashes per 100aa
+    clash_resids = get_clash_resids(model)
+
+    roll_clash_postfix, zero = clashes_per_100_rolling( \
+                                        model, clash_resids, 200, mol_count)
+    clash_postfix, zero = model_preparation.clashes.get_clash_infix( \
+                                        len(clash_resids), model.get_res_n())
+
+
+    # check if parts of the protein chain run through the sphere of a
+    # wrong monomer
+    #
+    # This check evaluates the fraction of residues involved in medium-length
+    # intermolecular beta sheet strands.
+    sheetintermol_infix, zero, zero = \
+                            intermolecular_betasheet_fraction(model, verbous)
+
+
+    # alignment of whole model to xy plane
+    # ------------------------------------
+    model_to_plane(model, meta, mol_count)
+    cen = center_model(model, f, meta)
+
+    if cen[2] > 0:
+        # turn by 180 degrees around x axis
+        model.transform(np.array([[1, 0, 0, 0], [0, -1, 0, 0], \
+                                  [0, 0, -1, 0]], dtype=float))
+        cen = center_model(model, f, meta)
+
+
+    # counterclockwise renaming of chain ids
+    # --------------------------------------
+    if mol_count >= 3:
+        symmaxis = model_preparation.chain_numbering. \
+                            order_counterclockwise(f, meta, mol_count)
+
+    ctl.d(mol_count)
+    ctl.d(symmaxis)
+
+
+    model_preparation.classification.export_clashes( \
+                path_export, filename, clash_postfix, roll_clash_postfix)
+    model_preparation.classification.export_metadata( \
+                path_export, filename, species, gene, clash_postfix, \
+                roll_clash_postfix, sheetintermol_infix)
+
+
+    # determination of the symmetry of SymPlex candidate
+    # ==================================================
+
+    # determination  of rotation angles between all monomers in the
+    # SymPlex candidate
+    # ------------------------------------------------------------------
+    # Rotation angles are determined by superposition of the interfaces.
+    model = atoms.read_pdb(f)
+
+    interface_residues = get_interface_residues(model, 1, 2)
+    interface_res_range = model_preparation.classification. \
+                        get_interface_res_range(interface_residues, meta[1])
+
+    rotang, rot_axis, rot_axis_point, rmsd, mate_distances = \
+                    get_nn_rotation(model, interface_res_range, mol_count)
+
+    rot_axes_point_average, uniqueness = \
+            model_preparation.rotsymm_ax.check_uniqueness( \
+                                    rot_axis_point, rot_axis, f, \
+                                    True if mol_count >= 3 else False)
+
+    if mol_count >= 3:
+        if uniqueness == False:
+            ctl.d('no unique rotation symmetry axis')
+            model_preparation.classification.write_marker( \
+                                            f+'_no_unique_rot_axis.txt')
+            symmaxis = False
+
+    ctl.d(rotang)
+    ctl.d(rot_axis)
+    ctl.d(rot_axis_point)
+
+
+    # determination of rotation angles
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    if not symmaxis:
+        # no unique axis of rotational symmetry found
+
+        rotang_mat, rot_axis_mat, rot_axis_point_mat = \
+                get_pairwise_rotation(model, interface_res_range, mol_count)
+
+        if verbous:
+            ctl.p('rotang_mat')
+            ctl.p(rotang_mat)
+            ctl.p('rot_axis_point_mat')
+            ctl.p(rot_axis_point_mat)
+
+        model_preparation.classification.export_no_symm( \
+                f, path_export, filename, clash_postfix, \
+                roll_clash_postfix, sheetintermol_infix)
+
+        if mol_count > 2 and microorganism_type == 1 and iteration == 0:
+
+            # determine interface residues to avoid processing of oligomers
+            # w/o contact
+            interface_res_mat = get_pairwise_interface_residues( \
+                                                        model, mol_count)
+
+            # determination of rotational symmetry axes
+            rot_axes = RotSymmAxes(rot_axis_point_mat, rotang_mat, \
+                                   interface_res_mat)
+            rot_axes.path_export = path_export
+            rot_axes.path = f
+            rot_axes.filename = filename
+            rot_axes.coinciding_axes()
+
+            # export all SymPlexes in coord file f to separate coord files
+            files_written = write_symplexes(rot_axes, f)
+
+            for file in files_written:
+                prepare_file(file, seq, path_export, False, iteration+1, \
+                             species, gene)
+
+    else:
+        # unique axis of rotational symmetry found
+
+        model_preparation.classification.export_rmsd( \
+                                                path_export, filename, rmsd)
+
+        model.move([(-1)*rot_axes_point_average[0], \
+                    (-1)*rot_axes_point_average[1], \
+                    0])
+        model.write_pdb(f)
+        bibpdb.clean_pdb(f)
+
+        multiplicities = params.get_multiplicities(path_export+'../', \
+                                                   microorganism_type)
+
+        multiplicity, symm_ang_infix, rotang_cleaned = \
+                model_preparation.classification.get_symmetry( \
+                                    rotang, mol_count, multiplicities)
+
+        if multiplicity != None:
+            path_interfaces = model_preparation.classification. \
+                    export_symm(f, path_export, filename, multiplicity, \
+                                symm_ang_infix, rotang_cleaned, \
+                                clash_postfix, roll_clash_postfix, \
+                                sheetintermol_infix)
+
+            export_interface_matrices(model, mol_count, mate_distances, f, \
+                                      path_interfaces, filename)
+
+        else:
+            model_preparation.classification.export_symm_unclassified( \
+                    f, path_export, filename, rotang, clash_postfix, \
+                    roll_clash_postfix, sheetintermol_infix)
+
+    return
+
+
+def analyze(prediction_dir, species='', gene=''):
+    '''
+    Preprocessing of predicted SymPlex (Symmetric Protein Complexes)
+    candidate models without ChimeraX session
+    (see model_preparation.analyze_prediction_dir.analyze).
+    '''
+    path_export_postfix_running = '_running'
+                # postfix for temporary name of export folder during runtime
+
+    path_export, fasta_path, gene_id = model_preparation.bib. \
+                get_export_path(prediction_dir, path_export_postfix_running)
+    files = model_preparation.bib.get_input_files(prediction_dir)
+
+    try:
+        os.mkdir(path_export)
+    except IOError:
+        pass
+
+    seq = model_preparation.bib.get_seq(prediction_dir, fasta_path, gene_id)
+
+
+    # iterate through all model input files.
+    for f0 in files:
+        prepare_file(f0, seq, path_export, species=species, gene=gene)
+
+
+    # rename export folder after completion
+    os.rename(path_export, \
+              path_export.replace(path_export_postfix_running, ''))
+
+    return
@@ -0,0 +1,306 @@
+import ctl
+import filesystem
+import metadata_db
+import model_preparation.bib
+import model_preparation.headless
+import scheduler
+
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import traceback
+
+
+'''
+Module providing the parallel model preparation of prediction directories
+(5_analyze_predictions).
+
+The coord files of all prediction directories are distributed as jobs to a
+pool of worker processes, either processes of the headless engine
+(model_preparation.headless) or headless ChimeraX instances
+(scheduler.start_workers, model_preparation.analyze_prediction_dir.
+analyze_jobs). Each worker exports to its own temporary export directory
+(export directory with postfix '_running_w<worker>'). When all files of a
+prediction directory are processed, the worker directories are merged into
+the temporary export directory ('_running' postfix), which is renamed to the
+export directory (*_o/, *_or/) in one step.
+'''
+
+path_export_postfix_running = '_running'
+        # postfix for temporary name of export folder during runtime
+
+
+def get_export_path(prediction_dir, worker_id=None):
+    '''
+    Get temporary export path of a prediction directory during runtime,
+    of a worker if worker_id is given.
+    '''
+    postfix = path_export_postfix_running
+
+    if worker_id != None:
+        postfix += '_w'+str(worker_id)
+
+    path_export, fasta_path, gene_id = model_preparation.bib. \
+                                get_export_path(prediction_dir, postfix)
+
+    return path_export
+
+
+def get_jobs(prediction_dirs, species='', gene=''):
+    '''
+    Get jobs (one job for each coord file) of prediction directories.
+
+    Return:
+        list of dicts with 'key', 'prediction_dir', 'file', 'seq',
+        'species', 'gene'
+    '''
+    jobs = []
+
+    for prediction_dir in prediction_dirs:
+        path_export, fasta_path, gene_id = model_preparation.bib. \
+                                    get_export_path(prediction_dir, '')
+        seq = model_preparation.bib.get_seq(prediction_dir, fasta_path, \
+                                            gene_id)
+
+        for f0 in model_preparation.bib.get_input_files(prediction_dir):
+            jobs.append({ 'key': path_export.split('/')[-2]+'__'+ \
+                                 f0.split('/')[-1][:-4], \
+                          'prediction_dir': prediction_dir, \
+                          'file': f0, \
+                          'seq': seq, \
+                          'species': species, \
+                          'gene': gene })
+
+    return jobs
+
+
+def write_done(lock_dir, job, success, error, duration):
+    ''' Write marker of a processed job (read by Progress.poll). '''
+
+    f = open(lock_dir+job['key']+'.done.tmp', 'w')
+    json.dump({ 'success': success, 'error': error, \
+                'duration': duration }, f)
+    f.close()
+
+    os.replace(lock_dir+job['key']+'.done.tmp', lock_dir+job['key']+'.done')
+
+    return
+
+
+def run_job_headless(job):
+    '''
+    Prepare the coord file of a job with the headless engine in the worker
+    directory of the process, errors are reported and do not stop the other
+    workers.
+
+    Return:
+        job, success, error message, duration
+    '''
+    time_start = time.time()
+
+    try:
+        path_export = get_export_path(job['prediction_dir'], os.getpid())
+        filesystem.create_folder([path_export])
+
+        model_preparation.headless.prepare_file(job['file'], job['seq'], \
+                path_export, species=job['species'], gene=job['gene'])
+    except Exception:
+        return job, False, traceback.format_exc(), time.time()-time_start
+    finally:
+        metadata_db.close()
+
+    return job, True, '', time.time()-time_start
+
+
+def merge(prediction_dir):
+    '''
+    Merge worker directories of a prediction directory into the export
+    directory (files are moved, metadata databases are merged) and rename
+    the export directory after completion.
+    '''
+    path_export = get_export_path(prediction_dir)
+    worker_paths = sorted(glob.glob(path_export[:-1]+'_w*/'))
+
+    filesystem.create_folder([path_export])
+
+    for worker_path in worker_paths:
+        for root, dirs, files in os.walk(worker_path):
+            path_rel = os.path.relpath(root, worker_path)
+
+            for d in dirs:
+                os.makedirs(os.path.join(path_export, path_rel, d), \
+                            exist_ok=True)
+
+            for fn in files:
+                src = os.path.join(root, fn)
+                dst = os.path.normpath(os.path.join(path_export, path_rel, fn))
+
+                if fn == metadata_db.db_filename:
+                    metadata_db.merge(dst, src)
+                else:
+                    os.replace(src, dst)
+
+        shutil.rmtree(worker_path)
+
+    metadata_db.close()
+
+    os.rename(path_export, \
+              path_export.replace(path_export_postfix_running, ''))
+
+    return
+
+
+def format_time(seconds):
+    ''' Format duration as h:mm:ss. '''
+
+    seconds = int(seconds)
+
+    return '%d:%02d:%02d' % (seconds//3600, seconds%3600//60, seconds%60)
+
+
+class Progress():
+    '''
+    This class describes the progress of the parallel model preparation:
+    processed jobs, completed prediction directories and estimated remaining
+    time. A prediction directory is merged (merge) as soon as all its jobs
+    are processed successfully.
+    '''
+
+
+    def __init__(self, jobs, lock_dir=''):
+        '''
+        Initialization of the Progress class.
+
+        lock_dir: directory with the markers of processed jobs (write_done),
+                  jobs of headless ChimeraX instances
+        '''
+        self.jobs = {job['key']: job for job in jobs}
+        self.lock_dir = lock_dir
+        self.processed = set() # keys of processed jobs
+        self.failed = [] # prediction directories with failed jobs
+        self.jobs_open = {} # prediction directory: number of open jobs
+        self.dirs_completed = 0
+        self.time_start = time.time()
+
+        for job in jobs:
+            d = job['prediction_dir']
+            self.jobs_open[d] = self.jobs_open.get(d, 0)+1
+
+        return
+
+
+    def update(self, job, success, error, duration):
+        ''' Record a processed job. '''
+
+        self.processed.add(job['key'])
+        prediction_dir = job['prediction_dir']
+
+        if not success:
+            ctl.p('FAILED ('+str(round(duration, 1))+' s): '+job['file'])
+            ctl.p(error)
+
+            if prediction_dir not in self.failed:
+                self.failed.append(prediction_dir)
+
+        self.jobs_open[prediction_dir] -= 1
+
+        if self.jobs_open[prediction_dir] == 0:
+            if prediction_dir in self.failed:
+                ctl.p('not merged (failed jobs): '+prediction_dir)
+            else:
+                merge(prediction_dir)
+                self.dirs_completed += 1
+
+        self.report()
+
+        return
+
+
+    def report(self):
+        ''' Print progress with estimated remaining time. '''
+
+        processed_n = len(self.processed)
+        elapsed = time.time()-self.time_start
+        remaining = elapsed/max(1, processed_n)*(len(self.jobs)-processed_n)
+
+        ctl.p(str(processed_n)+'/'+str(len(self.jobs))+' files, '+ \
+              str(self.dirs_completed)+'/'+str(len(self.jobs_open))+ \
+              ' directories, elapsed '+format_time(elapsed)+ \
+              ', remaining '+format_time(remaining))
+
+        return
+
+
+    def poll(self):
+        ''' Record jobs processed by other processes (write_done). '''
+
+        for key in self.jobs:
+            if key in self.processed or \
+               not os.path.exists(self.lock_dir+key+'.done'):
+                continue
+
+            f = open(self.lock_dir+key+'.done', 'r')
+            done = json.load(f)
+            f.close()
+
+            self.update(self.jobs[key], done['success'], done['error'], \
+                        done['duration'])
+
+        return
+
+
+def analyze(prediction_dirs, workers_n, engine=1, lock_dir='', \
+            script_path='', chimerax_exe='chimerax', species='', gene=''):
+    '''
+    Parallel preprocessing of the predicted SymPlex candidate models of
+    prediction directories (see model_preparation.analyze_prediction_dir.
+    analyze).
+
+    engine: 0: headless ChimeraX instances running script_path (worker
+               processes, see scheduler.start_workers),
+            1: headless engine (model_preparation.headless)
+    lock_dir: directory for job list, lock files and markers of processed
+              jobs, files of a previous run are removed
+    species, gene: stored in the metadata database
+
+    Return:
+        list of prediction directories not completed
+    '''
+    jobs = get_jobs(prediction_dirs, species, gene)
+
+    ctl.p(str(len(jobs))+' files in '+str(len(prediction_dirs))+ \
+          ' prediction directories, '+str(workers_n)+' workers')
+
+    if lock_dir != '':
+        shutil.rmtree(lock_dir, ignore_errors=True)
+        filesystem.create_folder([lock_dir])
+
+    progress = Progress(jobs, lock_dir)
+
+    # prediction directories without coord files
+    for prediction_dir in prediction_dirs:
+        if prediction_dir not in progress.jobs_open:
+            merge(prediction_dir)
+
+    if engine == 1:
+        with multiprocessing.Pool(workers_n) as pool:
+            for job, success, error, duration in \
+                    pool.imap_unordered(run_job_headless, jobs):
+                progress.update(job, success, error, duration)
+
+    else:
+        jobs_path = lock_dir+'jobs_'+str(os.getpid())+'.json'
+        scheduler.export_jobs(jobs, jobs_path)
+        scheduler.start_workers(script_path, jobs_path, workers_n, \
+                                chimerax_exe, progress.poll)
+
+    not_completed = [d for d in progress.jobs_open \
+                     if progress.jobs_open[d] > 0 or d in progress.failed]
+
+    for prediction_dir in not_completed:
+        ctl.p('not completed: '+prediction_dir)
+
+    return not_completed
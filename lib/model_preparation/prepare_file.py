@@ -1,3 +1,4 @@
+import atoms
 import ctl
 import bib
 import bibpdb
@@ -5,6 +6,7 @@ import geometry
 import interface_matrix
 import interface_matrix_signed
 import model_preparation.betasheet
+import model_preparation.classification
 import model_preparation.clashes
 import model_preparation.chain_numbering
 import model_preparation.pdb
@@ -12,18 +14,19 @@ import model_preparation.rotsymm_ax
 
 from model_preparation.rotsymm_ax import RotSymmAxes
 
-import os
 import params
-import shutil
 
 
 '''
 Module providing functions for model preparation of a single coord file.
 '''
 
-def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
+def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0, \
+                 species='', gene=''):
     '''
     Prepare a single coord file.
+
+    species, gene: stored in the metadata database
     '''
     f = f0
     filename = f.split('/')[-1]
@@ -66,20 +69,8 @@ def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
     # determination of number of chains in 2 ways and check for agreement
     resids = sess.resids(current_model_id)
     res_n = sess.get_res_n((current_model_id,))
-    mol_count = res_n/(resids[-1]-resids[0]+1)
-
-    if mol_count%1 > 0.001:
-        ctl.e(mol_count)
-        ctl.error('unclear number of chains')
-    else:
-        mol_count = int(mol_count)
-
-    mol_count2 = bib.get_multimer_n(f)
-
-    if mol_count != mol_count2:
-        ctl.e(mol_count)
-        ctl.e(mol_count2)
-        ctl.error('unclear number of chains')
+    mol_count = model_preparation.classification.get_mol_count( \
+                                                        resids, res_n, f)
 
     # continue if not at least 2 chains
     if mol_count <= 1:
@@ -113,8 +104,8 @@ def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
     bib.model_to_plane(meta, current_model_id, sess)
     sess.save_model_id(current_model_id, f)
 
-    coord = bibpdb.open_pdb(f, False)
-    cen = geometry.get_center(coord, 'all', meta[current_model_id][1])
+    cen = geometry.get_center(atoms.get_atom_table(f), 'all', \
+                              meta[current_model_id][1])
 
     sess.move_model(current_model_id, [(-1)*cen[0], (-1)*cen[1], 0])
     sess.save_model_id(current_model_id, f)
@@ -127,8 +118,8 @@ def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
                 sess, f, current_model_id, meta, 1, \
                 termini_with_signalsequence=False)
          
-        coord = bibpdb.open_pdb(f, False)
-        cen = geometry.get_center(coord, 'all', meta[current_model_id][1])
+        cen = geometry.get_center(atoms.get_atom_table(f), 'all', \
+                                  meta[current_model_id][1])
         sess.move_model(current_model_id, [(-1)*cen[0], (-1)*cen[1], 0])
         sess.save_model_id(current_model_id, f)
 
@@ -138,65 +129,19 @@ def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
     # counterclockwise renaming of chain ids
     # --------------------------------------
     if mol_count >= 3:
-        coord = bibpdb.open_pdb(f, False)     
-        complexcenter = geometry.get_center(coord, 'all', \
-                                            meta[current_model_id][1])
-        order = model_preparation.chain_numbering. \
-                    determine_subchain_order(coord, meta[current_model_id], \
-                                             mol_count)
-
-        # reverse order of chain ids if orientation is not counterclockwise
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        if order == -1:
-            # preparation: flip order when clockwise
-            multimer_n = mol_count
-
-            order_flipped = []
-            for i in range(multimer_n-1, -1, -1):
-                order_flipped.append(i)
-
-            bibpdb.reorder_chainids(path_export+filename, order_flipped)
-
-
-        coord = bibpdb.open_pdb(f, False)
-        complexcenter = geometry.get_center(coord, 'all', \
-                                            meta[current_model_id][1])
-
-        order = model_preparation.chain_numbering. \
-                    determine_subchain_order(coord, meta[current_model_id], \
-                                             mol_count)
-
-        if order == -1:
-            ctl.d('order')
-            ctl.d(order)
-            ctl.d('still: order == -1, no symm axis detectable')
-            symmaxis = False
-
-        ctl.d('symmaxis')
-        ctl.d(symmaxis)     
+        symmaxis = model_preparation.chain_numbering. \
+                        order_counterclockwise(f, meta[current_model_id], \
+                                               mol_count)
 
-        if symmaxis:
-          ctl.d(order)
-          bibpdb.reorder_chainids(f, order)
-     
     ctl.d(mol_count)
     ctl.d(symmaxis)
 
 
-    try:
-        os.mkdir(path_export+'clashes/')
-    except IOError:
-        pass
-
-    f_cl = open(path_export+'clashes/'+ \
-                filename[:-4]+clash_postfix+'.pdb', 'w')
-    f_cl.write('')
-    f_cl.close()
-
-    f_rollcl = open(path_export+'clashes/'+ \
-                filename[:-4]+roll_clash_postfix+'.txt', 'w')
-    f_rollcl.write('')
-    f_rollcl.close()
+    model_preparation.classification.export_clashes( \
+                path_export, filename, clash_postfix, roll_clash_postfix)
+    model_preparation.classification.export_metadata( \
+                path_export, filename, species, gene, clash_postfix, \
+                roll_clash_postfix, sheetintermol_infix)
 
 
     # determination of the symmetry of SymPlex candidate
@@ -218,17 +163,9 @@ def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     interface_residues = sess.get_interface_residues( \
                             (current_model_id, 1), (current_model_id, 2))
-
-    interface_residues = sorted([r[1] for r in interface_residues])
-
-    if len(interface_residues) < 1:
-        interface_res_range = meta[current_model_id][1]
-    else:
-        interface_res_range = [interface_residues[0], \
-                               interface_residues[-1]]
-
-        if interface_res_range[1]-interface_res_range[0] < 5:
-            interface_res_range = meta[current_model_id][1]
+    interface_res_range = model_preparation.classification. \
+                get_interface_res_range(interface_residues, \
+                                        meta[current_model_id][1])
 
 
     rotang, rot_axis, rot_axis_point, rmsd, mate_distances = \
@@ -279,33 +216,9 @@ def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
             ctl.p('rot_axis_point_mat')
             ctl.p(rot_axis_point_mat)
 
-        try:
-            os.mkdir(path_export+'no_symm_found/')
-        except IOError:
-            pass
-        try:
-            os.mkdir(path_export+'no_symm_found/clashes/')
-        except IOError:
-            pass       
-        try:
-            os.mkdir(path_export+'no_symm_found/sheetintermol/')
-        except IOError:
-            pass
-
-        shutil.copyfile(f, path_export+'no_symm_found/'+filename)
-        shutil.copyfile(f, path_export+'no_symm_found/clashes/'+ \
-                        filename[:-4]+clash_postfix+'.pdb')
-
-        f_rollcl = open(path_export+'no_symm_found/clashes/'+ \
-                        filename[:-4]+roll_clash_postfix+'.txt', 'w')
-        f_rollcl.write('')
-        f_rollcl.close()
-
-        f_cl = open(path_export+'no_symm_found/sheetintermol/'+ \
-                    filename[:-4]+sheetintermol_infix+'.txt', \
-                    'w')
-        f_cl.write('')
-        f_cl.close()
+        model_preparation.classification.export_no_symm( \
+                f, path_export, filename, clash_postfix, \
+                roll_clash_postfix, sheetintermol_infix)
 
 
         if mol_count > 2 and microorganism_type == 1 and iteration == 0:
@@ -328,21 +241,16 @@ def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
             files_written = rot_axes.write_symplexes(current_model_id, sess)
 
             for file in files_written:
-                prepare_file(file, seq, path_export, sess, False, iteration+1)
+                prepare_file(file, seq, path_export, sess, False, \
+                             iteration+1, species, gene)
 
     else:
         # unique axis of rotational symmetry found
 
         # export of rmsd between two monomers in the SymPlex candidate
         # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        try:
-            os.mkdir(path_export+'interfaces/')
-        except IOError:
-            pass  
-
-        f_info = open(path_export+'interfaces/'+filename[:-4]+'_rmsd.txt', 'w')
-        f_info.write(str(rmsd))
-        f_info.close()
+        model_preparation.classification.export_rmsd( \
+                                                path_export, filename, rmsd)
 
         current_model_id, meta = bib.open_model( \
                                         sess, f, \
@@ -360,184 +268,73 @@ def prepare_file(f0, seq, path_export, sess, verbous=False, iteration=0):
             multiplicities = params.get_multiplicities(path_export+'../', \
                                                 microorganism_type)
 
-            symm_found = []
-
-            for multiplicity in multiplicities:
-                symm_ang = 360/multiplicity
-                symm_ang_infix = ('000'+str(round(symm_ang)))[-3:]
-
-                rotang_cleaned = model_preparation.geometry. \
-                                clean_rotang(rotang, multiplicity, mol_count)
-
-                d0 = 15
-                d1 = 15
-                if 5 in multiplicities:
-                    if multiplicity == 5:
-                        d0 = 6
-                        d1 = 9
-                    elif multiplicity == 6:
-                        d1 = 6
-                    elif multiplicity == 4:
-                        d0 = 9
-
-                if 7 in multiplicities:
-                    if multiplicity == 7:
-                        d1 = 4
-                    elif multiplicity == 6:
-                        d0 = 4
-
-                # rule out that e.g. 4mer results in 2fold axis
-                if mol_count <= multiplicity:
-                    if abs(max(rotang_cleaned)-symm_ang) < d0 and \
-                       abs(min(rotang_cleaned)-symm_ang) < d1:
-                        try:
-                            os.mkdir(path_export+'symm_'+symm_ang_infix+'/')
-                        except IOError:
-                            pass
-                        try:
-                            os.mkdir(path_export+'symm_'+symm_ang_infix+ \
-                                     '/clashes/')
-                        except IOError:
-                            pass
-                        try:
-                            os.mkdir(path_export+'symm_'+symm_ang_infix+ \
-                                     '/sheetintermol/')
-                        except IOError:
-                            pass
-
-                        shutil.copyfile(f, path_export+'symm_'+ \
-                                        symm_ang_infix+'/'+filename)
-                        f_cl = open(path_export+'symm_'+ \
-                                    symm_ang_infix+'/clashes/'+ \
-                                    filename[:-4]+clash_postfix+'.pdb', 'w')
-                        f_cl.write('')
-                        f_cl.close()
-                        
-                        rotang_postfix = '_rotang'+ \
-                                     str(round(min(rotang_cleaned))). \
-                                         replace('.', '-')+'_'+ \
-                                     str(round(max(rotang_cleaned))). \
-                                         replace('.', '-')
-                        f_cl = open(path_export+'symm_'+ \
-                                    symm_ang_infix+'/'+ \
-                                    filename[:-4]+rotang_postfix+'.txt', 'w')
-                        f_cl.write('')
-                        f_cl.close()
-
-                        f_cl = open(path_export+'symm_'+ \
-                                    symm_ang_infix+'/clashes/'+ \
-                                    filename[:-4]+roll_clash_postfix+'.txt', \
-                                    'w')
-                        f_cl.write('')
-                        f_cl.close()
-
-                        f_cl = open(path_export+'symm_'+ \
-                                    symm_ang_infix+'/sheetintermol/'+ \
-                                    filename[:-4]+sheetintermol_infix+'.txt', \
-                                    'w')
-                        f_cl.write('')
-                        f_cl.close()
-
-                        try:
-                            os.mkdir(path_export+'symm_'+symm_ang_infix+ \
-                                     '/interfaces/')
-                        except IOError:
-                            pass  
-
-
-                        # calculate and export non-zero interface
-                        # matrix elements for the first two monomers in the
-                        # SymPlex candidate
-                        # -------------------------------------------------
-                        current_model_id, meta = bib.open_model( \
-                                sess, f, current_model_id, meta, \
-                                termini_with_signalsequence=False)
-
-                        interface_residues = sess.get_interface_residues( \
-                                (current_model_id, 1), (current_model_id, 2))
-
-                        interface_mat = interface_matrix.create( \
-                                interface_residues, mate_distances, sess)
-
-                        fn = path_export+ \
-                                'symm_'+symm_ang_infix+'/interfaces/'+ \
-                                filename[:-4]+'_interface.txt'
-                        interface_matrix.export_to_txt(interface_mat, fn)
-
-
-                        # calculate and export non-zero interface
-                        # matrix (signed interface matrix) elements for
-                        # monomer pairs in the SymPlex candidate
-                        # ---------------------------------------------
-                        rmsds = bibpdb.get_rmsds(f)
-                        interface_mat_signed = {}
-
-                        for monomer0 in range(1, mol_count):
-                            interface_residues = sess.get_interface_residues( \
-                                (current_model_id, monomer0), \
-                                (current_model_id, monomer0+1))
-
-                            interface_mat_signed_ = interface_matrix_signed. \
-                                        create(interface_residues, rmsds, sess)
-
-                            interface_mat_signed.update(interface_mat_signed_)
-
-                        if mol_count >= 3:
-                            interface_residues = \
-                                sess.get_interface_residues( \
-                                (current_model_id, 1), \
-                                (current_model_id, mol_count))
-
-                            interface_mat_signed_ = interface_matrix_signed. \
-                                        create(interface_residues, rmsds, sess)
-
-                            interface_mat_signed.update(interface_mat_signed_)
-
-
-                        fn = path_export+ \
-                                'symm_'+symm_ang_infix+'/interfaces/'+ \
-                                filename[:-4]+'_interface_signed.txt'
-
-                        interface_matrix_signed.export_to_txt( \
-                                interface_mat_signed, fn)
-
-
-                        symm_found.append(multiplicity)
-                        break
-
-
-            if symm_found == []:
-                try:
-                    os.mkdir(path_export+'symm_unclassified/')
-                except IOError:
-                    pass
-                try:
-                    os.mkdir(path_export+'symm_unclassified/clashes/')
-                except IOError:
-                    pass            
-                try:
-                    os.mkdir(path_export+'symm_unclassified/sheetintermol/')
-                except IOError:
-                    pass
-
-                shutil.copyfile(f, path_export+'symm_unclassified/'+ \
-                        filename[:-4]+'_'+ \
-                        str(round(min(rotang)))+'-'+str(round(max(rotang)))+ \
-                        '.pdb')
-                shutil.copyfile(f, path_export+'symm_unclassified/clashes/'+ \
-                        filename[:-4]+'_'+ \
-                        str(round(min(rotang)))+'-'+str(round(max(rotang)))+ \
-                        clash_postfix+'.pdb')
-
-                f_rollcl = open(path_export+'symm_unclassified/clashes/'+ \
-                        filename[:-4]+'_'+ \
-                        str(round(min(rotang)))+'-'+str(round(max(rotang)))+ \
-                        roll_clash_postfix+'.txt', 'w')
-                f_rollcl.write('')
-                f_rollcl.close()
-
-                f_cl = open(path_export+'symm_unclassified/sheetintermol/'+ \
-                            filename[:-4]+sheetintermol_infix+'.txt', \
-                            'w')
-                f_cl.write('')
-                f_cl.close()
+            multiplicity, symm_ang_infix, rotang_cleaned = \
+                    model_preparation.classification.get_symmetry( \
+                                        rotang, mol_count, multiplicities)
+
+            if multiplicity != None:
+                path_interfaces = model_preparation.classification. \
+                        export_symm(f, path_export, filename, multiplicity, \
+                                    symm_ang_infix, rotang_cleaned, \
+                                    clash_postfix, roll_clash_postfix, \
+                                    sheetintermol_infix)
+
+
+                # calculate and export non-zero interface
+                # matrix elements for the first two monomers in the
+                # SymPlex candidate
+                # -------------------------------------------------
+                current_model_id, meta = bib.open_model( \
+                        sess, f, current_model_id, meta, \
+                        termini_with_signalsequence=False)
+
+                interface_residues = sess.get_interface_residues( \
+                        (current_model_id, 1), (current_model_id, 2))
+
+                interface_mat = interface_matrix.create( \
+                        interface_residues, mate_distances, sess)
+
+                fn = path_interfaces+filename[:-4]+'_interface.txt'
+                interface_matrix.export_to_txt(interface_mat, fn)
+
+
+                # calculate and export non-zero interface
+                # matrix (signed interface matrix) elements for
+                # monomer pairs in the SymPlex candidate
+                # ---------------------------------------------
+                rmsds = bibpdb.get_rmsds(f)
+                interface_mat_signed = {}
+
+                for monomer0 in range(1, mol_count):
+                    interface_residues = sess.get_interface_residues( \
+                        (current_model_id, monomer0), \
+                        (current_model_id, monomer0+1))
+
+                    interface_mat_signed_ = interface_matrix_signed. \
+                                create(interface_residues, rmsds, sess)
+
+                    interface_mat_signed.update(interface_mat_signed_)
+
+                if mol_count >= 3:
+                    interface_residues = \
+                        sess.get_interface_residues( \
+                        (current_model_id, 1), \
+                        (current_model_id, mol_count))
+
+                    interface_mat_signed_ = interface_matrix_signed. \
+                                create(interface_residues, rmsds, sess)
+
+                    interface_mat_signed.update(interface_mat_signed_)
+
+
+                fn = path_interfaces+filename[:-4]+'_interface_signed.txt'
+
+                interface_matrix_signed.export_to_txt( \
+                        interface_mat_signed, fn)
+
+            else:
+                model_preparation.classification.export_symm_unclassified( \
+                        f, path_export, filename, rotang, clash_postfix, \
+                        roll_clash_postfix, sheetintermol_infix)
+
+    return
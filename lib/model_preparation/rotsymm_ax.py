@@ -1,4 +1,3 @@
-import bib
 import bibpdb
 import ctl
 import geometry
@@ -55,16 +54,26 @@ class RotSymmAxes():
         return rank_max
 
 
+    def get_symplex_filename(self):
+        '''
+        Get filename for the export of the next SymPlex.
+        '''
+        number = max(self.get_infix_file_num_next()+1, 20)
+        filename_parts = self.filename.split('rank')
+        filename_ = filename_parts[0]+'rank'+('00'+str(number))[-2:]+ \
+                    filename_parts[1][2:]
+
+        return filename_
+
+
     def write_symplexes(self, current_model_id, sess):
         '''
         Write (export) all SymPlexes to separate coord files.
         '''
         files_written = []
 
-        meta = {} 
-        current_model_id, meta = bib.open_model(sess, self.path, \
-                                                current_model_id, meta)
-        number = 0
+        current_model_id = sess.open_model(self.path)[0]
+        sess.split_model(current_model_id)
 
         for ax in self.axes:
             model_ids = []
@@ -72,10 +81,7 @@ class RotSymmAxes():
             for chain_id in ax[1]:
                 model_ids.append((current_model_id, chain_id+1))
 
-            number = max(self.get_infix_file_num_next()+1, 20)
-            filename_parts = self.filename.split('rank')
-            filename_ = filename_parts[0]+'rank'+('00'+str(number))[-2:]+ \
-                        filename_parts[1][2:]
+            filename_ = self.get_symplex_filename()
 
             sess.save_model_ids(model_ids, self.path_export+filename_, 'pdb')
             bibpdb.clean_pdb(self.path_export+filename_)
@@ -114,21 +120,19 @@ class RotSymmAxes():
         assigned = False
 
         for ax in self.axes:
-            for ax_point in ax[0]:
-                d = geometry.dist(ax_point, point)
-
-                if d <= self.axis_maxdist:
-                    if assigned:
-                        ctl.error('RotSymmAxes: add_axis: '+ \
-                                  'double asignment of axis possible')
-
-                    ax[0].append(point)
-                    ax[1].append(chain_ids[0])
-                    ax[1].append(chain_ids[1])
-                    ax[1] = sorted(ax[1])
-                    ax[2].append(rotang)
-                    assigned = True
-                    break
+            d = geometry.dists(ax[0], point)[:, 0]
+
+            if (d <= self.axis_maxdist).any():
+                if assigned:
+                    ctl.error('RotSymmAxes: add_axis: '+ \
+                              'double asignment of axis possible')
+
+                ax[0].append(point)
+                ax[1].append(chain_ids[0])
+                ax[1].append(chain_ids[1])
+                ax[1] = sorted(ax[1])
+                ax[2].append(rotang)
+                assigned = True
 
         if not assigned:
             self.axes.append([[point], sorted([chain_ids[0], chain_ids[1]]), \
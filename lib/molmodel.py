@@ -1,7 +1,8 @@
 import ctl
-import geometry
 import math
 
+import numpy as np
+
 
 '''
 Module providing functions for handling and analyzing molecular models.
@@ -21,13 +22,13 @@ def get_sibling_rmsd(model_id0, model_id1, resranges, sess):
     if resids0 != resids1:
         ctl.error('get_mate_rmsd: given models are no siblings.')
 
-    for resid in resids0:
-        coords0 = sess.get_xyz(model_id0, resid)
-        coords1 = sess.get_xyz(model_id1, resid)
+    coords0 = sess.get_xyz_many(model_id0, resids0)
+    coords1 = sess.get_xyz_many(model_id1, resids0)
+    dists = np.sqrt(np.sum((coords1-coords0)**2, axis=1))
 
-        d = geometry.dist(coords0, coords1)
-        distances.append(d)
-        sibling_distances[resid] = d
+    for resid, d in zip(resids0, dists):
+        distances.append(float(d))
+        sibling_distances[resid] = float(d)
 
     distances_squared = [d**2 for d in distances]
     rmsd = math.sqrt(sum(distances_squared)/len(distances))
@@ -0,0 +1,237 @@
+import ctl
+
+import math
+import numpy as np
+
+
+'''
+Module providing rigid-body transforms with NumPy, independent of ChimeraX.
+
+A transform is a 3x4 matrix [R|t] (rotation matrix R, translation t) that
+maps coordinates x to R*x+t, like the position matrices of ChimeraX models.
+Rotation angles are given in degrees in the range [0, 180], the sign of the
+rotation is given by the direction of the rotation axis (ChimeraX
+convention).
+'''
+
+def identity():
+    ''' Get identity transform. '''
+
+    return np.hstack((np.identity(3), np.zeros((3, 1))))
+
+
+def translation(vect):
+    ''' Get transform of a translation. '''
+
+    return np.hstack((np.identity(3), np.asarray(vect, dtype=float). \
+                                                            reshape(3, 1)))
+
+
+def rotation(axis, angle, center=[0, 0, 0]):
+    '''
+    Get transform of a rotation by angle (degrees, right-handed) around an
+    axis through center (like chimerax.geometry.rotation).
+    '''
+    axis = np.asarray(axis, dtype=float)
+    axis = axis/np.linalg.norm(axis)
+    center = np.asarray(center, dtype=float)
+
+    a = math.radians(angle)
+    k = np.array([[       0, -axis[2],  axis[1]], \
+                  [ axis[2],        0, -axis[0]], \
+                  [-axis[1],  axis[0],        0]])
+    r = np.identity(3)+math.sin(a)*k+(1-math.cos(a))*(k @ k)
+
+    return np.hstack((r, (center-r @ center).reshape(3, 1)))
+
+
+def multiply(tf0, tf1):
+    ''' Get product tf0*tf1 (tf1 applied first). '''
+
+    r = tf0[:, :3] @ tf1[:, :3]
+    t = tf0[:, :3] @ tf1[:, 3]+tf0[:, 3]
+
+    return np.hstack((r, t.reshape(3, 1)))
+
+
+def inverse(tf):
+    ''' Get inverse transform. '''
+
+    r = tf[:, :3].T
+    t = -r @ tf[:, 3]
+
+    return np.hstack((r, t.reshape(3, 1)))
+
+
+def apply(tf, xyz):
+    ''' Apply transform to coordinates (n, 3). '''
+
+    xyz = np.asarray(xyz, dtype=float)
+
+    return xyz @ tf[:, :3].T+tf[:, 3]
+
+
+def align_points(xyz, ref_xyz):
+    '''
+    Get transform that superimposes xyz onto ref_xyz with minimal sum of
+    squared distances (quaternion method of Horn, 1987).
+
+    Return:
+        tf: transform
+        rms: root mean square deviation after superposition
+    '''
+    xyz = np.asarray(xyz, dtype=float)
+    ref_xyz = np.asarray(ref_xyz, dtype=float)
+
+    if len(xyz) != len(ref_xyz) or len(xyz) == 0:
+        ctl.e(len(xyz))
+        ctl.e(len(ref_xyz))
+        ctl.error('align_points: number of points differs or is 0')
+
+    center = xyz.mean(axis=0)
+    ref_center = ref_xyz.mean(axis=0)
+    a = xyz-center
+    b = ref_xyz-ref_center
+
+    s = a.T @ b # correlation matrix
+    sxx, sxy, sxz = s[0]
+    syx, syy, syz = s[1]
+    szx, szy, szz = s[2]
+
+    n = np.array([[sxx+syy+szz, syz-szy, szx-sxz, sxy-syx], \
+                  [syz-szy, sxx-syy-szz, sxy+syx, szx+sxz], \
+                  [szx-sxz, sxy+syx, -sxx+syy-szz, syz+szy], \
+                  [sxy-syx, szx+sxz, syz+szy, -sxx-syy+szz]])
+
+    eigenvalues, eigenvectors = np.linalg.eigh(n)
+    q0, q1, q2, q3 = eigenvectors[:, np.argmax(eigenvalues)]
+
+    r = np.array([[q0*q0+q1*q1-q2*q2-q3*q3, 2*(q1*q2-q0*q3), \
+                   2*(q1*q3+q0*q2)], \
+                  [2*(q1*q2+q0*q3), q0*q0-q1*q1+q2*q2-q3*q3, \
+                   2*(q2*q3-q0*q1)], \
+                  [2*(q1*q3-q0*q2), 2*(q2*q3+q0*q1), \
+                   q0*q0-q1*q1-q2*q2+q3*q3]])
+
+    t = ref_center-r @ center
+    tf = np.hstack((r, t.reshape(3, 1)))
+
+    d = apply(tf, xyz)-ref_xyz
+    rms = math.sqrt((d*d).sum()/len(xyz))
+
+    return tf, rms
+
+
+def align_and_prune(xyz, ref_xyz, cutoff_distance=2.0, indices=None):
+    '''
+    Superposition with iterative pruning of far point pairs, like the
+    "matchmaker" (match) command of ChimeraX: in each iteration, the pairs
+    with a distance > cutoff_distance are removed, but at most 10% of the
+    remaining pairs or half of the far pairs, whichever is fewer.
+
+    Return:
+        tf: transform
+        rms: root mean square deviation of the remaining pairs
+        indices: indices of the remaining pairs
+    '''
+    xyz = np.asarray(xyz, dtype=float)
+    ref_xyz = np.asarray(ref_xyz, dtype=float)
+
+    if indices is None:
+        indices = np.arange(len(xyz))
+
+    while True:
+        tf, rms = align_points(xyz[indices], ref_xyz[indices])
+
+        d = apply(tf, xyz[indices])-ref_xyz[indices]
+        d2 = (d*d).sum(axis=1)
+        cutoff2 = cutoff_distance*cutoff_distance
+        order = d2.argsort()
+
+        if d2[order[-1]] <= cutoff2:
+            break
+
+        index1 = int(len(d2)*0.9) # cull 10%
+        index2 = int(((d2 <= cutoff2).sum()+len(d2))/2)
+                # cull half of the far pairs
+        survivors = indices[order[:max(index1, index2)]]
+
+        if len(survivors) < 3:
+            ctl.e(len(survivors))
+            ctl.error('align_and_prune: less than 3 pairs remaining')
+
+        indices = survivors
+
+    return tf, rms, indices
+
+
+def axis_angle(tf):
+    '''
+    Get rotation axis (unit vector) and rotation angle (degrees, [0, 180])
+    of a transform.
+    '''
+    r = tf[:, :3]
+    axis = np.array([r[2, 1]-r[1, 2], r[0, 2]-r[2, 0], r[1, 0]-r[0, 1]])
+    sin2a = np.linalg.norm(axis)
+    cos2a = r[0, 0]+r[1, 1]+r[2, 2]-1
+    angle = math.atan2(sin2a, cos2a)
+
+    if sin2a < 1e-6:
+        if cos2a > 0:
+            # no rotation
+            return np.array([0.0, 0.0, 1.0]), 0.0
+
+        # rotation by 180 degrees: axis from column of R+I with largest norm
+        rp = r+np.identity(3)
+        i = np.argmax(np.linalg.norm(rp, axis=0))
+        axis = rp[:, i]
+        sin2a = np.linalg.norm(axis)
+
+    return axis/sin2a, math.degrees(angle)
+
+
+def axis_center_shift(tf):
+    '''
+    Get rotation axis, axis point (point on the axis closest to the origin)
+    and shift along the axis of a transform.
+    '''
+    axis, angle = axis_angle(tf)
+    t = tf[:, 3]
+    shift = float(np.dot(t, axis))
+
+    if angle == 0:
+        return axis, np.zeros(3), shift
+
+    tp = t-shift*axis
+            # translation perpendicular to axis
+    center = 0.5*tp+(0.5/math.tan(math.radians(angle)/2))*np.cross(axis, tp)
+
+    return axis, center, shift
+
+
+def describe(tf):
+    '''
+    Get rotation angle, rotation axis, axis point and translation vector of
+    a transform as provided in the description of the "measure rotation"
+    command of ChimeraX.
+
+    Return:
+        angle: rotation angle (degrees)
+        axis: rotation axis [x, y, z]
+        axis_point: point on rotation axis [x, y, z]
+        transl: translation vector [x, y, z]
+    '''
+    axis, axis_point, shift = axis_center_shift(tf)
+    angle = axis_angle(tf)[1]
+
+    return angle, [float(a) for a in axis], \
+           [float(p) for p in axis_point], [float(t) for t in tf[:, 3]]
+
+
+def relative(tf, tf_ref):
+    '''
+    Get transform of a model position (tf) relative to a reference model
+    position (tf_ref), like "measure rotation" in ChimeraX.
+    '''
+    return multiply(inverse(tf_ref), tf)
+
@@ -0,0 +1,397 @@
+import ctl
+import filesystem
+
+import json
+import os
+import shlex
+import socket
+import subprocess
+import threading
+import time
+
+
+'''
+Module providing functions to distribute jobs to parallel worker processes
+(headless ChimeraX instances).
+
+A lock file records the owner of a job (pid, host, time of the claim). The
+lock file is written to a file private to the process first and then hard
+linked to the lock path, so a lock file never exists without content. While
+the job is running, the modification time of the lock file is updated as
+heartbeat (Heartbeat). Locks of dead owners are stale and are reclaimed by
+the next process claiming the job.
+'''
+
+heartbeat_interval = 60 # s
+heartbeat_timeout = 7200 # s, owner on another host is dead without heartbeat
+poll_interval = 10 # s, see start_workers
+
+
+def get_lock_path(lock_dir, key):
+    ''' Get path of the lock file of a job. '''
+
+    return lock_dir+key+'.lock'
+
+
+def get_private_path(lock_path, infix=''):
+    ''' Get path of a file of a lock that is private to this process. '''
+
+    return lock_path+infix+'.'+socket.gethostname()+'.'+str(os.getpid())
+
+
+def get_owner():
+    ''' Get owner entry of the current process. '''
+
+    return { 'pid': os.getpid(), \
+             'host': socket.gethostname(), \
+             'time': time.time() }
+
+
+def is_own(owner):
+    ''' Check if an owner entry is the entry of the current process. '''
+
+    return owner != None and owner['pid'] == os.getpid() and \
+           owner['host'] == socket.gethostname()
+
+
+def read_owner(lock_path):
+    ''' Read owner entry of a lock file (None if not readable). '''
+
+    try:
+        f = open(lock_path, 'r')
+        owner = json.load(f)
+        f.close()
+    except (IOError, ValueError):
+        return None
+
+    return owner
+
+
+def get_file_id(path):
+    ''' Get (device, inode, modification time) of a file, None if missing. '''
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return st.st_dev, st.st_ino, st.st_mtime
+
+
+def owner_alive(owner, mtime=None):
+    '''
+    Check if the owner of a lock is alive. On the same host the process id is
+    checked, on other hosts the heartbeat (modification time mtime of the
+    lock file).
+
+    A lock file without readable owner entry is alive if it is younger than
+    heartbeat_interval (lock files of the previous format were written after
+    their creation).
+    '''
+    if owner == None:
+        return mtime != None and time.time()-mtime < heartbeat_interval
+
+    if owner['host'] == socket.gethostname():
+        try:
+            os.kill(owner['pid'], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+
+        return True
+
+    heartbeat = owner['time']
+
+    if mtime != None:
+        heartbeat = max(heartbeat, mtime)
+
+    return time.time()-heartbeat < heartbeat_timeout
+
+
+def lock_alive(lock_path):
+    ''' Check if a lock file exists and its owner is alive. '''
+
+    file_id = get_file_id(lock_path)
+
+    if file_id == None:
+        return False
+
+    return owner_alive(read_owner(lock_path), file_id[2])
+
+
+def job_running(lock_dir, key):
+    ''' Check if a job is claimed by a living process. '''
+
+    return lock_alive(get_lock_path(lock_dir, key))
+
+
+def reclaim(lock_path):
+    '''
+    Remove a stale lock file.
+
+    The lock file is renamed to a name unique for this process first, so only
+    one process removes it. If the renamed lock is not the stale lock file
+    that was checked (same inode, another process reclaimed it in the
+    meantime), it is restored.
+
+    Return:
+        bool: True if the stale lock was removed
+    '''
+    file_id = get_file_id(lock_path)
+
+    if file_id == None:
+        return True
+
+    if owner_alive(read_owner(lock_path), file_id[2]):
+        return False
+
+    stale_path = get_private_path(lock_path, '.stale')
+
+    try:
+        os.rename(lock_path, stale_path)
+    except FileNotFoundError:
+        return False
+
+    if get_file_id(stale_path)[0:2] != file_id[0:2]:
+        try:
+            os.link(stale_path, lock_path)
+        except FileExistsError:
+            pass
+
+        os.unlink(stale_path)
+
+        return False
+
+    os.unlink(stale_path)
+    ctl.p('stale lock reclaimed: '+lock_path)
+
+    return True
+
+
+def claim(lock_dir, key):
+    '''
+    Claim a job by atomic creation of a lock file.
+
+    The owner entry is written to a file private to this process, which is
+    hard linked to the lock path. The link fails if the lock file exists, so
+    exactly one process succeeds in claiming the job, also on shared file
+    systems with several nodes. A stale lock file (owner not alive) is
+    reclaimed.
+
+    Return:
+        bool: True if the job was claimed by this process
+    '''
+    filesystem.create_folder([lock_dir])
+    lock_path = get_lock_path(lock_dir, key)
+    private_path = get_private_path(lock_path)
+
+    f = open(private_path, 'w')
+    f.write(json.dumps(get_owner()))
+    f.close()
+
+    claimed = True
+
+    try:
+        os.link(private_path, lock_path)
+    except FileExistsError:
+        claimed = False
+
+        if reclaim(lock_path):
+            try:
+                os.link(private_path, lock_path)
+                claimed = True
+            except FileExistsError:
+                pass
+
+    os.unlink(private_path)
+
+    return claimed
+
+
+class Heartbeat():
+    '''
+    Context manager that updates the modification time of the lock file of
+    a claimed job in a background thread.
+
+    The lock file is hard linked to a file private to this process. Only
+    this link is touched, and only while the lock path refers to the same
+    file (inode), so a lock file reclaimed by another process in the
+    meantime is never modified.
+    '''
+
+
+    def __init__(self, lock_dir, key):
+        ''' Initialization of the Heartbeat class. '''
+
+        self.lock_path = get_lock_path(lock_dir, key)
+        self.private_path = get_private_path(self.lock_path, '.heartbeat')
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+        return
+
+
+    def __enter__(self):
+        try:
+            os.link(self.lock_path, self.private_path)
+        except FileNotFoundError:
+            ctl.p('Heartbeat: lock lost: '+self.lock_path)
+            return self
+
+        if not is_own(read_owner(self.private_path)):
+            ctl.p('Heartbeat: lock lost: '+self.lock_path)
+            os.unlink(self.private_path)
+            return self
+
+        self.thread.start()
+
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop.set()
+
+        if self.thread.is_alive():
+            self.thread.join()
+
+        try:
+            os.unlink(self.private_path)
+        except FileNotFoundError:
+            pass
+
+        return False
+
+
+    def owned(self):
+        ''' Check if the lock path refers to the lock of this process. '''
+
+        lock_id = get_file_id(self.lock_path)
+
+        return lock_id != None and \
+               lock_id[0:2] == get_file_id(self.private_path)[0:2]
+
+
+    def beat(self):
+        '''
+        Update heartbeat time (modification time of the lock file).
+
+        Return:
+            bool: False if the lock was lost (reclaimed by another process)
+        '''
+        if not self.owned():
+            ctl.p('Heartbeat: lock lost: '+self.lock_path)
+            return False
+
+        os.utime(self.private_path)
+
+        return True
+
+
+    def run(self):
+        ''' Update heartbeat time until stopped. '''
+
+        while not self.stop.wait(heartbeat_interval):
+            if not self.beat():
+                return
+
+        return
+
+
+def export_jobs(jobs, path):
+    ''' Export job list to json file. '''
+
+    filesystem.create_folder([path])
+
+    f = open(path+'.tmp', 'w')
+    json.dump(jobs, f)
+    f.close()
+
+    os.replace(path+'.tmp', path)
+
+    return
+
+
+def import_jobs(path):
+    ''' Import job list from json file. '''
+
+    if not os.path.exists(path):
+        ctl.e(path)
+        ctl.error('import_jobs: job file does not exist')
+
+    f = open(path, 'r')
+    jobs = json.load(f)
+    f.close()
+
+    return jobs
+
+
+def get_worker_args(argv):
+    '''
+    Get worker arguments from command line arguments of a script.
+
+    Return:
+        worker_i: index of the worker process, -1: no worker process
+        jobs_path: path of the job list
+    '''
+    worker_i = -1
+    jobs_path = ''
+
+    for i,arg in enumerate(argv[:-1]):
+        if arg == '--worker':
+            worker_i = int(argv[i+1])
+        if arg == '--jobs':
+            jobs_path = argv[i+1]
+
+    if worker_i != -1 and jobs_path == '':
+        ctl.error('get_worker_args: worker without job list')
+
+    return worker_i, jobs_path
+
+
+def start_workers(script_path, jobs_path, workers_n, chimerax_exe='chimerax', \
+                  poll=None):
+    '''
+    Start worker processes (headless ChimeraX instances) that run the given
+    script on the given job list and wait until all of them are finished.
+
+    The output of each worker is written to a log file next to the job list.
+
+    poll: function called every poll_interval while waiting (e.g. progress
+          report) and once after all workers are finished
+
+    Return:
+        list of return codes of the worker processes
+    '''
+    processes = []
+
+    for worker_i in range(0, workers_n):
+        script_args = shlex.quote(script_path)+ \
+                      ' --worker '+str(worker_i)+ \
+                      ' --jobs '+shlex.quote(jobs_path)
+        cmd = [chimerax_exe, '--nogui', '--exit', '--script', script_args]
+
+        log = open(jobs_path[:-5]+'_worker'+str(worker_i)+'.log', 'w')
+        processes.append([subprocess.Popen(cmd, stdout=log, \
+                                           stderr=subprocess.STDOUT), log])
+        ctl.p('worker '+str(worker_i)+' started')
+
+    if poll != None:
+        while None in [p[0].poll() for p in processes]:
+            poll()
+            time.sleep(poll_interval)
+
+    return_codes = []
+
+    for worker_i,p in enumerate(processes):
+        return_codes.append(p[0].wait())
+        p[1].close()
+
+        if return_codes[-1] != 0:
+            ctl.p('worker '+str(worker_i)+' finished with return code '+ \
+                  str(return_codes[-1]))
+
+    if poll != None:
+        poll()
+
+    return return_codes
@@ -1,6 +1,8 @@
-import bib
 import ctl
 import geometry
+import rigid_body
+
+import numpy as np
 
 
 def get_trans_rot_param(ax0_fold, ax1_fold, model_number):
@@ -23,6 +25,61 @@ def get_trans_rot_param(ax0_fold, ax1_fold, model_number):
     return rot_angle
 
 
+def get_center(model, tfs, centers):
+    ''' Get center of a model after its transform (snapin_layer). '''
+
+    return rigid_body.apply(tfs[model.id], [centers[model.id]])[0]
+
+
+def move(model, vect, tfs, screen_axes):
+    '''
+    Add translation along the screen axes to the transform of a model (like
+    ChimeraxSession.move_model).
+    '''
+    tfs[model.id] = rigid_body.multiply( \
+                        rigid_body.translation(np.dot(vect, screen_axes)), \
+                        tfs[model.id])
+
+    return
+
+
+def turn(model, axis, angle, center, tfs, screen_axes):
+    '''
+    Add rotation around a screen axis through center to the transform of a
+    model (like ChimeraxSession.turn_model).
+    '''
+    tfs[model.id] = rigid_body.multiply( \
+                        rigid_body.rotation(screen_axes[axis], angle, center), \
+                        tfs[model.id])
+
+    return
+
+
+def match(model, model_to, tfs, sess):
+    '''
+    Add superposition of the first submodel of a model onto the first
+    submodel of model_to (CA atoms, pruning like the "match" command, see
+    ChimeraxSession.match) to the transform of the model, with the current
+    transforms of both models.
+    '''
+    submodel_id = (model.id[0], 1)
+    submodel_to_id = (model_to.id[0], 1)
+
+    resids = sorted(set(sess.resids(submodel_id)) & \
+                    set(sess.resids(submodel_to_id)))
+
+    xyz = rigid_body.apply(tfs[model.id], \
+                           sess.get_xyz_many(submodel_id, resids))
+    xyz_to = rigid_body.apply(tfs[model_to.id], \
+                              sess.get_xyz_many(submodel_to_id, resids))
+
+    tf, rms, indices = rigid_body.align_and_prune(xyz, xyz_to, 2.0)
+
+    tfs[model.id] = rigid_body.multiply(tf, tfs[model.id])
+
+    return
+
+
 def snapin_layer(axes, layer, conf, preserve_connections=False):
     '''
     Snap axes 0 and 1 to orientation points.
@@ -32,6 +89,10 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
         all representations/representatives of all axes
     - step 2:
         snap-in of axes 0 and 1 to snapin points (orientation points)
+
+    The transforms of all representations are calculated from their centers
+    (determined once), the snapin points and get_trans_rot_param, and are
+    applied to the model positions in one step.
     '''
     max_snapin_distance = 80
     
@@ -40,7 +101,6 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
     intermediate_id = 101
 
     ax0_order0_model = layer.ax_models(ax0, order=0)[0]
-    ax0_center = ax0_order0_model.get_center()
 
 
     # collect representations (models) to snapin for each axis
@@ -50,12 +110,25 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
         models_to_snapin[i] = layer.ax_models(ax)
 
 
+    # transforms (scene coordinates) and initial centers of the
+    # representations
+    screen_axes = sess.get_screen_axes()
+    tfs = {}
+    centers = {}
+
+    for models in models_to_snapin:
+        for m in models:
+            tfs[m.id] = rigid_body.identity()
+            centers[m.id] = np.array(m.get_center(), dtype=float)
+
+    ax0_center = get_center(ax0_order0_model, tfs, centers)
+
+
     # step 1: align center of ax0 to [0, 0, 0]
     # ----------------------------------------
     for i,ax in enumerate(axes):
         for j,m in enumerate(models_to_snapin[i]):
-            sess.run('move x '+str(-ax0_center[0])+' models #'+m.idstr)
-            sess.run('move y '+str(-ax0_center[1])+' models #'+m.idstr)
+            move(m, [-ax0_center[0], -ax0_center[1], 0], tfs, screen_axes)
 
 
     # step 2: snap axis 0 and 1 representations to snapin points
@@ -69,12 +142,13 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
         if i == 0:
             # vector from snapin point (which is origin 0, 0, 0) to
             # axis center of rep1
-            vect_start = ax0_order0_model.get_center()
+            vect_start = get_center(ax0_order0_model, tfs, centers)
 
         # axis 1
         if i == 1:
             # initial coords of representation 1 (rep1)
-            ax1_rep1 = models_to_snapin[i][ax0.preferred_bs].get_center()
+            ax1_rep1 = get_center(models_to_snapin[i][ax0.preferred_bs], \
+                                  tfs, centers)
 
             # get snapin point for representation 1 (rep1) of ax1
             # Snapin point is nearest reference point.
@@ -102,12 +176,28 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
         ctl.d(vect_start)
 
 
+        # initial coords of all axis representations (ax_reps) and their
+        # snapin points (nearest reference points)
+        ax_reps = np.array([get_center(m, tfs, centers) \
+                            for m in models_to_snapin[i]], \
+                           dtype=float).reshape(-1, 3)
+
+        if i == 0:
+            # coords of real molecule centers
+            ax_reps -= vect_start
+            snapin_ps, d = layer.get_ref_points(ax_reps)
+        else:
+            snapin_ps, d = layer.get_ref_points_ax1(ax_reps, ax)
+
+        d_xys = geometry.dists_rowwise(ax_reps, snapin_ps, xy=True)
+
+
         # for current axis: iterate through axis representations to snapin
         for j, model_to_snapin in enumerate(models_to_snapin[i]):
             ctl.d(model_to_snapin.id)
 
-            # initial coords of axis representation (ax_rep)
-            ax_rep = model_to_snapin.get_center()
+            d_xy = d_xys[j]
+            snapin_p = snapin_ps[j]
 
 
             # axis 0
@@ -116,12 +206,7 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
             # snapin point.
 
             if i == 0:
-                # coord of real molecule center
-                ax_rep_center = [ax_rep[0]-vect_start[0], \
-                                 ax_rep[1]-vect_start[1], \
-                                 ax_rep[2]-vect_start[2]]
-                snapin_p, d = layer.get_ref_point(ax_rep_center)
-                d_xy = geometry.dist_xy(ax_rep_center, snapin_p)
+                ax_rep_center = ax_reps[j].tolist()
 
                 if d_xy > max_snapin_distance:
                     ctl.e('model_to_snapin')
@@ -141,10 +226,7 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
             # snapin point.
 
             if i == 1:
-                # get snapin point for representation (ax_rep),
-                # snapin point is nearest reference point
-                snapin_p, d = layer.get_ref_point_ax1(ax_rep, ax)
-                d_xy = geometry.dist_xy(ax_rep, snapin_p)
+                ax_rep = ax_reps[j].tolist()
 
                 if d_xy > max_snapin_distance:
                     ctl.e('model_to_snapin')
@@ -161,10 +243,8 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
                 # align representation (ax_rep) to model with
                 # preferred binding site
                 if j != ax0.preferred_bs:
-                    sess.match( \
-                            (model_to_snapin.id[0], 1), (), \
-                            (models_to_snapin[i][ax0.preferred_bs].id[0], 1), \
-                            model_to_snapin.id)
+                    match(model_to_snapin, \
+                          models_to_snapin[i][ax0.preferred_bs], tfs, sess)
 
 
                 # calculated (snapin) rotation angle of for
@@ -179,19 +259,15 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
                 if rot_angle != 0:
 
                     # perform snapin rotation of representation (ax_rep)
-                    rot_center = model_to_snapin.get_center()
+                    rot_center = get_center(model_to_snapin, tfs, centers)
 
                     if ax0_order0_model.flipped == True:
                         sign = -1
                     else:
                         sign = 1
 
-                    sess.run('turn z '+str(rot_angle*sign)+' center '+ \
-                             str(rot_center[0])+', '+ \
-                             str(rot_center[1])+', '+ \
-                             str(rot_center[2])+ \
-                             ' models #'+ \
-                             model_to_snapin.idstr)
+                    turn(model_to_snapin, 2, rot_angle*sign, rot_center, \
+                         tfs, screen_axes)
 
 
                 # rot angle of representation (ax_rep) (before rotation by
@@ -289,7 +365,7 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
 
                 # coords (complex center) of representation (ax_rep) after
                 # match to preferred_bs model and rotation
-                ax_rep_center = model_to_snapin.get_center()
+                ax_rep_center = get_center(model_to_snapin, tfs, centers)
 
 
             # translation vector to final position on snapin point
@@ -297,10 +373,12 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
                       snapin_p[1]-ax_rep_center[1]]
 
             # translate model to calculated snapin position
-            sess.run('move x '+str(transl[0])+ \
-                                    ' models #'+str(model_to_snapin.id[0]))
-            sess.run('move y '+str(transl[1])+ \
-                                    ' models #'+str(model_to_snapin.id[0]))
+            move(model_to_snapin, [transl[0], transl[1], 0], tfs, \
+                 screen_axes)
+
+
+    # apply transforms of all representations
+    sess.transform_models([[(m[0],), tfs[m]] for m in tfs])
 
 
     models_all = [i for i in range(1, sess.last_id()+1)]
@@ -311,6 +389,5 @@ def snapin_layer(axes, layer, conf, preserve_connections=False):
         sess.close_id(model)
 
     sess.split(intermediate_id)
-    sess.run('save "'+conf.layer_snapin_raw_path+'"')
 
     return
@@ -737,22 +737,14 @@ class Axis_rep(Model, Axis):
 
 
     def get_center(self):
-        ''' Get center of whole axis molecule complex. '''
-
-        center = [0,0,0]
-        sum_vect = 0
-        sum_n = 0        
-        
-        for submodel_id in range(1, self.multimer_n+1):
-            resids = self.chimerax_session.resids((self.id[0], submodel_id))
-
-            for resid in resids:
-                if self.termini[0] <= resid <= self.termini[1]:
-                    sum_vect = sum_vect+self.chimerax_session. \
-                               get_xyz((self.id[0], submodel_id), resid)
-                    sum_n += 1
-
-        center = sum_vect/sum_n
+        '''
+        Get center of whole axis molecule complex (cached, see
+        ChimeraxSession.get_center).
+        '''
+        center = self.chimerax_session.get_center( \
+                    [(self.id[0], submodel_id) \
+                     for submodel_id in range(1, self.multimer_n+1)], \
+                    self.termini)
 
         return center
 
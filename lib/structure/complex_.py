@@ -4,25 +4,16 @@ import chimerax
 
 
 def get_center(model_id, submodel_n, termini, sess):
-    ''' Get center of complex model. '''
-
+    '''
+    Get center of complex model (cached, see ChimeraxSession.get_center),
+    with the residue ids of the first submodel for all submodels.
+    '''
     model_id = sess.model_reg.convert_model_id(model_id)
 
-    center = [0, 0, 0]
-    sum_vect = 0
-    sum_n = 0        
-
-    for submodel_id in range(1, submodel_n+1):
-
-        resids = sess.resids((model_id[0], 1))
-
-        for resid in resids:
-            if termini[0] <= resid <= termini[1]:
-                sum_vect = sum_vect+ \
-                        sess.get_xyz((model_id[0], submodel_id), int(resid))
-                sum_n += 1
-
-    center = sum_vect/sum_n
+    center = sess.get_center( \
+                [(model_id[0], submodel_id) \
+                 for submodel_id in range(1, submodel_n+1)], \
+                termini, (model_id[0], 1))
 
     return center
 
@@ -0,0 +1,81 @@
+import geometry
+
+import numpy as np
+
+
+lattices = {} # key (get_key): Lattice, shared by all layers
+lattices_max = 100 # max number of cached lattices
+
+
+class Lattice():
+    '''
+    This class describes the reference points (orientation points) of a
+    layer for axis 0 and for axis 1 (2-fold, 3-fold and 4-fold axis) as
+    arrays, for the nearest reference point queries of all representations
+    at once.
+    '''
+
+
+    def __init__(self, layer):
+        '''
+        Initialization of the Lattice class with the orientation points of
+        the layer (Layer.orient_points*).
+        '''
+        self.points = { 'ax0': layer.orient_points(), \
+                        2: layer.orient_points_2fold(), \
+                        3: layer.orient_points_3fold(), \
+                        4: layer.orient_points_4fold() }
+
+        for k in self.points:
+            self.points[k] = np.array(self.points[k], dtype=float). \
+                                                            reshape(-1, 3)
+
+        return
+
+
+    def get_nearest(self, k, coords):
+        '''
+        Get nearest reference points of axis k ('ax0' or fold of axis 1) to
+        given coordinates (n, 3), on equal distances the first reference
+        point.
+
+        Return:
+            array of reference points (n, 3), array of distances (n)
+        '''
+        ref_points = self.points[k]
+
+        if len(ref_points) == 0:
+            return np.zeros((len(coords), 3)), np.full(len(coords), 10000.)
+
+        indices, d = geometry.nearest_points(coords, ref_points)
+
+        return ref_points[indices], d
+
+
+def get_key(layer):
+    '''
+    Get key of the lattice of a layer: parameters the orientation points
+    depend on.
+    '''
+    ax0_fold = 0
+    if len(layer.axes) > 0:
+        ax0_fold = layer.axes[0].fold
+
+    return (layer.symmgroup, tuple(layer.symmgroups_compatible), \
+            layer.refpoint_constant, layer.flipped, ax0_fold)
+
+
+def get_lattice(layer):
+    '''
+    Get lattice of a layer, created once for each symmetry group and
+    reference point constant (incl. lattice constant offset).
+    '''
+    key = get_key(layer)
+
+    if key not in lattices:
+        if len(lattices) >= lattices_max:
+            lattices.clear()
+
+        lattices[key] = Lattice(layer)
+
+    return lattices[key]
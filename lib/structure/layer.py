@@ -1,7 +1,9 @@
 import ctl
 import geometry
+import structure.lattice
 
 import math
+import numpy as np
 from structure.primitive_unit_cell import PrimitiveUnitCell
 
 
@@ -111,28 +113,18 @@ class Layer():
     def calc_refpoint_constant(self, lc_offset=0):
         ''' Calculate reference point constant. '''
 
-        model_n = 0
-        distsum = 0
-        distances = ''
+        models = self.ax_models(self.axes[0])[1:]
 
-        for i,model in enumerate(self.ax_models(self.axes[0])):
-            if i == 0:
-                continue
-
-            model_n += 1   
-            model_xyz = model.trans_vect
-
-            d = geometry.dist(model_xyz, [0, 0, 0])
-            distances = distances+str(round(d/10, 3))+'nm, '
-            distsum += d
-
-
-        if model_n == 0:
+        if len(models) == 0:
             self.refpoint_constant = 0
             self.refpoint_constant_raw = ''
         else:
-            self.refpoint_constant = distsum/model_n + lc_offset
-            self.refpoint_constant_raw = distances[:-2]
+            d = geometry.dists(np.array([m.trans_vect for m in models]), \
+                               [0, 0, 0])[:, 0]
+
+            self.refpoint_constant = float(d.mean()) + lc_offset
+            self.refpoint_constant_raw = \
+                    ', '.join([str(round(di/10, 3))+'nm' for di in d])
 
         return self.refpoint_constant
 
@@ -140,38 +132,27 @@ class Layer():
     def calc_lattice_constant(self, lc_offset=0):
         ''' Calculate lattice constant from reference point constant. '''
 
-        model_n = 0
-        distsum = 0
-        distances = ''
-
         ax0_models = self.ax_models(self.axes[0])
 
-        for i,model in enumerate(ax0_models):
-            if i == 0:
-                model_neighbour_xyz = ax0_models[-1].trans_vect
-                continue
-
-            model_n += 1   
-            model_xyz = model.trans_vect
+        if len(ax0_models) < 2:
+            self.lattice_constant = 0
+            self.lattice_constant_raw = ''
+        else:
+            xyz = np.array([m.trans_vect for m in ax0_models], dtype=float)
 
-            # symmetry group p6 with 3fold axis0 and 2fold axis1
+            # symmetry group p6 with 3fold axis0 and 2fold axis1: distance
+            # to the neighbour (the last model for the second model, the
+            # previous model for all further models)
             if self.axes[0].fold == 3 and self.axes[1].fold == 2:
-                d = geometry.dist(model_xyz, model_neighbour_xyz)
+                neighbour_xyz = np.vstack((xyz[-1:], xyz[1:-1]))
             else:
-                d = geometry.dist(model_xyz, [0, 0, 0])
+                neighbour_xyz = np.zeros((len(xyz)-1, 3))
 
-            distances = distances+str(round(d/10, 3))+'nm, '
-            distsum += d
+            d = geometry.dists_rowwise(xyz[1:], neighbour_xyz)
 
-            model_neighbour_xyz = model_xyz
-
-
-        if model_n == 0:
-            self.lattice_constant = 0
-            self.lattice_constant_raw = ''
-        else:
-            self.lattice_constant = distsum/model_n + lc_offset
-            self.lattice_constant_raw = distances[:-2]
+            self.lattice_constant = float(d.mean()) + lc_offset
+            self.lattice_constant_raw = \
+                    ', '.join([str(round(di/10, 3))+'nm' for di in d])
 
         return self.lattice_constant
 
@@ -661,41 +642,53 @@ class Layer():
         return p
 
 
-    def get_ref_point(self, coords):
-        ''' Get nearest reference point (for axis 0) to given coordinates. '''
+    def get_lattice(self):
+        '''
+        Get lattice (reference points as arrays) of the layer, created once
+        for each symmetry group and reference point constant (see
+        structure.lattice).
+        '''
+        return structure.lattice.get_lattice(self)
 
-        ref_points = self.orient_points()
-        cand_min = [0,0,0]
-        dist_min = 10000
 
-        for r in ref_points:
-            d = geometry.dist(coords, r)
-            if d < dist_min:
-                cand_min = r
-                dist_min = d
+    def get_ref_points(self, coords):
+        '''
+        Get nearest reference points (for axis 0) to given coordinates (n, 3).
 
-        return cand_min, dist_min
+        Return:
+            array of reference points (n, 3), array of distances (n)
+        '''
+        return self.get_lattice().get_nearest('ax0', coords)
 
 
-    def get_ref_point_ax1(self, coords, axis):
-        ''' Get nearest reference point (for axis 1) to given coordinates. '''
+    def get_ref_points_ax1(self, coords, axis):
+        '''
+        Get nearest reference points (for axis 1) to given coordinates (n, 3).
 
-        if axis.fold == 2:
-            rp, d = self.get_ref_point_2fold(coords)
-            return rp, d
+        Return:
+            array of reference points (n, 3), array of distances (n)
+        '''
+        if axis.fold not in (2, 3, 4):
+            ctl.e(axis.fold)
+            ctl.error('Layer: get_ref_points_ax1: no ref point available.')
 
-        if axis.fold == 3:
-            rp, d = self.get_ref_point_3fold(coords)
-            return rp, d
+        return self.get_lattice().get_nearest(axis.fold, coords)
 
-        if axis.fold == 4:
-            rp, d = self.get_ref_point_4fold(coords)
-            return rp, d
 
-        ctl.e(axis.fold)
-        ctl.error('Layer: get_ref_point_ax1: no ref point available.')
+    def get_ref_point(self, coords):
+        ''' Get nearest reference point (for axis 0) to given coordinates. '''
 
-        return
+        rp, d = self.get_ref_points([coords])
+
+        return rp[0].tolist(), float(d[0])
+
+
+    def get_ref_point_ax1(self, coords, axis):
+        ''' Get nearest reference point (for axis 1) to given coordinates. '''
+
+        rp, d = self.get_ref_points_ax1([coords], axis)
+
+        return rp[0].tolist(), float(d[0])
 
 
     def get_ref_point_2fold(self, co):
@@ -703,17 +696,9 @@ class Layer():
         Get nearest reference point (for axis 1 (2), 2-fold axis) to given
         coordinates.
         '''
-        ref_points = self.orient_points_2fold()
-        cand_min = [0, 0, 0]
-        dist_min = 10000
-
-        for r in ref_points:
-            d = geometry.dist(co, r)
-            if d < dist_min:
-                cand_min = r
-                dist_min = d
+        rp, d = self.get_lattice().get_nearest(2, [co])
 
-        return cand_min, dist_min
+        return rp[0].tolist(), float(d[0])
 
 
     def get_ref_point_3fold(self, co):
@@ -721,17 +706,9 @@ class Layer():
         Get nearest reference point (for axis 1 (2), 3-fold axis) to given
         coordinates.
         '''
-        ref_points = self.orient_points_3fold()
-        cand_min = [0, 0, 0]
-        dist_min = 10000
+        rp, d = self.get_lattice().get_nearest(3, [co])
 
-        for r in ref_points:
-            d = geometry.dist(co, r)
-            if d < dist_min:
-                cand_min = r
-                dist_min = d
-
-        return cand_min, dist_min
+        return rp[0].tolist(), float(d[0])
 
 
     def get_ref_point_4fold(self, co):
@@ -739,14 +716,6 @@ class Layer():
         Get nearest reference point (for axis 1 (2), 4-fold axis) to given
         coordinates.
         '''
-        ref_points = self.orient_points_4fold()
-        cand_min = [0, 0, 0]
-        dist_min = 10000
-
-        for r in ref_points:
-            d = geometry.dist(co, r)
-            if d < dist_min:
-                cand_min = r
-                dist_min = d
+        rp, d = self.get_lattice().get_nearest(4, [co])
 
-        return cand_min, dist_min
+        return rp[0].tolist(), float(d[0])
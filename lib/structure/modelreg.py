@@ -36,6 +36,24 @@ class ModelReg():
         return
 
 
+    def snapshot(self):
+        '''
+        Get snapshot of the register (model ids and referenced objects), the
+        model objects themselves are not copied.
+        '''
+        return {m: list(self.models[m]) for m in self.models}
+
+
+    def restore(self, snapshot):
+        '''
+        Restore the register from a snapshot. The register object is kept,
+        because it is shared by all models.
+        '''
+        self.models = {m: list(snapshot[m]) for m in snapshot}
+
+        return
+
+
     def remove_model(self, model_id):
         '''
         Remove model including submodels from register.
@@ -75,47 +75,18 @@ class Monomer(Model):
 
 
     def get_center(self, res_range, sess):
-        ''' Get center of monomer model. '''
-
-        center = [0,0,0]
-        sum_vect = [0,0,0]
-        sum_n = 0        
-
-        for resid in sess.resids(self.id):
-
-            # sum of all residues inside given range
-            if res_range[0] <= resid <= res_range[1]:
-                sum_vect = [sum_vect[i]+c
-                            for i,c in enumerate(sess.get_xyz(self.id, resid))]
-                sum_n += 1
-
-        center[0] = sum_vect[0]/sum_n
-        center[1] = sum_vect[1]/sum_n
-        center[2] = sum_vect[2]/sum_n    
+        '''
+        Get center of monomer model (cached, see ChimeraxSession.get_center).
+        '''
+        center = sess.get_center([self.id], res_range).tolist()
 
         return center
 
 
 def get_center(model_id, res_range, sess):
-    ''' Get center of monomer model. '''
-
-    center = [0,0,0]
-    sum_vect = [0,0,0]
-    sum_n = 0        
-
-    model_id = sess.model_reg.convert_model_id(model_id)
-    resids = sess.resids(model_id)
-
-    for resid in resids:
-
-        # sum of all residues inside given range
-        if res_range[0] <= resid <= res_range[1]:
-            sum_vect = [sum_vect[i]+c
-                        for i,c in enumerate(sess.get_xyz(model_id, resid))]
-            sum_n += 1
-
-    center[0] = sum_vect[0]/sum_n
-    center[1] = sum_vect[1]/sum_n
-    center[2] = sum_vect[2]/sum_n    
+    '''
+    Get center of monomer model (cached, see ChimeraxSession.get_center).
+    '''
+    center = sess.get_center([model_id], res_range).tolist()
 
     return center
@@ -181,12 +181,8 @@ class PrimitiveUnitCell():
                 export_path, \
                 combination_model_id, \
                 ax0.chimerax_session, \
-                conf.cif_postprocess)
-        ctl.p('cif_add_symm')
-        export.cif_add_symm(export_path, export_path, \
-                            self.a, self.b, self.c, \
-                            self.alpha, self.beta, self.gamma, \
-                            self.symmgroup)
-        ctl.p('cif_add_symm finished')
+                conf.cif_postprocess, \
+                [self.a, self.b, self.c, \
+                 self.alpha, self.beta, self.gamma, self.symmgroup])
 
         return
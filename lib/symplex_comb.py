@@ -3,10 +3,14 @@ import files
 import filesystem
 import interface_matrix_signed
 import metadata
+import metadata_db
+import scheduler
+import symplex_prefilter
 
 import glob
 import os
 
+from assembler import Assembler
 from structure.modelreg import ModelReg
 from structure.axis import Axis
 
@@ -102,6 +106,324 @@ def predscen_symplex_comb(symplex0_predscenarios, symplex1_predscenarios, \
     return comb
 
 
+def combination_jobs(predscen_symplex_combinations, alignment_pivot_pos, \
+                     sess, conf):
+    '''
+    Create list of jobs for the combinatorial search, one job for each
+    (prediction scenario pair, SymPlex pair, insertion length, alignment
+    domain, pivot) combination that passes the checks done without
+    assembling the layer.
+
+    Each job is a dict that can be exported to json and run independently
+    with run_combination_job().
+    '''
+    jobs = []
+
+    for predscen_symplex_combination in predscen_symplex_combinations:
+        symplex0_predscen = predscen_symplex_combination[0][0]
+        symplex1_predscen = predscen_symplex_combination[0][1]
+        symplex0_folder, symplex1_folder = symplex_folders( \
+                                        symplex0_predscen, symplex1_predscen, \
+                                        conf.symplex_path, conf)
+
+        model_reg = ModelReg()
+        sess.set_model_reg(model_reg)
+
+        ax = [Axis(model_reg), Axis(model_reg)]
+
+        ax[0].set_session(sess, conf)
+        model_status0 = files.get_model_status(conf, symplex0_folder)
+        ax[0].set_folder(symplex0_folder, model_status0)
+
+        ax[1].set_session(sess, conf)
+        model_status1 = files.get_model_status(conf, symplex1_folder)
+        ax[1].set_folder(symplex1_folder, model_status1)
+
+        sc0 = metadata.get_subchain_abbr(ax[0].pathRaw)
+        sc1 = metadata.get_subchain_abbr(ax[1].pathRaw)
+
+        # check if SymPlex combination covers full sequence
+        if seq_coverage(sc0, sc1, conf) == False:
+            ctl.e(sc0)
+            ctl.e(sc1)
+            ctl.error('SymPlex combination does not cover the full sequence')
+
+        c = predscen_symplex_combination[1]
+                # combination of SymPlexes
+
+        ov_domains = overlapping_domains(symplex0_folder, symplex1_folder, \
+                                         conf)
+
+        symplex0_domains = domains(symplex0_folder, conf)
+        symplex1_domains = domains(symplex1_folder, conf)
+
+        insertion_lengths_ = insertion_lengths(sc0, sc1)
+                # insertion_length: number of domains to insert
+                # -1: insertion of all available domains
+
+        for insertion_length in insertion_lengths_:
+            sc_order = subchain_order(symplex0_folder, symplex1_folder, \
+                                      insertion_length, conf)
+
+            if sc_order == -1:
+                continue
+
+            for alignment_domain in ov_domains:
+                for p in alignment_pivot_pos:
+                    if alignment_domain == 1 and p == 0:
+                        continue
+
+                    if alignment_domain == len(conf.domains) and p == 1:
+                        continue
+
+                    if alignment_domain == 1 and insertion_length == 1:
+                        continue
+
+                    if alignment_domain+p >= len(conf.domains) and \
+                                                    insertion_length == 1:
+                        continue
+
+                    surface_section0, surface_section1 = \
+                            surface_sections( \
+                                    symplex0_domains, symplex1_domains, \
+                                    sc_order, conf.domains, \
+                                    alignment_domain, p, \
+                                    insertion_length)
+
+                    job = { 'symplex_folders': \
+                                    [symplex0_folder, symplex1_folder], \
+                            'model_status': [model_status0, model_status1], \
+                            'surface_sections': \
+                                    [surface_section0, surface_section1], \
+                            'symplex_combination': [c[0], c[1]], \
+                            'insertion_length': insertion_length, \
+                            'alignment_domain': alignment_domain, \
+                            'alignment_pivot_pos': p }
+
+                    model_reg = ModelReg()
+                    sess.set_model_reg(model_reg)
+                    ax = combination_axes(job, sess, conf, model_reg)
+
+                    # check order of rotational symmetry of both SymPlexes
+                    if get_symm_order(ax[0]) != ax[0].fold or \
+                       get_symm_order(ax[1]) != ax[1].fold:
+                        continue
+
+
+                    # skip cases in which insertions of 1 domain in length
+                    # do not have an interface with each other
+                    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+                    if insertion_length == 1:
+                        if sc_order == 0:
+                            distogram = interface_matrix_domain( \
+                                                ax[1], alignment_domain, conf)
+                        elif sc_order == 1:
+                            distogram = interface_matrix_domain( \
+                                                ax[0], alignment_domain, conf)
+
+                        if len(distogram) == 0:
+                            continue
+
+                    job['name_prefix'] = \
+                        str(ax[0].fold)+str(ax[1].fold)+'_'+ \
+                        str(metadata.get_subchain_abbr(ax[0].pathRaw))+'-'+ \
+                        str(metadata.get_subchain_abbr(ax[1].pathRaw))
+                    job['name_postfix'] = \
+                        'd'+str(alignment_domain)+'_'+ \
+                        str(2*(insertion_length+1)+p)+'_'+ \
+                        str(c[0])+'-'+str(c[1])
+                    job['key'] = job['name_prefix']+'_'+job['name_postfix']
+
+                    jobs.append(job)
+
+    return jobs
+
+
+def prefilter_jobs(jobs, sess, conf, path_combination_part1, mode=1):
+    '''
+    Early rejection of jobs whose assembly is predicted to fail
+    (symplex_prefilter), before any model is opened in ChimeraX.
+
+    mode: 1: report only, all jobs are kept (default until the prefilter is
+             validated against previous runs)
+          2: rejection of the jobs predicted to fail
+
+    Predicted failures are logged and recorded with the predicted failure
+    code in the metadata database (table prefilter), rejected jobs (mode 2)
+    additionally in prefiltered_out/. The predictions are compared with the
+    results of previous runs (ranking_candidates/, filtered_out/): precision
+    and recall per code and the assembled combinations that would have been
+    rejected ("lost" assemblies).
+
+    Return:
+        list of jobs to assemble
+    '''
+    jobs_passed = []
+    predictions = {}
+
+    for job in jobs:
+        model_reg = ModelReg()
+        sess.set_model_reg(model_reg)
+        ax = combination_axes(job, sess, conf, model_reg)
+
+        predicted, features = symplex_prefilter.predict(ax, job, conf)
+        predictions[job['key']] = predicted
+
+        if predicted != 1:
+            ctl.p('prefilter: '+job['key']+' predicted to fail: '+ \
+                  symplex_prefilter.result_infixes[predicted])
+            record_prefiltered(job, predicted, features, \
+                               path_combination_part1, conf, mode == 2)
+
+        if predicted == 1 or mode != 2:
+            jobs_passed.append(job)
+
+    predicted_n = len([k for k in predictions if predictions[k] != 1])
+
+    if mode == 2:
+        ctl.p('prefilter: '+str(predicted_n)+' of '+str(len(jobs))+ \
+              ' combinations rejected')
+    else:
+        ctl.p('prefilter (report only): '+str(predicted_n)+' of '+ \
+              str(len(jobs))+' combinations predicted to fail, '+ \
+              'all combinations are assembled')
+
+    results = symplex_prefilter.read_results(path_combination_part1)
+    symplex_prefilter.report(symplex_prefilter.evaluate(predictions, results))
+
+    return jobs_passed
+
+
+def record_prefiltered(job, predicted, features, path_combination_part1, \
+                       conf, rejected=True):
+    '''
+    Record a job predicted to fail by the prefilter with its predicted
+    failure code, a rejected job also in prefiltered_out/.
+    '''
+    result_infix = symplex_prefilter.result_infixes[predicted]
+
+    if rejected:
+        foldername = job['name_prefix']+'_'+result_infix+'_'+ \
+                     job['name_postfix']
+
+        filesystem.create_folder([path_combination_part1+'prefiltered_out/'])
+        f = open(path_combination_part1+'prefiltered_out/'+foldername+ \
+                 '.txt', 'w')
+        f.write('')
+        f.close()
+
+    entry = { 'name': job['key'], \
+              'species': conf.species, \
+              'gene': conf.gene, \
+              'predicted': predicted, \
+              'result_infix': result_infix }
+
+    if features != {}:
+        entry.update({ 'axis_z0': features['axis_z'][0], \
+                       'axis_z1': features['axis_z'][1], \
+                       'coincident_n': features['coincident_n'][-1], \
+                       'tilt': features['tilt'] })
+
+    metadata_db.write(path_combination_part1+metadata_db.db_filename, \
+                      'prefilter', entry)
+
+    return
+
+
+def combination_axes(job, sess, conf, model_reg):
+    '''
+    Create and configure both Axis objects of a job of the combinatorial
+    search.
+    '''
+    ax = [Axis(model_reg), Axis(model_reg)]
+
+    for i in range(0, 2):
+        ax[i].set_session(sess, conf)
+        ax[i].set_folder(job['symplex_folders'][i], job['model_status'][i])
+        ax[i].set_domains([ conf.domains[job['alignment_domain']-1] ])
+        ax[i].set_surface(job['surface_sections'][i])
+        ax[i].set_model_active(job['symplex_combination'][i])
+
+    return ax
+
+
+def combination_processed(job, path_combination_part1, \
+                          path_export_postfix_running, lock_dir=None):
+    '''
+    Check if the combination of a job has already been calculated or is
+    currently calculated.
+
+    lock_dir: lock files of the scheduler, a running combination without
+        living owner of its lock is stale and is not processed (the new run
+        resumes its checkpoints), None: running combinations are processed
+    '''
+    comb_fn_str = path_combination_part1+ \
+                  job['name_prefix']+'_*_'+job['name_postfix']
+
+    comb_fn_str_running = path_combination_part1+'*'+ \
+                          job['key']+path_export_postfix_running
+
+    if check_processed(comb_fn_str) == True:
+        return True
+
+    if check_processed(comb_fn_str_running) == True:
+        if lock_dir != None and \
+           scheduler.job_running(lock_dir, job['key']) == False:
+            ctl.p('stale running combination: '+job['key'])
+            return False
+
+        return True
+
+    return False
+
+
+def run_combination_job(job, sess, conf, path_export_postfix_running):
+    '''
+    Assemble the combination of SymPlexes of a job of the combinatorial
+    search and rename the assembly directory according to the result.
+    '''
+    model_reg = ModelReg()
+    sess.set_model_reg(model_reg)
+    ax = combination_axes(job, sess, conf, model_reg)
+
+    p = job['alignment_pivot_pos']
+
+    conf.set_export_path_postfix( \
+        '_'+conf.gene+'_v'+conf.version+'/'+ \
+        conf.species+'_'+conf.species_name+'_'+ \
+        job['key']+path_export_postfix_running)
+    conf.update_export_paths()
+
+    assembler = Assembler(ax, conf)
+    assembler.alignment_pivot_pos = p
+    ctl.p('alignment_domain')
+    ctl.p(job['alignment_domain'])
+    ctl.p(p)
+    ctl.p(job['insertion_length'])
+
+    assembly_successful, assembly_return, result_message = assembler.run()
+
+    # create reduced assembly model without hydrogens
+    # to save storage space
+    assembly_models = sorted(glob.glob(conf.export_path+'assembly/'+'*.cif'))
+
+    if len(assembly_models) == 1:
+        assembly_model = assembly_models[0]
+
+        sess.init()
+        sess.open_model(assembly_model)
+        sess.run('delete H')
+        sess.save_model_id((1,), assembly_model.replace('.cif', '_woH.cif'))
+        os.unlink(assembly_model)
+
+    assembly_dir_rename(assembler, assembly_return, ax, \
+                        job['symplex_combination'], \
+                        job['insertion_length'], \
+                        job['alignment_domain'], p, conf)
+
+    return assembly_return
+
+
 def get_symm_order(ax):
     '''
     Get order of rotational symmetry in a complex model from path.
@@ -464,6 +786,8 @@ def assembly_dir_rename(assembler, assembly_return, ax, \
 
         os.rename(conf.export_path, path_combination_part1+foldername_new+'/')
 
+        ranking_candidate = 0
+
         if round(validation_scores[1], 3) >= 2.000:
             f = open(path_combination_part1+'filtered_out/'+ \
                      foldername_new+'.txt', 'w')
@@ -474,6 +798,14 @@ def assembly_dir_rename(assembler, assembly_return, ax, \
                      foldername_new+'.txt', 'w')
             f.write('') 
             f.close()
+            ranking_candidate = 1
+
+        entry = { 'result_infix': '', \
+                  'ranking_candidate': ranking_candidate, \
+                  'score_quality': validation_scores[0], \
+                  'score_clash': validation_scores[1], \
+                  'score_bend': validation_scores[2], \
+                  'backbone_clashes': validation_scores[3] }
 
     elif assembly_return in result_infixes: # assembly not possible
         foldername_new = \
@@ -493,10 +825,30 @@ def assembly_dir_rename(assembler, assembly_return, ax, \
         f.write('') 
         f.close()
 
+        entry = { 'result_infix': result_infixes[assembly_return], \
+                  'ranking_candidate': 0 }
+
     else:
         ctl.e(assembly_return)
         ctl.error('unknown result type')
 
+    entry.update({ 'name': foldername_new, \
+                   'species': conf.species, \
+                   'gene': conf.gene, \
+                   'symm_order0': ax[0].fold, \
+                   'symm_order1': ax[1].fold, \
+                   'subchains0': metadata.get_subchain_abbr(ax[0].pathRaw), \
+                   'subchains1': metadata.get_subchain_abbr(ax[1].pathRaw), \
+                   'result': assembly_return, \
+                   'alignment_domain': alignment_domain, \
+                   'alignment_pivot_pos': alignment_pivot_pos, \
+                   'insertion_length': insertion_length, \
+                   'symplex_combination0': symplex_combination[0], \
+                   'symplex_combination1': symplex_combination[1] })
+
+    metadata_db.write(path_combination_part1+metadata_db.db_filename, \
+                      'assemblies', entry)
+
     return
 
 
@@ -0,0 +1,334 @@
+import atoms
+import bibpdb
+import ctl
+import molmodel
+import rigid_body
+from structure.layer import Layer
+
+import glob
+import math
+import numpy as np
+import os
+
+
+'''
+Module providing an early rejection of SymPlex combinations of the
+combinatorial search (symplex_comb) whose assembly (Assembler.run) is
+predicted to fail, before any model is opened in ChimeraX.
+
+The prediction uses the coord files of the active SymPlex models only
+(atoms.get_atom_table) and repeats the cheap checks of Assembler.run in the
+order of the assembly:
+     9: no symmetry group for the folds of the axes
+     4: rotational symmetry axis of a SymPlex not perpendicular to xy plane
+     7: z component of the rotational symmetry axis <= 0 (fold > 2)
+    12: no coincident residues of the SymPlexes after superposition on the
+        alignment domain (pivot residues)
+     2: tilt of the ax1 rotational symmetry axis > 45° after superposition
+    11: surface section completely within the termini
+The failures that depend on the built layer (3, 5, 8, 10, 13) are not
+predicted.
+
+The predictions are compared with the results of previous runs
+(ranking_candidates/, filtered_out/) by evaluate().
+'''
+
+perpendicular_min = 0.99 # min z component of rotsymm axis (RotSymmAxis)
+tilt_max = 45 # max tilt of ax1 in degrees (Assembler.build_layer)
+coincident_dists = [1, 2] # distance cutoffs of coincident residues
+match_cutoff = 2.0 # pruning cutoff of the superposition ("match")
+
+result_infixes = { 2: 'axistilt', \
+                   3: 'gap', \
+                   4: 'notperpendicular', \
+                   5: 'snapindist', \
+                   6: 'rotsymmaxnotdetermined', \
+                   7: 'rotsymmaxinverted', \
+                   8: 'snapinrot', \
+                   9: 'nosymmgroup', \
+                  10: 'snapinrotstep', \
+                  11: 'withintermini', \
+                  12: 'nocoincidentres', \
+                  13: 'incompletemonomer' }
+        # like symplex_comb.assembly_dir_rename
+
+predicted_codes = [2, 4, 7, 9, 11, 12]
+
+model_cache = {} # coord file: [chainids, ca, rotsymm axis, termini]
+
+
+def get_ca(table, chainid):
+    '''
+    Get CA atoms of a chain.
+
+    Return:
+        dict resid: xyz
+    '''
+    mask = (table.chainid == chainid) & (table.name == 'CA')
+
+    return dict(zip(table.resid[mask].tolist(), table.xyz[mask]))
+
+
+def get_pairs(ca0, ca1, res_range=None):
+    '''
+    Get paired CA coordinates of the residues present in both chains
+    (within res_range).
+
+    Return:
+        resids, xyz0 (n, 3), xyz1 (n, 3)
+    '''
+    resids = sorted(set(ca0) & set(ca1))
+
+    if res_range != None:
+        resids = [r for r in resids if res_range[0] <= r <= res_range[1]]
+
+    xyz0 = np.array([ca0[r] for r in resids], dtype=float).reshape(-1, 3)
+    xyz1 = np.array([ca1[r] for r in resids], dtype=float).reshape(-1, 3)
+
+    return resids, xyz0, xyz1
+
+
+def superpose(xyz, ref_xyz):
+    '''
+    Superposition like the "match" command (pruning of far pairs), for few
+    pairs without pruning.
+    '''
+    if len(xyz) >= 10:
+        tf, rms, indices = rigid_body.align_and_prune(xyz, ref_xyz, \
+                                                      match_cutoff)
+    else:
+        tf, rms = rigid_body.align_points(xyz, ref_xyz)
+
+    return tf
+
+
+def get_model(path):
+    '''
+    Get chain ids, CA atoms of the chains, rotational symmetry axis (transform
+    of chain 1 to chain 2, unit vector) and termini of a SymPlex model
+    (cached).
+    '''
+    if path in model_cache:
+        return model_cache[path]
+
+    table = atoms.get_atom_table(path)
+    chainids = table.get_chainids()
+    ca = [get_ca(table, c) for c in chainids]
+
+    axis = None
+
+    if len(chainids) >= 2:
+        resids, xyz0, xyz1 = get_pairs(ca[0], ca[1])
+
+        if len(resids) >= 3:
+            axis = rigid_body.axis_angle(superpose(xyz0, xyz1))[0]
+
+    termini = molmodel.get_termini(bibpdb.get_rmsds(path))
+
+    model_cache[path] = [chainids, ca, axis, termini]
+
+    return model_cache[path]
+
+
+def get_features(ax, job, conf):
+    '''
+    Get geometric features of a SymPlex combination.
+
+    Return:
+        dict with 'folds', 'axis_z' (z components of the rotsymm axes),
+        'coincident_n' (coincident residues within coincident_dists),
+        'tilt' (degrees), 'termini'
+    '''
+    models = [get_model(a.model_active_path) for a in ax]
+    res_range = conf.domains[job['alignment_domain']-1]
+
+    features = { 'folds': [a.fold for a in ax], \
+                 'axis_z': [None if m[2] is None else float(m[2][2]) \
+                            for m in models], \
+                 'coincident_n': [0 for d in coincident_dists], \
+                 'tilt': None, \
+                 'termini': [m[3] for m in models] }
+
+    # superposition of the contact submodel of ax1 (first chain, see
+    # Assembler.ax1_contact_submodel_0) to the first chain of ax0 on the
+    # alignment domain
+    resids, xyz0, xyz1 = get_pairs(models[0][1][0], models[1][1][0], \
+                                   res_range)
+
+    if len(resids) < 3:
+        return features
+
+    tf = superpose(xyz1, xyz0)
+
+    resids, xyz0, xyz1 = get_pairs(models[0][1][0], models[1][1][0])
+    d = np.linalg.norm(rigid_body.apply(tf, xyz1)-xyz0, axis=1)
+
+    features['coincident_n'] = [int((d <= c).sum()) for c in coincident_dists]
+
+    if models[1][2] is not None:
+        axis1 = tf[:, :3] @ models[1][2]
+        features['tilt'] = math.degrees(math.acos(min(1, abs(axis1[2]))))
+
+    return features
+
+
+def predict(ax, job, conf):
+    '''
+    Predict the result of the assembly of a SymPlex combination.
+
+    Return:
+        int: 1: assembly not predicted to fail, else predicted failure code
+        dict: features (get_features)
+    '''
+    layer = Layer()
+    layer.get_possible_symmgroups([a.fold for a in ax])
+
+    if layer.symmgroup == '' and layer.symmgroups_compatible == []:
+        return 9, {}
+
+    features = get_features(ax, job, conf)
+
+    for i,a in enumerate(ax):
+        axis_z = features['axis_z'][i]
+
+        if axis_z == None:
+            continue
+
+        if abs(axis_z) < perpendicular_min:
+            return 4, features
+
+        if a.fold > 2 and axis_z <= 0:
+            return 7, features
+
+    if features['coincident_n'][-1] == 0:
+        return 12, features
+
+    if features['tilt'] != None and features['tilt'] > tilt_max:
+        return 2, features
+
+    if 1 in conf.delete_termini_modes:
+        for i,a in enumerate(ax):
+            surface = job['surface_sections'][i]
+            termini = features['termini'][i]
+
+            if surface == None or len(surface) == 0:
+                continue
+
+            if surface[0][1] <= termini[0] or surface[0][0] >= termini[1]:
+                return 11, features
+
+    return 1, features
+
+
+def get_key(foldername):
+    '''
+    Get job key (symplex_comb.combination_jobs) and result code from the
+    folder name of an assembled combination.
+
+    Return:
+        key, result code (1: assembly possible)
+    '''
+    parts = foldername.split('_')
+    key = '_'.join(parts[:2]+parts[-3:])
+    result = 1
+
+    if len(parts) == 6:
+        for code in result_infixes:
+            if result_infixes[code] == parts[2]:
+                result = code
+
+    return key, result
+
+
+def read_results(path_combination_part1):
+    '''
+    Read results of previous runs from the result lists ranking_candidates/
+    and filtered_out/.
+
+    Return:
+        dict key: result code
+    '''
+    results = {}
+
+    for folder in ['ranking_candidates/', 'filtered_out/']:
+        for f in sorted(glob.glob(path_combination_part1+folder+'*.txt')):
+            key, result = get_key(os.path.basename(f)[:-4])
+            results[key] = result
+
+    return results
+
+
+def evaluate(predictions, results):
+    '''
+    Compare predicted failures with the results of previous runs.
+
+    predictions: dict key: predicted code
+    results: dict key: result code (read_results)
+
+    Return:
+        dict: 'n': compared combinations,
+              'tp', 'fp', 'fn': predicted and failed, predicted but not
+                failed, failed but not predicted,
+              'precision', 'recall' (failures of the predicted codes),
+              'lost': keys of predicted failures that were assembled,
+              'codes': {code: [tp, fp, fn]} with tp: predicted code equal
+                to the result code
+    '''
+    stats = { 'n': 0, 'tp': 0, 'fp': 0, 'fn': 0, 'lost': [], \
+              'codes': {c: [0, 0, 0] for c in predicted_codes} }
+
+    for key in predictions:
+        if key not in results:
+            continue
+
+        predicted = predictions[key]
+        result = results[key]
+        stats['n'] += 1
+
+        if predicted != 1 and result != 1:
+            stats['tp'] += 1
+        elif predicted != 1:
+            stats['fp'] += 1
+            stats['lost'].append(key)
+        elif result in predicted_codes:
+            stats['fn'] += 1
+
+        for code in predicted_codes:
+            if predicted == code and result == code:
+                stats['codes'][code][0] += 1
+            elif predicted == code:
+                stats['codes'][code][1] += 1
+            elif result == code:
+                stats['codes'][code][2] += 1
+
+    stats['precision'] = stats['tp']/max(1, stats['tp']+stats['fp'])
+    stats['recall'] = stats['tp']/max(1, stats['tp']+stats['fn'])
+
+    return stats
+
+
+def report(stats):
+    ''' Print evaluation of the prefilter (evaluate). '''
+
+    ctl.p('prefilter: '+str(stats['n'])+' combinations with results')
+    ctl.p('precision: '+str(round(stats['precision'], 3))+ \
+          ', recall: '+str(round(stats['recall'], 3)))
+
+    for code in stats['codes']:
+        tp, fp, fn = stats['codes'][code]
+
+        if tp+fp+fn == 0:
+            continue
+
+        ctl.p(str(code)+' '+result_infixes[code]+': '+ \
+              'precision '+str(round(tp/max(1, tp+fp), 3))+ \
+              ', recall '+str(round(tp/max(1, tp+fn), 3))+ \
+              ' ('+str(tp)+'/'+str(fp)+'/'+str(fn)+')')
+
+    if len(stats['lost']) > 0:
+        ctl.p('assembled combinations predicted to fail:')
+
+        for key in stats['lost']:
+            ctl.p(key)
+
+    return
@@ -39,6 +39,7 @@ class Assemblies():
         Create lists for the data structure of a assembly.
         '''
         assembly['subchains'] = {}
+        assembly['nnptms'] = {} # coord file: nnpTM (symplot.corpus)
 
         return assembly
 
@@ -2,16 +2,12 @@ import glob
 import os
 
 import ctl
-import bibpdb
-import symplot.clash_dist
 import symplot.checks
+import symplot.corpus
 import interface_cluster
-import interface_matrix
-import interface_matrix_signed
 import symplot.prediction_scenario
 import metadata
 import model_filter.model_filter
-import molmodel
 import params
 import symplot
 import symplot.predictions_sort
@@ -58,6 +54,12 @@ def determine_clusters(mode, subchain_mode, root_path, assemb, verbous):
         # dictionary for interface distograms
         interface_distograms = {}
         interface_distograms2 = {}
+        distogram_paths = {} # interface distogram key: coord file
+
+        # corpus of the SymPlex data of the species
+        corpus = symplot.corpus.Corpus(symplot.corpus.get_path( \
+                                    a, mode.interface_matrix_type), \
+                                    mode.interface_matrix_type)
 
         # get folders of all prediction scenarios
         scenario_folders = symplot.prediction_scenario.get_folders(a[3]+a[1])
@@ -176,52 +178,18 @@ def determine_clusters(mode, subchain_mode, root_path, assemb, verbous):
                     if score < 0.20:
                         continue
 
-                    clashes = model_filter.model_filter.clashes_converted(f)
-
-                    filename_cl = f.replace('clashes/', ''). \
-                                  replace('symm_180/', ''). \
-                                  replace('symm_120/', ''). \
-                                  replace('symm_090/', ''). \
-                                  replace('symm_072/', ''). \
-                                  replace('symm_060/', ''). \
-                                  replace('symm_051/', '')
-
-
-                    # get optional score from clash distribution file if
-                    # available
-                    if 'cla' in filename_cl:
-                        filename_cl = filename_cl.split('_cla')[0]+'.pdb'
-
-                    cl_dist = symplot.clash_dist.load( \
-                                                    filename_cl+'_cldist.txt')
-                    cl_score = symplot.clash_dist.get_score(cl_dist)
-
-
-                    # load interface matrices
-                    # -----------------------
-
-                    # determine termini
-                    rmsds = bibpdb.get_rmsds(f)
-                    termini = molmodel.get_termini(rmsds)
-
-                    # create list of terminus residues to exclude
-                    terminus_res = [r for r in range(0, termini[0])]+ \
-                                   [r for r in range(termini[1],5000)]
-
-                    if mode.interface_matrix_type == 0:
-                        distogram = interface_matrix.load(f, terminus_res)
-                    elif mode.interface_matrix_type == 1:
-                        distogram = interface_matrix_signed.load( \
-                                                f, terminus_res, \
-                                                monomers_involved=[1, 2])
+                    # load interface matrices and clash values (corpus)
+                    # ------------------------------------------------
+                    entry = corpus.get_entry(f, sc_folder)
 
-                        scenario_path = symplot.prediction_scenario. \
-                                    get_path(f, sc_folder)
-                        fn = symplot.prediction_scenario.get_coord_filename(f)
-                        mol_count = bibpdb.get_multimer_n(scenario_path+fn)
+                    clashes = entry['clashes']
+                    cl_score = entry['cl_score']
+                    distogram = entry['distogram']
+                    mol_count = entry['mol_count']
+                    monomers_involved = entry['monomers_involved']
 
-                        monomers_involved = interface_matrix_signed. \
-                                            monomers_involved(f, terminus_res)
+                    if mode.show_nnptm == 1:
+                        a['nnptms'][f] = corpus.get_nnptm(f, root_path)
 
 
                     if distogram == {} or \
@@ -258,6 +226,8 @@ def determine_clusters(mode, subchain_mode, root_path, assemb, verbous):
                                         interface_distogram_key] = distogram
                                 interface_distograms2[ \
                                         interface_distogram_key] = distogram
+                                distogram_paths[ \
+                                        interface_distogram_key] = f
 
 
                     if score != -1 and score >= a[6][0]:
@@ -279,12 +249,9 @@ def determine_clusters(mode, subchain_mode, root_path, assemb, verbous):
 
         # calculate correlation coefficients
         # ----------------------------------
-        if mode.interface_matrix_type == 0:
-            interface_correlations_ = interface_matrix. \
-                                    corr_coefficients(interface_distograms2)
-        elif mode.interface_matrix_type == 1:
-            interface_correlations_ = interface_matrix_signed. \
-                                    corr_coefficients(interface_distograms2)
+        interface_correlations_ = corpus.get_correlations( \
+                                    interface_distograms2, distogram_paths)
+        corpus.write()
 
         f = open(root_path+'interface_correlation.txt', 'w')
         f.write('')
@@ -0,0 +1,444 @@
+import ctl
+import bibpdb
+import interface_correlation
+import interface_matrix
+import interface_matrix_signed
+import metadata
+import metadata_db
+import model_filter.model_filter
+import molmodel
+import symplot.clash_dist
+import symplot.nnptm
+import symplot.prediction_scenario
+
+import hashlib
+import numpy as np
+import os
+import zipfile
+
+
+'''
+Module providing a persistent corpus of the SymPlex data of a species for the
+SymPlot (symplot.assemblies_clusters.determine_clusters).
+
+For each SymPlex (coord file in symm_*/clashes/) the corpus holds the
+interface distogram, termini, score and clash values, the nnpTM (only if
+requested, mode show_nnptm), and the correlation coefficients between the
+interface distograms. The corpus is stored as compressed npz file in the
+main folder of the predictions of the species and updated incrementally: an
+entry is reloaded only if the modification time or size of one of its
+source files (incl. the metadata database) has changed, the correlation
+coefficients are calculated only for distograms missing in the stored
+correlation matrix.
+'''
+
+version = 2 # format version of the corpus file
+
+
+def get_path(assembly, interface_matrix_type):
+    '''
+    Get path of the corpus file of an assembly (one file per species/gene and
+    interface matrix type).
+    '''
+    matrix_type = ['unsigned', 'signed'][interface_matrix_type]
+
+    return assembly[3]+assembly[1]+'_interface_corpus_'+matrix_type+'.npz'
+
+
+def get_signature(files):
+    '''
+    Get signature of source files (modification time and size, '-' for
+    missing files).
+    '''
+    signature = []
+
+    for file in files:
+        try:
+            stat = os.stat(file)
+            signature.append(str(stat.st_mtime_ns)+':'+str(stat.st_size))
+        except OSError:
+            signature.append('-')
+
+    return ';'.join(signature)
+
+
+def get_nnptm_signature(files):
+    '''
+    Get signature of the nnpTM files of a SymPlex (file names, modification
+    time and size).
+    '''
+    return ';'.join([f.split('/')[-1] for f in files])+'|'+ \
+           get_signature(files)
+
+
+def get_hash(distogram):
+    ''' Get hash of the content of an interface distogram. '''
+
+    keys, values = encode_distogram(distogram)
+
+    return hashlib.sha1(keys.tobytes()+values.tobytes()).hexdigest()
+
+
+def encode_distogram(distogram):
+    '''
+    Encode interface distogram as arrays of the residue pairs (n, 2) and
+    matrix elements (n, 3).
+    '''
+    keys = np.array(list(distogram), dtype=np.int64).reshape(-1, 2)
+    values = np.array(list(distogram.values()), dtype=float).reshape(-1, 3)
+
+    return keys, values
+
+
+def decode_distogram(keys, values):
+    ''' Decode interface distogram from arrays (encode_distogram). '''
+
+    return { (k[0], k[1]): v for k, v in \
+             zip(keys.tolist(), values.tolist()) }
+
+
+def get_cl_filename(path):
+    '''
+    Get filename of the clash distribution file of a SymPlex.
+    '''
+    filename_cl = path.replace('clashes/', ''). \
+                       replace('symm_180/', ''). \
+                       replace('symm_120/', ''). \
+                       replace('symm_090/', ''). \
+                       replace('symm_072/', ''). \
+                       replace('symm_060/', ''). \
+                       replace('symm_051/', '')
+
+    if 'cla' in filename_cl:
+        filename_cl = filename_cl.split('_cla')[0]+'.pdb'
+
+    return filename_cl+'_cldist.txt'
+
+
+def load_entry(path, sc_folder, interface_matrix_type):
+    '''
+    Load the SymPlex data of a coord file from the source files.
+
+    Return:
+        dict with 'distogram', 'termini', 'score', 'clashes', 'cl_score',
+        'mol_count', 'monomers_involved', 'nnptm' (not loaded, see
+        Corpus.get_nnptm)
+    '''
+    clashes = model_filter.model_filter.clashes_converted(path)
+
+    cl_dist = symplot.clash_dist.load(get_cl_filename(path))
+    cl_score = symplot.clash_dist.get_score(cl_dist)
+
+    # determine termini
+    rmsds = bibpdb.get_rmsds(path)
+    termini = molmodel.get_termini(rmsds)
+
+    # create list of terminus residues to exclude
+    terminus_res = [r for r in range(0, termini[0])]+ \
+                   [r for r in range(termini[1],5000)]
+
+    mol_count = 0
+    monomers_involved = []
+
+    if interface_matrix_type == 0:
+        distogram = interface_matrix.load(path, terminus_res)
+    elif interface_matrix_type == 1:
+        distogram = interface_matrix_signed.load(path, terminus_res, \
+                                                 monomers_involved=[1, 2])
+
+        scenario_path = symplot.prediction_scenario.get_path(path, sc_folder)
+        fn = symplot.prediction_scenario.get_coord_filename(path)
+        mol_count = bibpdb.get_multimer_n(scenario_path+fn)
+
+        monomers_involved = interface_matrix_signed.monomers_involved( \
+                                                    path, terminus_res)
+
+    entry = { 'distogram': distogram, \
+              'termini': termini, \
+              'score': metadata.get_score(path), \
+              'clashes': clashes, \
+              'cl_score': cl_score, \
+              'mol_count': mol_count, \
+              'monomers_involved': list(monomers_involved), \
+              'nnptm': -1, \
+              'nnptm_signature': '' }
+
+    return entry
+
+
+class Corpus():
+    '''
+    This class describes the corpus of the SymPlex data of a species.
+    '''
+
+
+    def __init__(self, path, interface_matrix_type):
+        '''
+        Initialization of the Corpus class, a stored corpus is loaded.
+        '''
+        self.path = path
+        self.interface_matrix_type = interface_matrix_type
+        self.entries = {}
+            # coord file: entry (load_entry) with 'signature' and 'hash'
+        self.corr_paths = []
+        self.corr_hashes = []
+        self.corr_coeffs = np.zeros((0, 0))
+        self.corr_counts = np.zeros((0, 0), dtype=np.int32)
+            # correlation matrix of the interface distograms of corr_paths
+            # with the hashes corr_hashes
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+
+        self.read()
+
+        return
+
+
+    def read(self):
+        ''' Read corpus file (no entries if not existing or outdated). '''
+
+        try:
+            data = np.load(self.path, allow_pickle=False)
+        except (IOError, ValueError, zipfile.BadZipFile):
+            return
+
+        if int(data['version']) != version or \
+           int(data['interface_matrix_type']) != self.interface_matrix_type:
+            ctl.p('corpus: format changed, corpus discarded')
+            data.close()
+            return
+
+        columns = {k: data[k] for k in data.files}
+        columns['termini'] = columns['termini'].tolist()
+        columns['monomers_involved'] = \
+                                columns['monomers_involved'].tolist()
+        dg_offsets = columns['dg_offsets']
+        mi_offsets = columns['mi_offsets']
+
+        for i, path in enumerate(columns['paths'].tolist()):
+            d0, d1 = dg_offsets[i], dg_offsets[i+1]
+
+            self.entries[path] = { \
+                'signature': str(columns['signatures'][i]), \
+                'hash': str(columns['hashes'][i]), \
+                'distogram': decode_distogram(columns['dg_keys'][d0:d1], \
+                                              columns['dg_values'][d0:d1]), \
+                'termini': columns['termini'][i], \
+                'score': float(columns['scores'][i]), \
+                'clashes': float(columns['clashes'][i]), \
+                'cl_score': int(columns['cl_scores'][i]), \
+                'nnptm': float(columns['nnptms'][i]), \
+                'nnptm_signature': str(columns['nnptm_signatures'][i]), \
+                'mol_count': int(columns['mol_counts'][i]), \
+                'monomers_involved': [tuple(m) for m in \
+                        columns['monomers_involved'] \
+                                    [mi_offsets[i]:mi_offsets[i+1]]] }
+
+        self.corr_paths = columns['corr_paths'].tolist()
+        self.corr_hashes = columns['corr_hashes'].tolist()
+        self.corr_coeffs = columns['corr_coeffs']
+        self.corr_counts = columns['corr_counts']
+
+        data.close()
+
+        ctl.d('corpus: '+str(len(self.entries))+' entries loaded')
+
+        return
+
+
+    def write(self):
+        '''
+        Write corpus file (atomic replacement), entries of coord files not
+        existing anymore are removed.
+        '''
+        if not self.changed:
+            return
+
+        paths = [p for p in self.entries if os.path.exists(p)]
+        entries = [self.entries[p] for p in paths]
+        encoded = [encode_distogram(e['distogram']) for e in entries]
+
+        dg_offsets = np.cumsum([0]+[len(k) for k, v in encoded])
+        mi_offsets = np.cumsum([0]+[len(e['monomers_involved']) \
+                                    for e in entries])
+
+        f = open(self.path+'.tmp', 'wb')
+        np.savez_compressed(f, \
+            version=version, \
+            interface_matrix_type=self.interface_matrix_type, \
+            paths=np.array(paths, dtype=str), \
+            signatures=np.array([e['signature'] for e in entries], \
+                                dtype=str), \
+            hashes=np.array([e['hash'] for e in entries], dtype=str), \
+            dg_offsets=dg_offsets, \
+            dg_keys=np.concatenate([k for k, v in encoded]+ \
+                                   [np.zeros((0, 2), dtype=np.int64)]), \
+            dg_values=np.concatenate([v for k, v in encoded]+ \
+                                     [np.zeros((0, 3))]), \
+            termini=np.array([e['termini'] for e in entries], \
+                             dtype=np.int64).reshape(-1, 2), \
+            scores=np.array([e['score'] for e in entries], dtype=float), \
+            clashes=np.array([e['clashes'] for e in entries], dtype=float), \
+            cl_scores=np.array([e['cl_score'] for e in entries], \
+                               dtype=np.int64), \
+            nnptms=np.array([e['nnptm'] for e in entries], dtype=float), \
+            nnptm_signatures=np.array([e['nnptm_signature'] \
+                                       for e in entries], dtype=str), \
+            mol_counts=np.array([e['mol_count'] for e in entries], \
+                                dtype=np.int64), \
+            mi_offsets=mi_offsets, \
+            monomers_involved=np.array([m for e in entries for m in \
+                                        e['monomers_involved']], \
+                                       dtype=np.int64).reshape(-1, 2), \
+            corr_paths=np.array(self.corr_paths, dtype=str), \
+            corr_hashes=np.array(self.corr_hashes, dtype=str), \
+            corr_coeffs=self.corr_coeffs, \
+            corr_counts=self.corr_counts)
+        f.close()
+
+        os.replace(self.path+'.tmp', self.path)
+
+        self.changed = False
+
+        ctl.d('corpus: '+str(len(paths))+' entries written, '+ \
+              str(self.hits)+' hits, '+str(self.misses)+' misses')
+
+        return
+
+
+    def get_entry(self, path, sc_folder):
+        '''
+        Get SymPlex data of a coord file (load_entry), loaded from the source
+        files if not in the corpus or if a source file has changed.
+        '''
+        if self.interface_matrix_type == 0:
+            interface_path = interface_matrix.get_path(path)
+        else:
+            interface_path = interface_matrix_signed.get_path(path)
+
+        coord_path = symplot.prediction_scenario.get_path(path, sc_folder)+ \
+                     symplot.prediction_scenario.get_coord_filename(path)
+
+        signature = get_signature([path, interface_path, \
+                                   get_cl_filename(path), coord_path, \
+                                   metadata_db.find_db(path)])
+            # metadata database: score and clashes (metadata.get_score,
+            # metadata.get_clashes)
+
+        if path in self.entries and \
+           self.entries[path]['signature'] == signature:
+            self.hits += 1
+            return self.entries[path]
+
+        self.misses += 1
+
+        entry = load_entry(path, sc_folder, self.interface_matrix_type)
+        entry['signature'] = signature
+        entry['hash'] = get_hash(entry['distogram'])
+
+        self.entries[path] = entry
+        self.changed = True
+
+        return entry
+
+
+    def get_nnptm(self, path, root_path):
+        '''
+        Get nnpTM score of a coord file (symplot.nnptm.get_nnptm), loaded
+        only if not in the corpus or if the nnpTM files have changed.
+        The entry of the coord file has to be loaded (get_entry).
+        '''
+        entry = self.entries[path]
+        signature = get_nnptm_signature( \
+                            symplot.nnptm.get_files(path, root_path))
+
+        if entry['nnptm_signature'] == signature:
+            return entry['nnptm']
+
+        entry['nnptm'] = symplot.nnptm.get_nnptm(path, root_path)
+        entry['nnptm_signature'] = signature
+        self.changed = True
+
+        return entry['nnptm']
+
+
+    def get_correlations(self, interface_distograms, paths):
+        '''
+        Get correlation coefficients between all combinations of given
+        interface distograms (like interface_correlation.corr_coefficients).
+
+        The stored correlation matrix is kept for the stored distograms that
+        are still valid (e.g. distograms of another subchain mode), only the
+        rows and columns of distograms missing in it are calculated.
+
+        paths: dict distogram key: coord file (entry of the corpus)
+        '''
+        signed = self.interface_matrix_type == 1
+        distogram_keys = list(interface_distograms)
+
+        valid = [i for i, (p, h) in \
+                 enumerate(zip(self.corr_paths, self.corr_hashes)) \
+                 if p in self.entries and self.entries[p]['hash'] == h]
+        corr_paths = [self.corr_paths[i] for i in valid]
+        new_paths = []
+
+        for d in distogram_keys:
+            if paths[d] not in corr_paths and paths[d] not in new_paths:
+                new_paths.append(paths[d])
+
+        if len(new_paths) > 0 or len(valid) < len(self.corr_paths):
+            ctl.d('corpus: correlation coefficients of '+ \
+                  str(len(new_paths))+' distograms calculated')
+
+            corr_coefficients = interface_correlation. \
+                    corr_coefficients_new( \
+                        {p: self.entries[p]['distogram'] \
+                         for p in corr_paths+new_paths}, \
+                        set(new_paths), signed=signed)
+
+            m = len(valid)
+            corr_paths += new_paths
+            n = len(corr_paths)
+
+            corr_coeffs = np.zeros((n, n))
+            corr_counts = np.zeros((n, n), dtype=np.int32)
+            corr_coeffs[:m, :m] = self.corr_coeffs[np.ix_(valid, valid)]
+            corr_counts[:m, :m] = self.corr_counts[np.ix_(valid, valid)]
+
+            index = {p: i for i, p in enumerate(corr_paths)}
+
+            for (p0, p1), (corr_coeff, nonzero_n) in \
+                                            corr_coefficients.items():
+                i = index[p0]
+                j = index[p1]
+                corr_coeffs[i, j] = corr_coeffs[j, i] = corr_coeff
+                corr_counts[i, j] = corr_counts[j, i] = nonzero_n
+
+            self.corr_paths = corr_paths
+            self.corr_hashes = [self.entries[p]['hash'] for p in corr_paths]
+            self.corr_coeffs = corr_coeffs
+            self.corr_counts = corr_counts
+            self.changed = True
+
+        index = {p: i for i, p in enumerate(self.corr_paths)}
+        rows = [index[paths[d]] for d in distogram_keys]
+
+        corr_coefficients = {}
+
+        if len(distogram_keys) < 2:
+            return corr_coefficients
+
+        for i, d0 in enumerate(distogram_keys):
+            for j in range(i+1, len(distogram_keys)):
+                r0 = rows[i]
+                r1 = rows[j]
+                nonzero_n = int(self.corr_counts[r0, r1])
+
+                if nonzero_n == 0:
+                    corr_coefficients[(d0, distogram_keys[j])] = (0, 0)
+                else:
+                    corr_coefficients[(d0, distogram_keys[j])] = \
+                            (float(self.corr_coeffs[r0, r1]), nonzero_n)
+
+        return corr_coefficients
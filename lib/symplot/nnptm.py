@@ -22,14 +22,14 @@ def get_nnptm(path_file, root_path):
     return nnptm
 
 
-def get_nnptms(path_file, root_path):
+def get_files(path_file, root_path):
     '''
-    Get list of nnpTM scores of next neighbor pairs.
+    Get nnpTM files (chain pairs) of a complex model.
     '''
     filename = symplot.prediction_scenario.get_coord_filename(path_file)
 
     if not '.pdb' in filename:
-        return -1
+        return []
 
     filename_part1 = '_'.join(filename.split('_')[:-1])
 
@@ -38,9 +38,22 @@ def get_nnptms(path_file, root_path):
 
     files = sorted(glob.glob(path_prediction_set+filename_part1+ \
                                 '_ch*_iptm*.txt'))
+
+    return files
+
+
+def get_nnptms(path_file, root_path):
+    '''
+    Get list of nnpTM scores of next neighbor pairs.
+    '''
+    filename = symplot.prediction_scenario.get_coord_filename(path_file)
+
+    if not '.pdb' in filename:
+        return -1
+
     nnptm_vals = []
 
-    for f in files:
+    for f in get_files(path_file, root_path):
 
         # get nnpTM score of a next neighbor pair
         nnptm = metadata.get_chainpair_nnptm(f)
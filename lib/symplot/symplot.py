@@ -323,7 +323,9 @@ def calc_symplot(root_path, mode, assemb, symplot_):
                                 # mode show_nnptm
                                 infix_nnptm = ''
                                 if mode.show_nnptm == 1:
-                                    nnptm = symplot.nnptm.get_nnptm( \
+                                    nnptm = s['nnptms'].get(symplex[6])
+                                    if nnptm == None:
+                                        nnptm = symplot.nnptm.get_nnptm( \
                                                         symplex[6], root_path)
                                     if nnptm != -1:
                                         infix_nnptm = str(nnptm)
@@ -1,23 +1,36 @@
 import bib
+import contacts
 import ctl
 import export
 import filesystem
+import metadata_db
 
 import math
+import numpy as np
 import os
 
 
-def validation(model_id, model_id_restrict, axes, export_path, conf, sess):
+clash_tolerance = 0.05
+        # max relative deviation of the number of clashes (get_clashes)
+        # from the ChimeraX command "clashes" (count_clashes_chimerax),
+        # checked in debug mode (validation, check_chimerax); a tolerance
+        # of the count, not a distance: both determinations use the
+        # ChimeraX defaults overlapCutoff 0.6 Å and hbondAllowance 0.4 Å
+        # (contacts.find_clashes), the counts differ only by the radii
+
+
+def validation(model_id, model_id_restrict, axes, export_path, conf, sess, \
+               check_chimerax=False):
     '''
     Validation of created models and export of validation data.
+
+    check_chimerax: comparison of the number of clashes with the ChimeraX
+                    command "clashes" (count_clashes_chimerax), error if the
+                    deviation exceeds clash_tolerance (debug mode)
     '''
     model_id = sess.model_reg.convert_model_id(model_id)
     model_id_restrict = sess.model_reg.convert_model_id(model_id_restrict)
 
-    model_id_str = sess.model_reg.convert_model_id_to_str(model_id)
-    model_id_restrict_str = sess.model_reg. \
-                                convert_model_id_to_str(model_id_restrict)
-
     model_res_n = sess.get_model_res_n(model_id)
 
     if export_path[0:len(conf.export_path)] != conf.export_path:
@@ -38,61 +51,44 @@ def validation(model_id, model_id_restrict, axes, export_path, conf, sess):
 
     # determination of clashes
     # ~~~~~~~~~~~~~~~~~~~~~~~~
-    clashes = sess.run('clashes #'+str(model_id_str)+' & ~@H* '+ \
-                       'restrict #'+str(model_id_restrict_str)+' & ~@H* '+ \
-                       'intraModel true interModel true interSubmodel true')
-            # exclude clashes involving hydrogen atoms (performance)
-            #
-            # notice: a ChimeraX model including the clashes is created
-
-    clash_cutoff = model_res_n*2*2
-
-    clashes_residues_n_allatoms, clashes_residues_n_woh, \
-            clashes_atoms_n_allatoms, clashes_atoms_n_woh, \
-            clashes_backboneatoms_n_woh, clash_cutoff_exceeded = \
-                                        analyze_clashes(clashes, clash_cutoff)
-            # clashes involving hydrogen atoms are excluded anyhow in this
-            # function (performance)
+    clash_atoms, clash_pairs = get_clashes(model_id, model_id_restrict, sess)
 
-    if clashes_residues_n_allatoms != clashes_residues_n_woh:
-        ctl.e('clashes_residues_n_allatoms')
-        ctl.e(clashes_residues_n_allatoms)
+    clash_atom_counts, clash_res_counts, clash_backbone_counts = \
+                        contacts.get_clash_counts(clash_atoms, clash_pairs)
+            # clashes per atom, per residue and backbone clashes per atom
 
-        ctl.e('clashes_residues_n_woh')
-        ctl.e(clashes_residues_n_woh)
-
-        ctl.e('clashes_atoms_n_allatoms')
-        ctl.e(clashes_atoms_n_allatoms)
-
-        ctl.e('clashes_atoms_n_woh')
-        ctl.e(clashes_atoms_n_woh)
-
-        ctl.error('validation: '+ \
-                  'clash number not consistent with excluded hydrogens')
+    clash_cutoff = model_res_n*2*2
 
+    clashes_atoms_n_woh = int(clash_atom_counts.sum())
+    clashes_backboneatoms_n_woh = int(clash_backbone_counts.sum())
+    clash_cutoff_exceeded = clashes_atoms_n_woh > clash_cutoff
 
-    if clashes_atoms_n_allatoms != clashes_atoms_n_woh and \
-       clash_cutoff_exceeded == False:
-        ctl.e('clashes_residues_n_allatoms')
-        ctl.e(clashes_residues_n_allatoms)
+    if check_chimerax:
+        clashes_chimerax = count_clashes_chimerax(model_id, \
+                                                  model_id_restrict, sess)
 
-        ctl.e('clashes_residues_n_woh')
-        ctl.e(clashes_residues_n_woh)
+        if abs(clashes_atoms_n_woh/2-clashes_chimerax) > \
+                                    clash_tolerance*max(1, clashes_chimerax):
+            ctl.e('clashes')
+            ctl.e(clashes_atoms_n_woh/2)
+            ctl.e('clashes_chimerax')
+            ctl.e(clashes_chimerax)
+            ctl.error('validation: number of clashes deviates from '+ \
+                      'ChimeraX "clashes" by more than clash_tolerance')
 
-        ctl.e('clashes_atoms_n_allatoms')
-        ctl.e(clashes_atoms_n_allatoms)
+    if clash_cutoff_exceeded:
+        clashes_atoms_n_woh = clash_cutoff
+            # number of clashing atoms capped like the former per-clash
+            # analysis (comparability of the clash scores)
 
-        ctl.e('clashes_atoms_n_woh')
-        ctl.e(clashes_atoms_n_woh)
+    h_atoms = np.char.startswith(clash_atoms.name[clash_pairs.ravel()], 'H')
+            # hydrogen atoms (~@H*) are excluded from the clashes
 
+    if h_atoms.any():
+        ctl.e(clash_atoms.name[clash_pairs.ravel()][h_atoms])
         ctl.error('validation: '+ \
                   'clash number not consistent with excluded hydrogens')
 
-
-    if clashes_atoms_n_allatoms%2 == 1 and clash_cutoff_exceeded == False:
-        ctl.e(clashes_atoms_n_allatoms)
-        ctl.error('validation: odd number of clashing atoms')
-
     if clashes_atoms_n_woh%2 == 1 and clash_cutoff_exceeded == False:
         ctl.e(clashes_atoms_n_woh)
         ctl.error('validation: odd number of clashing atoms')
@@ -101,11 +97,9 @@ def validation(model_id, model_id_restrict, axes, export_path, conf, sess):
         ctl.e(clashes_backboneatoms_n_woh)
         ctl.error('validation: odd number of clashing atoms')
 
-    clashes_between_atoms_n_allatoms = int(clashes_atoms_n_allatoms/2)
     clashes_between_atoms_n_woh = int(clashes_atoms_n_woh/2)
     clashes_between_backboneatoms_n_woh = int(clashes_backboneatoms_n_woh/2)
 
-
     clashes = clashes_between_atoms_n_woh
     clashes_per_100residues = 100*clashes/model_res_n
     clashes_per_residue = clashes/model_res_n
@@ -199,105 +193,84 @@ def validation(model_id, model_id_restrict, axes, export_path, conf, sess):
 
         f.close()
 
+        metadata_db.write(conf.get_struct_coll_meta_path()+ \
+                          metadata_db.db_filename, 'validations', \
+                          { 'name': conf.species+'_'+conf.species_name+'/'+ \
+                                    path_part2, \
+                            'species': conf.species, \
+                            'gene': conf.gene, \
+                            'score_quality': quality_score, \
+                            'score_clash': clashes_per_residue, \
+                            'score_bend': ax1_tilt_score, \
+                            'backbone_clashes': backbone_clashes_per_residue, \
+                            'clashes_per_100residues': \
+                                                clashes_per_100residues, \
+                            'score_bendz': rmsd })
+
     return [clashes_per_100residues, \
             [quality_score, clashes_per_residue, ax1_tilt_score, \
             backbone_clashes_per_residue]]
 
 
-def analyze_clashes(clashes, clash_cutoff=None, without_h=True):
-    '''
-    Determine number of clashes for different clash types.
+def get_clashes(model_id, model_id_restrict, sess):
     '''
-    clashes_residues_n_allatoms = 0
-            # number of clashing residues,
-            # considering all types of atoms (including hydrogens)
-
-    clashes_residues_n_woh = 0
-            # number of clashing residues,
-            # considering all types of atoms except hydrogens
-
-    clashes_atoms_n_allatoms = 0
-            # number of clashing atoms,
-            # considering all types of atoms (including hydrogens)
-
-    clashes_atoms_n_woh = 0
-            # number of clashing atoms,
-            # considering all types of atoms except hydrogens
-
-    clashes_backboneatoms_n_woh = 0
-            # number of clashing backbone atoms,
-            # considering all types of atoms except hydrogens
-
-    clash_cutoff_exceeded = False
-            # if clash cutoff exceeded, continue with backbone clashes only
+    Determine clashes between the atoms of model_id and the atoms of
+    model_id_restrict (including all submodels), independent of the ChimeraX
+    command "clashes" (module contacts, defaults of "clashes", hydrogen atoms
+    excluded).
 
-    for clash_res in clashes:
-        perres_clashes_atoms_n_allatoms = 0
-                # number of clashing atoms per residue (clash_res),
-                # considering all types of atoms (including hydrogens)
+    Clashes between cysteines are skipped to avoid counting clashes caused by
+    unrecognized disulfide bonds.
 
-        perres_clashes_atoms_n_woh = 0
-                # number of clashing atoms per residue (clash_res),
-                # considering all types of atoms except hydrogens
-
-        perres_clashes_backboneatoms_n_woh = 0
-                # number of clashing backbone atoms per residue (clash_res),
-                # considering all types of atoms except hydrogens
-
-        # check if clash cutoff is exceeded (performance)
-        if clash_cutoff != None and clashes_atoms_n_woh > clash_cutoff:
-            clash_cutoff_exceeded = True
+    Return:
+        Atoms object of model_id_restrict, clashing atom pairs (i, j)
+    '''
+    model_atoms, bonds, atom_model_ids = sess.get_atoms(model_id_restrict)
 
-        clash_res_ = str(clash_res).strip().split(' ')
-        clash_res_name = clash_res_[-3].strip().lower()
-                # name of clashing residue, e.g. 'ala'
-        clash_atom = clash_res_[-1].strip()
-                # clashing atom, e.g. 'C'
+    test_mask = np.array([m[:len(model_id)] == model_id \
+                          for m in atom_model_ids], dtype=bool)
 
-        if without_h == True and clash_atom[0] == 'H':
-            ctl.error('analyze_clashes: hydrogen (H atom) in list of clashes')
+    pairs, overlaps = contacts.find_clashes(model_atoms, test_mask, \
+                                            bonds=bonds)
 
-        if clash_cutoff_exceeded == False or \
-            clash_cutoff_exceeded == True and clash_atom in ('N', 'CA', 'C'):
-                    # in the case that clash cutoff is exceeded,
-                    # continue with backbone clashes only (performance)
+    cys = model_atoms.resname == 'CYS'
+    pairs = pairs[~(cys[pairs[:, 0]] & cys[pairs[:, 1]])]
 
-            for clash_partner in clashes[clash_res]:
-                clash_partner_ = str(clash_partner).strip().split(' ')
-                clash_partner_atom = clash_partner_[-1].strip()
+    return model_atoms, pairs
 
-                # skip clashes between cysteines to avoid counting clashes
-                # caused by unrecognized disulfide bonds
-                if clash_res_name == 'cys':
-                    if clash_partner_[-3].strip().lower() == 'cys':
-                        continue
 
-                if without_h == True and clash_partner_atom[0] == 'H':
-                    ctl.error('analyze_clashes: '+ \
-                              'hydrogen (H atom) in list of clashes')
+def count_clashes_chimerax(model_id, model_id_restrict, sess):
+    '''
+    Determine number of clashes with the ChimeraX command "clashes" (same
+    selection as get_clashes).
 
-                perres_clashes_atoms_n_allatoms += 1
+    Used for the comparison with get_clashes: the numbers of clashes are
+    expected to agree within clash_tolerance (relative), differences result
+    from the united-atom radii of the atom types.
 
-                if clash_atom[0] != 'H' and clash_partner_atom[0] != 'H':
-                    perres_clashes_atoms_n_woh += 1
+    notice: a ChimeraX model including the clashes is created
+    '''
+    model_id_str = sess.model_reg.convert_model_id_to_str(model_id)
+    model_id_restrict_str = sess.model_reg. \
+                                convert_model_id_to_str(model_id_restrict)
 
-                if clash_atom in ('N', 'CA', 'C') and \
-                                clash_partner_[-1].strip() in ('N', 'CA', 'C'):
-                    perres_clashes_backboneatoms_n_woh += 1
+    clashes = sess.run('clashes #'+model_id_str+' & ~@H* '+ \
+                       'restrict #'+model_id_restrict_str+' & ~@H* '+ \
+                       'intraModel true interModel true interSubmodel true')
 
+    clashes_atoms_n = 0
 
-            clashes_atoms_n_allatoms += perres_clashes_atoms_n_allatoms
-            clashes_atoms_n_woh += perres_clashes_atoms_n_woh
-            clashes_backboneatoms_n_woh += perres_clashes_backboneatoms_n_woh
+    for clash_atom in clashes:
+        clash_atom_ = str(clash_atom).strip().split(' ')
 
-            clashes_residues_n_allatoms += \
-                                        min(1, perres_clashes_atoms_n_allatoms)
-            clashes_residues_n_woh += min(1, perres_clashes_atoms_n_woh)
+        for clash_partner in clashes[clash_atom]:
+            clash_partner_ = str(clash_partner).strip().split(' ')
 
+            # skip clashes between cysteines
+            if clash_atom_[-3].strip().lower() == 'cys' and \
+               clash_partner_[-3].strip().lower() == 'cys':
+                continue
 
-    if clash_cutoff != None and clashes_atoms_n_woh > clash_cutoff:
-        clashes_atoms_n_woh = clash_cutoff
+            clashes_atoms_n += 1
 
-    return clashes_residues_n_allatoms, clashes_residues_n_woh, \
-            clashes_atoms_n_allatoms, clashes_atoms_n_woh, \
-            clashes_backboneatoms_n_woh, clash_cutoff_exceeded
+    return int(clashes_atoms_n/2)
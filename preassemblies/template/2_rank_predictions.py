@@ -2,9 +2,15 @@ import glob
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-import pathlib
 import pickle
 import shutil
+import sys
+
+
+sidecar_extension = '.npz'
+        # sidecar of a result pickle with scores, PAE and distance matrix
+score_keys = ['ptm', 'iptm', 'ranking_confidence', \
+              'max_predicted_aligned_error']
 
 
 def get_file(file, attempt=0):
@@ -74,16 +80,74 @@ def sort_models(ptm_file):
     return modelssort
 
 
-def gen_diagram(mode, ds, de, prefix, path_part1):
+def get_sidecar_path(pkl_file):
     '''
-    Generate and save diagram for models.
+    Get path of the sidecar of a result pickle.
     '''
-    work_dir = str(pathlib.Path().absolute())+'/'
-    pkl_files = sorted(glob.glob(work_dir+'result_*.pkl'))
+    return pkl_file[:-4]+sidecar_extension
 
-    if len(pkl_files) == 0:
-        return
 
+def extract_sidecar(pkl_file):
+    '''
+    Extract scores, PAE and argmax distance matrix of a result pickle into a
+    small uncompressed npz sidecar, which is read instead of the pickle.
+    The sidecar is only created if missing or older than the pickle.
+    '''
+    sidecar_path = get_sidecar_path(pkl_file)
+
+    if os.path.isfile(sidecar_path) and \
+       os.path.getmtime(sidecar_path) >= os.path.getmtime(pkl_file):
+        return sidecar_path
+
+    with open(pkl_file, 'rb') as f:
+        d1 = pickle.load(f)
+
+    arrays = {}
+
+    for key in score_keys:
+        if key in d1:
+            arrays[key] = np.float64(d1[key])
+
+    if 'predicted_aligned_error' in d1:
+        arrays['pae'] = np.asarray(d1['predicted_aligned_error'], \
+                                   dtype=np.float32)
+
+    if 'distogram' in d1:
+        distance_bins = np.append(0, d1['distogram']['bin_edges'])
+        distance_logits = d1['distogram']['logits']
+        arrays['distance_matrix'] = \
+            distance_bins[distance_logits.argmax(-1)].astype(np.float32)
+
+    del d1 # only one result pickle in memory
+
+    with open(sidecar_path+'.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+
+    os.replace(sidecar_path+'.tmp', sidecar_path)
+
+    return sidecar_path
+
+
+def extract_sidecars(path_part1):
+    '''
+    Extract sidecars of all result pickles (one pickle loaded at a time).
+    '''
+    pkl_files = sorted(glob.glob(path_part1+'result_*.pkl'))
+
+    for i,p in enumerate(pkl_files):
+        if not os.path.isfile(get_sidecar_path(p)):
+            print('extract sidecar '+str(i+1)+'/'+str(len(pkl_files))+ \
+                  ': '+p)
+
+        extract_sidecar(p)
+
+    return
+
+
+def create_diagram(ds, de):
+    '''
+    Create figure of a diagram for models ds ... de-1.
+    '''
     maxr = '/'+str(de)+': '
 
     i = -1
@@ -105,67 +169,85 @@ def gen_diagram(mode, ds, de, prefix, path_part1):
 
     plt.tight_layout()
 
-    i = -1
+    return figu, axes, matrix
 
-    for j,m in enumerate(modelssort[ds:de]):
-        if j%5 == 0:
-           i += 1
 
-        pkl_files = sorted(glob.glob(work_dir+'result_'+m[0]+'.pkl'))
+def plot_model(mode, j, m, sidecar, axes, matrix):
+    '''
+    Plot panel of a model (j: index in the diagram) from its sidecar.
+    '''
+    i = j//5
+
+    if mode == 'stat':
+        data = sidecar['pae']
+
+    if mode == 'dist':
+        data = sidecar['distance_matrix']
+
+    ptm = float(sidecar['ptm'])
+    iptm = float(sidecar['iptm'])
+
+    if mode == 'stat':
+        vmin = 0
+        vmax = 32
+        title1 = matrix[i][j%5][1]+'pTM:'+str(round(ptm,2))+ \
+                 ' ipTM:'+str(round(iptm, 2))+' comb.:'+str(round(m[1], 2))
+    if mode == 'dist':     
+        vmin = 0
+        vmax = 20
+        title1 = matrix[i][j%5][1]+'contact map'
+
+    if len(matrix) == 1:
+        im = axes[j].imshow(data, vmin=vmin, vmax=vmax)
+        axes[j].tick_params(axis='x', direction='in')
+        axes[j].tick_params(axis='y', direction='in')
+        axes[j].set_title(title1, fontsize=9, fontweight='bold', pad=6)
+        if i == 0 and j == 0:
+            axes[j].figure.colorbar(im)
+    else:
+        im = axes[i, j%5].imshow(data, vmin=vmin, vmax=vmax)
+        axes[i, j%5].tick_params(axis='x', direction='in')
+        axes[i, j%5].tick_params(axis='y', direction='in')
+        axes[i, j%5].set_title(title1, fontsize=9, fontweight='bold', \
+                               pad=6)
+        if i == 0 and j == 0:
+            axes[i, j%5].figure.colorbar(im)
+
+    return
+
+
+def gen_diagrams(diagrams, modelssort, path_part1):
+    '''
+    Generate and save diagrams for models.
+
+    diagrams: list of [mode, ds, de, prefix] with mode 'stat': PAE,
+              'dist': contact map
+    The sidecar of each model is loaded once for all diagrams.
+    '''
+    if len(glob.glob(path_part1+'result_*'+sidecar_extension)) == 0:
+        return
 
-        if len(pkl_files) == 0:
+    figures = [create_diagram(d[1], d[2]) for d in diagrams]
+
+    for j,m in enumerate(modelssort[:max([d[2] for d in diagrams])]):
+        sidecar_path = path_part1+'result_'+m[0]+sidecar_extension
+
+        if not os.path.isfile(sidecar_path):
             continue
 
-        pkl_file = pkl_files[0]
-
-        with open(path_part1+pkl_file, 'rb') as f:
-            d1 = pickle.load(f)
-
-        if mode == 'stat':
-            data = d1['predicted_aligned_error']
-
-        if mode == 'dist':
-            distance_bins = np.append(0, d1['distogram']['bin_edges'])
-            distance_logits = d1['distogram']['logits']
-            distance_matrix = distance_bins[distance_logits.argmax(-1)]
-            data = distance_matrix
-
-        ptm = float(d1['ptm'])
-        iptm = float(d1['iptm'])
-
-        mpae = d1['max_predicted_aligned_error']
-        if mpae != 31.75:
-            print('ERROR: gen_diagram: mpae')
-            sys.exit()
-
-        if mode == 'stat':
-            vmin = 0
-            vmax = 32
-            title1 = matrix[i][j%5][1]+'pTM:'+str(round(ptm,2))+ \
-                     ' ipTM:'+str(round(iptm, 2))+' comb.:'+str(round(m[1], 2))
-        if mode == 'dist':     
-            vmin = 0
-            vmax = 20
-            title1 = matrix[i][j%5][1]+'contact map'
-
-        if len(matrix) == 1:
-            im = axes[j].imshow(data, vmin=vmin, vmax=vmax)
-            axes[j].tick_params(axis='x', direction='in')
-            axes[j].tick_params(axis='y', direction='in')
-            axes[j].set_title(title1, fontsize=9, fontweight='bold', pad=6)
-            if i == 0 and j == 0:
-                axes[j].figure.colorbar(im)
-        else:
-            im = axes[i, j%5].imshow(data, vmin=vmin, vmax=vmax)
-            axes[i, j%5].tick_params(axis='x', direction='in')
-            axes[i, j%5].tick_params(axis='y', direction='in')
-            axes[i, j%5].set_title(title1, fontsize=9, fontweight='bold', \
-                                   pad=6)
-            if i == 0 and j == 0:
-                axes[i, j%5].figure.colorbar(im)
+        with np.load(sidecar_path) as sidecar:
+            if float(sidecar['max_predicted_aligned_error']) != 31.75:
+                print('ERROR: gen_diagram: mpae')
+                sys.exit()
 
-    figu.savefig(path_part1+prefix+'_'+('00'+str(ds))[-2:]+'-'+ \
-                 ('00'+str(de))[-2:]+'.png')
+            for d, (figu, axes, matrix) in zip(diagrams, figures):
+                if d[1] <= j < d[2]:
+                    plot_model(d[0], j-d[1], m, sidecar, axes, matrix)
+
+    for d, (figu, axes, matrix) in zip(diagrams, figures):
+        figu.savefig(path_part1+d[3]+'_'+('00'+str(d[1]))[-2:]+'-'+ \
+                     ('00'+str(d[2]))[-2:]+'.png')
+        plt.close(figu)
 
     return
 
@@ -238,10 +320,12 @@ if __name__ == "__main__":
                                 ('00'+str(i))[-2:]+'_'+ \
                                 (str(round(m[1],3))+'000')[0:5]+'.pdb')
 
-        gen_diagram('stat', 0, 5, '', path_part1)
-        gen_diagram('stat', 0, 25, '', path_part1)
-        gen_diagram('dist', 0, 5, 'contactmap', path_part1)
-        gen_diagram('dist', 0, 25, 'contactmap', path_part1)
+        extract_sidecars(path_part1)
+
+        gen_diagrams([['stat', 0, 5, ''], \
+                      ['stat', 0, 25, ''], \
+                      ['dist', 0, 5, 'contactmap'], \
+                      ['dist', 0, 25, 'contactmap']], modelssort, path_part1)
 
     else:
         pkl_files = sorted(glob.glob(path_part1+'*.pkl'))
@@ -250,8 +334,9 @@ if __name__ == "__main__":
             if p == path_part1+'features.pkl':
                   continue
 
-            with open(p, 'rb') as f:
-                d1 = pickle.load(f)
+            with np.load(extract_sidecar(p)) as sidecar:
+                d1 = {'ranking_confidence': \
+                                    float(sidecar['ranking_confidence'])}
 
             print(p+':')
             print('ranking_confidence: '+str(d1['ranking_confidence']))
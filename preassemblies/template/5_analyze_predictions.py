@@ -13,56 +13,77 @@ sys.path.append(path_symprofold+'lib/')
 
 import ctl
 import model_preparation.analyze_prediction_dir
+import model_preparation.bib
+import model_preparation.parallel
+import scheduler
+
+
+# configuration
+# ~~~~~~~~~~~~~
+workers_n = 1
+        # number of parallel worker processes, 1: sequential processing in
+        # this ChimeraX session
+engine = 0
+        # engine of the worker processes (workers_n > 1)
+        # 0: headless ChimeraX instances, 1: headless engine without ChimeraX
+chimerax_exe = 'chimerax'
+        # ChimeraX executable used to start the worker processes
+species = ''
+        # species abbreviation, e.g. 'Vaer' (like conf.set_species of the
+        # assembly scripts), stored in the metadata database
+gene = ''
+        # gene id, e.g. 'A0A1M5ZCF8' (like conf.set_gene of the assembly
+        # scripts), stored in the metadata database
+
+# end of configuration section
 
 
 work_dir = os.path.dirname(os.path.realpath(__file__))+'/'
-existing_dirs = sorted(glob.glob(work_dir+'*_o*'))
-
-if len(existing_dirs) > 150:
-    ctl.e(existing_dirs)
-    ctl.e(len(existing_dirs))
-    ctl.error('ERROR: more than 150 existing directories with analyzed '+ \
-                                                              'predictions')
-    sys.exit()
-
-else:            
-    for f in existing_dirs:
-        if len(f) < 5:
-            print('ERROR: path length too short')
-            sys.exit()
-
-        try:
-            shutil.rmtree(f+'/')
-        except IOError:
-            pass
-
-
-prediction_dirs0 = sorted(glob.glob(work_dir+'*_*x*'))
-prediction_dirs = []
-
-for d in prediction_dirs0:
-    if os.path.isdir(d):
-        prediction_dirs.append(d+'/')
-
-
-prediction_dirs_for_processing = []
-
-for d in prediction_dirs:
-
-    # append directory with unrelaxed files
-    prediction_dirs_for_processing.append(d)
-
-    if os.path.isdir(d+d.split('/')[-2]):
-        files_ranked = sorted(glob.glob(d+d.split('/')[-2]+ \
-                                    '/rank*_*.*.pdb'))
-
-        if len(files_ranked) >= 5:
-            # if directory with complete set of relaxed files available,
-            # also append directory with relaxed files
-            prediction_dirs_for_processing.append(d+d.split('/')[-2]+'/')
-
-
-for d in prediction_dirs_for_processing:
-    model_preparation.analyze_prediction_dir.analyze(d, session)
+lock_dir = work_dir+'analyze_locks/'
+        # job list, lock files and markers of processed files of the workers
+
+worker_i, jobs_path = scheduler.get_worker_args(sys.argv)
+        # worker_i: -1: main process, >= 0: worker process started by the
+        # main process
+
+if worker_i == -1:
+    existing_dirs = sorted(glob.glob(work_dir+'*_o*'))
+
+    if len(existing_dirs) > 150:
+        ctl.e(existing_dirs)
+        ctl.e(len(existing_dirs))
+        ctl.error('ERROR: more than 150 existing directories with '+ \
+                  'analyzed predictions')
+        sys.exit()
+
+    else:            
+        for f in existing_dirs:
+            if len(f) < 5:
+                print('ERROR: path length too short')
+                sys.exit()
+
+            try:
+                shutil.rmtree(f+'/')
+            except IOError:
+                pass
+
+
+    prediction_dirs_for_processing = \
+            model_preparation.bib.get_prediction_dirs(work_dir)
+
+    if workers_n == 1:
+        for d in prediction_dirs_for_processing:
+            model_preparation.analyze_prediction_dir.analyze(d, session, \
+                                                             species, gene)
+
+    else:
+        model_preparation.parallel.analyze(prediction_dirs_for_processing, \
+                workers_n, engine, lock_dir, os.path.realpath(__file__), \
+                chimerax_exe, species, gene)
+
+else:
+    jobs = scheduler.import_jobs(jobs_path)
+    model_preparation.analyze_prediction_dir.analyze_jobs(jobs, lock_dir, \
+                                                          worker_i, session)
 
 print('finished')
@@ -0,0 +1,140 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import rigid_body
+from center_cache import CenterCache
+
+import numpy as np
+import unittest
+
+
+'''
+Tests of the center cache: centers of moved structures updated analytically
+compared with the mean of the moved coordinates.
+'''
+
+
+class Position():
+    ''' Scene position of a structure (3x4 matrix). '''
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+
+class Structure():
+    ''' Structure with residue coordinates in its own coordinate system. '''
+
+    def __init__(self, xyz):
+        self.xyz = np.asarray(xyz, dtype=float)
+        self.num_atoms = len(xyz)
+        self.scene_position = Position(rigid_body.identity())
+
+
+    def scene_coords(self):
+        return rigid_body.apply(self.scene_position.matrix, self.xyz)
+
+
+    def move(self, tf):
+        ''' Move structure in the scene (new position matrix). '''
+
+        self.scene_position = Position( \
+                    rigid_body.multiply(tf, self.scene_position.matrix))
+
+
+def get_tf(rng):
+    ''' Random rigid-body transform. '''
+
+    return rigid_body.rotation(rng.normal(0, 1, 3), \
+                               float(rng.uniform(-180, 180)), \
+                               rng.uniform(-20, 20, 3))
+
+
+class TestCenterCache(unittest.TestCase):
+    '''
+    Centers of the cache compared with the mean of the scene coordinates.
+    '''
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.cache = CenterCache()
+
+
+    def get_center(self, key, structs):
+        ''' Get center like ChimeraxSession.get_center. '''
+
+        entry = self.cache.get_entry(key, structs)
+
+        if entry == None:
+            entry = self.cache.build_entry(key, structs, \
+                                [s.scene_coords() for s in structs])
+
+        return self.cache.get_center(entry)
+
+
+    def test_move(self):
+        struct = Structure(self.rng.normal(0, 10, (50, 3)))
+        struct.move(get_tf(self.rng))
+
+        for i in range(10):
+            center = self.get_center((1,), [struct])
+
+            np.testing.assert_allclose(center, \
+                                       struct.scene_coords().mean(axis=0))
+
+            struct.move(get_tf(self.rng))
+
+        self.assertEqual(self.cache.get_stats(), \
+                         { 'hits': 0, 'updates': 9, 'misses': 1, \
+                           'entries': 1 })
+
+        # unmoved structure
+        self.get_center((1,), [struct])
+        self.get_center((1,), [struct])
+        self.assertEqual(self.cache.hits, 1)
+
+
+    def test_parts(self):
+        ''' Center of several structures weighted by number of residues. '''
+
+        structs = [Structure(self.rng.normal(0, 10, (n, 3))) \
+                   for n in [10, 40, 25]]
+
+        for i in range(5):
+            for s in structs:
+                s.move(get_tf(self.rng))
+
+            np.testing.assert_allclose( \
+                self.get_center((1, 'parts'), structs), \
+                np.concatenate([s.scene_coords() for s in structs]). \
+                                                            mean(axis=0))
+
+
+    def test_changed(self):
+        ''' Changed or reopened structures and invalidated entries. '''
+
+        struct = Structure(self.rng.normal(0, 10, (20, 3)))
+        self.get_center((1,), [struct])
+
+        struct.num_atoms -= 1
+        self.assertEqual(self.cache.get_entry((1,), [struct]), None)
+
+        self.get_center((1,), [struct])
+        self.assertEqual(self.cache.get_entry((1,), \
+                         [Structure(struct.xyz)]), None)
+
+        self.cache.get_entry((1,), [struct])
+        self.cache.invalidate((1, 2))
+        self.assertEqual(self.cache.get_entry((1,), [struct]), None)
+
+
+    def test_empty_range(self):
+        entry = self.cache.build_entry((1,), [Structure(np.zeros((3, 3)))], \
+                                       [np.zeros((0, 3))])
+
+        with self.assertRaises(Exception):
+            self.cache.get_center(entry)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import atoms
+import contacts
+
+import numpy as np
+import scipy.sparse.csgraph
+import unittest
+
+
+'''
+Tests of the clash detection (contacts.find_clashes, get_clash_counts) on
+synthetic atoms: overlap cutoff and hydrogen-bond allowance (ChimeraX
+defaults), skipped pairs (same residue, bond separation, group), counting
+per atom, residue and chain, compared with all atom pairs.
+'''
+
+
+def get_atoms(rows):
+    ''' Atoms from rows (name, resname, chainid, resid, element, xyz). '''
+
+    return atoms.from_columns([r[0] for r in rows], [r[1] for r in rows], \
+                              [r[2] for r in rows], [r[3] for r in rows], \
+                              [r[4] for r in rows], [r[5] for r in rows])
+
+
+def get_pair(element0, element1, d, name0='CB', name1='CB'):
+    ''' Two atoms of different chains at distance d. '''
+
+    return get_atoms([(name0, 'ALA', 'A', 1, element0, [0, 0, 0]), \
+                      (name1, 'ALA', 'B', 1, element1, [d, 0, 0])])
+
+
+def find_clashes_ref(model_atoms, overlap_cutoff=0.6, hbond_allowance=0.4, \
+                     bond_separation=4):
+    ''' Clashes of all atom pairs (loop). '''
+
+    radii = contacts.get_radii(model_atoms)
+    res_index = model_atoms.get_residue_index()
+    path_n = scipy.sparse.csgraph.shortest_path( \
+                            contacts.get_bonds(model_atoms), unweighted=True)
+
+    pairs = []
+
+    for i in range(len(model_atoms)):
+        for j in range(i+1, len(model_atoms)):
+            d = np.linalg.norm(model_atoms.xyz[i]-model_atoms.xyz[j])
+            overlap = radii[i]+radii[j]-d
+
+            if model_atoms.element[i] in ['N', 'O'] and \
+               model_atoms.element[j] in ['N', 'O']:
+                overlap -= hbond_allowance
+
+            if overlap >= overlap_cutoff and res_index[i] != res_index[j] \
+               and path_n[i, j] >= bond_separation:
+                pairs.append((i, j))
+
+    return pairs
+
+
+class TestContacts(unittest.TestCase):
+    '''
+    Clashes compared with the definition of the ChimeraX command "clashes".
+    '''
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+
+    def assertClashes(self, model_atoms, n, **kwargs):
+        pairs, overlaps = contacts.find_clashes(model_atoms, **kwargs)
+        self.assertEqual(len(pairs), n)
+
+
+    def test_overlap_cutoff(self):
+        # CB (sp3 carbon): 1.88+1.88-d >= 0.6
+        self.assertClashes(get_pair('C', 'C', 3.15), 1)
+        self.assertClashes(get_pair('C', 'C', 3.17), 0)
+        self.assertClashes(get_pair('C', 'C', 3.17), 1, overlap_cutoff=0.5)
+
+        pairs, overlaps = contacts.find_clashes(get_pair('C', 'C', 3.0))
+        self.assertAlmostEqual(overlaps[0], 0.76)
+
+
+    def test_hbond_allowance(self):
+        # N, O: 1.64+1.42-d-0.4 >= 0.6
+        self.assertClashes(get_pair('N', 'O', 2.05, 'N', 'O'), 1)
+        self.assertClashes(get_pair('N', 'O', 2.07, 'N', 'O'), 0)
+        self.assertClashes(get_pair('N', 'O', 2.07, 'N', 'O'), 1, \
+                           hbond_allowance=0)
+
+        # no hydrogen bond between C and O
+        self.assertClashes(get_pair('C', 'O', 2.07, 'CB', 'O'), 1)
+
+
+    def test_search_cutoff(self):
+        '''
+        Clash at the largest distance of the largest radii (search cutoff
+        of the KD-tree).
+        '''
+        d = 2*contacts.radius_c_sp3-0.6
+
+        self.assertClashes(get_pair('C', 'C', d-1e-9), 1)
+        self.assertClashes(get_pair('C', 'C', d+1e-6), 0)
+
+
+    def test_skipped_pairs(self):
+        # same residue
+        model_atoms = get_pair('C', 'C', 2.5)
+        model_atoms.chainid[1] = 'A'
+        self.assertClashes(model_atoms, 0)
+        self.assertClashes(model_atoms, 1, intra_res=True)
+
+        # same group (e.g. rigid body)
+        model_atoms = get_pair('C', 'C', 2.5)
+        self.assertClashes(model_atoms, 0, group=np.array([0, 0]))
+        self.assertClashes(model_atoms, 1, group=np.array([0, 1]))
+
+        # test atoms (restrict)
+        self.assertClashes(model_atoms, 1, test_mask=np.array([True, False]))
+        self.assertClashes(model_atoms, 0, \
+                           test_mask=np.array([False, False]))
+
+        # bond separation: chain of bonded atoms (1.5 Å) folded back, atoms
+        # 0 and 3 separated by 3 bonds, 0 and 4 by 4 bonds
+        xyz = [[0, 0, 0], [1.5, 0, 0], [1.5, 1.5, 0], [1.5, 1.5, 1.5], \
+               [0, 1.5, 1.5]]
+        model_atoms = get_atoms([('CB', 'ALA', 'A', k+1, 'C', xyz[k]) \
+                                 for k in range(5)])
+        pairs, overlaps = contacts.find_clashes(model_atoms)
+
+        self.assertEqual(pairs.tolist(), [[0, 4]])
+
+
+    def test_random(self):
+        ''' Comparison with all atom pairs. '''
+
+        for trial in range(20):
+            n = int(self.rng.integers(2, 80))
+            elements = self.rng.choice(['C', 'N', 'O', 'S'], n)
+            names = [{ 'C': 'CB', 'N': 'N', 'O': 'O', 'S': 'SG' }[e] \
+                     for e in elements]
+            chainids = self.rng.choice(['A', 'B'], n)
+            order = np.argsort(chainids, kind='stable')
+
+            model_atoms = get_atoms([(names[k], 'ALA', chainids[k], \
+                                      int(self.rng.integers(1, 8)), \
+                                      elements[k], \
+                                      self.rng.uniform(0, 9, 3)) \
+                                     for k in order])
+
+            pairs, overlaps = contacts.find_clashes(model_atoms)
+
+            with self.subTest(trial=trial):
+                self.assertEqual(sorted(map(tuple, pairs.tolist())), \
+                                 find_clashes_ref(model_atoms))
+
+
+    def test_clash_counts(self):
+        '''
+        Clashes per atom, per residue (incl. the same residue id in
+        different chains) and backbone clashes.
+        '''
+        model_atoms = get_atoms([('N', 'ALA', 'A', 1, 'N', [0, 0, 0]), \
+                                 ('CA', 'ALA', 'A', 1, 'C', [0, 0, 0]), \
+                                 ('CB', 'ALA', 'A', 2, 'C', [0, 0, 0]), \
+                                 ('CA', 'ALA', 'B', 1, 'C', [0, 0, 0]), \
+                                 ('C', 'ALA', 'B', 1, 'C', [0, 0, 0]), \
+                                 ('CB', 'ALA', 'B', 2, 'C', [0, 0, 0])])
+        pairs = np.array([[1, 3], [0, 4], [2, 3], [2, 5]])
+
+        atom_counts, res_counts, bb_counts = \
+                            contacts.get_clash_counts(model_atoms, pairs)
+
+        self.assertEqual(atom_counts.tolist(), [1, 1, 2, 2, 1, 1])
+        self.assertEqual(res_counts.tolist(), [2, 2, 3, 1])
+        self.assertEqual(bb_counts.tolist(), [1, 1, 0, 1, 1, 0])
+
+        # per chain
+        self.assertEqual([int(atom_counts[model_atoms.chainid == c].sum()) \
+                          for c in ['A', 'B']], [4, 4])
+
+        self.assertEqual(contacts.get_clashing_atoms(pairs).tolist(), \
+                         [0, 1, 2, 3, 4, 5])
+
+        # no clashes
+        atom_counts, res_counts, bb_counts = contacts.get_clash_counts( \
+                            model_atoms, np.zeros((0, 2), dtype=int))
+        self.assertEqual(atom_counts.tolist(), [0]*6)
+        self.assertEqual(res_counts.tolist(), [0]*4)
+
+
+if __name__ == '__main__':
+    unittest.main()
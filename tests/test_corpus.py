@@ -0,0 +1,123 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import interface_correlation
+import symplot.corpus
+
+import numpy as np
+import tempfile
+import unittest
+
+
+'''
+Tests of the incremental correlation coefficients of the SymPlot corpus.
+'''
+
+
+def get_distograms(n, seed):
+    ''' Random interface distograms. '''
+
+    rng = np.random.default_rng(seed)
+    distograms = {}
+
+    for k in range(n):
+        distograms['/p/m%02d_cla0-1.pdb' % k] = \
+            dict([((int(a), int(b)), [round(float(rng.uniform(3, 10)), 2), \
+                                      0.0, 0.0]) \
+                  for a, b in rng.integers(1, 25, (40, 2))])
+
+    return distograms
+
+
+def assert_equal_corr(test, corr, corr_ref):
+    ''' Compare correlation coefficients (pairs in any order). '''
+
+    test.assertEqual(len(corr), len(corr_ref))
+
+    for (d0, d1), (corr_coeff, nonzero_n) in corr.items():
+        ref = corr_ref.get((d0, d1), corr_ref.get((d1, d0)))
+
+        test.assertEqual(nonzero_n, ref[1])
+        test.assertAlmostEqual(corr_coeff, ref[0], places=12)
+
+    return
+
+
+class TestCorpus(unittest.TestCase):
+    '''
+    Correlation coefficients of the corpus compared with the calculation
+    over all distograms.
+    '''
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def get_corpus(self, distograms, interface_matrix_type):
+        corpus = symplot.corpus.Corpus(self.tmp.name+'/corpus.npz', \
+                                       interface_matrix_type)
+
+        for path in distograms:
+            corpus.entries[path] = { \
+                    'distogram': distograms[path], \
+                    'hash': symplot.corpus.get_hash(distograms[path]) }
+
+        return corpus
+
+
+    def test_corr_coefficients_new(self):
+        distograms = get_distograms(30, 0)
+        new_keys = set(list(distograms)[5:9])
+
+        for signed in [False, True]:
+            corr_ref = interface_correlation.corr_coefficients(distograms, \
+                                                               signed)
+            corr = interface_correlation.corr_coefficients_new(distograms, \
+                                                        new_keys, signed)
+
+            with self.subTest(signed=signed):
+                assert_equal_corr(self, corr, \
+                        dict([(k, v) for k, v in corr_ref.items() \
+                              if k[0] in new_keys or k[1] in new_keys]))
+
+
+    def test_incremental(self):
+        distograms = get_distograms(20, 1)
+        keys = list(distograms)
+
+        for interface_matrix_type in [0, 1]:
+            corpus = self.get_corpus(distograms, interface_matrix_type)
+            paths = dict([(k, k) for k in keys])
+
+            for subset in [keys[:10], keys[5:15], keys, keys[::3]]:
+                subset_distograms = dict([(k, distograms[k]) \
+                                          for k in subset])
+                corr_ref = interface_correlation.corr_coefficients( \
+                                subset_distograms, interface_matrix_type == 1)
+
+                with self.subTest(type=interface_matrix_type, \
+                                  subset=len(subset)):
+                    assert_equal_corr(self, \
+                        corpus.get_correlations(subset_distograms, paths), \
+                        corr_ref)
+
+            # changed distogram (new hash): its rows are recalculated
+            path = keys[3]
+            distograms[path] = get_distograms(1, 2)['/p/m00_cla0-1.pdb']
+            corpus.entries[path] = { \
+                    'distogram': distograms[path], \
+                    'hash': symplot.corpus.get_hash(distograms[path]) }
+
+            assert_equal_corr(self, \
+                corpus.get_correlations(distograms, paths), \
+                interface_correlation.corr_coefficients(distograms, \
+                                                interface_matrix_type == 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,272 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import atoms
+import contacts
+import geometry
+import interface_matrix
+import interface_matrix_signed
+import molmodel
+
+import glob
+import math
+import numpy as np
+import unittest
+
+
+'''
+Regression test of the interface matrices: the KD-tree path
+(create_from_coords) has to give the same matrix elements as the former
+nested loops over all residue pairs.
+
+The coord files of example preassemblies (e.g. the SymProFold tutorial data)
+are used if the environment variable SYMPROFOLD_EXAMPLES points to their
+directory, e.g.
+    SYMPROFOLD_EXAMPLES=/path/SymProFold_Tutorial_Data python -m pytest tests
+otherwise synthetic helix bundles are used.
+'''
+
+examples_max = 20 # maximal number of example coord files
+cutoff = 10 # distance cutoff of the interface matrices
+
+
+# Former implementation (nested loops)
+# ------------------------------------
+
+def create_loop(interface_res, mate_distances, coords):
+    '''
+    Interface matrix as calculated by the former interface_matrix.create,
+    coords: CA coordinates of each entry of interface_res.
+    '''
+    matr = {}
+
+    for i,r0 in enumerate(interface_res):
+        for j,r1 in enumerate(interface_res):
+            if r1[1] <= r0[1]:
+                continue
+
+            d = geometry.dist(coords[i], coords[j])
+            key = (r0[1], r1[1])
+
+            if d <= cutoff:
+                matr[key] = [round(d, 2), \
+                             mate_distances[r0[1]], mate_distances[r1[1]]]
+
+    matr_sort = dict(sorted(matr.items(), key=lambda item: item[0]))
+
+    return matr_sort
+
+
+def create_signed_loop(interface_res, rmsds, xyz):
+    '''
+    Signed interface matrix as calculated by the former
+    interface_matrix_signed.create.
+    '''
+    interface_residues = molmodel.interface_residues_per_model(interface_res)
+
+    matr = {}
+
+    for model_id0 in interface_residues:
+        for model_id1 in interface_residues:
+            if model_id1[1] <= model_id0[1]:
+                continue
+
+            for r0 in interface_residues[model_id0]:
+                for r1 in interface_residues[model_id1]:
+                    d = geometry.dist(xyz(model_id0, r0), xyz(model_id1, r1))
+                    key = ((model_id0[1], model_id1[1]), r0, r1)
+
+                    if d <= cutoff:
+                        matr[key] = [round(d, 2), rmsds[r0], rmsds[r1]]
+
+    matr_sort = dict(sorted(matr.items(), key=lambda item: item[0]))
+
+    return matr_sort
+
+
+# Models
+# ------
+
+def get_helix_bundle(length, fold, seed):
+    '''
+    Synthetic SymPlex: fold-fold bundle of ideal helices (N, CA, C, O, CB
+    on helical paths) with coordinate noise.
+    '''
+    rng = np.random.default_rng(seed)
+    atom_names = ['N', 'CA', 'C', 'O', 'CB']
+    radii = [1.6, 2.3, 1.7, 2.0, 3.3] # distance to helix axis (Å)
+    phases = [-30, 0, 40, 60, 10] # phase relative to CA (degrees)
+    helix_dist = 10 # distance between the axes of neighboring helices (Å)
+
+    radius = helix_dist/(2*math.sin(math.pi/fold))
+
+    name, chainid, resid, xyz = [], [], [], []
+
+    for k in range(fold):
+        angle_k = 2*math.pi*k/fold
+
+        for i in range(length):
+            for n, r, p in zip(atom_names, radii, phases):
+                angle = math.radians(100*i+p)+angle_k
+                pos = [radius*math.cos(angle_k)+r*math.cos(angle), \
+                       radius*math.sin(angle_k)+r*math.sin(angle), \
+                       1.5*i+0.3*p/60]
+
+                name.append(n)
+                chainid.append(chr(ord('A')+k))
+                resid.append(i+1)
+                xyz.append(pos)
+
+    xyz = np.array(xyz)+rng.normal(0, 0.3, (len(xyz), 3))
+
+    return atoms.from_columns(name, ['ALA']*len(name), chainid, resid, \
+                              [n[0] for n in name], xyz)
+
+
+def get_models():
+    ''' Get example models (coord files) or synthetic helix bundles. '''
+
+    path = os.environ.get('SYMPROFOLD_EXAMPLES', '')
+
+    if path != '':
+        files = sorted(glob.glob(path+'/**/*.pdb', recursive=True))
+        models = []
+
+        for f in files:
+            model = atoms.read_pdb(f)
+
+            if len(model.get_chainids()) >= 2:
+                models.append((f, model))
+
+            if len(models) >= examples_max:
+                break
+
+        if len(models) > 0:
+            return models
+
+    return [('bundle_%d_%d' % (length, fold), \
+             get_helix_bundle(length, fold, length*fold)) \
+            for length in [60, 120] for fold in [2, 3, 4, 6]]
+
+
+def get_interface_residues(model, monomer0, monomer1):
+    '''
+    Get interface residues between two monomers as [(0, monomer), resid]
+    (like model_preparation.headless.get_interface_residues).
+    '''
+    chainids = model.get_chainids()
+
+    residues = contacts.get_interface_residues( \
+                    model.get_chain(chainids[monomer0-1]), \
+                    model.get_chain(chainids[monomer1-1]))
+
+    monomers = [monomer0, monomer1]
+
+    return [[(0, monomers[r[0]]), r[1]] for r in residues]
+
+
+def get_xyz_function(model):
+    ''' Get function (model_id, resid) -> CA coordinates of a model. '''
+
+    chainids = model.get_chainids()
+
+    def xyz(model_id, resid):
+        return model.get_xyz_many(chainids[model_id[1]-1], [resid])[0]
+
+    return xyz
+
+
+# Tests
+# -----
+
+class TestInterfaceMatrix(unittest.TestCase):
+    '''
+    Comparison of the KD-tree interface matrices with the nested loops.
+    '''
+
+    def setUp(self):
+        self.models = get_models()
+        self.rng = np.random.default_rng(0)
+
+
+    def get_values(self, model):
+        ''' Random per-residue values (mate distances, rmsds). '''
+
+        resids = model.resids(model.get_chainids()[0])
+
+        return dict(zip(resids, \
+                        [round(float(v), 2) for v in \
+                         self.rng.uniform(0, 5, len(resids))]))
+
+
+    def test_interface_matrix(self):
+        for name, model in self.models:
+            interface_res = get_interface_residues(model, 1, 2)
+            mate_distances = self.get_values(model)
+
+            xyz = get_xyz_function(model)
+            coords = [xyz(r[0], r[1]) for r in interface_res]
+
+            with self.subTest(model=name):
+                self.assertGreater(len(interface_res), 0)
+                self.assertEqual( \
+                    interface_matrix.create_from_coords( \
+                        [r[1] for r in interface_res], coords, \
+                        mate_distances), \
+                    create_loop(interface_res, mate_distances, coords))
+
+
+    def test_interface_matrix_signed(self):
+        for name, model in self.models:
+            chainids = model.get_chainids()
+            rmsds = self.get_values(model)
+            mol_count = len(chainids)
+
+            monomer_pairs = [(m, m+1) for m in range(1, mol_count)]
+            if mol_count >= 3:
+                monomer_pairs.append((1, mol_count))
+
+            for monomer0, monomer1 in monomer_pairs:
+                interface_res = get_interface_residues(model, monomer0, \
+                                                       monomer1)
+                interface_residues = \
+                        molmodel.interface_residues_per_model(interface_res)
+
+                coords = {}
+                for model_id in interface_residues:
+                    coords[model_id] = model.get_xyz_many( \
+                                            chainids[model_id[1]-1], \
+                                            interface_residues[model_id])
+
+                with self.subTest(model=name, monomers=(monomer0, monomer1)):
+                    self.assertEqual( \
+                        interface_matrix_signed.create_from_coords( \
+                            interface_residues, coords, rmsds), \
+                        create_signed_loop(interface_res, rmsds, \
+                                           get_xyz_function(model)))
+
+
+    def test_random_coords(self):
+        '''
+        Random residue sets incl. duplicate resids (same resid in both
+        monomers) and distances close to the cutoff.
+        '''
+        for trial in range(50):
+            n = int(self.rng.integers(0, 60))
+            resids = [int(r) for r in self.rng.integers(1, 40, n)]
+            interface_res = [[(0, int(m)), r] for m, r in \
+                             zip(self.rng.integers(1, 3, n), resids)]
+            coords = self.rng.uniform(0, 20, (n, 3))
+            coords[1::7] = coords[0:-1:7]+[cutoff, 0, 0]
+            values = dict([(r, float(r)/10) for r in range(1, 40)])
+
+            with self.subTest(trial=trial):
+                self.assertEqual( \
+                    interface_matrix.create_from_coords(resids, coords, \
+                                                        values), \
+                    create_loop(interface_res, values, coords))
+
+
+if __name__ == '__main__':
+    unittest.main()
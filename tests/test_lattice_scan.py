@@ -0,0 +1,316 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import atoms
+import contacts
+import lattice_scan
+
+import math
+import numpy as np
+import unittest
+
+
+'''
+Tests of the lattice scan (variation of the lattice constant by translation
+of the snapped-in representations) with synthetic layers and a mock session.
+'''
+
+refpoint_constant = 20 # reference point constant of the synthetic layer
+
+
+# Mock session and layer
+# ----------------------
+
+class Model():
+    ''' Representation of a layer (blob of atoms around a center). '''
+
+    def __init__(self, model_id, layer_atoms):
+        self.id = (model_id,)
+        self.atoms = layer_atoms
+
+
+    def get_center(self):
+        return self.atoms.xyz.mean(axis=0)
+
+
+class Layer():
+    ''' Layer with the representations of the axes. '''
+
+    def __init__(self, models):
+        self.models = models
+
+
+    def ax_models(self, ax):
+        return self.models[ax]
+
+
+class Session():
+    ''' Session providing the atoms of the models and recording moves. '''
+
+    def __init__(self, models):
+        self.models = dict([(m.id[0], m) for m in models])
+        self.moves = []
+
+
+    def get_atoms(self, model_id):
+        model_atoms = self.models[model_id[0]].atoms
+
+        return model_atoms, [], [model_id]*len(model_atoms)
+
+
+    def move_model(self, model_id, shift):
+        self.moves.append((model_id, shift))
+
+
+    def batch(self, label):
+        return Batch()
+
+
+class Batch():
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+def get_blob(center, seed, n=80, radius=13):
+    ''' Atoms distributed in a sphere (one residue per atom). '''
+
+    rng = np.random.default_rng(seed)
+    xyz = rng.normal(0, 1, (n, 3))
+    xyz *= (radius*rng.uniform(0, 1, n)**(1/3)/ \
+            np.linalg.norm(xyz, axis=1))[:, None]
+
+    return atoms.from_columns(['CA']*n, ['ALA']*n, ['A']*n, \
+                              np.arange(1, n+1), ['C']*n, xyz+center)
+
+
+def get_layer(fold=4):
+    '''
+    Synthetic snapped-in layer: representations of axis 0 at the reference
+    points on a ring (radius refpoint_constant), axis 1 at the origin.
+    '''
+    models = [[], []]
+
+    for k in range(fold):
+        angle = 2*math.pi*k/fold
+        center = [refpoint_constant*math.cos(angle), \
+                  refpoint_constant*math.sin(angle), 0]
+        models[0].append(Model(k+1, get_blob(center, k)))
+
+    models[1].append(Model(fold+1, get_blob([0, 0, 0], fold)))
+
+    return [0, 1], Layer(models), models[0]+models[1]
+
+
+def get_scan(curve, lc_offset_step=2):
+    '''
+    LatticeScan with given clashes per lattice offset
+    (curve[k]: clashes of the offset k*lc_offset_step).
+    '''
+    scan = lattice_scan.LatticeScan.__new__(lattice_scan.LatticeScan)
+    scan.lc_offsets = dict([(k*lc_offset_step, c) \
+                            for k, c in enumerate(curve)])
+
+    return scan
+
+
+def get_decayed_ref(curve, lc_offset_step=2):
+    ''' Smallest decayed lattice offset > 0 by definition. '''
+
+    level = abs(curve[0]-curve[-1])*lattice_scan.clash_decay
+
+    for k in range(1, len(curve)-1):
+        if abs(curve[k]-curve[-1]) <= level:
+            return k*lc_offset_step
+
+    return (len(curve)-1)*lc_offset_step
+
+
+class CountingScan(lattice_scan.LatticeScan):
+    ''' LatticeScan with a clash curve, counting the evaluated offsets. '''
+
+    def __init__(self, curve, lc_offset_step=2):
+        self.curve = curve
+        self.lc_offset_step = lc_offset_step
+        self.lc_offsets = {}
+
+
+    def get_clashes(self, lc_offset):
+        if lc_offset not in self.lc_offsets:
+            self.lc_offsets[lc_offset] = \
+                                    self.curve[lc_offset//self.lc_offset_step]
+
+        return self.lc_offsets[lc_offset]
+
+
+# Tests
+# -----
+
+class TestLatticeScan(unittest.TestCase):
+    '''
+    Clashes of the translated representations and the search of the lattice
+    offset compared with the linear scan.
+    '''
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+
+    def test_clash_decay(self):
+        self.assertAlmostEqual(lattice_scan.clash_decay, math.exp(-2), 4)
+
+
+    def test_translate_layer(self):
+        axes, layer, models = get_layer()
+        sess = Session(models)
+
+        lattice_scan.translate_layer(axes, layer, 1.5, sess)
+
+        self.assertEqual([m[0] for m in sess.moves], \
+                         [m.id for m in models])
+
+        for m, (model_id, shift) in zip(models, sess.moves):
+            center = m.get_center()
+            np.testing.assert_allclose(shift, \
+                                       [center[0]/2, center[1]/2, 0])
+
+
+    def test_get_clashes(self):
+        ''' Clashes compared with find_clashes on the moved atoms. '''
+
+        axes, layer, models = get_layer()
+        scan = lattice_scan.LatticeScan(axes, layer, refpoint_constant, \
+                                        Session(models))
+
+        for lc_offset in [0, 4, 10]:
+            scale = (refpoint_constant+lc_offset)/refpoint_constant
+            moved = []
+            group = []
+
+            for i, m in enumerate(models):
+                a = m.atoms.copy()
+                a.xyz = a.xyz.copy()
+                a.xyz[:, :2] += m.get_center()[:2]*(scale-1)
+                moved.append(a)
+                group.append(np.full(len(a), i))
+
+            layer_atoms = atoms.from_columns( \
+                    np.concatenate([a.name for a in moved]), \
+                    np.concatenate([a.resname for a in moved]), \
+                    np.concatenate([[str(i)]*len(a) \
+                                    for i, a in enumerate(moved)]), \
+                    np.concatenate([a.resid for a in moved]), \
+                    np.concatenate([a.element for a in moved]), \
+                    np.concatenate([a.xyz for a in moved]))
+            pairs, overlaps = contacts.find_clashes(layer_atoms, \
+                                        group=np.concatenate(group))
+
+            with self.subTest(lc_offset=lc_offset):
+                self.assertAlmostEqual(scan.get_clashes(lc_offset), \
+                                       100*len(pairs)/len(layer_atoms))
+
+        # clashes decrease with the distance of the representations
+        self.assertGreater(scan.get_clashes(0), scan.get_clashes(10))
+        self.assertEqual(scan.get_clashes(30), 0)
+
+
+    def test_search_layer(self):
+        axes, layer, models = get_layer()
+
+        for lc_offset_max in [10, 20, 30]:
+            scan = lattice_scan.LatticeScan(axes, layer, refpoint_constant, \
+                                            Session(models))
+            curve = [scan.get_clashes(k) \
+                     for k in range(0, lc_offset_max+1, 2)]
+
+            with self.subTest(lc_offset_max=lc_offset_max):
+                self.assertEqual(scan.search(lc_offset_max), \
+                                 get_decayed_ref(curve))
+                self.assertEqual(scan.search_linear(lc_offset_max), \
+                                 get_decayed_ref(curve))
+
+
+    def test_decayed(self):
+        scan = get_scan([10, 6, 2, 1, 1, 0])
+
+        self.assertFalse(scan.decayed(2, 10))
+        self.assertFalse(scan.decayed(4, 10))
+        self.assertTrue(scan.decayed(6, 10))
+        self.assertTrue(scan.decayed(10, 10))
+
+        # no decay (constant clashes): every offset has decayed
+        self.assertTrue(get_scan([3, 3, 3]).decayed(2, 4))
+
+
+    def test_monotone(self):
+        self.assertTrue(get_scan([10, 6, 6, 1, 0]).monotone())
+        self.assertFalse(get_scan([10, 6, 7, 1, 0]).monotone())
+        self.assertTrue(get_scan([]).monotone())
+
+
+    def test_search_linear(self):
+        self.assertEqual(get_scan([10, 6, 2, 1, 1, 0]).search_linear(10), 6)
+        self.assertEqual(get_scan([10, 9, 8, 7, 6, 0]).search_linear(10), 10)
+        self.assertEqual(get_scan([0, 0, 0, 0]).search_linear(6), 2)
+
+
+    def test_search_monotone(self):
+        ''' Decreasing clash curves: same offset as the linear scan. '''
+
+        for trial in range(200):
+            n = int(self.rng.integers(2, 25))
+            curve = list(np.sort(self.rng.exponential(10, n))[::-1])
+            if self.rng.uniform() < 0.3:
+                curve[int(self.rng.integers(0, n))] = \
+                                        curve[int(self.rng.integers(0, n))]
+                curve = sorted(curve, reverse=True)
+
+            lc_offset_max = 2*(n-1)
+            scan = CountingScan(curve)
+
+            with self.subTest(trial=trial, curve=curve):
+                self.assertEqual(scan.search(lc_offset_max), \
+                                 get_decayed_ref(curve))
+
+
+    def test_search_evaluations(self):
+        ''' The golden-section search evaluates fewer offsets. '''
+
+        curve = [100*math.exp(-k/3) for k in range(31)]
+        scan = CountingScan(curve)
+
+        self.assertEqual(scan.search(60), get_decayed_ref(curve))
+        self.assertLess(len(scan.lc_offsets), 15)
+
+
+    def test_search_non_monotone(self):
+        '''
+        Non-monotone clash curves: if a rise is evaluated, the result of the
+        linear scan is returned.
+        '''
+        curve = [10, 0.5, 8, 8, 8, 8, 8, 8, 1, 1, 1]
+        scan = CountingScan(curve)
+        lc_offset = scan.search(20)
+
+        self.assertFalse(scan.monotone())
+        self.assertEqual(lc_offset, get_decayed_ref(curve))
+        self.assertEqual(lc_offset, 2)
+
+        for trial in range(200):
+            n = int(self.rng.integers(3, 25))
+            curve = list(self.rng.exponential(10, n))
+            scan = CountingScan(curve)
+            lc_offset = scan.search(2*(n-1))
+
+            if not scan.monotone():
+                with self.subTest(trial=trial, curve=curve):
+                    self.assertEqual(lc_offset, get_decayed_ref(curve))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import metadata_db
+
+import importlib.util
+import math
+import numpy as np
+import subprocess
+import tempfile
+import unittest
+
+
+'''
+Tests of the headless model preparation (model_preparation.headless and
+tools/model_preparation_headless.py) on a synthetic prediction directory
+with a 4-fold helix bundle.
+
+The model preparation imports model_preparation.sstruct, which requires
+BeautifulSoup (bs4), the tests are skipped without it.
+'''
+
+bs4_available = importlib.util.find_spec('bs4') != None
+script_path = os.path.dirname(os.path.realpath(__file__))+ \
+              '/../tools/model_preparation_headless.py'
+
+
+def write_bundle(path, length, fold, seed):
+    '''
+    Write pdb file of a fold-fold bundle of ideal helices (N, CA, C, O, CB)
+    with coordinate noise and pLDDT 90 in the b factor column.
+    '''
+    rng = np.random.default_rng(seed)
+    atom_names = ['N', 'CA', 'C', 'O', 'CB']
+    radii = [1.6, 2.3, 1.7, 2.0, 3.3] # distance to helix axis (Å)
+    phases = [-30, 0, 40, 60, 10] # phase relative to CA (degrees)
+    helix_dist = 10 # distance between the axes of neighboring helices (Å)
+
+    radius = helix_dist/(2*math.sin(math.pi/fold))
+    serial = 1
+
+    f = open(path, 'w')
+
+    for k in range(fold):
+        angle_k = 2*math.pi*k/fold
+
+        for i in range(length):
+            for n, r, p in zip(atom_names, radii, phases):
+                angle = math.radians(100*i+p)+angle_k
+                pos = np.array([radius*math.cos(angle_k)+r*math.cos(angle), \
+                                radius*math.sin(angle_k)+r*math.sin(angle), \
+                                1.5*i+0.3*p/60])+rng.normal(0, 0.1, 3)
+
+                f.write('ATOM  %5d  %-3s ALA %s%4d    %8.3f%8.3f%8.3f' \
+                        '  1.00%6.2f           %s\n' % \
+                        ((serial, n, chr(ord('A')+k), i+1)+tuple(pos)+ \
+                         (90.0, n[0])))
+                serial += 1
+
+        f.write('TER\n')
+
+    f.write('END\n')
+    f.close()
+
+    return
+
+
+@unittest.skipUnless(bs4_available, 'bs4 (BeautifulSoup) not installed')
+class TestModelPreparationHeadless(unittest.TestCase):
+    '''
+    Headless model preparation of a synthetic 4-fold SymPlex candidate.
+    '''
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.work_dir = self.tmp.name+'/'
+        self.prediction_dir = self.work_dir+'GENE1_4x/'
+
+        os.makedirs(self.prediction_dir)
+        write_bundle(self.prediction_dir+'rank_001_model.pdb', 60, 4, 0)
+
+        f = open(self.work_dir+'GENE1.fasta', 'w')
+        f.write('>GENE1\n'+'A'*60+'\n')
+        f.close()
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def check_export(self, species, gene):
+        ''' Check export directory of the prediction directory. '''
+
+        path_export = self.work_dir+'GENE1_4x_o/'
+
+        self.assertTrue(os.path.isdir(path_export))
+        self.assertFalse(os.path.exists(self.work_dir+'GENE1_4x_o_running'))
+        self.assertTrue(os.path.exists(path_export+ \
+                                       'symm_090/rank_001_model.pdb'))
+        self.assertTrue(os.path.exists(path_export+'symm_090/interfaces/'+ \
+                                       'rank_001_model_interface.txt'))
+
+        entry = metadata_db.get_model(path_export+'rank_001_model.pdb')
+
+        self.assertEqual(entry['symm_order'], 4)
+        self.assertEqual(entry['symm_dir'], 'symm_090')
+        self.assertEqual(entry['clashes'], 0)
+        self.assertEqual(entry['species'], species)
+        self.assertEqual(entry['gene'], gene)
+
+        return
+
+
+    def test_analyze(self):
+        import model_preparation.headless
+
+        model_preparation.headless.analyze(self.prediction_dir, \
+                                           species='spec', gene='gene')
+
+        self.check_export('spec', 'gene')
+
+
+    def test_script(self):
+        ''' Working directory with prediction directories. '''
+
+        p = subprocess.run([sys.executable, script_path, '--workers', '1', \
+                            '--species', 'spec', '--gene', 'gene', \
+                            self.work_dir], capture_output=True, text=True)
+
+        self.assertEqual(p.returncode, 0, p.stdout+p.stderr)
+        self.check_export('spec', 'gene')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,384 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import rigid_body
+
+import math
+import numpy as np
+import re
+import unittest
+from scipy.spatial.transform import Rotation
+
+
+'''
+Tests of the rigid-body transforms: known rotations (incl. identity and
+180 degrees), superposition with pruning compared with the matchmaker
+algorithm of ChimeraX, and the description of a transform compared with the
+former parsing of the ChimeraX "measure rotation" text (get_rot_axis,
+get_rot_axis_point, get_transl_vec of chimerax_api).
+'''
+
+
+# Former implementation (ChimeraX text description)
+# -------------------------------------------------
+
+def get_transl_vec(txt):
+    ''' Get translation vector from ChimeraX text description. '''
+
+    vec = [0,0,0]
+    txt = txt.split("\n")
+
+    vec[0] = txt[1].strip()
+    vec[1] = txt[2].strip()
+    vec[2] = txt[3].strip()
+
+    # replace multiple spaces by a single space
+    vec = [re.sub(r'\s{2,}', ' ', v) for v in vec]
+
+    vec = [v.split(' ')[3] for v in vec]
+    vec = [float(v) for v in vec]
+
+    return vec
+
+
+def get_rot_axis(txt):
+    ''' Get rotation axis from ChimeraX text description. '''
+
+    vec = [0,0,0]
+    txt = txt.split("\n")
+    v0 = txt[4].strip()
+
+    # replace multiple spaces by a single space
+    v0 = re.sub(r'\s{2,}', ' ', v0)
+
+    v0 = v0.split(' ')
+
+    vec = [v0[1], v0[2], v0[3]]
+    vec = [float(v) for v in vec]
+
+    return vec
+
+
+def get_rot_axis_point(txt):
+    ''' Get rotation axis point from ChimeraX text description. '''
+
+    vec = [0,0,0]
+    txt = txt.split("\n")
+    v0 = txt[5].strip()
+
+    # replace multiple spaces by a single space
+    v0 = re.sub(r'\s{2,}', ' ', v0)
+
+    v0 = v0.split(' ')
+
+    vec = [v0[2], v0[3], v0[4]]
+    vec = [float(v) for v in vec]
+
+    return vec
+
+
+def get_description(tf):
+    '''
+    Text description of a transform in the format of ChimeraX
+    (Place.description), axis and angle from the rotation vector (scipy),
+    axis point as point on the axis closest to the origin (least squares).
+    '''
+    r = tf[:, :3]
+    t = tf[:, 3]
+
+    rotvec = Rotation.from_matrix(r).as_rotvec()
+    angle = np.linalg.norm(rotvec)
+    axis = rotvec/angle if angle > 1e-9 else np.array([0.0, 0.0, 1.0])
+    shift = np.dot(t, axis)
+
+    # axis points x: (I-R)x = t-shift*axis, minimum norm solution
+    axis_point = np.linalg.lstsq(np.identity(3)-r, t-shift*axis, \
+                                 rcond=1e-9)[0]
+
+    lines = ['Matrix rotation and translation']
+    lines += [' %12.8f %12.8f %12.8f %12.8f' % tuple(row) for row in tf]
+    lines += ['Axis %12.8f %12.8f %12.8f' % tuple(axis), \
+              'Axis point %12.8f %12.8f %12.8f' % tuple(axis_point), \
+              'Rotation angle (degrees) %12.8f' % math.degrees(angle), \
+              'Shift along axis %12.8f' % shift]
+
+    return '\n'.join(lines)
+
+
+def align_and_prune_ref(xyz, ref_xyz, cutoff_distance, indices):
+    ''' Pruning as in the matchmaker command of ChimeraX (recursive). '''
+
+    tf, rms = rigid_body.align_points(xyz[indices], ref_xyz[indices])
+    d = rigid_body.apply(tf, xyz[indices])-ref_xyz[indices]
+    d2 = (d*d).sum(axis=1)
+    cutoff2 = cutoff_distance*cutoff_distance
+    i = d2.argsort()
+
+    if d2[i[-1]] <= cutoff2:
+        return tf, rms, indices
+
+    index1 = int(len(d2)*0.9)
+    index2 = int(((d2 <= cutoff2).sum()+len(d2))/2)
+    survivors = indices[i[:max(index1, index2)]]
+
+    return align_and_prune_ref(xyz, ref_xyz, cutoff_distance, survivors)
+
+
+# Tests
+# -----
+
+class TestRigidBody(unittest.TestCase):
+    '''
+    Rigid-body transforms compared with scipy and the former ChimeraX
+    text descriptions.
+    '''
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+
+    def random_tf(self):
+        axis = self.rng.normal(0, 1, 3)
+        angle = float(self.rng.uniform(0, 180))
+        center = self.rng.uniform(-20, 20, 3)
+        shift = self.rng.uniform(-5, 5)
+
+        return rigid_body.multiply( \
+                    rigid_body.translation(shift*axis/np.linalg.norm(axis)), \
+                    rigid_body.rotation(axis, angle, center))
+
+
+    def known_tfs(self):
+        ''' Transforms incl. identity, 180 degrees and negative angles. '''
+
+        tfs = [rigid_body.identity(), rigid_body.translation([1, -2, 3])]
+
+        for axis in [[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0], \
+                     [1, -1, 0], [1, 2, 3], [-1, 0, 0]]:
+            for angle in [180, 90, -90, 45, 1e-3, 179.999]:
+                tfs.append(rigid_body.multiply( \
+                            rigid_body.translation([0.5, 0, -1]), \
+                            rigid_body.rotation(axis, angle, [3, -4, 5])))
+
+        return tfs+[self.random_tf() for i in range(50)]
+
+
+    def test_translation(self):
+        tf = rigid_body.translation([1, 2, 3])
+        xyz = self.rng.normal(0, 5, (10, 3))
+
+        np.testing.assert_allclose(rigid_body.apply(tf, xyz), xyz+[1, 2, 3])
+        np.testing.assert_allclose(rigid_body.apply(rigid_body.inverse(tf), \
+                                                    xyz), xyz-[1, 2, 3])
+
+
+    def test_rotation(self):
+        ''' Right-handed rotation around an axis through center. '''
+
+        tf = rigid_body.rotation([0, 0, 1], 90, [1, 0, 0])
+
+        np.testing.assert_allclose(rigid_body.apply(tf, [[2, 0, 0]]), \
+                                   [[1, 1, 0]], atol=1e-12)
+        np.testing.assert_allclose(rigid_body.apply(tf, [[1, 0, 5]]), \
+                                   [[1, 0, 5]], atol=1e-12)
+
+        for i in range(20):
+            axis = self.rng.normal(0, 1, 3)
+            angle = float(self.rng.uniform(-360, 360))
+            r = Rotation.from_rotvec(math.radians(angle)* \
+                                     axis/np.linalg.norm(axis)).as_matrix()
+
+            np.testing.assert_allclose( \
+                    rigid_body.rotation(axis, angle)[:, :3], r, atol=1e-12)
+
+
+    def test_multiply_inverse(self):
+        for i in range(20):
+            tf0 = self.random_tf()
+            tf1 = self.random_tf()
+            xyz = self.rng.normal(0, 5, (10, 3))
+
+            np.testing.assert_allclose( \
+                    rigid_body.apply(rigid_body.multiply(tf0, tf1), xyz), \
+                    rigid_body.apply(tf0, rigid_body.apply(tf1, xyz)))
+            np.testing.assert_allclose( \
+                    rigid_body.multiply(tf0, rigid_body.inverse(tf0)), \
+                    rigid_body.identity(), atol=1e-12)
+
+
+    def test_axis_angle(self):
+        axis, angle = rigid_body.axis_angle(rigid_body.identity())
+        self.assertEqual(angle, 0)
+        np.testing.assert_allclose(axis, [0, 0, 1])
+
+        # sign of the rotation given by the direction of the axis
+        axis, angle = rigid_body.axis_angle(rigid_body.rotation([0, 0, 1], \
+                                                                -90))
+        self.assertAlmostEqual(angle, 90)
+        np.testing.assert_allclose(axis, [0, 0, -1], atol=1e-12)
+
+        for axis_ref in [[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0], \
+                         [1, -1, 0], [1, 2, 3]]:
+            axis_ref = np.array(axis_ref)/np.linalg.norm(axis_ref)
+            axis, angle = rigid_body.axis_angle( \
+                                    rigid_body.rotation(axis_ref, 180))
+
+            with self.subTest(axis=axis_ref):
+                self.assertAlmostEqual(angle, 180)
+                self.assertAlmostEqual(abs(np.dot(axis, axis_ref)), 1)
+
+        for tf in self.known_tfs():
+            axis, angle = rigid_body.axis_angle(tf)
+
+            with self.subTest(tf=tf):
+                self.assertGreaterEqual(angle, 0)
+                self.assertLessEqual(angle, 180)
+                np.testing.assert_allclose( \
+                        rigid_body.rotation(axis, angle)[:, :3], \
+                        tf[:, :3], atol=1e-9)
+
+
+    def test_axis_center_shift(self):
+        ''' Transform recomposed from axis, axis point and shift. '''
+
+        # no rotation: axis z, axis point at the origin (as ChimeraX)
+        axis, center, shift = rigid_body.axis_center_shift( \
+                                    rigid_body.translation([1, -2, 3]))
+        np.testing.assert_allclose(axis, [0, 0, 1])
+        np.testing.assert_allclose(center, [0, 0, 0])
+        self.assertEqual(shift, 3)
+
+        for tf in self.known_tfs()[2:]:
+            axis, center, shift = rigid_body.axis_center_shift(tf)
+            angle = rigid_body.axis_angle(tf)[1]
+
+            with self.subTest(tf=tf):
+                np.testing.assert_allclose( \
+                    rigid_body.multiply( \
+                        rigid_body.translation(shift*axis), \
+                        rigid_body.rotation(axis, angle, center)), \
+                    tf, atol=1e-6)
+
+                self.assertAlmostEqual(np.dot(center, axis), 0)
+
+
+    def test_describe(self):
+        ''' Comparison with the former parsing of ChimeraX descriptions. '''
+
+        for tf in self.known_tfs():
+            angle, axis, axis_point, transl = rigid_body.describe(tf)
+            txt = get_description(tf)
+            axis_ref = get_rot_axis(txt)
+
+            with self.subTest(tf=tf):
+                np.testing.assert_allclose(transl, get_transl_vec(txt), \
+                                           atol=1e-7)
+                self.assertAlmostEqual(angle, \
+                        float(txt.split('\n')[6].split()[-1]), 5)
+
+                if angle < 179.9:
+                    np.testing.assert_allclose(axis, axis_ref, atol=1e-6)
+                else:
+                    # rotation by 180 degrees: axis sign arbitrary
+                    self.assertAlmostEqual( \
+                            abs(np.dot(axis, axis_ref)), 1, 6)
+
+                if angle > 1e-2:
+                    np.testing.assert_allclose(axis_point, \
+                            get_rot_axis_point(txt), atol=1e-4)
+
+        # signed rotation around z (former get_rot_angle_z)
+        for angle_ref in [-120, -30, 30, 120]:
+            angle, axis, axis_point, transl = rigid_body.describe( \
+                                rigid_body.rotation([0, 0, 1], angle_ref, \
+                                                    [10, 0, 0]))
+
+            with self.subTest(angle=angle_ref):
+                self.assertAlmostEqual(angle*axis[2], angle_ref)
+                np.testing.assert_allclose(axis_point, [10, 0, 0], \
+                                           atol=1e-9)
+
+
+    def test_relative(self):
+        tf = self.random_tf()
+        tf_ref = self.random_tf()
+
+        np.testing.assert_allclose( \
+                rigid_body.multiply(tf_ref, rigid_body.relative(tf, tf_ref)), \
+                tf, atol=1e-9)
+
+
+    def test_align_points(self):
+        for tf in self.known_tfs():
+            xyz = self.rng.normal(0, 10, (30, 3))
+            ref_xyz = rigid_body.apply(tf, xyz)
+
+            tf_found, rms = rigid_body.align_points(xyz, ref_xyz)
+
+            with self.subTest(tf=tf):
+                np.testing.assert_allclose(tf_found, tf, atol=1e-8)
+                self.assertAlmostEqual(rms, 0, 6)
+
+        # noisy points: rms of the optimal superposition (Kabsch, SVD)
+        for i in range(20):
+            xyz = self.rng.normal(0, 10, (30, 3))
+            ref_xyz = rigid_body.apply(self.random_tf(), xyz)+ \
+                      self.rng.normal(0, 1, (30, 3))
+            tf, rms = rigid_body.align_points(xyz, ref_xyz)
+
+            a = xyz-xyz.mean(axis=0)
+            b = ref_xyz-ref_xyz.mean(axis=0)
+            u, s, vt = np.linalg.svd(a.T @ b)
+            d = np.sign(np.linalg.det(u @ vt))
+            rms_ref = math.sqrt(max(0, ((a*a).sum()+(b*b).sum()- \
+                                        2*(s[0]+s[1]+d*s[2]))/len(xyz)))
+
+            self.assertAlmostEqual(rms, rms_ref, 6)
+            self.assertAlmostEqual(np.linalg.det(tf[:, :3]), 1)
+
+        with self.assertRaises(Exception):
+            rigid_body.align_points(np.zeros((3, 3)), np.zeros((4, 3)))
+
+
+    def test_align_and_prune(self):
+        ''' Comparison with the matchmaker pruning of ChimeraX. '''
+
+        for trial in range(30):
+            n = 100
+            tf = self.random_tf()
+            xyz = self.rng.normal(0, 10, (n, 3))
+            ref_xyz = rigid_body.apply(tf, xyz)+ \
+                      self.rng.normal(0, 0.3, (n, 3))
+
+            outliers = self.rng.choice(n, int(self.rng.integers(0, 30)), \
+                                       replace=False)
+            ref_xyz[outliers] += self.rng.normal(0, 8, (len(outliers), 3))
+
+            tf_found, rms, indices = rigid_body.align_and_prune(xyz, ref_xyz)
+            tf_ref, rms_ref, indices_ref = align_and_prune_ref(xyz, ref_xyz, \
+                                                    2.0, np.arange(n))
+
+            d = rigid_body.apply(tf_found, xyz[indices])-ref_xyz[indices]
+
+            with self.subTest(trial=trial):
+                self.assertEqual(list(indices), list(indices_ref))
+                np.testing.assert_allclose(tf_found, tf_ref)
+                self.assertAlmostEqual(rms, rms_ref)
+                self.assertLessEqual(np.sqrt((d*d).sum(axis=1)).max(), 2.0)
+                self.assertAlmostEqual(rms, np.sqrt((d*d).sum(axis=1). \
+                                                    mean()))
+
+        # pairs within the cutoff: no pruning
+        xyz = self.rng.normal(0, 10, (20, 3))
+        tf_found, rms, indices = rigid_body.align_and_prune(xyz, xyz+1)
+        self.assertEqual(list(indices), list(range(20)))
+
+        # fewer than 3 pairs remaining
+        with self.assertRaises(Exception):
+            rigid_body.align_and_prune(xyz[:3], \
+                                       self.rng.normal(0, 10, (3, 3)), 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
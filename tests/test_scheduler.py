@@ -0,0 +1,154 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import scheduler
+
+import json
+import socket
+import subprocess
+import tempfile
+import time
+import unittest
+
+
+'''
+Tests of the job locks of the scheduler (claim, reclaim, Heartbeat).
+'''
+
+
+def get_dead_pid():
+    ''' Get process id of a finished process. '''
+
+    p = subprocess.Popen([sys.executable, '-c', ''])
+    p.wait()
+
+    return p.pid
+
+
+def write_lock(lock_path, content, age=0):
+    ''' Write a lock file with given content and age (s). '''
+
+    f = open(lock_path, 'w')
+    f.write(content)
+    f.close()
+
+    mtime = time.time()-age
+    os.utime(lock_path, (mtime, mtime))
+
+    return
+
+
+class TestScheduler(unittest.TestCase):
+    '''
+    Claiming of jobs by lock files.
+    '''
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.lock_dir = self.tmp.name+'/locks/'
+        self.lock_path = scheduler.get_lock_path(self.lock_dir, 'job')
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def test_claim(self):
+        self.assertTrue(scheduler.claim(self.lock_dir, 'job'))
+        self.assertTrue(scheduler.is_own(scheduler.read_owner(self.lock_path)))
+        self.assertTrue(scheduler.job_running(self.lock_dir, 'job'))
+
+        # claimed by a living process (this process)
+        self.assertFalse(scheduler.claim(self.lock_dir, 'job'))
+
+        # no private files left
+        self.assertEqual(os.listdir(self.lock_dir), ['job.lock'])
+
+
+    def test_empty_lock(self):
+        '''
+        A lock file without owner entry (e.g. created but not yet written)
+        is not reclaimed while it is younger than heartbeat_interval.
+        '''
+        os.makedirs(self.lock_dir)
+        write_lock(self.lock_path, '')
+
+        self.assertTrue(scheduler.job_running(self.lock_dir, 'job'))
+        self.assertFalse(scheduler.reclaim(self.lock_path))
+        self.assertFalse(scheduler.claim(self.lock_dir, 'job'))
+        self.assertEqual(scheduler.read_owner(self.lock_path), None)
+
+        # old lock file without owner entry is stale
+        write_lock(self.lock_path, '', 2*scheduler.heartbeat_interval)
+
+        self.assertFalse(scheduler.job_running(self.lock_dir, 'job'))
+        self.assertTrue(scheduler.claim(self.lock_dir, 'job'))
+        self.assertTrue(scheduler.is_own(scheduler.read_owner(self.lock_path)))
+
+
+    def test_reclaim_dead_owner(self):
+        os.makedirs(self.lock_dir)
+        write_lock(self.lock_path, json.dumps( \
+                        { 'pid': get_dead_pid(), \
+                          'host': socket.gethostname(), \
+                          'time': time.time() }))
+
+        self.assertFalse(scheduler.job_running(self.lock_dir, 'job'))
+        self.assertTrue(scheduler.claim(self.lock_dir, 'job'))
+        self.assertTrue(scheduler.is_own(scheduler.read_owner(self.lock_path)))
+
+
+    def test_other_host(self):
+        ''' Owner on another host: alive until heartbeat_timeout. '''
+
+        os.makedirs(self.lock_dir)
+        owner = json.dumps( \
+                    { 'pid': 1, 'host': 'other.host', \
+                      'time': time.time()-2*scheduler.heartbeat_timeout })
+
+        # recent heartbeat (modification time)
+        write_lock(self.lock_path, owner)
+        self.assertFalse(scheduler.claim(self.lock_dir, 'job'))
+
+        # no heartbeat
+        write_lock(self.lock_path, owner, 2*scheduler.heartbeat_timeout)
+        self.assertTrue(scheduler.claim(self.lock_dir, 'job'))
+
+
+    def test_heartbeat(self):
+        self.assertTrue(scheduler.claim(self.lock_dir, 'job'))
+        mtime = time.time()-1000
+        os.utime(self.lock_path, (mtime, mtime))
+
+        with scheduler.Heartbeat(self.lock_dir, 'job') as heartbeat:
+            self.assertTrue(heartbeat.beat())
+            self.assertGreater(os.stat(self.lock_path).st_mtime, mtime+500)
+
+
+    def test_heartbeat_lock_lost(self):
+        '''
+        A lock reclaimed by another process is not modified by the
+        heartbeat of the former owner.
+        '''
+        self.assertTrue(scheduler.claim(self.lock_dir, 'job'))
+
+        with scheduler.Heartbeat(self.lock_dir, 'job') as heartbeat:
+            os.unlink(self.lock_path)
+            owner = json.dumps({ 'pid': 1, 'host': 'other.host', \
+                                 'time': time.time() })
+            write_lock(self.lock_path, owner, 1000)
+            mtime = os.stat(self.lock_path).st_mtime
+
+            self.assertFalse(heartbeat.beat())
+            self.assertEqual(os.stat(self.lock_path).st_mtime, mtime)
+
+            f = open(self.lock_path, 'r')
+            self.assertEqual(f.read(), owner)
+            f.close()
+
+        self.assertEqual(os.listdir(self.lock_dir), ['job.lock'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__))+'/../lib/')
+
+import rigid_body
+import snapin
+
+import numpy as np
+import unittest
+from scipy.spatial.transform import Rotation
+
+
+'''
+Tests of the analytic snap-in transforms: the transforms composed by
+snapin.move, snapin.turn and snapin.match are compared with the individual
+steps applied one after another to synthetic coordinates (centers measured
+again after each step, like the former snapin_layer in the session).
+'''
+
+
+class Model():
+    ''' Representation (model id and CA coordinates of submodel 1). '''
+
+    def __init__(self, model_id, xyz):
+        self.id = (model_id,)
+        self.xyz = xyz
+
+
+class Session():
+    ''' Session providing the initial coordinates of the submodels. '''
+
+    def __init__(self, models):
+        self.models = dict([(m.id[0], m) for m in models])
+
+
+    def resids(self, submodel_id):
+        return list(range(1, len(self.models[submodel_id[0]].xyz)+1))
+
+
+    def get_xyz_many(self, submodel_id, resids):
+        return self.models[submodel_id[0]].xyz[np.array(resids)-1]
+
+
+def get_screen_axes(rng):
+    ''' Random screen axes (rows: x, y, z in scene coordinates). '''
+
+    return Rotation.random(random_state=int(rng.integers(1000))).as_matrix()
+
+
+class TestSnapin(unittest.TestCase):
+    '''
+    Composition of move, turn and match compared with the individual steps.
+    '''
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+
+    def get_models(self, n):
+        '''
+        Models with the same CA trace in random positions, with noise and a
+        few displaced residues (pruned by match).
+        '''
+        trace = np.cumsum(self.rng.normal(0, 2.2, (40, 3)), axis=0)
+        models = []
+
+        for k in range(n):
+            r = Rotation.random(random_state=k).as_matrix()
+            xyz = trace @ r.T+self.rng.uniform(-50, 50, 3)+ \
+                  self.rng.normal(0, 0.2, trace.shape)
+            xyz[self.rng.choice(len(xyz), 3, replace=False)] += 6
+            models.append(Model(k+1, xyz))
+
+        return models
+
+
+    def test_composition(self):
+        for trial in range(20):
+            models = self.get_models(4)
+            sess = Session(models)
+            screen_axes = get_screen_axes(self.rng)
+
+            tfs = dict([(m.id, rigid_body.identity()) for m in models])
+            centers = dict([(m.id, m.xyz.mean(axis=0)) for m in models])
+
+            # coordinates after the individual steps
+            xyz = dict([(m.id, m.xyz.copy()) for m in models])
+
+            for step in range(12):
+                m = models[int(self.rng.integers(len(models)))]
+                op = int(self.rng.integers(3))
+
+                if op == 0:
+                    vect = self.rng.uniform(-20, 20, 3)
+                    snapin.move(m, vect, tfs, screen_axes)
+
+                    xyz[m.id] = xyz[m.id]+vect @ screen_axes
+
+                elif op == 1:
+                    axis = int(self.rng.integers(3))
+                    angle = float(self.rng.uniform(-180, 180))
+                    center = snapin.get_center(m, tfs, centers)
+                    snapin.turn(m, axis, angle, center, tfs, screen_axes)
+
+                    # rotation around the screen axis through the measured
+                    # center
+                    r = Rotation.from_rotvec(np.radians(angle)* \
+                                             screen_axes[axis]).as_matrix()
+                    center = xyz[m.id].mean(axis=0)
+                    xyz[m.id] = (xyz[m.id]-center) @ r.T+center
+
+                else:
+                    m_to = models[(models.index(m)+1)%len(models)]
+                    snapin.match(m, m_to, tfs, sess)
+
+                    tf, rms, indices = rigid_body.align_and_prune( \
+                                            xyz[m.id], xyz[m_to.id], 2.0)
+                    xyz[m.id] = rigid_body.apply(tf, xyz[m.id])
+
+                    with self.subTest(trial=trial, step=step):
+                        self.assertLess(rms, 1.0)
+
+                for m in models:
+                    with self.subTest(trial=trial, step=step, model=m.id):
+                        np.testing.assert_allclose( \
+                                rigid_body.apply(tfs[m.id], m.xyz), \
+                                xyz[m.id], atol=1e-6)
+                        np.testing.assert_allclose( \
+                                snapin.get_center(m, tfs, centers), \
+                                xyz[m.id].mean(axis=0), atol=1e-6)
+
+
+    def test_move_screen_axes(self):
+        ''' Translation along the screen axes (like move_model). '''
+
+        m = self.get_models(1)[0]
+        screen_axes = get_screen_axes(self.rng)
+        tfs = { m.id: rigid_body.identity() }
+
+        snapin.move(m, [1, 0, 0], tfs, screen_axes)
+        snapin.move(m, [0, 0, 2], tfs, screen_axes)
+
+        np.testing.assert_allclose(tfs[m.id][:, 3], \
+                                   screen_axes[0]+2*screen_axes[2])
+        np.testing.assert_allclose(tfs[m.id][:, :3], np.identity(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
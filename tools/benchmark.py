@@ -0,0 +1,876 @@
+import os
+import sys
+sys.path[0] = os.path.dirname(os.path.realpath(__file__))+'/../lib/'
+        # replaces the script directory, the script tools/model_preparation.py
+        # would shadow the package model_preparation in lib/
+
+import atoms
+import contacts
+import ctl
+import export
+import interface_cluster
+import interface_correlation
+import interface_matrix
+import metadata_db
+import model_preparation.headless
+
+import json
+import math
+import numpy as np
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+
+
+
+
+# Benchmark of the assembly and model preparation hot paths
+# - synthetic SymPlexes: n-fold helix bundles (ideal alpha helices) of
+#   configurable chain length, oligomer order (fold) and number of
+#   predictions
+# - time (min and median of repeated runs) and peak memory (tracemalloc,
+#   separate run) of each stage
+# - scaling curves over chain length, fold and number of predictions
+# - stages with ChimeraX when run as ChimeraX script, e.g.
+#   chimerax --nogui --exit --script "benchmark.py --out results.json"
+# - comparison of two result files (e.g. of two commits)
+#
+# usage:
+#   python benchmark.py [--lengths 50,100,..] [--folds 2,3,..]
+#                       [--predictions 4,8,..] [--repeat n]
+#                       [--stages stage,..] [--out results.json]
+#   python benchmark.py --compare base.json results.json [--threshold 1.2]
+# ================================================================
+
+version = 1 # version of the result file
+
+length_base = 100 # chain length of the scaling curves over fold, predictions
+fold_base = 3 # fold of the scaling curves over chain length, predictions
+predictions_base = 8 # predictions of the scaling curves over length, fold
+
+lengths_default = [50, 100, 200, 400]
+folds_default = [2, 3, 4, 6]
+predictions_default = [4, 8, 16, 32]
+
+helix_dist = 10 # distance between the axes of neighboring helices (Å)
+noise = 0.2 # coordinate noise of the predictions (Å)
+
+seq_pattern = 'MKLAELLKKAEELLKRAEELAKKLLEEAKRLAEELKKLAG'
+        # heptad-like sequence of a helix bundle
+
+aa_3 = { 'A': 'ALA', 'E': 'GLU', 'G': 'GLY', 'K': 'LYS', 'L': 'LEU', \
+         'M': 'MET', 'R': 'ARG' }
+
+
+# Synthetic SymPlexes
+# -------------------
+
+def place_atom(a, b, c, bond, angle, torsion):
+    '''
+    Place atom d with given bond length c-d, angle b-c-d and torsion
+    a-b-c-d (degrees) relative to the atoms a, b, c.
+    '''
+    angle = math.radians(angle)
+    torsion = math.radians(torsion)
+
+    bc = (c-b)/np.linalg.norm(c-b)
+    n = np.cross(b-a, bc)
+    n /= np.linalg.norm(n)
+    m = np.cross(n, bc)
+
+    return c-bond*math.cos(angle)*bc+ \
+           bond*math.sin(angle)*math.cos(torsion)*m+ \
+           bond*math.sin(angle)*math.sin(torsion)*n
+
+
+def get_helix(length, phi=-57, psi=-47):
+    '''
+    Get backbone and CB atoms of an ideal alpha helix along the z axis
+    (centered at the origin).
+
+    Return:
+        array (length, 5, 3) with N, CA, C, O, CB of each residue
+    '''
+    res = [[np.array([0, 1.458, 0]), np.zeros(3), np.array([1.525, 0, 0])]]
+
+    for i in range(1, length):
+        n, ca, c = res[-1]
+        n1 = place_atom(n, ca, c, 1.329, 116.2, psi)
+        ca1 = place_atom(ca, c, n1, 1.458, 121.7, 180)
+        c1 = place_atom(c, n1, ca1, 1.525, 111.2, phi)
+        res.append([n1, ca1, c1])
+
+    helix = np.zeros((length, 5, 3))
+
+    for i,(n, ca, c) in enumerate(res):
+        if i < length-1:
+            o = place_atom(res[i+1][0], ca, c, 1.231, 120.5, 180)
+        else:
+            o = place_atom(n, ca, c, 1.231, 120.5, 180-psi)
+
+        helix[i] = [n, ca, c, o, place_atom(c, n, ca, 1.53, 110.5, -122.5)]
+
+    # align helix axis (first principal axis of the CA atoms) to z
+    xyz = helix.reshape(-1, 3)-helix[:, 1].mean(axis=0)
+    u, s, vt = np.linalg.svd(helix[:, 1]-helix[:, 1].mean(axis=0))
+    axis = vt[0] if vt[0][2] >= 0 else -vt[0]
+
+    v = np.cross(axis, [0, 0, 1])
+    cos = axis[2]
+
+    if np.linalg.norm(v) > 1e-8:
+        vx = np.array([[    0, -v[2],  v[1]], \
+                       [ v[2],     0, -v[0]], \
+                       [-v[1],  v[0],     0]])
+        r = np.eye(3)+vx+vx@vx/(1+cos)
+        xyz = xyz@r.T
+
+    return xyz.reshape(length, 5, 3)
+
+
+def get_seq(length):
+    ''' Get sequence of a synthetic SymPlex chain. '''
+
+    return (seq_pattern*(length//len(seq_pattern)+1))[:length]
+
+
+class SymPlexGenerator():
+    '''
+    This class describes a generator of synthetic SymPlexes: n-fold helix
+    bundles written as prediction directories (rank*_model.pdb with pLDDT
+    in the B-factor column, fasta file of the gene) like AlphaFold
+    predictions.
+    '''
+
+
+    def __init__(self, work_dir, seed=0):
+        '''
+        Initialization of the SymPlexGenerator class.
+
+        work_dir: directory of the generated files
+        '''
+        self.work_dir = work_dir
+        self.seed = seed
+        self.helices = {} # length: helix (get_helix)
+
+        return
+
+
+    def get_coords(self, length, fold, prediction=0):
+        '''
+        Get coordinates of a SymPlex (array (fold, length, 5, 3)).
+
+        The predictions differ in the rotation of the helices around their
+        axes (two groups of interfaces) and by coordinate noise.
+        '''
+        if length not in self.helices:
+            self.helices[length] = get_helix(length)
+
+        helix = self.helices[length]
+        radius = helix_dist/(2*math.sin(math.pi/fold))
+        rng = np.random.default_rng([self.seed, length, fold, prediction])
+
+        phase = math.radians(40*(prediction%2))
+        c, s = math.cos(phase), math.sin(phase)
+        helix = helix@np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]]).T
+
+        coords = np.zeros((fold, length, 5, 3))
+
+        for k in range(fold):
+            angle = 2*math.pi*k/fold
+            c, s = math.cos(angle), math.sin(angle)
+            rot = np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+            coords[k] = (helix+[radius, 0, 0])@rot.T
+
+        coords += rng.normal(0, noise, coords.shape)
+
+        return coords
+
+
+    def write_pdb(self, path, length, fold, prediction=0):
+        ''' Write a SymPlex to a pdb file. '''
+
+        coords = self.get_coords(length, fold, prediction)
+        seq = get_seq(length)
+        names = ['N', 'CA', 'C', 'O', 'CB']
+
+        f = open(path, 'w')
+        atom_nr = 1
+
+        for k in range(fold):
+            chainid = chr(ord('A')+k)
+
+            for i in range(length):
+                for j,name in enumerate(names):
+                    if name == 'CB' and seq[i] == 'G':
+                        continue
+
+                    f.write('ATOM  %5d  %-3s %3s %s%4d    %8.3f%8.3f%8.3f' \
+                            '  1.00%6.2f           %s\n' % \
+                            (atom_nr, name, aa_3[seq[i]], chainid, i+1, \
+                             coords[k, i, j, 0], coords[k, i, j, 1], \
+                             coords[k, i, j, 2], 90, name[0]))
+                    atom_nr += 1
+
+            f.write('TER\n')
+
+        f.write('END\n')
+        f.close()
+
+        return
+
+
+    def get_prediction_dir(self, length, fold, predictions):
+        '''
+        Get prediction directory with the given number of predictions of a
+        SymPlex (generated once).
+        '''
+        gene_id = 'BENCH'+str(length)
+        species_dir = self.work_dir+'Bench/'
+        prediction_dir = species_dir+gene_id+'_'+str(length)+'x'+ \
+                         str(fold)+'_'+str(predictions)+'/'
+
+        if os.path.exists(prediction_dir):
+            return prediction_dir
+
+        os.makedirs(prediction_dir)
+
+        f = open(species_dir+gene_id+'.fasta', 'w')
+        f.write('>'+gene_id+'\n'+get_seq(length)+'\n')
+        f.close()
+
+        for prediction in range(predictions):
+            self.write_pdb(prediction_dir+'rank%02d_model.pdb' % \
+                           (prediction+1), length, fold, prediction)
+
+        return prediction_dir
+
+
+    def get_files(self, length, fold, predictions):
+        ''' Get coord files and sequence of the predictions of a SymPlex. '''
+
+        prediction_dir = self.get_prediction_dir(length, fold, predictions)
+
+        files = [prediction_dir+'rank%02d_model.pdb' % (p+1) \
+                 for p in range(predictions)]
+
+        return files, get_seq(length)
+
+
+    def get_export_dir(self, name):
+        ''' Get (empty) export directory of a stage. '''
+
+        path = self.work_dir+'export_'+name+'/'
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+        return path
+
+
+def write_cif(model, path):
+    '''
+    Write the atoms of a model as atom_site table of a cif file in the
+    column layout of ChimeraX (input of export.postprocess).
+    '''
+    rows = []
+
+    for i in range(len(model)):
+        rows.append(['ATOM', str(i+1), model.element[i], model.name[i], '.', \
+                     model.resname[i], model.chainid[i], '1', \
+                     str(model.resid[i]), \
+                     '%.3f' % model.xyz[i][0], '%.3f' % model.xyz[i][1], \
+                     '%.3f' % model.xyz[i][2], model.chainid[i], \
+                     str(model.resid[i]), '?', '1.00', '90.00', '1'])
+
+    widths = [max([len(r[c]) for r in rows]) for c in range(len(rows[0]))]
+
+    f = open(path, 'w')
+    f.write('data_bench\n#\nloop_\n')
+
+    for col in ['group_PDB', 'id', 'type_symbol', 'label_atom_id', \
+                'label_alt_id', 'label_comp_id', 'label_asym_id', \
+                'label_entity_id', 'label_seq_id', 'Cartn_x', 'Cartn_y', \
+                'Cartn_z', 'auth_asym_id', 'auth_seq_id', \
+                'pdbx_PDB_ins_code', 'occupancy', 'B_iso_or_equiv', \
+                'pdbx_PDB_model_num']:
+        f.write('_atom_site.'+col+'\n')
+
+    for r in rows:
+        f.write(' '.join([c.ljust(w) for c, w in zip(r, widths)])+'\n')
+
+    f.write('#\n')
+    f.close()
+
+    return
+
+
+def get_distogram(model):
+    '''
+    Get interface distogram of the first two monomers of a model (like
+    model_preparation.headless.export_interface_matrices).
+    '''
+    interface_residues = model_preparation.headless. \
+                                    get_interface_residues(model, 1, 2)
+
+    chainids = model.get_chainids()
+    resids = model.resids(chainids[0])
+    mate_distances = dict(zip(resids, np.linalg.norm( \
+                            model.get_xyz_many(chainids[0], resids)- \
+                            model.get_xyz_many(chainids[1], resids), axis=1)))
+
+    return interface_matrix.create_from_coords( \
+                [r[1] for r in interface_residues], \
+                model_preparation.headless.get_interface_coords(model, \
+                                                    interface_residues), \
+                mate_distances)
+
+
+def get_distograms(gen, case):
+    '''
+    Get interface distograms of the predictions of a SymPlex, keys like
+    symplot.assemblies_clusters (prediction scenario, fold, score, filename).
+    '''
+    files, seq = gen.get_files(case['length'], case['fold'], \
+                               case['predictions'])
+    distograms = {}
+
+    for i,f in enumerate(files):
+        key = (os.path.dirname(f), case['fold'], 90-i, os.path.basename(f))
+        distograms[key] = get_distogram(atoms.read_pdb(f))
+
+    return distograms
+
+
+# Stages
+# ------
+# Each stage function prepares the input of a case (not timed) and returns
+# the function to time and a function to clean up (or None).
+
+def stage_prepare_file(gen, case, sess):
+    ''' Model preparation of a coord file (headless engine). '''
+
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+    path_export = gen.get_export_dir('prepare_file')
+
+    def run():
+        model_preparation.headless.prepare_file(files[0], seq, path_export)
+
+    return run, metadata_db.close
+
+
+def stage_interface_matrix(gen, case, sess):
+    ''' Interface matrix of the first two monomers from CA coordinates. '''
+
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+    model = atoms.read_pdb(files[0])
+
+    interface_residues = model_preparation.headless. \
+                                    get_interface_residues(model, 1, 2)
+    resids = [r[1] for r in interface_residues]
+    coords = model_preparation.headless.get_interface_coords(model, \
+                                                        interface_residues)
+    mate_distances = {r: 1.0 for r in model.resids()}
+
+    def run():
+        interface_matrix.create_from_coords(resids, coords, mate_distances)
+
+    return run, None
+
+
+def stage_corr_coefficients(gen, case, sess):
+    ''' Correlation coefficients between the distograms of the predictions. '''
+
+    distograms = get_distograms(gen, case)
+
+    def run():
+        interface_correlation.corr_coefficients(distograms)
+
+    return run, None
+
+
+def stage_cluster(gen, case, sess):
+    ''' Clustering of the predictions by correlation coefficients. '''
+
+    corr_coefficients = interface_correlation.corr_coefficients( \
+                                                get_distograms(gen, case))
+
+    def run():
+        interface_cluster.cluster(corr_coefficients)
+
+    return run, None
+
+
+def stage_clashes(gen, case, sess):
+    '''
+    Clashes of the first monomer with the SymPlex and clash counts (core of
+    validation.validation, see validation.get_clashes).
+    '''
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+    model = atoms.read_pdb(files[0])
+    test_mask = model.chainid == model.get_chainids()[0]
+
+    def run():
+        pairs, overlaps = contacts.find_clashes(model, test_mask)
+        contacts.get_clash_counts(model, pairs)
+
+    return run, None
+
+
+def stage_ref_points(gen, case, sess):
+    '''
+    Nearest reference points of the lattice to the CA atoms of a SymPlex
+    (lookups of snapin.snapin_layer).
+    '''
+    from structure.axis import Axis
+    from structure.layer import Layer
+            # import chimerax_api (via bib)
+
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+    coords = atoms.read_pdb(files[0]).xyz
+
+    axis = Axis(None)
+    axis.set_fold(case['fold'])
+
+    layer = Layer([axis])
+    layer.set_symmgroup('p'+str(case['fold']))
+    layer.refpoint_constant = 2*helix_dist
+
+    def run():
+        layer.get_ref_points(coords)
+
+    return run, None
+
+
+def stage_sort_lines(gen, case, sess):
+    ''' Sorting of the atom lines of a cif file (export.sort_lines). '''
+
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+    path = gen.work_dir+'sort_lines.cif'
+    write_cif(atoms.read_pdb(files[0]), path)
+
+    f = open(path, 'r')
+    lines = [l for l in f if l.startswith('ATOM')]
+    f.close()
+
+    def run():
+        export.sort_lines(lines)
+
+    return run, None
+
+
+def stage_postprocess(gen, case, sess):
+    ''' Postprocessing of a cif file (export.postprocess). '''
+
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+    path = gen.work_dir+'postprocess.cif'
+    write_cif(atoms.read_pdb(files[0]), path)
+
+    def run():
+        export.postprocess(path, path[:-4]+'_out.cif')
+
+    return run, None
+
+
+def stage_prepare_file_chimerax(gen, case, sess):
+    ''' Model preparation of a coord file (ChimeraX). '''
+
+    import model_preparation.prepare_file
+
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+    path_export = gen.get_export_dir('prepare_file_chimerax')
+
+    def run():
+        model_preparation.prepare_file.prepare_file(files[0], seq, \
+                                                    path_export, sess)
+
+    return run, metadata_db.close
+
+
+def stage_interface_matrix_chimerax(gen, case, sess):
+    '''
+    Interface matrix of the first two monomers with the coordinates of the
+    ChimeraX models (interface_matrix.create).
+    '''
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+    model = atoms.read_pdb(files[0])
+
+    model_id = sess.open_model(files[0])
+    sess.run('split #'+str(model_id[0]))
+
+    interface_res = [[(model_id[0], r[0][1]), r[1]] for r in \
+                     model_preparation.headless.get_interface_residues( \
+                                                            model, 1, 2)]
+    mate_distances = {r: 1.0 for r in model.resids()}
+
+    def run():
+        interface_matrix.create(interface_res, mate_distances, sess)
+
+    def cleanup():
+        sess.close_id(model_id)
+
+    return run, cleanup
+
+
+def stage_clashes_chimerax(gen, case, sess):
+    '''
+    Clashes of the first monomer with the SymPlex of a ChimeraX model
+    (validation.get_clashes).
+    '''
+    import validation
+
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+
+    model_id = sess.open_model(files[0])
+    sess.run('split #'+str(model_id[0]))
+
+    def run():
+        model_atoms, pairs = validation.get_clashes(model_id+(1,), \
+                                                    model_id, sess)
+        contacts.get_clash_counts(model_atoms, pairs)
+
+    def cleanup():
+        sess.close_id(model_id)
+
+    return run, cleanup
+
+
+def stage_clashes_command(gen, case, sess):
+    '''
+    Clashes of the first monomer with the SymPlex with the ChimeraX command
+    "clashes" (validation.count_clashes_chimerax).
+    '''
+    import validation
+
+    files, seq = gen.get_files(case['length'], case['fold'], 1)
+
+    model_id = sess.open_model(files[0])
+    sess.run('split #'+str(model_id[0]))
+
+    def run():
+        validation.count_clashes_chimerax(model_id+(1,), model_id, sess)
+        sess.run('close #'+str(model_id[0]+1)+'-1000')
+                # models of the clashes created by the command
+
+    def cleanup():
+        sess.close_id(model_id)
+
+    return run, cleanup
+
+
+stages = { \
+    'prepare_file':          [stage_prepare_file, 'headless', \
+                              ['length', 'fold']], \
+    'interface_matrix':      [stage_interface_matrix, 'headless', \
+                              ['length', 'fold']], \
+    'corr_coefficients':     [stage_corr_coefficients, 'headless', \
+                              ['length', 'fold', 'predictions']], \
+    'cluster':               [stage_cluster, 'headless', \
+                              ['length', 'fold', 'predictions']], \
+    'clashes':               [stage_clashes, 'headless', \
+                              ['length', 'fold']], \
+    'ref_points':            [stage_ref_points, 'headless', \
+                              ['length', 'fold']], \
+    'sort_lines':            [stage_sort_lines, 'headless', \
+                              ['length', 'fold']], \
+    'postprocess':           [stage_postprocess, 'headless', \
+                              ['length', 'fold']], \
+    'prepare_file_chimerax': [stage_prepare_file_chimerax, 'chimerax', \
+                              ['length', 'fold']], \
+    'interface_matrix_chimerax': [stage_interface_matrix_chimerax, \
+                              'chimerax', ['length', 'fold']], \
+    'clashes_chimerax':      [stage_clashes_chimerax, 'chimerax', \
+                              ['length', 'fold']], \
+    'clashes_command':       [stage_clashes_command, 'chimerax', \
+                              ['length', 'fold']] }
+        # stage: function, engine, parameters of the case the stage
+        # depends on
+
+
+# Benchmark
+# ---------
+
+def get_cases(lengths, folds, predictions):
+    '''
+    Get cases of the scaling curves over chain length, fold and number of
+    predictions (the other parameters at their base values).
+    '''
+    cases = []
+
+    for length in lengths:
+        cases.append({ 'length': length, 'fold': fold_base, \
+                       'predictions': predictions_base })
+
+    for fold in folds:
+        cases.append({ 'length': length_base, 'fold': fold, \
+                       'predictions': predictions_base })
+
+    for p in predictions:
+        cases.append({ 'length': length_base, 'fold': fold_base, \
+                       'predictions': p })
+
+    return cases
+
+
+def measure(run, repeat):
+    '''
+    Time a function (repeat runs) and determine the peak memory of the
+    Python allocations (incl. numpy arrays) in a separate run (tracemalloc
+    slows down the execution).
+
+    Return:
+        list of times in s, peak memory in bytes
+    '''
+    times = []
+
+    for i in range(repeat):
+        time_start = time.perf_counter()
+        run()
+        times.append(time.perf_counter()-time_start)
+
+    tracemalloc.start()
+    run()
+    memory_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return times, memory_peak
+
+
+def get_commit():
+    ''' Get git commit of the repository (with '+' if modified). '''
+
+    path = os.path.dirname(os.path.realpath(__file__))
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=path, \
+                    capture_output=True, text=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', \
+                                 '--untracked-files=no'], cwd=path, \
+                    capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+    if status != '':
+        commit += '+'
+
+    return commit
+
+
+def benchmark(cases, stage_names, repeat, session=None):
+    '''
+    Run the stages for all cases, stages with ChimeraX only if a ChimeraX
+    session is given.
+
+    Return:
+        list of results (dicts with stage, engine, case parameters, times,
+        time (min), time_median, memory_peak)
+    '''
+    sess = None
+
+    if session != None:
+        import chimerax_api
+        from structure.modelreg import ModelReg
+
+        sess = chimerax_api.ChimeraxSession(session, 1)
+        sess.set_model_reg(ModelReg())
+        sess.run('close session')
+
+    work_dir = tempfile.mkdtemp(prefix='symprofold_benchmark_')+'/'
+    gen = SymPlexGenerator(work_dir)
+    results = []
+    done = set()
+
+    try:
+        for stage in stage_names:
+            function, engine, params = stages[stage]
+
+            if engine == 'chimerax' and sess == None:
+                continue
+
+            for case in cases:
+                case_ = {p: case[p] for p in params}
+                key = (stage,)+tuple(case_.values())
+
+                # cases of a stage independent of the varied parameter
+                if key in done:
+                    continue
+
+                done.add(key)
+
+                try:
+                    run, cleanup = function(gen, case, sess)
+                except ImportError as e:
+                    ctl.p(stage+' skipped: '+str(e))
+                    break
+
+                try:
+                    times, memory_peak = measure(run, repeat)
+                finally:
+                    if cleanup != None:
+                        cleanup()
+
+                result = { 'stage': stage, 'engine': engine }
+                result.update(case_)
+                result.update({ 'times': times, \
+                                'time': min(times), \
+                                'time_median': float(np.median(times)), \
+                                'memory_peak': memory_peak })
+                results.append(result)
+
+                ctl.p(stage+' '+json.dumps(case_)+': '+ \
+                      str(round(min(times)*1000, 2))+' ms, '+ \
+                      str(round(memory_peak/1e6, 2))+' MB')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def write_results(path, results, repeat, chimerax):
+    ''' Write results with the environment of the run (atomic). '''
+
+    f = open(path+'.tmp', 'w')
+    json.dump({ 'version': version, \
+                'commit': get_commit(), \
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'), \
+                'python': platform.python_version(), \
+                'numpy': np.__version__, \
+                'machine': platform.machine(), \
+                'chimerax': chimerax, \
+                'repeat': repeat, \
+                'results': results }, f, indent=1)
+    f.close()
+
+    os.replace(path+'.tmp', path)
+
+    return
+
+
+def get_result_key(result):
+    ''' Get key of a result (stage, engine and case parameters). '''
+
+    return tuple([result[k] for k in ['stage', 'engine']]+ \
+                 [result.get(p) for p in ['length', 'fold', 'predictions']])
+
+
+def compare(path_base, path, threshold=1.2):
+    '''
+    Compare results with base results (e.g. of the previous commit).
+
+    threshold: ratio of time or memory counted as regression
+
+    Return:
+        number of regressions
+    '''
+    runs = []
+
+    for p in [path_base, path]:
+        f = open(p, 'r')
+        runs.append(json.load(f))
+        f.close()
+
+    ctl.p('base: '+runs[0]['commit']+' '+runs[0]['time'])
+    ctl.p('new:  '+runs[1]['commit']+' '+runs[1]['time'])
+
+    base = {get_result_key(r): r for r in runs[0]['results']}
+    regressions = 0
+
+    for r in runs[1]['results']:
+        key = get_result_key(r)
+
+        if key not in base:
+            continue
+
+        time_ratio = r['time']/max(base[key]['time'], 1e-9)
+        memory_ratio = r['memory_peak']/max(base[key]['memory_peak'], 1)
+
+        flag = ''
+        if time_ratio > threshold or memory_ratio > threshold:
+            flag = ' REGRESSION'
+            regressions += 1
+
+        ctl.p(' '.join([str(k) for k in key if k != None])+': time '+ \
+              str(round(time_ratio, 2))+'x, memory '+ \
+              str(round(memory_ratio, 2))+'x'+flag)
+
+    ctl.p(str(regressions)+' regressions')
+
+    return regressions
+
+
+def get_args(argv):
+    '''
+    Get arguments from command line.
+
+    Return:
+        dict of arguments
+    '''
+    args = { 'lengths': lengths_default, \
+             'folds': folds_default, \
+             'predictions': predictions_default, \
+             'repeat': 3, \
+             'stages': list(stages), \
+             'out': 'benchmark.json', \
+             'compare': [], \
+             'threshold': 1.2 }
+
+    i = 1
+    while i < len(argv):
+        arg = argv[i][2:]
+
+        if arg in ['lengths', 'folds', 'predictions']:
+            args[arg] = [int(v) for v in argv[i+1].split(',')]
+        elif arg == 'stages':
+            args[arg] = argv[i+1].split(',')
+        elif arg in ['repeat']:
+            args[arg] = int(argv[i+1])
+        elif arg in ['threshold']:
+            args[arg] = float(argv[i+1])
+        elif arg == 'out':
+            args[arg] = argv[i+1]
+        elif arg == 'compare':
+            args[arg] = argv[i+1:i+3]
+            i += 1
+        else:
+            ctl.e(argv[i])
+            ctl.error('benchmark: unknown argument')
+
+        i += 2
+
+    for stage in args['stages']:
+        if stage not in stages:
+            ctl.e(stage)
+            ctl.error('benchmark: unknown stage')
+
+    return args
+
+
+def main(argv, session=None):
+    ''' Run benchmark or comparison. '''
+
+    args = get_args(argv)
+
+    if len(args['compare']) == 2:
+        return compare(args['compare'][0], args['compare'][1], \
+                       args['threshold'])
+
+    cases = get_cases(args['lengths'], args['folds'], args['predictions'])
+    results = benchmark(cases, args['stages'], args['repeat'], session)
+
+    write_results(args['out'], results, args['repeat'], session != None)
+    ctl.p('results: '+args['out'])
+
+    return 0
+
+
+if __name__ == '__main__':
+    if main(sys.argv) > 0:
+        sys.exit(1)
+elif 'session' in globals():
+    # ChimeraX script (chimerax --nogui --exit --script "benchmark.py ..")
+    main(sys.argv, session)
@@ -0,0 +1,101 @@
+import os
+import sys
+sys.path[0] = os.path.dirname(os.path.realpath(__file__))+'/../lib/'
+        # replaces the script directory, the script tools/model_preparation.py
+        # would shadow the package model_preparation in lib/
+
+import ctl
+import model_preparation.bib
+import model_preparation.parallel
+
+import glob
+
+
+# Preprocessing of predicted SymPlex (Symmetric Protein Complexes)
+# candidate models without ChimeraX (headless)
+# - alignment of whole model to xy plane
+# - counterclockwise renaming of chain ids
+# - determination of the symmetry of SymPlex candidate
+#
+# usage:
+#   python model_preparation_headless.py [--workers n] [--species s]
+#                                        [--gene g] path [path ...]
+#
+#   path: prediction directory (containing the pdb files of the predictions)
+#         or working directory with prediction directories (like in
+#         5_analyze_predictions.py)
+#   species, gene: stored in the metadata database (like the configuration
+#                  of 5_analyze_predictions.py)
+# ================================================================
+
+def get_args(argv):
+    '''
+    Get arguments from command line.
+
+    Return:
+        workers_n, species, gene, list of paths
+    '''
+    workers_n = 1
+    species = ''
+    gene = ''
+    paths = []
+
+    i = 1
+    while i < len(argv):
+        if argv[i] == '--workers':
+            workers_n = int(argv[i+1])
+            i += 2
+            continue
+
+        if argv[i] == '--species':
+            species = argv[i+1]
+            i += 2
+            continue
+
+        if argv[i] == '--gene':
+            gene = argv[i+1]
+            i += 2
+            continue
+
+        paths.append(os.path.realpath(argv[i])+'/')
+        i += 1
+
+    return workers_n, species, gene, paths
+
+
+def get_prediction_dirs(paths):
+    ''' Get prediction directories from given paths. '''
+
+    prediction_dirs = []
+
+    for path in paths:
+        if len(glob.glob(path+'*.pdb')) > 0:
+            prediction_dirs.append(path)
+        else:
+            prediction_dirs += model_preparation.bib.get_prediction_dirs(path)
+
+    return prediction_dirs
+
+
+if __name__ == '__main__':
+    workers_n, species, gene, paths = get_args(sys.argv)
+
+    if len(paths) == 0:
+        ctl.p('usage: python model_preparation_headless.py '+ \
+              '[--workers n] [--species s] [--gene g] path [path ...]')
+        sys.exit(1)
+
+    prediction_dirs = get_prediction_dirs(paths)
+
+    # the coord files of all prediction directories are distributed to the
+    # workers, a prediction directory is exported when all its files are
+    # processed
+    not_completed = model_preparation.parallel.analyze(prediction_dirs, \
+                                                       workers_n, engine=1, \
+                                                       species=species, \
+                                                       gene=gene)
+
+    ctl.p('finished')
+
+    if len(not_completed) > 0:
+        sys.exit(1)